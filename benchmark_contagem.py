@@ -0,0 +1,420 @@
+# Arquivo: benchmark_contagem.py
+# Benchmark offline e reproduzível de contar_gado_em_video: vídeos sintéticos (utils/video_sintetico.py),
+# detector falso ou modelo YOLO real, banco e SFTP em memória. Cada cenário roda num processo novo
+# (pico de RSS isolado) e o resultado vai para um JSON que pode ser comparado com o de uma execução anterior.
+#
+# Exemplos:
+#   python benchmark_contagem.py --saida bench.json
+#   python benchmark_contagem.py --cenarios rapido --modelo n --saida bench_yolo.json
+#   python benchmark_contagem.py --saida depois.json --comparar antes.json
+#   python benchmark_contagem.py --cenarios rapido --rastreadores botsort,bytetrack,iou --saida rastreadores.json
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Any, List, Optional, Callable, Iterator
+
+import numpy as np
+
+VERSAO_FORMATO = 1
+
+# Cenários: resolução, duração e densidade do rebanho, mais os parâmetros da contagem a exercitar.
+CENARIOS: Dict[str, List[Dict[str, Any]]] = {
+    "rapido": [
+        {"nome": "360p_5_animais", "largura": 640, "altura": 360, "frames": 150, "animais": 5},
+    ],
+    "padrao": [
+        {"nome": "360p_5_animais", "largura": 640, "altura": 360, "frames": 300, "animais": 5},
+        {"nome": "360p_30_animais", "largura": 640, "altura": 360, "frames": 300, "animais": 30},
+        {"nome": "720p_15_animais", "largura": 1280, "altura": 720, "frames": 300, "animais": 15},
+        {"nome": "1080p_15_animais", "largura": 1920, "altura": 1080, "frames": 300, "animais": 15},
+        {"nome": "720p_15_animais_lote8", "largura": 1280, "altura": 720, "frames": 300, "animais": 15,
+         "contagem": {"batch_size": 8}},
+        {"nome": "1080p_15_animais_roi_gate", "largura": 1920, "altura": 1080, "frames": 300, "animais": 15,
+         "contagem": {"roi": True, "gate_movimento": True}},
+        {"nome": "720p_15_animais_anotado_metade", "largura": 1280, "altura": 720, "frames": 300, "animais": 15,
+         "contagem": {"perfil_video": "metade"}, "video_anotado": True},
+    ],
+}
+
+ESTAGIOS = ("decodificacao", "inferencia", "rastreamento", "contagem", "codificacao", "quadro")
+
+
+# ---------------------------------------------------------------------------
+# Fakes em memória
+# ---------------------------------------------------------------------------
+class BancoMemoria:
+    """Substitui executar_query: conta os comandos SQL por tipo em vez de ir ao PostgreSQL."""
+
+    def __init__(self):
+        self.chamadas: Dict[str, int] = {}
+
+    def executar_query(self, query: str, params: tuple = (), fetch: Optional[str] = None):
+        comando = query.strip().split(None, 1)[0].upper()
+        self.chamadas[comando] = self.chamadas.get(comando, 0) + 1
+        if fetch == 'one' and comando == "UPDATE" and "RETURNING cancelado" in query:
+            return (False,)  # Flush do progresso: linha existe e não foi cancelada
+        return [] if fetch == 'all' else None
+
+    @property
+    def total(self) -> int:
+        return sum(self.chamadas.values())
+
+
+class SFTPMemoria:
+    """Cliente SFTP em memória com o subconjunto usado pelo sftp_handler e pela fila de transferências."""
+
+    def __init__(self, contador: Dict[str, int]):
+        self.arquivos: Dict[str, bytes] = {}
+        self.contador = contador
+
+    def _contar(self, operacao: str):
+        self.contador[operacao] = self.contador.get(operacao, 0) + 1
+
+    def put(self, local, remoto, callback=None):
+        self._contar("put")
+        with open(local, "rb") as f: self.arquivos[remoto] = f.read()
+
+    def get(self, remoto, local, callback=None):
+        self._contar("get")
+        with open(local, "wb") as f: f.write(self.arquivos[remoto])
+
+    def remove(self, remoto):
+        self._contar("remove")
+        if self.arquivos.pop(remoto, None) is None: raise FileNotFoundError(remoto)
+
+    def stat(self, remoto):
+        self._contar("stat")
+        return os.stat_result((0o040755,) + (0,) * 9)
+
+
+class PoolSFTPMemoria:
+    """Mesma interface do PoolSFTP (executar/garantir_diretorio), sem rede."""
+
+    def __init__(self):
+        self.chamadas: Dict[str, int] = {}
+        self.sftp = SFTPMemoria(self.chamadas)
+
+    def executar(self, operacao: Callable[[Any], Any], tentativas: int = 2) -> Any:
+        return operacao(self.sftp)
+
+    def garantir_diretorio(self, sftp: Any, remote_dir: str):
+        pass
+
+    @property
+    def total(self) -> int:
+        return sum(self.chamadas.values())
+
+
+# ---------------------------------------------------------------------------
+# Medição por estágio
+# ---------------------------------------------------------------------------
+class Cronometro:
+    """Amostras de latência (segundos) por estágio."""
+
+    def __init__(self):
+        self.amostras: Dict[str, List[float]] = {e: [] for e in ESTAGIOS}
+
+    def envolver(self, estagio: str, funcao: Callable) -> Callable:
+        amostras = self.amostras[estagio]
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try: return funcao(*args, **kwargs)
+            finally: amostras.append(time.perf_counter() - inicio)
+        return medida
+
+    def resumo(self) -> Dict[str, Any]:
+        saida = {}
+        for estagio, amostras in self.amostras.items():
+            if not amostras:
+                saida[estagio] = None
+                continue
+            ms = np.asarray(amostras) * 1000.0
+            saida[estagio] = {"n": len(ms), "total_s": round(float(ms.sum()) / 1000.0, 3), "media_ms": round(float(ms.mean()), 3),
+                              **{f"p{p}_ms": round(float(np.percentile(ms, p)), 3) for p in (50, 90, 99)},
+                              "max_ms": round(float(ms.max()), 3)}
+        return saida
+
+
+class _CapturaMedida:
+    """VideoCapture com read/grab cronometrados (o cv2.VideoCapture nativo não aceita monkeypatch)."""
+
+    def __init__(self, cap: Any, cronometro: Cronometro):
+        self._cap = cap
+        self.read = cronometro.envolver("decodificacao", cap.read)
+        self.grab = cronometro.envolver("decodificacao", cap.grab)
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._cap, nome)
+
+
+class _Cv2Medido:
+    """Proxy do módulo cv2 para utils.contagem_video: só o VideoCapture é trocado."""
+
+    def __init__(self, cv2_real: Any, cronometro: Cronometro):
+        self._cv2 = cv2_real
+        self._cronometro = cronometro
+
+    def VideoCapture(self, *args: Any) -> _CapturaMedida:
+        return _CapturaMedida(self._cv2.VideoCapture(*args), self._cronometro)
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._cv2, nome)
+
+
+class _EncoderMedido:
+    """Writer do vídeo anotado (ffmpeg ou OpenCV) com o write cronometrado."""
+
+    def __init__(self, writer: Any, cronometro: Cronometro):
+        self._writer = writer
+        self.write = cronometro.envolver("codificacao", writer.write)
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._writer, nome)
+
+
+class _ProgressoMedido:
+    """ProgressoManager real (sobre o BancoMemoria) que também marca o intervalo entre frames."""
+
+    def __init__(self, progresso: Any, cronometro: Cronometro):
+        self._progresso = progresso
+        self._amostras = cronometro.amostras["quadro"]
+        self._ultimo: Optional[float] = None
+        self.frames = 0
+
+    def atualizar(self, video_name: str, frame_atual: int, total_estimado: int, no_processing: bool = False,
+                  contagem: Optional[int] = None) -> bool:
+        agora = time.perf_counter()
+        if self._ultimo is not None: self._amostras.append(agora - self._ultimo)
+        self._ultimo = agora
+        self.frames += 1
+        return self._progresso.atualizar(video_name, frame_atual, total_estimado, no_processing, contagem)
+
+    def __getattr__(self, nome: str) -> Any:
+        return getattr(self._progresso, nome)
+
+
+@contextmanager
+def _substituir(alvo: Any, nome: str, valor: Any) -> Iterator[None]:
+    original = getattr(alvo, nome)
+    setattr(alvo, nome, valor)
+    try: yield
+    finally: setattr(alvo, nome, original)
+
+
+@contextmanager
+def _na_pasta(pasta: str) -> Iterator[None]:
+    anterior = os.getcwd()
+    os.chdir(pasta)
+    try: yield
+    finally: os.chdir(anterior)
+
+
+def _rss_pico_mb() -> float:
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)  # bytes no macOS, KiB no Linux
+
+
+# ---------------------------------------------------------------------------
+# Execução de um cenário
+# ---------------------------------------------------------------------------
+def executar_cenario(cenario: Dict[str, Any], modelo: str = "blobs", pasta: Optional[str] = None) -> Dict[str, Any]:
+    """Gera o vídeo do cenário, roda contar_gado_em_video instrumentado e devolve as métricas."""
+    os.environ["DATABASE_URL"] = ""  # Nunca abre conexões reais, mesmo com um .env carregado
+    os.environ["USE_SFTP"] = "true"  # SFTP ligado (em memória) para flagrar transferências no caminho crítico
+    os.environ["CREATE_ANNOTATED_VIDEO"] = "true" if cenario.get("video_anotado") else "false"
+    import cv2
+    from utils import contagem_video, gerenciador_progresso, sftp_handler
+    from utils.modelos import ModeloCompartilhado, SessaoRastreamento, registro_modelos
+    from utils.motor_contagem import MotorContagem
+    from utils import renderizacao
+    from utils.video_sintetico import gerar_video_sintetico, DetectorBlobs
+
+    pasta_temporaria = None if pasta else tempfile.mkdtemp(prefix="bench_")
+    pasta = pasta or pasta_temporaria
+    video = gerar_video_sintetico(os.path.join(pasta, f"{cenario['nome']}.mp4"), cenario["largura"], cenario["altura"],
+                                  cenario["frames"], cenario.get("fps", 30.0), cenario["animais"], cenario.get("semente", 0))
+    if modelo == "blobs":
+        registro_modelos.registrar("blobs", DetectorBlobs())
+    registro_modelos.obter(modelo)  # Carga e aquecimento fora da medição
+
+    banco = BancoMemoria()
+    pool_sftp = PoolSFTPMemoria()
+    cronometro = Cronometro()
+    progresso = _ProgressoMedido(gerenciador_progresso.ProgressoManager(), cronometro)
+    video_name = os.path.basename(video["caminho"])
+
+    abrir_encoder_original = renderizacao.abrir_encoder
+    def abrir_encoder_medido(*args: Any, **kwargs: Any):
+        writer, nome = abrir_encoder_original(*args, **kwargs)
+        return _EncoderMedido(writer, cronometro), nome
+
+    with ExitStack() as pilha:
+        for alvo, nome, valor in ((gerenciador_progresso, "executar_query", banco.executar_query),
+                                  (sftp_handler, "_pool", pool_sftp),
+                                  (contagem_video, "cv2", _Cv2Medido(cv2, cronometro)),
+                                  (renderizacao, "abrir_encoder", abrir_encoder_medido),
+                                  (ModeloCompartilhado, "predict", cronometro.envolver("inferencia", ModeloCompartilhado.predict)),
+                                  (SessaoRastreamento, "_aplicar_tracker", cronometro.envolver("rastreamento", SessaoRastreamento._aplicar_tracker)),
+                                  (MotorContagem, "processar", cronometro.envolver("contagem", MotorContagem.processar))):
+            pilha.enter_context(_substituir(alvo, nome, valor))
+        if pasta_temporaria: pilha.callback(shutil.rmtree, pasta_temporaria, True)
+        pilha.enter_context(_na_pasta(pasta))  # Vídeo anotado vai para videos_processados_temp dentro da pasta do cenário
+        progresso.iniciar(video_name)
+        inicio = time.perf_counter()
+        resultado = contagem_video.contar_gado_em_video(video["caminho"], video_name, progresso, model_choice=modelo,
+                                                        orientation="S", **cenario.get("contagem", {}))
+        tempo = time.perf_counter() - inicio
+        if resultado is not None: progresso.finalizar(video_name, resultado)
+        progresso.encerrar(video_name)
+
+    frames = max(1, progresso.frames)
+    return {
+        "nome": cenario["nome"],
+        "cenario": cenario,
+        "modelo": modelo,
+        "frames_processados": progresso.frames,
+        "tempo_s": round(tempo, 3),
+        "fps": round(progresso.frames / tempo, 2) if tempo > 0 else None,
+        "total_count": resultado.get("total_count") if resultado else None,
+        "esperado": video["esperado"],
+        "estagios": cronometro.resumo(),
+        "rss_pico_mb": _rss_pico_mb(),
+        "db": {"chamadas": banco.total, "por_frame": round(banco.total / frames, 4), "por_comando": banco.chamadas},
+        "sftp": {"chamadas": pool_sftp.total, "por_frame": round(pool_sftp.total / frames, 4), "por_operacao": pool_sftp.chamadas},
+        "erro": None if resultado is not None else "contar_gado_em_video retornou None",
+    }
+
+
+def _cenario_em_processo(cenario: Dict[str, Any], modelo: str, saida: Any):
+    try:
+        saida.put(executar_cenario(cenario, modelo))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        saida.put({"nome": cenario["nome"], "cenario": cenario, "modelo": modelo, "erro": f"{e.__class__.__name__}: {e}"})
+
+
+def executar_isolado(cenario: Dict[str, Any], modelo: str) -> Dict[str, Any]:
+    """Roda o cenário num processo novo (spawn), para o pico de RSS e os caches não vazarem entre cenários."""
+    ctx = multiprocessing.get_context("spawn")
+    saida = ctx.Queue()
+    processo = ctx.Process(target=_cenario_em_processo, args=(cenario, modelo, saida))
+    processo.start()
+    resultado = saida.get()
+    processo.join()
+    return resultado
+
+
+# ---------------------------------------------------------------------------
+# Relatório
+# ---------------------------------------------------------------------------
+def _ambiente() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import torch
+        versao_torch = torch.__version__
+    except ImportError:
+        versao_torch = None
+    return {"commit": commit, "python": platform.python_version(), "plataforma": platform.platform(),
+            "cpus": os.cpu_count(), "torch": versao_torch}
+
+
+def _p50_quadro(resultado: Dict[str, Any]) -> Optional[float]:
+    quadro = (resultado.get("estagios") or {}).get("quadro")
+    return quadro["p50_ms"] if quadro else None
+
+
+def comparar(atual: Dict[str, Any], anterior: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """fps e latência por quadro de cada cenário em relação a um JSON anterior."""
+    anteriores = {c["nome"]: c for c in anterior.get("cenarios", [])}
+    linhas = []
+    for c in atual["cenarios"]:
+        a = anteriores.get(c["nome"])
+        if not a or not a.get("fps") or not c.get("fps"): continue
+        linhas.append({"nome": c["nome"], "fps_antes": a["fps"], "fps_depois": c["fps"],
+                       "variacao_fps_pct": round(100.0 * (c["fps"] - a["fps"]) / a["fps"], 1),
+                       "quadro_p50_ms_antes": _p50_quadro(a), "quadro_p50_ms_depois": _p50_quadro(c)})
+    return linhas
+
+
+def com_rastreador(cenario: Dict[str, Any], tipo: str) -> Dict[str, Any]:
+    """Variante do cenário com outro rastreador (utils/rastreadores.py)."""
+    return {**cenario, "nome": f"{cenario['nome']}_{tipo}", "rastreador": tipo,
+            "contagem": {**cenario.get("contagem", {}), "rastreador": {"tipo": tipo}}}
+
+
+def custo_rastreadores(resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Custo por frame do estágio de rastreamento de cada rastreador, somando os cenários, e a contagem obtida."""
+    por_tipo: Dict[str, Dict[str, Any]] = {}
+    for r in resultados:
+        tipo = r.get("cenario", {}).get("rastreador")
+        estagio = (r.get("estagios") or {}).get("rastreamento")
+        if not tipo or not estagio: continue
+        acc = por_tipo.setdefault(tipo, {"rastreador": tipo, "frames": 0, "total_s": 0.0, "p50_ms": [], "contagem": 0, "esperado": 0})
+        acc["frames"] += estagio["n"]; acc["total_s"] += estagio["total_s"]; acc["p50_ms"].append(estagio["p50_ms"])
+        acc["contagem"] += r.get("total_count") or 0; acc["esperado"] += r.get("esperado") or 0
+    return [{**acc, "media_ms_por_frame": round(1000.0 * acc["total_s"] / acc["frames"], 3) if acc["frames"] else None,
+             "p50_ms": round(float(np.median(acc["p50_ms"])), 3), "total_s": round(acc["total_s"], 3)}
+            for acc in por_tipo.values()]
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline de contagem.")
+    parser.add_argument("--cenarios", default="padrao", choices=sorted(CENARIOS), help="Conjunto de cenários.")
+    parser.add_argument("--filtro", default="", help="Roda só os cenários cujo nome contém este texto.")
+    parser.add_argument("--modelo", default="blobs", help="'blobs' (detector falso) ou um model_choice do registro (n, m, l, p).")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Execuções por cenário (o JSON guarda todas).")
+    parser.add_argument("--saida", default="benchmark_resultado.json", help="Arquivo JSON de saída.")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior para comparar.")
+    parser.add_argument("--rastreadores", default="", help="Roda cada cenário com cada rastreador (ex.: 'botsort,bytetrack,iou').")
+    parser.add_argument("--mesmo-processo", action="store_true", help="Não isola os cenários em processos (depuração).")
+    args = parser.parse_args(argv)
+
+    cenarios = [c for c in CENARIOS[args.cenarios] if args.filtro in c["nome"]]
+    tipos = [t.strip().lower() for t in args.rastreadores.split(",") if t.strip()]
+    if tipos:
+        cenarios = [com_rastreador(c, tipo) for c in cenarios for tipo in tipos]
+    resultados = []
+    for cenario in cenarios:
+        for repeticao in range(args.repeticoes):
+            print(f"[BENCH] {cenario['nome']} ({repeticao + 1}/{args.repeticoes}) com modelo '{args.modelo}'...")
+            r = executar_cenario(cenario, args.modelo) if args.mesmo_processo else executar_isolado(cenario, args.modelo)
+            r["repeticao"] = repeticao
+            resultados.append(r)
+            if r.get("erro"): print(f"[BENCH ERRO] {cenario['nome']}: {r['erro']}")
+            else: print(f"[BENCH] {r['nome']}: {r['fps']} fps, contagem {r['total_count']}/{r['esperado']}, "
+                        f"RSS {r['rss_pico_mb']} MB, DB {r['db']['por_frame']}/frame, SFTP {r['sftp']['por_frame']}/frame")
+
+    relatorio = {"versao": VERSAO_FORMATO, "gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"), "ambiente": _ambiente(),
+                 "modelo": args.modelo, "cenarios": resultados}
+    if tipos:
+        relatorio["rastreadores"] = custo_rastreadores(resultados)
+        for linha in relatorio["rastreadores"]:
+            print(f"[BENCH] Rastreador {linha['rastreador']}: {linha['media_ms_por_frame']} ms/frame (p50 {linha['p50_ms']} ms), "
+                  f"contagem {linha['contagem']}/{linha['esperado']}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            relatorio["comparacao"] = comparar(relatorio, json.load(f))
+        for linha in relatorio["comparacao"]:
+            print(f"[BENCH] {linha['nome']}: {linha['fps_antes']} -> {linha['fps_depois']} fps ({linha['variacao_fps_pct']:+.1f}%)")
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"[BENCH] Resultado gravado em {args.saida}")
+    return relatorio
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Arquivo: conftest.py
+# Fixtures compartilhadas pelos testes: progresso em memória para contar_gado_em_video e um servidor SFTP
+# local (paramiko) para o pool de conexões e a fila de transferências, sem rede.
+import os
+import socket
+import tempfile
+import threading
+
+import paramiko
+import pytest
+
+from utils.executor_processos import ProgressoLocal
+
+
+@pytest.fixture
+def progresso():
+    return ProgressoLocal()
+
+
+class _Autorizacao(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if (username, password) == ("gado", "senha") else paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class _HandleLocal(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class _SFTPLocal(paramiko.SFTPServerInterface):
+    """Servidor SFTP mínimo sobre uma pasta local, contando as chamadas de stat."""
+
+    def __init__(self, server, *args, raiz, contadores, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.raiz = raiz
+        self.contadores = contadores
+
+    def _local(self, caminho):
+        return os.path.join(self.raiz, caminho.lstrip("/"))
+
+    def stat(self, path):
+        self.contadores["stat"] += 1
+        try: return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e: return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def canonicalize(self, path):
+        return "/" + path.strip("/.")
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(self._local(path), flags, 0o644)
+            modo = "wb" if flags & os.O_WRONLY else "r+b" if flags & os.O_RDWR else "rb"
+            f = os.fdopen(fd, modo)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        handle = _HandleLocal(flags)
+        handle.readfile = handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try: os.remove(self._local(path))
+        except OSError as e: return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def mkdir(self, path, attr):
+        try: os.mkdir(self._local(path))
+        except OSError as e: return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+
+class ServidorSFTPLocal:
+    """Servidor SSH/SFTP em 127.0.0.1 numa porta livre, para testar o pool sem rede."""
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+        self.chave = paramiko.RSAKey.generate(1024)
+        self.contadores = {"stat": 0, "conexoes": 0}
+        self.transports = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.porta = self.sock.getsockname()[1]
+        threading.Thread(target=self._aceitar, daemon=True).start()
+
+    def _aceitar(self):
+        while True:
+            try: cliente, _ = self.sock.accept()
+            except OSError: return
+            self.contadores["conexoes"] += 1
+            t = paramiko.Transport(cliente)
+            t.add_server_key(self.chave)
+            t.set_subsystem_handler("sftp", paramiko.SFTPServer, _SFTPLocal, raiz=self.raiz, contadores=self.contadores)
+            t.start_server(server=_Autorizacao())
+            self.transports.append(t)
+
+    def derrubar_conexoes(self):
+        for t in self.transports: t.close()
+
+    def fechar(self):
+        self.derrubar_conexoes()
+        self.sock.close()
+
+
+@pytest.fixture
+def servidor():
+    with tempfile.TemporaryDirectory() as raiz:
+        srv = ServidorSFTPLocal(raiz)
+        yield srv
+        srv.fechar()
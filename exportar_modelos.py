@@ -0,0 +1,105 @@
+# Arquivo: exportar_modelos.py
+# Exporta os modelos para ONNX / OpenVINO IR no build da imagem (ou antes do deploy), para que o primeiro job
+# não pague a exportação, e compara os backends num vídeo de amostra (velocidade e concordância das detecções).
+# Com --int8 gera também as variantes quantizadas ("l-int8"), e --desvio-int8 confere a contagem delas contra
+# a fp32 num conjunto de vídeos de referência.
+#
+# Exemplos:
+#   python exportar_modelos.py --modelos l,n --backends openvino,onnx
+#   python exportar_modelos.py --modelos l --comparar amostra.mp4 --passo 30 --saida backends.json
+#   python exportar_modelos.py --modelos l,p --int8 --desvio-int8 ref1.mp4 ref2.mp4 --saida int8.json
+import argparse
+import json
+import os
+import sys
+from typing import Dict, Any, List, Optional
+
+from utils.backends_inferencia import BACKENDS, backend_disponivel, exportacoes
+from utils.quantizacao import SUFIXO_INT8, preparar_calibracao
+
+
+def _lista(texto: str) -> List[str]:
+    return [item.strip().lower() for item in texto.split(",") if item.strip()]
+
+
+def exportar(modelos: List[str], backends: List[str], int8: bool = False) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Exporta cada (modelo, backend) para o cache; None onde o backend não está disponível ou a exportação falhou.
+    Com int8, exporta também "<modelo>-int8", calibrado nas filmagens de MODELOS_INT8_CALIBRACAO_DIR.
+    """
+    from utils.modelos import MODEL_FILES
+    calibracao = preparar_calibracao() if int8 else None
+    if int8 and calibracao is None:
+        print("[EXPORTAR ERRO] Sem filmagens em MODELOS_INT8_CALIBRACAO_DIR: variantes INT8 não geradas.")
+    resultado: Dict[str, Dict[str, Optional[str]]] = {}
+    for choice in modelos:
+        if choice not in MODEL_FILES:
+            print(f"[EXPORTAR ERRO] Modelo '{choice}' desconhecido (use {', '.join(MODEL_FILES)}).")
+            continue
+        variantes = [(choice, None)] + ([(choice + SUFIXO_INT8, calibracao)] if calibracao else [])
+        for nome, calib in variantes:
+            resultado[nome] = {}
+            for backend in backends:
+                if not backend_disponivel(backend, int8=bool(calib)):
+                    print(f"[EXPORTAR] {backend} indisponível neste ambiente; '{nome}' seguirá no PyTorch.")
+                    resultado[nome][backend] = None
+                    continue
+                resultado[nome][backend] = exportacoes.obter(MODEL_FILES[choice], backend, calib)
+    return resultado
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Exporta os modelos YOLO para ONNX / OpenVINO e compara os backends.")
+    parser.add_argument("--modelos", default="l", help="model_choices separados por vírgula (n, m, l, p).")
+    parser.add_argument("--backends", default="openvino,onnx", help="Backends a exportar, separados por vírgula.")
+    parser.add_argument("--comparar", default=None, help="Vídeo de amostra para comparar os backends com o PyTorch.")
+    parser.add_argument("--passo", type=int, default=30, help="Amostra um frame a cada N do vídeo de comparação.")
+    parser.add_argument("--max-frames", type=int, default=50, help="Máximo de frames amostrados para a comparação.")
+    parser.add_argument("--int8", action="store_true", help="Exporta também as variantes INT8 (<modelo>-int8).")
+    parser.add_argument("--desvio-int8", nargs="+", default=None, metavar="VIDEO",
+                        help="Vídeos de referência: compara a contagem INT8 com a fp32 de cada modelo.")
+    parser.add_argument("--orientacao", default="S", help="Orientação do movimento nos vídeos de referência.")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON com o resultado.")
+    args = parser.parse_args(argv)
+
+    backends = [b for b in _lista(args.backends) if b != "pytorch"]
+    invalidos = [b for b in backends if b not in BACKENDS]
+    if invalidos:
+        parser.error(f"Backends inválidos: {', '.join(invalidos)}.")
+    modelos = _lista(args.modelos)
+
+    relatorio: Dict[str, Any] = {"exportacoes": exportar(modelos, backends, args.int8), "cache": exportacoes.situacao()}
+    if args.comparar:
+        from utils.amostragem_frames import amostrar_frames
+        from utils.backends_inferencia import comparar_backends
+        frames = [frame for _, frame in amostrar_frames(args.comparar, args.passo, max(1, args.max_frames))]
+        relatorio["comparacao"] = [comparar_backends(choice, frames, backends) for choice in modelos]
+        for item in relatorio["comparacao"]:
+            for backend, r in item["backends"].items():
+                if not r.get("disponivel"):
+                    print(f"[EXPORTAR] {item['model_choice']}/{backend}: indisponível (usou {r.get('usado')}).")
+                    continue
+                print(f"[EXPORTAR] {item['model_choice']}/{backend}: {r['ms_por_frame_p50']} ms/frame (p50), "
+                      f"{r['deteccoes']} detecções, concordância {r.get('concordancia', 1.0)}, speedup {r.get('speedup_vs_pytorch', 1.0)}x")
+    if args.desvio_int8:
+        from utils.quantizacao import desvio_contagem
+        os.environ["USE_SFTP"] = "false"
+        os.environ["CREATE_ANNOTATED_VIDEO"] = "false"
+        relatorio["desvio_int8"] = [desvio_contagem(choice, args.desvio_int8, orientation=args.orientacao) for choice in modelos]
+        for item in relatorio["desvio_int8"]:
+            print(f"[EXPORTAR] {item['model_choice']}{SUFIXO_INT8} ({item['precisao_int8_usada']}): contagem {item['total_int8']} vs "
+                  f"{item['total_fp32']} fp32 ({item['desvio_total_pct']}%), pior vídeo {item['desvio_max_abs_pct']}%, "
+                  f"speedup {item['speedup_int8']}x -> {'APROVADO' if item['aprovado'] else 'REPROVADO'} (limite {item['limite_pct']}%)")
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        print(f"[EXPORTAR] Resultado gravado em {args.saida}")
+    return relatorio
+
+
+if __name__ == "__main__":
+    relatorio = main()
+    # No build, falha se algum backend pedido e disponível não exportou, ou se a variante INT8 desviou demais.
+    falhou = any(caminho is None and backend_disponivel(b, int8=nome.endswith(SUFIXO_INT8))
+                 for nome, r in relatorio["exportacoes"].items() for b, caminho in r.items())
+    sys.exit(1 if falhou or not all(item["aprovado"] for item in relatorio.get("desvio_int8", [])) else 0)
@@ -7,12 +7,32 @@ import os
 load_dotenv()
 
 # --- AGORA, IMPORTE O RESTO DA SUA APLICAÇÃO ---
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routes import video_routes # Este import agora acontecerá DEPOIS de load_dotenv()
+from utils.gerenciador_progresso import fechar_banco
+from utils.inicializacao import prontidao, preparar_banco_com_backoff, iniciar_aquecimento
+from utils.metricas import metricas
+from utils.sftp_handler import fechar_pool_sftp
+
+# Nada de banco ou modelos no import: a API começa a escutar em menos de um segundo e o banco (com
+# retentativas) e os modelos ficam prontos em segundo plano. O /ready diz quando a instância pode receber jobs.
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    preparo_banco = asyncio.create_task(preparar_banco_com_backoff())
+    iniciar_aquecimento()
+    yield
+    preparo_banco.cancel()
+    video_routes.transferencias.fechar()
+    video_routes.progresso_manager.flush()  # Último progresso dos jobs em memória
+    fechar_pool_sftp()
+    fechar_banco()
 
 # Cria a instância do FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=ciclo_de_vida)
 
 # Configuração do CORS (importante para o frontend se comunicar com o backend)
 # Permite que seu app React Native (rodando em uma origem diferente)
@@ -43,5 +63,16 @@ def read_root():
         "database_url_loaded": db_url_loaded
     }
 
+# Readiness (para o balanceador/autoscaler): 200 com banco e modelos prontos, 503 enquanto aquecem.
+@app.get("/ready")
+def ready_endpoint():
+    situacao = prontidao.situacao()
+    return JSONResponse(status_code=200 if situacao["pronto"] else 503, content=situacao)
+
+# Métricas no formato do Prometheus: jobs, frames, tempo por estágio, banco, SFTP e utilização dos pools.
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Lembre-se que o comando para rodar é:
 # uvicorn main:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
@@ -1,113 +1,412 @@
+import json
 import os
-import shutil
-import threading
 import uuid
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Optional, List
+from collections import OrderedDict
+from contextlib import aclosing
+from fastapi import APIRouter, HTTPException, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.requests import ClientDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, List, Dict
 
 from utils.gerenciador_progresso import ProgressoManager
-from utils.contagem_video import contar_gado_em_video
-from utils.sftp_handler import upload_file_sftp
-from schemas import VideoRequest
+from utils.executor_processos import executar_contagem
+from utils.fila_transferencias import FilaTransferencias, sftp_ativo, caminho_remoto_original, caminho_remoto_processado
+from utils.agendador import AgendadorJobs, FilaCheia
+from utils.metricas import metricas, jobs_total, registrar_tempos_job
+from utils.upload_retomavel import GerenciadorUploads, ArquivoEmEscrita, UploadErro, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_BYTES
+from utils.rastreadores import resolver_config
+from utils.cache_resultados import CacheResultados, calcular_sha256, chave_resultado, chave_deteccoes, recontar_deteccoes
+from schemas import VideoRequest, UploadSessaoRequest
 
 router = APIRouter()
 DATA_DIR = os.getenv("RENDER_DATA_DIR", "data")
 UPLOAD_FOLDER = os.path.join(DATA_DIR, "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Arquivos parciais dos uploads retomáveis; ao concluir, o vídeo é movido para UPLOAD_FOLDER.
+uploads = GerenciadorUploads(os.path.join(DATA_DIR, "uploads_parciais"), UPLOAD_FOLDER)
+# Resultados por conteúdo do vídeo + parâmetros, e detecções para recontagem sem inferência.
+cache_resultados = CacheResultados()
+# SHA-256 calculado durante o upload, consumido pelo /predict-video/ (evita reler o arquivo). Limitado: uploads
+# que nunca chegam ao /predict-video/ saem pelo mais antigo (sem o hash em memória, o predict relê o arquivo).
+HASHES_UPLOADS_MAX = 1000
+hashes_uploads: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _guardar_hash_upload(nome_arquivo: str, sha256: str):
+    hashes_uploads[nome_arquivo] = sha256
+    hashes_uploads.move_to_end(nome_arquivo)
+    while len(hashes_uploads) > HASHES_UPLOADS_MAX:
+        hashes_uploads.popitem(last=False)
 
 progresso_manager = ProgressoManager()
-processos_em_andamento = {}
+# Arquivamento SFTP em segundo plano (fila persistente, retomada após reinício); progresso por tarefa no /progresso.
+transferencias = FilaTransferencias(os.path.join(DATA_DIR, "transferencias"), ao_progresso=progresso_manager.atualizar_transferencia)
+# Limita quantos jobs rodam ao mesmo tempo (MAX_JOBS_SIMULTANEOS) e quantos esperam (MAX_FILA_JOBS).
+agendador = AgendadorJobs()
+
+# Métricas lidas na hora do /metrics.
+metricas.medidor("jobs", "Jobs de contagem na fila e em execução.",
+                 lambda: {(estado,): agendador.resumo()[estado] for estado in ("na_fila", "executando")}, ("estado",))
+metricas.medidor("jobs_max_concorrentes", "Limite de jobs de contagem simultâneos.", lambda: agendador.max_concorrentes)
+metricas.medidor("progresso_ouvintes", "Clientes conectados aos streams de progresso (SSE e WebSocket).",
+                 lambda: progresso_manager.difusor.total_ouvintes())
+metricas.medidor("transferencias_pendentes", "Transferências SFTP na fila (pendentes ou em execução).", lambda: len(transferencias.situacao()))
+
+def _ocupacao_workers():
+    from utils import executor_processos
+    if executor_processos._pool is None: return None  # Backend de threads, ou nenhum job ainda
+    r = executor_processos._pool.resumo()
+    return {("total",): r["workers"], ("vivos",): r["vivos"], ("prontos",): r["prontos"], ("ocupados",): len(r["ocupados"])}
+
+metricas.medidor("workers_processo", "Processos do pool de contagem (EXECUTOR_BACKEND=processo).", _ocupacao_workers, ("estado",))
+
+def _resposta_erro_upload(e: UploadErro) -> JSONResponse:
+    return JSONResponse(status_code=e.status_code, content={"detail": e.mensagem, **e.extra})
+
+# Folga para os cabeçalhos do multipart (boundary, Content-Disposition, nome do arquivo) acima do vídeo em si.
+UPLOAD_FOLGA_MULTIPART_BYTES = 64 * 1024
 
 @router.post("/upload-video/")
-async def upload_video_endpoint(file: UploadFile = File(...)):
+async def upload_video_endpoint(request: Request):
     """
-    Recebe um vídeo do frontend, salva-o temporariamente no disco do servidor
+    Recebe um vídeo do frontend (multipart, campo "file"), salva-o temporariamente no disco do servidor
     com um nome único e retorna esse nome.
+    A gravação é feita em blocos fora do event loop (os /progresso continuam respondendo) e o SHA-256
+    é calculado durante a cópia. Para redes instáveis, prefira o upload retomável em /upload-sessao/.
+
+    O corpo é lido aqui, e não por um parâmetro File(...): assim um Content-Length acima de UPLOAD_MAX_BYTES
+    é recusado com 413 antes de o Starlette copiar o multipart para o disco. Sem Content-Length (chunked),
+    o corpo inteiro ainda é recebido e o limite só vale na cópia para UPLOAD_FOLDER; só o /upload-sessao/
+    aplica o limite enquanto recebe os bytes.
     """
+    tamanho = request.headers.get("content-length")
+    if tamanho and tamanho.isdigit() and int(tamanho) > UPLOAD_MAX_BYTES + UPLOAD_FOLGA_MULTIPART_BYTES:
+        return _resposta_erro_upload(UploadErro(413, f"Arquivo excede o limite de {UPLOAD_MAX_BYTES} bytes.", limite_bytes=UPLOAD_MAX_BYTES))
+    async with request.form() as formulario:
+        file = formulario.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=422, detail="Envie o vídeo no campo 'file' de um formulário multipart.")
+        return await _salvar_upload(file)
+
+async def _salvar_upload(file: UploadFile):
     file_extension = os.path.splitext(file.filename)[1]
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     temp_local_path = os.path.join(UPLOAD_FOLDER, unique_filename)
 
     print(f"[UPLOAD] Recebendo '{file.filename}', salvando como '{unique_filename}'...")
 
+    destino = None
     try:
-        with open(temp_local_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        destino = await run_in_threadpool(ArquivoEmEscrita, temp_local_path)
+        while True:
+            bloco = await file.read(UPLOAD_CHUNK_BYTES)
+            if not bloco:
+                break
+            await run_in_threadpool(destino.escrever, bloco)
+        await run_in_threadpool(destino.fechar)
         print(f"[UPLOAD] Vídeo salvo temporariamente em: {temp_local_path}")
     except Exception as e:
         print(f"[UPLOAD ERRO] Falha ao salvar o arquivo temporariamente: {e}")
+        if destino is not None: destino.abortar()
+        if os.path.exists(temp_local_path): os.remove(temp_local_path)
+        if isinstance(e, UploadErro):
+            return _resposta_erro_upload(e)
         raise HTTPException(status_code=500, detail=f"Falha ao salvar o arquivo no servidor: {str(e)}")
 
-    # O upload para a HostGator e a limpeza foram movidos para dentro de 'contar_gado_em_video'.
-    # Este endpoint agora é muito mais rápido e simples.
+    # O arquivamento na HostGator não acontece aqui: o processamento do job enfileira o original e o vídeo
+    # anotado na FilaTransferencias (SFTP em segundo plano).
 
+    _guardar_hash_upload(unique_filename, destino.hasher.hexdigest())
     return {
         "message": f"Arquivo '{file.filename}' recebido com sucesso.",
-        "nome_arquivo": unique_filename # Retorna o nome único usado no servidor
+        "nome_arquivo": unique_filename, # Retorna o nome único usado no servidor
+        "sha256": destino.hasher.hexdigest(),
     }
 
+# --- Upload retomável: cria a sessão, envia os bytes por PUT a partir do offset confirmado e conclui. ---
+@router.post("/upload-sessao/")
+async def criar_upload_sessao_endpoint(request: UploadSessaoRequest):
+    try:
+        return await run_in_threadpool(uploads.criar, request.nome_arquivo_original, request.tamanho_total, request.sha256)
+    except UploadErro as e:
+        return _resposta_erro_upload(e)
+
+@router.get("/upload-sessao/{upload_id}")
+async def situacao_upload_sessao_endpoint(upload_id: str):
+    """Offset já recebido pelo servidor: depois de uma queda de conexão, o cliente continua daqui."""
+    try:
+        return await run_in_threadpool(uploads.situacao, upload_id)
+    except UploadErro as e:
+        return _resposta_erro_upload(e)
+
+@router.put("/upload-sessao/{upload_id}")
+async def enviar_upload_sessao_endpoint(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """
+    Recebe bytes crus (corpo da requisição) a partir de `offset`. O corpo é lido em streaming e gravado em
+    blocos fora do event loop; se a conexão cair no meio, o que chegou fica salvo e o offset avança até ali.
+    """
+    try:
+        arquivo = await run_in_threadpool(uploads.abrir_escrita, upload_id, offset)
+    except UploadErro as e:
+        return _resposta_erro_upload(e)
+    buffer = bytearray()
+    try:
+        async for parte in request.stream():
+            buffer += parte
+            if len(buffer) >= UPLOAD_CHUNK_BYTES:
+                await run_in_threadpool(arquivo.escrever, bytes(buffer)); buffer.clear()
+        if buffer:
+            await run_in_threadpool(arquivo.escrever, bytes(buffer))
+    except ClientDisconnect:
+        try:
+            if buffer: await run_in_threadpool(arquivo.escrever, bytes(buffer))
+        except UploadErro as e:
+            # O cliente já foi embora e não recebe resposta; o offset salvo continua valendo para retomar.
+            print(f"[UPLOAD ERRO] Falha ao gravar o último bloco da sessão {upload_id}: {e.mensagem}")
+        print(f"[UPLOAD] Conexão caiu na sessão {upload_id}; offset salvo em {arquivo.offset} bytes.")
+    except UploadErro as e:
+        return _resposta_erro_upload(e)
+    finally:
+        # Sempre fecha o arquivo e solta a sessão, inclusive se a gravação falhar (disco cheio, OSError).
+        await run_in_threadpool(uploads.fechar_escrita, upload_id, arquivo)
+    return await run_in_threadpool(uploads.situacao, upload_id)
+
+@router.post("/upload-sessao/{upload_id}/concluir")
+async def concluir_upload_sessao_endpoint(upload_id: str):
+    """Confere tamanho (e o SHA-256, se informado na criação) e libera o arquivo para o /predict-video/."""
+    try:
+        resultado = await run_in_threadpool(uploads.concluir, upload_id)
+    except UploadErro as e:
+        return _resposta_erro_upload(e)
+    _guardar_hash_upload(resultado["nome_arquivo"], resultado["sha256"])
+    return {"message": "Upload concluído com sucesso.", **resultado}
+
+@router.delete("/upload-sessao/{upload_id}")
+async def cancelar_upload_sessao_endpoint(upload_id: str):
+    try:
+        await run_in_threadpool(uploads.cancelar, upload_id)
+    except UploadErro as e:
+        return _resposta_erro_upload(e)
+    return {"status": "cancelado", "upload_id": upload_id}
+
+def _resposta_em_processamento(video_name: str) -> JSONResponse:
+    print(f"[PREDICT AVISO] Vídeo {video_name} já está sendo processado.")
+    return JSONResponse(
+        status_code=409,
+        content={"status": "em_processamento", "message": "Este vídeo já está sendo processado."}
+    )
+
 @router.post("/predict-video/")
 async def predict_video_endpoint(request: VideoRequest):
     video_name_on_server = request.nome_arquivo
-    
-    if progresso_manager.is_processing(video_name_on_server):
-        print(f"[PREDICT AVISO] Vídeo {video_name_on_server} já está sendo processado.")
-        return JSONResponse(
-            status_code=409,
-            content={"status": "em_processamento", "message": "Este vídeo já está sendo processado."}
-        )
-    
-    progresso_manager.iniciar(video_name_on_server)
+    # Reserva antes de qualquer await: de dois POSTs simultâneos do mesmo vídeo, só um passa daqui, então o
+    # perdedor nunca reinicia o estado (banco, progresso, cancelamento) do job que já está rodando. Um job
+    # cancelado também segue reservado até a thread dele sair do agendador.
+    if not agendador.reservar(video_name_on_server):
+        return _resposta_em_processamento(video_name_on_server)
+    try:
+        return await _iniciar_processamento(request)
+    finally:
+        agendador.liberar_reserva(video_name_on_server)
+
+async def _iniciar_processamento(request: VideoRequest):
+    """Corpo do /predict-video/, executado só por quem tem a reserva do vídeo no agendador."""
+    video_name_on_server = request.nome_arquivo
+    # Outra instância da API pode estar processando o mesmo vídeo (o estado fica no banco).
+    if await progresso_manager.is_processing_async(video_name_on_server):
+        return _resposta_em_processamento(video_name_on_server)
+
+    video_path = os.path.join(UPLOAD_FOLDER, video_name_on_server)
+    # Parâmetros que definem a contagem (também compõem a chave do cache de resultados).
+    parametros = dict(
+        model_choice=request.model_choice,
+        orientation=request.orientation,
+        target_classes=request.target_classes,
+        line_position_ratio=request.line_position_ratio,
+        frame_skip=request.frame_skip or 1,
+        gate_movimento=bool(request.gate_movimento),
+        roi=bool(request.roi),
+        roi_banda_ratio=request.roi_banda_ratio or 0.4,
+        linhas=[l.model_dump() for l in request.linhas] if request.linhas else None,
+        zonas=[z.model_dump() for z in request.zonas] if request.zonas else None,
+        segmentos_paralelos=request.segmentos_paralelos or 1,
+        perfil_video=request.perfil_video,
+        backend_inferencia=request.backend_inferencia,
+        rastreador=request.rastreador.model_dump(exclude_none=True) if request.rastreador else None,
+    )
+    if parametros["segmentos_paralelos"] > 1:
+        # O modo por segmentos rastreia todos os frames e não gera vídeo anotado: recusa em vez de ignorar.
+        ignorados = [nome for nome, ativo in (("frame_skip", parametros["frame_skip"] > 1),
+                                              ("gate_movimento", parametros["gate_movimento"]),
+                                              ("perfil_video", parametros["perfil_video"] is not None)) if ativo]
+        if ignorados:
+            return JSONResponse(status_code=400, content={
+                "status": "parametros_invalidos",
+                "message": f"segmentos_paralelos > 1 não suporta: {', '.join(ignorados)}."})
+    if parametros["rastreador"]:
+        # Perfil resolvido já aqui: um perfil inexistente é recusado na hora e a chave do cache usa os parâmetros efetivos.
+        try: parametros["rastreador"] = resolver_config(parametros["rastreador"])
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"status": "parametros_invalidos", "message": str(e)})
+
+    # --- Cache de resultados: mesmo conteúdo + mesmos parâmetros de um job já finalizado conclui na hora. ---
+    video_sha256 = chave = None
+    if request.usar_cache and os.path.isfile(video_path):
+        video_sha256 = hashes_uploads.pop(video_name_on_server, None) or await run_in_threadpool(calcular_sha256, video_path)
+        chave = chave_resultado(video_sha256, parametros)
+        em_cache = await run_in_threadpool(cache_resultados.obter, chave)
+        if em_cache is not None:
+            em_cache.update(video=video_name_on_server, cache={"hit": True, "chave": chave})
+            await progresso_manager.iniciar_async(video_name_on_server)
+            await progresso_manager.finalizar_async(video_name_on_server, em_cache)
+            progresso_manager.encerrar(video_name_on_server)
+            jobs_total.inc(evento="cache")
+            if os.path.exists(video_path): os.remove(video_path)
+            print(f"[CACHE] Resultado reaproveitado para {video_name_on_server} (chave {chave[:12]}).")
+            return {"status": "concluido", "message": "Resultado obtido do cache (vídeo e parâmetros já processados).",
+                    "video_name": video_name_on_server, "resultado": em_cache}
+    chave_det = chave_deteccoes(video_sha256, parametros) if video_sha256 else None
 
     # --- FUNÇÃO DA THREAD CORRIGIDA ---
     def processamento_em_thread():
+        remoto_original = None
         try:
             print(f"[THREAD] Iniciando a chamada para contar_gado_em_video para: {video_name_on_server}")
             
-            # Chama a função de contagem e armazena o resultado retornado
-            resultado = contar_gado_em_video(
-                video_path=os.path.join(UPLOAD_FOLDER, video_name_on_server),
-                video_name=video_name_on_server,
-                progresso_manager=progresso_manager,
-                model_choice=request.model_choice,
-                orientation=request.orientation,
-                target_classes=request.target_classes,
-                line_position_ratio=request.line_position_ratio,
-            )
+            deteccoes = cache_resultados.carregar_deteccoes(chave_det)
+            if deteccoes is not None:
+                # Mesmo vídeo e modelo já rastreados: só a linha/orientação mudou, reconta sem inferência.
+                progresso_manager.update_status_message(video_name_on_server, "Recontando a partir das detecções em cache...")
+                resultado = recontar_deteccoes(deteccoes, video_name_on_server, **parametros)
+                if os.path.exists(video_path): os.remove(video_path)
+            else:
+                if sftp_ativo() and os.path.isfile(video_path):
+                    # O original vai para a HostGator em segundo plano; a contagem começa já no arquivo local.
+                    remoto_original = caminho_remoto_original(video_name_on_server)
+                    transferencias.enfileirar_upload(video_path, remoto_original, video_name_on_server)
+                # Chama a função de contagem (em thread ou no pool de processos, conforme EXECUTOR_BACKEND)
+                resultado = executar_contagem(
+                    progresso_manager,
+                    video_name_on_server,
+                    video_path=video_path,
+                    batch_size=request.batch_size or 1,
+                    comparar_sequencial=bool(request.comparar_sequencial),
+                    salvar_deteccoes=cache_resultados.caminho_deteccoes(chave_det) if chave_det else None,
+                    **parametros,
+                )
+            arquivo_processado = resultado.pop("arquivo_processado", None) if resultado else None
+            if resultado is not None and chave:
+                cache_resultados.gravar(chave, video_sha256, parametros, resultado)
+                if chave_det: cache_resultados.limpar_deteccoes()
             
             # Se 'resultado' não for None (ou seja, o processamento foi bem-sucedido e não foi cancelado)...
             if resultado is not None:
                 # ...chama .finalizar() para atualizar o banco de dados com os resultados.
                 print(f"[THREAD] contagem_video retornou um resultado. Finalizando o progresso no banco de dados...")
                 progresso_manager.finalizar(video_name_on_server, resultado)
+                registrar_tempos_job(resultado.get("tempos"))
+                jobs_total.inc(evento="concluido")
             else:
                 # Se resultado for None, o erro ou cancelamento já foi tratado dentro de contar_gado_em_video
                 # e o status no banco de dados já foi atualizado para finalizado=True.
                 print(f"[THREAD] contagem_video retornou None. O status já deve estar como erro ou cancelado.")
+                jobs_total.inc(evento="interrompido")
+            # O cliente já tem a contagem; o vídeo anotado é arquivado em segundo plano.
+            if arquivo_processado and os.path.isfile(arquivo_processado):
+                transferencias.enfileirar_upload(arquivo_processado, caminho_remoto_processado(os.path.basename(arquivo_processado)),
+                                                 video_name_on_server, mover=True)
 
         except Exception as e:
             import traceback
             print(f"[THREAD ERRO FATAL] Um erro inesperado ocorreu na thread para {video_name_on_server}: {e}")
             traceback.print_exc()
             progresso_manager.erro(video_name_on_server, f"Erro crítico na thread: {str(e)}")
+            jobs_total.inc(evento="falhou")
+        finally:
+            # O original só fica na HostGator enquanto o job roda (se o envio nem começou, é descartado).
+            if remoto_original:
+                try: transferencias.enfileirar_remocao(remoto_original, video_name_on_server)
+                except Exception as e: print(f"[TRANSFER ERRO] Falha ao enfileirar remoção de {remoto_original}: {e}")
+            # Libera o estado em memória do job (o banco já tem o estado final).
+            progresso_manager.encerrar(video_name_on_server)
 
-    thread = threading.Thread(target=processamento_em_thread)
-    thread.start()
-    processos_em_andamento[video_name_on_server] = thread
+    try:
+        await progresso_manager.iniciar_async(video_name_on_server)
+        posicao = agendador.submeter(video_name_on_server, processamento_em_thread, prioridade=request.prioridade or 0)
+        jobs_total.inc(evento="enfileirado")
+    except FilaCheia as e:
+        await progresso_manager.erro_async(video_name_on_server, str(e))
+        jobs_total.inc(evento="recusado")
+        print(f"[PREDICT AVISO] Fila cheia, recusando {video_name_on_server}.")
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)},
+            content={"status": "fila_cheia", "message": str(e), "retry_after": e.retry_after}
+        )
 
     return {
-        "status": "iniciado",
-        "message": f"Processamento para '{video_name_on_server}' iniciado.",
-        "video_name": video_name_on_server
+        "status": "iniciado" if posicao == 0 else "na_fila",
+        "message": f"Processamento para '{video_name_on_server}' iniciado." if posicao == 0 else f"Processamento para '{video_name_on_server}' na fila (posição {posicao + 1}).",
+        "video_name": video_name_on_server,
+        "fila": agendador.situacao(video_name_on_server)
     }
 
 @router.get("/progresso/{video_name}")
 async def progresso_endpoint(video_name: str):
-    return progresso_manager.status(video_name)
+    status = await progresso_manager.status_async(video_name)
+    fila = agendador.situacao(video_name)
+    if fila and fila["estado"] == "na_fila":
+        status = {**status, "fila": fila}
+    return status
+
+def _evento_progresso(estado: dict) -> str:
+    """Nome do evento do stream para um estado: progresso, concluido, erro ou cancelado."""
+    if not estado.get("finalizado"): return "progresso"
+    if estado.get("cancelado"): return "cancelado"
+    return "erro" if estado.get("erro") else "concluido"
+
+@router.get("/progresso/{video_name}/stream")
+async def progresso_stream_endpoint(video_name: str, request: Request):
+    """
+    Server-sent events com o progresso do job: frame atual, mensagens de status, contagem parcial,
+    transferências SFTP e, por fim, o resultado. Substitui o polling do /progresso; todos os clientes
+    do mesmo job leem do mesmo canal em memória. O stream termina quando o job e o arquivamento acabam.
+    """
+    async def eventos():
+        versao = 0
+        async with aclosing(progresso_manager.acompanhar(video_name)) as estados:  # Libera o canal na desconexão
+            async for estado in estados:
+                if await request.is_disconnected(): break
+                if estado is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                versao += 1
+                yield f"id: {versao}\nevent: {_evento_progresso(estado)}\ndata: {json.dumps(estado, default=str)}\n\n"
+    return StreamingResponse(eventos(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/ws/progresso/{video_name}")
+async def progresso_websocket_endpoint(websocket: WebSocket, video_name: str):
+    """Mesmo conteúdo do stream SSE, como mensagens JSON {"evento": ..., "dados": ...}; fecha ao fim do job."""
+    await websocket.accept()
+    try:
+        async with aclosing(progresso_manager.acompanhar(video_name)) as estados:
+            async for estado in estados:
+                if estado is None:
+                    await websocket.send_json({"evento": "heartbeat"})
+                    continue
+                await websocket.send_text(json.dumps({"evento": _evento_progresso(estado), "dados": estado}, default=str))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 @router.get("/cancelar-processamento/{video_name}")
 async def cancelar_endpoint(video_name: str):
-    if progresso_manager.cancelar(video_name):
+    if await progresso_manager.cancelar_async(video_name):
+      # Um job que ainda estava na fila nunca vai rodar: sai do agendador e libera o estado em memória.
+      if agendador.remover(video_name):
+          progresso_manager.encerrar(video_name)
       return {"message": f"Solicitação de cancelamento para {video_name} enviada."}
     return {"message": f"Não foi possível cancelar ou o processo para {video_name} não está ativo."}
\ No newline at end of file
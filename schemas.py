@@ -1,9 +1,63 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 
 # BaseModel é a classe base do Pydantic para criar modelos de dados.
 # Field é usado para adicionar metadados extras aos campos, como exemplos, descrições e validações.
 
+class UploadSessaoRequest(BaseModel):
+    """Abre uma sessão de upload retomável (POST /upload-sessao/)."""
+    nome_arquivo_original: str = Field(..., example="curral_manha.mp4")
+    tamanho_total: int = Field(..., gt=0, example=2147483648, description="Tamanho do arquivo em bytes.")
+    sha256: Optional[str] = Field(
+        default=None,
+        description="SHA-256 do arquivo (hex). Se informado, é conferido ao concluir o upload."
+    )
+
+
+class LinhaConfig(BaseModel):
+    """
+    Linha de contagem extra, em coordenadas normalizadas (0.0 a 1.0) do frame.
+    Os lados são relativos a quem caminha de (x1, y1) para (x2, y2).
+    """
+    nome: str = Field(..., example="pista_1")
+    x1: float = Field(..., ge=0.0, le=1.0)
+    y1: float = Field(..., ge=0.0, le=1.0)
+    x2: float = Field(..., ge=0.0, le=1.0)
+    y2: float = Field(..., ge=0.0, le=1.0)
+    sentido: Literal["esquerda_direita", "direita_esquerda", "ambos"] = Field(
+        default="ambos",
+        description="Sentido contado. 'ambos' conta os dois, separados em por_sentido (ex.: entrada/saída)."
+    )
+
+
+class ZonaConfig(BaseModel):
+    """Zona poligonal de contagem (entradas e saídas), com vértices em coordenadas normalizadas (0.0 a 1.0)."""
+    nome: str = Field(..., example="curral")
+    pontos: List[List[float]] = Field(..., min_length=3, example=[[0.1, 0.1], [0.5, 0.1], [0.5, 0.6], [0.1, 0.6]])
+
+
+class RastreadorConfig(BaseModel):
+    """
+    Rastreador do job: tipo, perfil de câmera (perfis_camera.yaml) e ajustes por cima do perfil.
+    Campos omitidos vêm do perfil ou, sem perfil, dos padrões do tipo.
+    """
+    tipo: Optional[Literal["bytetrack", "botsort", "iou"]] = Field(
+        default=None,
+        example="iou",
+        description="'botsort' (padrão, com compensação de movimento da câmera), 'bytetrack' ou 'iou' (leve, para câmeras fixas de brete)."
+    )
+    perfil: Optional[str] = Field(default=None, example="brete", description="Perfil de câmera com os parâmetros da instalação.")
+    track_buffer: Optional[int] = Field(default=None, ge=1, example=30, description="Frames (a 30 fps) que um track perdido é mantido.")
+    match_thresh: Optional[float] = Field(default=None, gt=0.0, le=1.0, example=0.8, description="Limiar de associação do ByteTrack/BoT-SORT.")
+    track_high_thresh: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="Confiança da primeira associação (ByteTrack/BoT-SORT).")
+    track_low_thresh: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="Confiança mínima da segunda associação (ByteTrack/BoT-SORT).")
+    new_track_thresh: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="Confiança mínima para abrir um track novo.")
+    gmc: Optional[bool] = Field(default=None, example=False, description="Liga/desliga a compensação de movimento da câmera do BoT-SORT.")
+    iou_min: Optional[float] = Field(default=None, gt=0.0, le=1.0, example=0.3, description="IoU mínimo para manter o ID (rastreador 'iou').")
+    distancia_max: Optional[float] = Field(default=None, gt=0.0, example=0.5,
+                                           description="Distância máxima entre centros, em diagonais da caixa, quando não há IoU (rastreador 'iou').")
+
+
 class VideoRequest(BaseModel):
     """
     Define a estrutura esperada para o corpo da requisição POST em /predict-video/.
@@ -27,7 +81,9 @@ class VideoRequest(BaseModel):
     model_choice: Optional[str] = Field(
         default="l",
         example="l",
-        description="Escolha do modelo YOLO: 'n' (nano), 'm' (médio), 'l' (grande), ou 'p' (próprio/best.pt)."
+        description="Escolha do modelo YOLO: 'n' (nano), 'm' (médio), 'l' (grande), ou 'p' (próprio/best.pt). "
+                    "Com o sufixo '-int8' (ex.: 'l-int8') usa a variante quantizada, mais rápida na CPU e com contagem "
+                    "verificada contra a fp32 (exportar_modelos.py --desvio-int8)."
     )
     
     target_classes: Optional[List[str]] = Field(
@@ -44,10 +100,101 @@ class VideoRequest(BaseModel):
         description="Posição da linha de contagem para linhas Horizontais/Verticais (0.0 a 1.0)."
     )
 
+    batch_size: Optional[int] = Field(
+        default=1,
+        ge=1,
+        le=32,
+        example=4,
+        description="Quantidade de frames inferidos por chamada do modelo. 1 = frame a frame; valores maiores aproveitam melhor a CPU."
+    )
+
+    frame_skip: Optional[int] = Field(
+        default=1,
+        ge=1,
+        le=30,
+        example=1,
+        description="Processa 1 a cada N frames do vídeo. 1 = todos os frames."
+    )
+
+    gate_movimento: Optional[bool] = Field(
+        default=False,
+        example=True,
+        description="Só roda o detector quando há movimento perto da linha de contagem (ou animais sendo rastreados). Acelera vídeos com a câmera vazia na maior parte do tempo."
+    )
+
+    roi: Optional[bool] = Field(
+        default=False,
+        example=True,
+        description="Roda o detector só numa faixa em volta da linha de contagem (tiles ao longo da linha nas orientações diagonais). Reduz bastante o custo em vídeos 1080p/4K."
+    )
+
+    roi_banda_ratio: Optional[float] = Field(
+        default=0.4,
+        gt=0.0,
+        le=1.0,
+        example=0.4,
+        description="Largura da faixa do ROI como fração da dimensão perpendicular à linha (altura para linhas horizontais, largura para verticais)."
+    )
+
+    linhas: Optional[List[LinhaConfig]] = Field(
+        default=None,
+        description="Linhas de contagem extras (ex.: várias pistas ou entrada/saída), contadas junto com a linha da orientação."
+    )
+
+    zonas: Optional[List[ZonaConfig]] = Field(
+        default=None,
+        description="Zonas poligonais onde são contadas as entradas e saídas de animais."
+    )
+
+    perfil_video: Optional[Literal["completo", "metade", "fps_reduzido", "destaques"]] = Field(
+        default=None,
+        example="metade",
+        description="Perfil do vídeo anotado (quando CREATE_ANNOTATED_VIDEO está ligado): 'completo', 'metade' (metade da resolução), 'fps_reduzido' ou 'destaques' (só trechos em volta de cada contagem). Padrão: RENDER_PERFIL do servidor."
+    )
+
+    rastreador: Optional[RastreadorConfig] = Field(
+        default=None,
+        description="Rastreador e seus parâmetros (por requisição ou por perfil de câmera). Padrão: RASTREADOR_PADRAO do servidor."
+    )
+
+    backend_inferencia: Optional[Literal["auto", "pytorch", "onnx", "openvino"]] = Field(
+        default=None,
+        example="auto",
+        description="Backend de inferência na CPU: 'auto' (o mais rápido disponível: OpenVINO, ONNX Runtime ou PyTorch), 'pytorch', 'onnx' ou 'openvino'. O modelo é exportado no primeiro uso; se o backend falhar, usa PyTorch. Padrão: MODELOS_BACKEND do servidor."
+    )
+
+    segmentos_paralelos: Optional[int] = Field(
+        default=1,
+        ge=1,
+        le=16,
+        example=1,
+        description="Divide vídeos longos em N trechos processados em paralelo (tracks costurados nas emendas). 1 = processamento sequencial. Neste modo não é gerado vídeo anotado e frame_skip, gate_movimento e perfil_video não são aceitos."
+    )
+
+    comparar_sequencial: Optional[bool] = Field(
+        default=False,
+        example=False,
+        description="Só no modo segmentos_paralelos > 1: roda também a contagem sequencial e informa speedup e concordância no resultado."
+    )
+
+    usar_cache: Optional[bool] = Field(
+        default=True,
+        example=True,
+        description="Reaproveita o resultado de um job finalizado com o mesmo vídeo (mesmo conteúdo) e os mesmos parâmetros; se só a linha/orientação mudou, reconta a partir das detecções salvas, sem rodar o modelo."
+    )
+
+    prioridade: Optional[int] = Field(
+        default=0,
+        ge=-10,
+        le=10,
+        example=0,
+        description="Prioridade na fila de processamento. Maior sai primeiro; empates seguem a ordem de chegada."
+    )
+
 # Exemplo de como usar em video_routes.py:
 # from schemas import VideoRequest
 #
 # @router.post("/predict-video/")
 # async def predict_video_endpoint(request: VideoRequest):
 #     # FastAPI usará a classe acima para validar a requisição
-#     # ...
\ No newline at end of file
+#     # ...
@@ -0,0 +1,117 @@
+# Arquivo: test_agendador.py
+# Verifica o agendador de jobs (prioridade, FIFO entre iguais, retirada da fila, fila cheia) e o /predict-video/
+# em cima dele: dois POSTs simultâneos do mesmo vídeo iniciam um job só, e um vídeo cancelado cuja thread ainda
+# não saiu do agendador é recusado com 409 (sem reiniciar o estado do job), e volta a ser aceito depois.
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import video_routes
+from schemas import VideoRequest
+from utils import gerenciador_progresso
+from utils.agendador import AgendadorJobs, FilaCheia
+from utils.gerenciador_progresso import ProgressoManager
+
+
+def _esperar(condicao, timeout=5.0):
+    limite = time.time() + timeout
+    while not condicao():
+        assert time.time() < limite, "condição não atingida a tempo"
+        time.sleep(0.01)
+
+
+def test_prioridade_fifo_e_remocao():
+    agendador = AgendadorJobs(max_concorrentes=1, max_fila=3, duracao_inicial_s=10)
+    liberar, ordem = threading.Event(), []
+    agendador.submeter("ocupando", lambda: liberar.wait(5))
+    _esperar(lambda: (agendador.situacao("ocupando") or {}).get("estado") == "executando")
+
+    for job_id, prioridade in (("normal-1", 0), ("normal-2", 0), ("urgente", 5)):
+        agendador.submeter(job_id, lambda job_id=job_id: ordem.append(job_id), prioridade=prioridade)
+    assert agendador.situacao("urgente")["posicao_fila"] == 1 and agendador.situacao("normal-2")["posicao_fila"] == 3
+    assert agendador.situacao("normal-1")["inicio_estimado_s"] == pytest.approx(20, abs=1)
+    with pytest.raises(FilaCheia) as erro:
+        agendador.submeter("sobrando", lambda: None)
+    assert erro.value.retry_after >= 1
+    with pytest.raises(ValueError):
+        agendador.submeter("normal-1", lambda: None)
+
+    # Cancelado antes de começar: sai da fila e nunca roda; um job em execução não é removido.
+    assert agendador.remover("normal-1") and not agendador.remover("normal-1") and not agendador.remover("ocupando")
+    assert agendador.situacao("normal-2")["posicao_fila"] == 2
+    liberar.set()
+    _esperar(lambda: agendador.resumo()["na_fila"] == 0 and agendador.resumo()["executando"] == 0)
+    assert ordem == ["urgente", "normal-2"] and agendador.situacao("normal-1") is None
+
+
+def test_reenvio_logo_apos_cancelar_recebe_409(monkeypatch):
+    monkeypatch.setattr(gerenciador_progresso, "banco", None)
+    monkeypatch.setenv("USE_SFTP", "false")
+    pm, agendador = ProgressoManager(), AgendadorJobs(max_concorrentes=1)
+    monkeypatch.setattr(video_routes, "progresso_manager", pm)
+    monkeypatch.setattr(video_routes, "agendador", agendador)
+    liberar, execucoes = threading.Event(), []
+
+    def contagem_lenta(manager, video_name, **kwargs):
+        # Simula a contagem que só percebe o cancelamento no próximo lote de frames.
+        execucoes.append(video_name)
+        liberar.wait(5)
+        liberar.clear()
+        return None
+    monkeypatch.setattr(video_routes, "executar_contagem", contagem_lenta)
+    app = FastAPI(); app.include_router(video_routes.router)
+    cliente = TestClient(app)
+    corpo = {"nome_arquivo": "curral.mp4", "orientation": "N", "usar_cache": False}
+
+    assert cliente.post("/predict-video/", json=corpo).status_code == 200
+    _esperar(lambda: execucoes)
+    assert "enviada" in cliente.get("/cancelar-processamento/curral.mp4").json()["message"]
+    evento_cancelamento = pm._cancelamentos["curral.mp4"]
+
+    resposta = cliente.post("/predict-video/", json=corpo)
+    assert resposta.status_code == 409 and resposta.json()["status"] == "em_processamento"
+    # O job cancelado continua com o próprio estado: nada foi reiniciado para "Na fila".
+    assert pm._cancelamentos.get("curral.mp4") is evento_cancelamento and evento_cancelamento.is_set()
+    assert pm._locais["curral.mp4"]["finalizado"]
+
+    liberar.set()
+    _esperar(lambda: not agendador.contem("curral.mp4"))
+    assert cliente.post("/predict-video/", json=corpo).status_code == 200
+    _esperar(lambda: len(execucoes) == 2)
+    liberar.set()
+    _esperar(lambda: not agendador.contem("curral.mp4"))
+
+
+def test_posts_simultaneos_do_mesmo_video_iniciam_um_job(monkeypatch):
+    monkeypatch.setattr(gerenciador_progresso, "banco", None)
+    monkeypatch.setenv("USE_SFTP", "false")
+    pm, agendador = ProgressoManager(), AgendadorJobs(max_concorrentes=1)
+    monkeypatch.setattr(video_routes, "progresso_manager", pm)
+    monkeypatch.setattr(video_routes, "agendador", agendador)
+    liberar, inicios = threading.Event(), []
+    monkeypatch.setattr(video_routes, "executar_contagem", lambda *a, **k: liberar.wait(5) and None)
+
+    async def consulta_lenta(video_name):
+        await asyncio.sleep(0.05)  # Round-trip ao banco: o outro POST roda enquanto este espera
+        return False
+    iniciar = pm.iniciar_async
+
+    async def iniciar_contado(video_name):
+        inicios.append(video_name)
+        await iniciar(video_name)
+    monkeypatch.setattr(pm, "is_processing_async", consulta_lenta)
+    monkeypatch.setattr(pm, "iniciar_async", iniciar_contado)
+
+    async def dois_posts():
+        pedido = VideoRequest(nome_arquivo="curral.mp4", orientation="N", usar_cache=False)
+        return await asyncio.gather(video_routes.predict_video_endpoint(pedido), video_routes.predict_video_endpoint(pedido))
+    respostas = asyncio.run(dois_posts())
+    assert sorted(getattr(r, "status_code", 200) for r in respostas) == [200, 409]
+    # O perdedor não tocou no estado do job: um único iniciar.
+    assert inicios == ["curral.mp4"]
+    liberar.set()
+    _esperar(lambda: not agendador.contem("curral.mp4"))
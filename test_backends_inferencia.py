@@ -0,0 +1,71 @@
+# Arquivo: test_backends_inferencia.py
+# Verifica a escolha do backend de inferência (auto cai no PyTorch sem os pacotes opcionais), o cache de
+# modelos exportados (chave pelo hash dos pesos e tamanho de entrada, reaproveitamento, falha sem repetição)
+# e o pareamento de detecções usado na comparação entre backends.
+import os
+
+import numpy as np
+
+from utils import backends_inferencia
+from utils.backends_inferencia import CacheExportacoes, candidatos, parear_deteccoes
+
+
+def _exportador(chamadas, falhar=False):
+    def exportar(pesos, backend, imgsz, pasta, calibracao=None):
+        chamadas.append((os.path.basename(pesos), backend, imgsz, calibracao))
+        if falhar:
+            raise RuntimeError("exportação quebrou")
+        artefato = os.path.join(pasta, "modelo" + backends_inferencia.SUFIXOS[backend])
+        with open(artefato, "wb") as f:
+            f.write(b"modelo exportado")
+        return artefato
+    return exportar
+
+
+def test_auto_cai_no_pytorch_sem_pacotes_opcionais(monkeypatch):
+    monkeypatch.setattr(backends_inferencia, "backend_disponivel", lambda b, int8=False: False)
+    assert candidatos("auto") == ["pytorch"]
+    assert candidatos("onnx") == ["onnx", "pytorch"]  # Explícito: tenta e, se falhar, PyTorch
+    monkeypatch.setattr(backends_inferencia, "backend_disponivel", lambda b, int8=False: b == "onnx")
+    assert candidatos("auto") == ["onnx", "pytorch"]
+
+
+def test_cache_reaproveita_exportacao_e_muda_com_os_pesos(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends_inferencia, "backend_disponivel", lambda b, int8=False: True)
+    pesos = tmp_path / "best.pt"; pesos.write_bytes(b"pesos v1")
+    chamadas = []
+    cache = CacheExportacoes(str(tmp_path / "cache"), imgsz=640, exportador=_exportador(chamadas))
+    primeiro = cache.obter(str(pesos), "onnx")
+    assert primeiro.endswith("-640.onnx") and open(primeiro, "rb").read() == b"modelo exportado"
+    assert cache.obter(str(pesos), "onnx") == primeiro and len(chamadas) == 1  # Reaproveitado sem exportar de novo
+    # Outro processo (ou reinício) encontra o artefato pronto no disco.
+    assert CacheExportacoes(str(tmp_path / "cache"), imgsz=640, exportador=_exportador(chamadas)).obter(str(pesos), "onnx") == primeiro
+    assert len(chamadas) == 1
+
+    assert CacheExportacoes(str(tmp_path / "cache"), imgsz=320, exportador=_exportador(chamadas)).obter(str(pesos), "onnx") != primeiro
+    pesos.write_bytes(b"pesos v2 retreinados")
+    os.utime(pesos, (1, 1))
+    assert cache.obter(str(pesos), "onnx") != primeiro and len(chamadas) == 3
+    assert [a for a in os.listdir(tmp_path / "cache") if a.startswith(".")] == []  # Nenhum temporário esquecido
+
+
+def test_falha_na_exportacao_nao_se_repete(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends_inferencia, "backend_disponivel", lambda b, int8=False: True)
+    pesos = tmp_path / "yolov8n.pt"; pesos.write_bytes(b"pesos")
+    chamadas = []
+    cache = CacheExportacoes(str(tmp_path / "cache"), exportador=_exportador(chamadas, falhar=True))
+    assert cache.obter(str(pesos), "openvino") is None
+    assert cache.obter(str(pesos), "openvino") is None and len(chamadas) == 1
+    assert list(cache.situacao()["falhas"].values()) == ["exportação quebrou"]
+
+
+def test_pareamento_de_deteccoes_por_iou_e_classe():
+    ref = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [50, 50, 60, 60]], dtype=np.float32)
+    alt = np.array([[1, 1, 10, 10], [50, 50, 60, 60], [20, 20, 30, 30]], dtype=np.float32)
+    pares = parear_deteccoes(ref, np.array([0, 0, 1]), alt, np.array([0, 0, 0]))
+    assert len(pares) == 2 and min(pares) > 0.8  # A caixa [50..60] mudou de classe: não conta
+    assert parear_deteccoes(ref, np.zeros(3), alt[:0], np.zeros(0)) == []
+    # Caixas sobrepostas: o par (B, A') já usado e com IoU maior não encerra o pareamento antes de (C, C').
+    ref = np.array([[0, 0, 10, 10], [2, 0, 12, 10], [30, 0, 40, 10]], dtype=np.float32)
+    alt = np.array([[0, 0, 10, 10], [3, 0, 13, 10], [33, 0, 43, 10]], dtype=np.float32)
+    assert np.round(parear_deteccoes(ref, np.zeros(3), alt, np.zeros(3)), 2).tolist() == [1.0, 0.82, 0.54]
@@ -0,0 +1,113 @@
+# Arquivo: test_banco_async.py
+# Verifica o pool assíncrono do banco (espera por conexão em vez de falhar, timeout, descarte de conexões
+# quebradas), a fachada síncrona usada pelas threads e o /progresso aguardando o banco sem bloquear o loop.
+import asyncio
+import threading
+import time
+
+import psycopg
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import video_routes
+from utils import gerenciador_progresso
+from utils.banco_async import BancoAsync
+from utils.gerenciador_progresso import ProgressoManager
+
+
+class ConexaoFalsa:
+    """AsyncConnection mínima: cada comando demora `demora` segundos e devolve `linha`."""
+
+    def __init__(self, registro, demora=0.05, linha=(1,), falha=None):
+        self.registro, self.demora, self.linha, self.falha = registro, demora, linha, falha
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.registro["ativas"] += 1
+        self.registro["pico"] = max(self.registro["pico"], self.registro["ativas"])
+        try:
+            await asyncio.sleep(self.demora)
+            if self.falha:
+                self.closed = True
+                raise self.falha
+            self.registro["comandos"].append((query, params))
+        finally:
+            self.registro["ativas"] -= 1
+
+    async def fetchone(self):
+        return self.linha
+
+    async def close(self):
+        self.closed = True
+
+
+def _banco(maximo, timeout_s=5.0, **kwargs):
+    registro = {"ativas": 0, "pico": 0, "comandos": [], "conexoes": 0}
+
+    async def conectar():
+        registro["conexoes"] += 1
+        return ConexaoFalsa(registro, **kwargs)
+    return BancoAsync("postgresql://falso", conectar=conectar, minimo=1, maximo=maximo, timeout_s=timeout_s), registro
+
+
+def test_pool_esgotado_espera_e_nao_bloqueia_o_loop():
+    banco, registro = _banco(maximo=2)
+
+    async def cenario():
+        batidas = []
+
+        async def relogio():
+            while True:
+                batidas.append(time.monotonic()); await asyncio.sleep(0.01)
+        tarefa = asyncio.create_task(relogio())
+        resultados = await asyncio.gather(*(banco.executar_async("SELECT 1", (), "one") for _ in range(20)))
+        tarefa.cancel()
+        return resultados, batidas
+
+    resultados, batidas = asyncio.run(cenario())
+    assert all(r == ((1,), True) for r in resultados)  # Nenhuma falhou por pool esgotado
+    assert registro["pico"] == 2 and registro["conexoes"] == 2
+    # 20 comandos de 50 ms em 2 conexões (~0,5 s) e o loop de quem chamou seguiu livre o tempo todo.
+    assert len(batidas) > 20 and max(b - a for a, b in zip(batidas, batidas[1:])) < 0.1
+    banco.fechar()
+
+
+def test_timeout_da_espera_e_fachada_sincrona():
+    banco, _ = _banco(maximo=1, timeout_s=0.1, demora=0.3)
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(banco.executar("UPDATE x", (1,)))) for _ in range(2)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert sorted(r[1] for r in resultados) == [False, True]  # A segunda desistiu após DB_POOL_TIMEOUT_S
+    assert banco.situacao()["esperando"] == 0
+    banco.fechar()
+
+
+def test_conexao_quebrada_sai_do_pool():
+    banco, registro = _banco(maximo=1, falha=psycopg.OperationalError("servidor caiu"))
+    assert banco.executar("SELECT 1", (), "one") == (None, False)
+    assert banco.situacao() == {"em_uso": 0, "livres": 0, "max": 1, "esperando": 0}
+    assert banco.executar("SELECT 1", (), "one") == (None, False) and registro["conexoes"] == 2  # Reconectou
+    banco.fechar()
+
+
+def test_progresso_de_job_remoto_aguarda_o_banco(monkeypatch):
+    linha = ("remoto.mp4", 30, 100, time.time(), "00:00:10", False, None, None, False)
+    banco, registro = _banco(maximo=2, linha=linha)
+    monkeypatch.setattr(gerenciador_progresso, "banco", banco)
+    monkeypatch.setattr(video_routes, "progresso_manager", ProgressoManager())
+    app = FastAPI(); app.include_router(video_routes.router)
+    with TestClient(app) as cliente:
+        status = cliente.get("/progresso/remoto.mp4").json()
+    assert status["frame_atual"] == 30 and status["finalizado"] is False
+    assert registro["comandos"] == [(gerenciador_progresso.SQL_STATUS, ("remoto.mp4",))]
+    banco.fechar()
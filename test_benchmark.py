@@ -0,0 +1,25 @@
+import json
+
+import benchmark_contagem
+
+
+def test_benchmark_gera_json_comparavel(tmp_path, monkeypatch):
+    cenario = {"nome": "minimo", "largura": 320, "altura": 240, "frames": 60, "animais": 3,
+               "contagem": {"perfil_video": "metade"}, "video_anotado": True}
+    monkeypatch.setitem(benchmark_contagem.CENARIOS, "teste", [cenario])
+    monkeypatch.setattr("utils.renderizacao.RENDER_ENCODER", "opencv")
+    for var in ("DATABASE_URL", "USE_SFTP", "CREATE_ANNOTATED_VIDEO"): monkeypatch.setenv(var, "")
+    saida = tmp_path / "bench.json"
+    benchmark_contagem.main(["--cenarios", "teste", "--mesmo-processo", "--saida", str(saida)])
+    relatorio = benchmark_contagem.main(["--cenarios", "teste", "--mesmo-processo", "--saida", str(tmp_path / "b.json"),
+                                         "--comparar", str(saida)])
+
+    r = json.loads(saida.read_text())["cenarios"][0]
+    assert r["erro"] is None and r["fps"] > 0 and r["frames_processados"] == 60
+    assert r["total_count"] == r["esperado"] == 3
+    for estagio in ("decodificacao", "inferencia", "rastreamento", "codificacao", "quadro"):
+        assert r["estagios"][estagio]["p50_ms"] <= r["estagios"][estagio]["p99_ms"]
+    # Contagem não toca o SFTP (arquivamento é da fila) e o banco só é atualizado de forma agrupada.
+    assert r["sftp"]["chamadas"] == 0
+    assert 0 < r["db"]["por_frame"] < 1
+    assert relatorio["comparacao"][0]["nome"] == "minimo"
@@ -0,0 +1,50 @@
+# Arquivo: test_cache_resultados.py
+# Verifica as chaves do cache e a recontagem a partir das detecções salvas (sem rodar o modelo de novo).
+import os
+
+from utils.modelos import registro_modelos
+from utils.contagem_video import contar_gado_em_video
+from utils.cache_resultados import CacheResultados, chave_resultado, chave_deteccoes, recontar_deteccoes
+from utils.executor_processos import ProgressoLocal
+from utils.video_sintetico import DetectorBlobs, gerar_video_sintetico
+
+
+def test_chaves_ignoram_parametros_sem_efeito():
+    base = {"model_choice": "l", "orientation": "s", "target_classes": ["horse", "cow"], "line_position_ratio": 0.5}
+    assert chave_resultado("abc", base) == chave_resultado("abc", {**base, "orientation": "S", "batch_size": 8,
+                                                                   "target_classes": ["cow", "horse"]})
+    assert chave_resultado("abc", base) != chave_resultado("abc", {**base, "line_position_ratio": 0.6})
+    assert chave_deteccoes("abc", base) == chave_deteccoes("abc", {**base, "orientation": "N", "line_position_ratio": 0.3})
+    assert chave_deteccoes("abc", {**base, "roi": True}) is None
+
+    cache = CacheResultados()
+    cache.gravar("k", "abc", base, {"total_count": 3})
+    resultado = cache.obter("k"); resultado["total_count"] = 99
+    assert cache.obter("k") == {"total_count": 3}
+
+
+def test_recontagem_com_outra_linha_bate_com_a_inferencia(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "false")
+    registro_modelos.registrar("blobs", DetectorBlobs())
+    cache = CacheResultados(pasta_deteccoes=str(tmp_path / "deteccoes"))
+    caminho = cache.caminho_deteccoes("video1")
+
+    def contar(ratio, salvar=None):
+        video = os.path.join(tmp_path, f"video_{ratio}.mp4")
+        gerar_video_sintetico(video, 320, 240, 90, n_animais=3)
+        progresso = ProgressoLocal()
+        resultado = contar_gado_em_video(video, os.path.basename(video), progresso, model_choice="blobs", orientation="S",
+                                         line_position_ratio=ratio, salvar_deteccoes=salvar)
+        assert not progresso.erros
+        return resultado
+
+    original = contar(0.5, salvar=caminho)
+    deteccoes = cache.carregar_deteccoes("video1")
+    assert deteccoes is not None and deteccoes["total_frames"] == original["total_frames"]
+    assert recontar_deteccoes(deteccoes, "v", orientation="S", line_position_ratio=0.5)["total_count"] == original["total_count"]
+
+    for ratio in (0.3, 0.8):
+        recontado = recontar_deteccoes(deteccoes, "v", orientation="S", line_position_ratio=ratio)
+        direto = contar(ratio)
+        assert (recontado["total_count"], recontado["por_classe"]) == (direto["total_count"], direto["por_classe"])
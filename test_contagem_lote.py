@@ -0,0 +1,33 @@
+# Arquivo: test_contagem_lote.py
+# Verifica que o modo em lote (batch_size > 1) conta exatamente o mesmo que o modo frame a frame.
+# Usa um detector falso (blobs claros em fundo escuro, utils/video_sintetico.py) no lugar do YOLO, então não precisa de pesos.
+import os
+
+from utils.modelos import registro_modelos
+from utils.contagem_video import contar_gado_em_video
+from utils.executor_processos import ProgressoLocal
+from utils.video_sintetico import DetectorBlobs, gerar_video_sintetico
+
+
+def _contar(tmp_path, batch_size):
+    video = os.path.join(tmp_path, f"video_lote_{batch_size}.mp4")
+    gerar_video_sintetico(video, 320, 240, 90, n_animais=3)
+    progresso = ProgressoLocal()
+    resultado = contar_gado_em_video(video, os.path.basename(video), progresso,
+                                     model_choice="blobs", orientation="S", batch_size=batch_size)
+    assert not progresso.erros
+    return resultado
+
+
+def test_lote_conta_igual_ao_frame_a_frame(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "false")
+    registro_modelos.registrar("blobs", DetectorBlobs())
+
+    por_frame = _contar(tmp_path, batch_size=1)
+    assert por_frame["total_count"] == 3
+
+    for batch_size in (4, 7):
+        em_lote = _contar(tmp_path, batch_size=batch_size)
+        assert em_lote["total_count"] == por_frame["total_count"]
+        assert em_lote["por_classe"] == por_frame["por_classe"]
@@ -0,0 +1,46 @@
+# Arquivo: test_contagem_paralela.py
+# Verifica o modo por segmentos paralelos: um animal que cruza a linha exatamente na emenda entre dois
+# segmentos é costurado num track só e contado uma vez, e parâmetros não suportados são recusados na rota.
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import video_routes
+from utils.agendador import AgendadorJobs
+from utils.contagem_paralela import contar_trajetorias, costurar_trajetorias, planejar_segmentos
+from utils.contagem_video import get_line_and_direction_config, linha_principal
+from utils.motor_contagem import MotorContagem
+
+
+def _trajetoria(frames, x=300.0, velocidade=2.0, y0=0.0, cls=0):
+    """Caixa 40x40 descendo `velocidade` px por frame (frame, x1, y1, x2, y2, classe)."""
+    return np.array([[f, x, y0 + velocidade * f, x + 40, y0 + velocidade * f + 40, cls] for f in frames], dtype=np.float32)
+
+
+def test_animal_cruzando_na_emenda_conta_uma_vez():
+    planos = planejar_segmentos(200, 2, 20)
+    assert planos == [(0, 0, 100), (80, 100, 200)]
+    # O animal 1 cruza a linha (y=220) entre os frames 99 e 100, bem na emenda: o segmento 0 o vê até o frame 99
+    # e o segmento 1 (com outro ID) desde a leitura da sobreposição. O animal 2 só aparece e cruza no segmento 1.
+    segmento_0 = {7: _trajetoria(range(0, 100))}
+    segmento_1 = {3: _trajetoria(range(80, 200)), 4: _trajetoria(range(150, 200), x=100, velocidade=4, y0=-450)}
+    trajetorias, costuras = costurar_trajetorias([segmento_0, segmento_1], planos)
+    assert costuras == 1 and len(trajetorias) == 2
+    completa = next(t for t in trajetorias.values() if len(t) == 200)
+    assert completa[:, 0].tolist() == list(range(200))  # Sem frames repetidos na sobreposição
+
+    line_type, direcao, pontos, _, _ = get_line_and_direction_config("S", 640, 440, 0.5)
+    motor = MotorContagem([linha_principal(line_type, direcao, pontos)], names={0: "cow"})
+    assert contar_trajetorias(trajetorias, motor) == (2, {"cow": 2})
+
+
+def test_segmentos_paralelos_recusa_parametros_nao_suportados(monkeypatch):
+    agendador = AgendadorJobs()
+    monkeypatch.setattr(video_routes, "agendador", agendador)
+    app = FastAPI(); app.include_router(video_routes.router)
+    cliente = TestClient(app)
+    corpo = {"nome_arquivo": "longo.mp4", "orientation": "N", "segmentos_paralelos": 4, "usar_cache": False}
+    for extra in ({"frame_skip": 2}, {"gate_movimento": True}, {"perfil_video": "metade"}):
+        resposta = cliente.post("/predict-video/", json={**corpo, **extra})
+        assert resposta.status_code == 400 and list(extra)[0] in resposta.json()["message"]
+    assert agendador.resumo()["na_fila"] == 0 and not agendador.contem("longo.mp4")
@@ -0,0 +1,71 @@
+# Arquivo: test_executor_processos.py
+# Verifica o pool de processos com um worker falso (sem torch nem modelos): progresso e cancelamento repassados
+# entre os processos, e um worker que caiu no meio de um job ou morreu ocioso (mesmo logo depois de responder,
+# com o lock da fila de saída ainda preso) é recriado sem derrubar o pool.
+import os
+import time
+
+import pytest
+
+from utils import executor_processos
+from utils.executor_processos import PoolProcessos, ProgressoLocal
+
+
+def _worker_falso(indice, entrada, saida, torch_threads, precarregar):
+    """
+    Mesmo protocolo de _loop_worker_processo: responde cada job com o pid de quem o executou. Jobs com
+    modo="cancelavel" mandam progresso e esperam o "cancelar"; modo="cair" derruba o processo.
+    """
+    saida.put(("pronto", indice, os.getpid()))
+    while True:
+        msg = entrada.get()
+        if msg is None:
+            return
+        if msg[0] != "job":
+            continue
+        _, job_id, kwargs = msg
+        if kwargs.get("modo") == "cair":
+            os._exit(3)
+        if kwargs.get("modo") == "cancelavel":
+            saida.put(("atualizar", job_id, 10, 100, 1))
+            while entrada.get() != ("cancelar", job_id):
+                pass
+            saida.put(("erro", job_id, "Processamento cancelado."))
+            saida.put(("resultado", job_id, None))
+            continue
+        saida.put(("resultado", job_id, {"video": job_id, "pid": os.getpid()}))
+
+
+def _pool(monkeypatch, num_workers=1):
+    monkeypatch.setattr(executor_processos, "_loop_worker_processo", _worker_falso)
+    pool = PoolProcessos(num_workers=num_workers)
+    assert pool.aguardar_prontos(timeout=60)
+    return pool
+
+
+def test_worker_morto_ocioso_e_recriado(monkeypatch):
+    pool = _pool(monkeypatch)
+    primeiro = pool.executar(ProgressoLocal(), "a.mp4")
+    assert primeiro["video"] == "a.mp4"
+
+    antigo = pool._workers[0].processo
+    antigo.kill(); antigo.join(10)
+    inicio = time.monotonic()
+    segundo = pool.executar(ProgressoLocal(), "b.mp4")
+    assert segundo["video"] == "b.mp4" and segundo["pid"] != primeiro["pid"]
+    assert time.monotonic() - inicio < 30 and pool.resumo()["vivos"] == 1
+
+
+def test_cancelamento_repassado_e_worker_que_cai_no_job(monkeypatch):
+    pool = _pool(monkeypatch)
+    progresso = ProgressoLocal()
+    progresso.cancelamento.set()  # Cancelado assim que sai para o worker: o pool repassa o pedido
+    assert pool.executar(progresso, "cancelado.mp4", modo="cancelavel") is None
+    assert progresso.ultimo == (10, 100, 1) and progresso.erros == ["Processamento cancelado."]
+
+    pid = pool._workers[0].processo.pid
+    with pytest.raises(RuntimeError, match="exitcode=3"):
+        pool.executar(ProgressoLocal(), "crash.mp4", modo="cair")
+    # Só o job do worker que caiu falha: o próximo roda num worker novo.
+    assert pool.executar(ProgressoLocal(), "depois.mp4")["pid"] != pid
+    assert pool.resumo()["ocupados"] == [] and pool.resumo()["vivos"] == 1
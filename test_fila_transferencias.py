@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from utils.fila_transferencias import FilaTransferencias, LimitadorBanda
+from utils.sftp_handler import PoolSFTP, ConexaoPerdida
+
+
+class PoolInstavel:
+    """Pool que derruba as primeiras `falhas` operações, para exercitar as novas tentativas da fila."""
+
+    def __init__(self, pool, falhas):
+        self.pool = pool
+        self.falhas = falhas
+
+    def executar(self, operacao, tentativas=2):
+        if self.falhas > 0:
+            self.falhas -= 1
+            raise ConexaoPerdida("conexão resetada")
+        return self.pool.executar(operacao, tentativas)
+
+    def garantir_diretorio(self, sftp, remote_dir):
+        self.pool.garantir_diretorio(sftp, remote_dir)
+
+
+@pytest.fixture
+def pool(servidor):
+    p = PoolSFTP("127.0.0.1", servidor.porta, "gado", "senha", max_conexoes=4)
+    yield p
+    p.fechar()
+
+
+def _fila(pasta, pool, **kwargs):
+    eventos = []
+    fila = FilaTransferencias(str(pasta), ao_progresso=eventos.append, obter_pool=lambda: pool, backoff_s=0.01, **kwargs)
+    return fila, eventos
+
+
+def test_upload_em_partes_paralelas(servidor, pool, tmp_path):
+    conteudo = os.urandom(300 * 1024 + 123)
+    local = tmp_path / "video.mp4"; local.write_bytes(conteudo)
+    fila, eventos = _fila(tmp_path / "fila", pool, parte_bytes=64 * 1024, partes_paralelas=3)
+    fila.enfileirar_upload(str(local), "kyoday/uploads/video.mp4", video_name="video.mp4")
+    os.remove(local)  # A fila guardou a própria cópia: o job pode apagar o original
+    assert fila.aguardar(timeout=30)
+    fila.fechar()
+    with open(os.path.join(servidor.raiz, "kyoday/uploads/video.mp4"), "rb") as f:
+        assert f.read() == conteudo
+    assert eventos[-1]["estado"] == "concluida" and eventos[-1]["video_name"] == "video.mp4"
+    assert os.listdir(tmp_path / "fila" / "arquivos") == [] and os.listdir(tmp_path / "fila" / "tarefas") == []
+
+
+def test_falhas_de_conexao_sao_repetidas(servidor, pool, tmp_path):
+    local = tmp_path / "video.mp4"; local.write_bytes(b"x" * 5000)
+    fila, eventos = _fila(tmp_path / "fila", PoolInstavel(pool, falhas=2))
+    fila.enfileirar_upload(str(local), "videos/video.mp4")
+    assert fila.aguardar(timeout=30)
+    fila.fechar()
+    assert os.path.getsize(os.path.join(servidor.raiz, "videos/video.mp4")) == 5000
+    assert eventos[-1]["estado"] == "concluida" and eventos[-1]["tentativas"] == 3
+
+
+def test_remocao_descarta_upload_pendente_e_fila_sobrevive_reinicio(servidor, pool, tmp_path):
+    os.makedirs(os.path.join(servidor.raiz, "videos"))
+    with open(os.path.join(servidor.raiz, "videos/antigo.mp4"), "wb") as f: f.write(b"antigo")
+    local = tmp_path / "antigo.mp4"; local.write_bytes(b"novo")
+
+    fila, eventos = _fila(tmp_path / "fila", pool)
+    fila.fechar()  # Sem threads: simula um processo que caiu antes de executar a fila
+    fila.enfileirar_upload(str(local), "videos/antigo.mp4", video_name="antigo.mp4")
+    fila.enfileirar_remocao("videos/antigo.mp4", video_name="antigo.mp4")
+    assert [e["estado"] for e in eventos if e["tipo"] == "upload"][-1] == "descartada"
+    assert [t["tipo"] for t in fila.situacao("antigo.mp4")] == ["remocao"]
+
+    retomada, _ = _fila(tmp_path / "fila", pool)
+    assert retomada.aguardar(timeout=30)
+    retomada.fechar()
+    assert not os.path.exists(os.path.join(servidor.raiz, "videos/antigo.mp4"))
+
+
+def test_limitador_de_banda():
+    limitador = LimitadorBanda(200 * 1024)
+    inicio = time.monotonic()
+    for _ in range(10):
+        limitador.consumir(40 * 1024)  # 400 KiB a 200 KiB/s, com 200 KiB de fichas iniciais
+    assert time.monotonic() - inicio >= 0.9
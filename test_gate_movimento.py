@@ -0,0 +1,47 @@
+# Arquivo: test_gate_movimento.py
+# Verifica que o gate de movimento pula os frames parados sem mudar a contagem.
+import os
+
+import cv2
+import numpy as np
+
+from utils.modelos import registro_modelos
+from utils.contagem_video import contar_gado_em_video
+from utils.executor_processos import ProgressoLocal
+from utils.video_sintetico import DetectorBlobs
+
+
+def criar_video_com_pausas(path, w=320, h=240):
+    """60 frames vazios, dois blobs descendo, mais 60 frames vazios."""
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (w, h))
+    vazio = np.zeros((h, w, 3), np.uint8)
+    for _ in range(60): out.write(vazio)
+    for i in range(80):
+        frame = vazio.copy()
+        for x, inicio in ((60, 0), (200, 10)):
+            y = int((i - inicio) * 4) - 30
+            if i >= inicio: cv2.rectangle(frame, (x, y), (x + 40, y + 30), (255, 255, 255), -1)
+        out.write(frame)
+    for _ in range(60): out.write(vazio)
+    out.release()
+
+
+def test_gate_pula_frames_parados_e_conta_igual(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "false")
+    registro_modelos.registrar("blobs", DetectorBlobs())
+
+    resultados = {}
+    for gate in (False, True):
+        video = os.path.join(tmp_path, f"video_gate_{gate}.mp4")
+        criar_video_com_pausas(video)
+        progresso = ProgressoLocal()
+        resultados[gate] = contar_gado_em_video(video, os.path.basename(video), progresso, model_choice="blobs",
+                                                orientation="S", gate_movimento=gate)
+        assert not progresso.erros
+
+    assert resultados[False]["total_count"] == 2
+    assert resultados[True]["total_count"] == resultados[False]["total_count"]
+    stats = resultados[True]["gate_movimento"]
+    assert stats["frames_avaliados"] == 200
+    assert stats["frames_pulados"] > 60
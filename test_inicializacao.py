@@ -0,0 +1,74 @@
+# Arquivo: test_inicializacao.py
+# Verifica a subida rápida da API: import sem torch/ultralytics e sem tocar no banco; banco preparado no
+# lifespan com retentativas; modelos aquecidos em segundo plano; /ready separado do / (liveness).
+import os
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from utils import gerenciador_progresso, inicializacao, modelos
+from utils.banco_async import BancoAsync
+
+
+def test_import_da_api_nao_carrega_modelos_nem_conecta_ao_banco(tmp_path):
+    # "Banco" que aceita a conexão TCP e nunca responde: um connect no import travaria até o timeout.
+    servidor = socket.socket(); servidor.bind(("127.0.0.1", 0)); servidor.listen(1)
+    porta = servidor.getsockname()[1]
+    ambiente = dict(os.environ, DATABASE_URL=f"postgresql://u:s@127.0.0.1:{porta}/kyoday", RENDER_DATA_DIR=str(tmp_path),
+                    HG_HOST="", HG_USER="", HG_PASS="")
+    codigo = ("import sys, time; t = time.perf_counter(); import main; "
+              "print(round(time.perf_counter() - t, 2), [m for m in ('torch', 'ultralytics', 'cv2') if m in sys.modules])")
+    saida = subprocess.run([sys.executable, "-c", codigo], env=ambiente, cwd=os.path.dirname(os.path.abspath(main.__file__)),
+                           capture_output=True, text=True, timeout=60)
+    assert saida.returncode == 0, saida.stderr
+    segundos, pesados = saida.stdout.strip().splitlines()[-1].split(" ", 1)
+    assert pesados == "[]"
+    assert select.select([servidor], [], [], 0)[0] == []  # Nenhuma conexão com o banco durante o import
+    assert float(segundos) < 5
+    servidor.close()
+
+
+class _ConexaoFalsa:
+    closed = False
+    def cursor(self): return self
+    async def __aenter__(self): return self
+    async def __aexit__(self, *exc): return False
+    async def execute(self, query, params=None): pass
+    async def close(self): self.closed = True
+
+
+def test_lifespan_prepara_banco_com_backoff_e_aquece_modelos(monkeypatch):
+    tentativas = []
+
+    async def conectar():
+        tentativas.append(time.monotonic())
+        if len(tentativas) <= 2:
+            raise ConnectionError("PostgreSQL ainda subindo")
+        return _ConexaoFalsa()
+    monkeypatch.setattr(gerenciador_progresso, "banco", BancoAsync("postgresql://falso", conectar=conectar, minimo=1))
+    monkeypatch.setattr(inicializacao, "DB_PREPARO_ESPERA_INICIAL_S", 0.05)
+    liberar_modelo = threading.Event()
+    monkeypatch.setattr(inicializacao, "MODELOS_AQUECER", "l")
+    monkeypatch.setattr(modelos.registro_modelos, "obter", lambda choice: liberar_modelo.wait(10))
+    fechadas = []
+    monkeypatch.setattr(main.video_routes, "transferencias", type("Fila", (), {"fechar": lambda self: fechadas.append(1)})())
+
+    with TestClient(main.app) as cliente:
+        assert cliente.get("/").status_code == 200  # Liveness na hora, com banco e modelos ainda a caminho
+        resposta = cliente.get("/ready")
+        assert resposta.status_code == 503 and not resposta.json()["componentes"]["modelos"]["pronto"]
+        liberar_modelo.set()
+        for _ in range(100):
+            resposta = cliente.get("/ready")
+            if resposta.status_code == 200: break
+            time.sleep(0.05)
+        assert resposta.status_code == 200, resposta.json()
+        assert "tentativa 3" in resposta.json()["componentes"]["banco"]["detalhe"]
+    assert len(tentativas) == 3 and tentativas[2] - tentativas[1] > tentativas[1] - tentativas[0]  # Espera dobrando
+    assert fechadas == [1]  # Shutdown fecha a fila de transferências
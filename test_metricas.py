@@ -0,0 +1,57 @@
+import re
+
+from utils.contagem_video import contar_gado_em_video
+from utils.metricas import Histograma, RegistroMetricas, estagio_segundos, frames_total, metricas, registrar_tempos_job
+from utils.modelos import registro_modelos
+from utils.video_sintetico import DetectorBlobs, gerar_video_sintetico
+
+
+def test_quantil_do_histograma():
+    h = Histograma((0.01, 0.1, 1.0))
+    for v in [0.005] * 50 + [0.05] * 40 + [0.5] * 10:
+        h.observar(v)
+    assert h.baldes == [50, 40, 10, 0]
+    assert h.quantil(0.5) == 0.01
+    assert 0.01 < h.quantil(0.9) <= 0.1 and 0.1 < h.quantil(0.99) <= 0.5
+
+
+def test_exportacao_no_formato_prometheus():
+    registro = RegistroMetricas()
+    c = registro.contador("testes_total", "Contador de teste.", ("tipo",))
+    h = registro.histograma("teste_segundos", "Histograma de teste.", limites=(0.1, 1.0))
+    registro.medidor("teste_conexoes", "Medidor de teste.", lambda: {("livres",): 3, ("em_uso",): 2}, ("estado",))
+    c.inc(tipo='a"b'); c.inc(2, tipo="x")
+    h.observar(0.05); h.observar(0.5); h.observar(5)
+    texto = registro.exportar()
+    assert '# TYPE kyoday_testes_total counter' in texto
+    assert 'kyoday_testes_total{tipo="a\\"b"} 1' in texto and 'kyoday_testes_total{tipo="x"} 2' in texto
+    # Baldes cumulativos, com +Inf igual ao _count.
+    assert 'kyoday_teste_segundos_bucket{le="0.1"} 1' in texto and 'kyoday_teste_segundos_bucket{le="1"} 2' in texto
+    assert 'kyoday_teste_segundos_bucket{le="+Inf"} 3' in texto and "kyoday_teste_segundos_count 3" in texto
+    assert 'kyoday_teste_conexoes{estado="em_uso"} 2' in texto
+    for linha in texto.splitlines():
+        assert linha.startswith("#") or re.match(r'^[a-z_]+(\{.*\})? [-+0-9.eInfa]+$', linha), linha
+
+
+def test_resultado_traz_tempos_por_estagio(tmp_path, monkeypatch, progresso):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "true")
+    monkeypatch.setattr("utils.renderizacao.RENDER_ENCODER", "opencv")
+    monkeypatch.chdir(tmp_path)
+    registro_modelos.registrar("blobs", DetectorBlobs())
+    gerar_video_sintetico(str(tmp_path / "video.mp4"), 320, 240, 90, n_animais=3)
+    resultado = contar_gado_em_video(str(tmp_path / "video.mp4"), "video.mp4", progresso, model_choice="blobs", batch_size=4)
+
+    tempos = resultado["tempos"]
+    assert tempos["frames"] == 90 and tempos["fps"] > 0
+    estagios = tempos["estagios"]
+    assert set(estagios) == {"decodificacao", "inferencia", "rastreamento", "contagem", "desenho", "codificacao", "progresso"}
+    assert estagios["inferencia"]["n"] == 90 // 4 + 1 and estagios["rastreamento"]["n"] == 90
+    assert estagios["codificacao"]["n"] == 90 and sum(estagios["decodificacao"]["baldes"]) == estagios["decodificacao"]["n"]
+
+    # O resumo (que pode vir de um worker em outro processo) é somado às métricas do processo da API.
+    frames_antes = frames_total.valor()
+    registrar_tempos_job(tempos)
+    assert frames_total.valor() == frames_antes + 90
+    assert 'kyoday_estagio_segundos_count{estagio="rastreamento"}' in metricas.exportar()
+    assert estagio_segundos._series[("inferencia",)].n >= estagios["inferencia"]["n"]
@@ -0,0 +1,58 @@
+# Arquivo: test_motor_contagem.py
+# Verifica o motor de contagem vetorizado: regras da linha da orientação, várias linhas e zonas.
+import numpy as np
+
+from utils.contagem_video import get_line_and_direction_config, linha_principal, is_crossing_diagonal_line, LINHA_PRINCIPAL
+from utils.motor_contagem import MotorContagem, LinhaContagem, ZonaContagem
+
+NAMES = {0: "cow", 1: "horse"}
+
+
+def test_linha_principal_segue_as_regras_antigas():
+    rng = np.random.default_rng(0)
+    w, h = 640, 480
+    for orientacao in ("N", "S", "E", "W", "NE", "NW", "SE", "SW"):
+        line_type, direcao, pontos, coord, _ = get_line_and_direction_config(orientacao, w, h, 0.5)
+        motor = MotorContagem([linha_principal(line_type, direcao, pontos)], names=NAMES)
+        n = 2000
+        px, py, cx, cy = rng.integers(0, w, n), rng.integers(0, h, n), rng.integers(0, w, n), rng.integers(0, h, n)
+        motor.processar(np.arange(n), np.zeros(n, int), px, py, cx, cy)
+
+        esperado = 0
+        for a, b, c, d in zip(px, py, cx, cy):
+            if line_type == "horizontal":
+                esperado += (direcao == "top_bottom" and b < coord <= d) or (direcao == "bottom_top" and b > coord >= d)
+            elif line_type == "vertical":
+                esperado += (direcao == "left_right" and a < coord <= c) or (direcao == "right_left" and a > coord >= c)
+            else:
+                esperado += is_crossing_diagonal_line(a, b, c, d, pontos[0], pontos[1], direcao)
+        assert motor.total_linha(LINHA_PRINCIPAL)[0] == esperado, orientacao
+
+
+def test_varias_linhas_e_zona_com_contadores_por_classe():
+    motor = MotorContagem(
+        [LinhaContagem("pista_esq", (0, 100), (100, 100), "ambos"), LinhaContagem("pista_dir", (100, 100), (200, 100), "ambos")],
+        [ZonaContagem("curral", [(0, 150), (200, 150), (200, 200), (0, 200)])],
+        names=NAMES)
+    # Frame 1 -> 2: ID 1 (cow) desce pela pista esquerda, ID 2 (horse) sobe pela direita, ID 3 fica parado.
+    motor.processar([1, 2, 3], [0, 1, 0], [50, 150, 10], [90, 110, 10], [50, 150, 10], [110, 90, 10])
+    # Frame 2 -> 3: ID 1 entra no curral; ID 1 volta a cruzar a pista esquerda mas já foi contado nela.
+    motor.processar([1, 2], [0, 1], [50, 150], [110, 90], [50, 150], [160, 80])
+    motor.processar([1], [0], [50], [160], [50], [90])
+
+    resumo = motor.resumo()
+    assert resumo["linhas"]["pista_esq"]["total"] == 1
+    assert resumo["linhas"]["pista_esq"]["por_sentido"] == {"esquerda_direita": {"cow": 1}, "direita_esquerda": {}}
+    assert resumo["linhas"]["pista_dir"]["por_sentido"] == {"esquerda_direita": {}, "direita_esquerda": {"horse": 1}}
+    assert resumo["zonas"]["curral"]["entradas_por_classe"] == {"cow": 1}
+    assert resumo["zonas"]["curral"]["saidas"] == 1
+    # Máscara da anotação: só os IDs contados em alguma linha (o ID 3 ficou parado).
+    assert motor.ja_contados([1, 2, 3]).tolist() == [True, True, False]
+
+
+def test_ids_nao_sao_embaralhados_com_as_caixas():
+    # IDs fora de ordem: só o ID 7 (última caixa) cruza; a contagem é atribuída à classe dele.
+    motor = MotorContagem([LinhaContagem("l", (0, 100), (300, 100), "esquerda_direita")], names=NAMES)
+    motor.processar([42, 9, 7], [0, 0, 1], [10, 50, 200], [10, 10, 90], [10, 50, 200], [20, 20, 110])
+    assert motor.contados == {7} and motor.ja_contados([42, 7, 9, 7]).tolist() == [False, True, False, True]
+    assert motor.total_linha("l") == (1, {"horse": 1})
@@ -0,0 +1,113 @@
+# Arquivo: test_progresso_stream.py
+# Verifica os streams de progresso (SSE e WebSocket): um canal em memória por job, agrupamento das
+# atualizações, contagem parcial, mensagens de status e resultado final, sem consultas por ouvinte.
+import asyncio
+import json
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import video_routes
+from utils.difusor_progresso import DifusorProgresso
+from utils.gerenciador_progresso import ProgressoManager
+
+
+def _cliente(monkeypatch):
+    pm = ProgressoManager()
+    monkeypatch.setattr(video_routes, "progresso_manager", pm)
+    app = FastAPI(); app.include_router(video_routes.router)
+    return TestClient(app), pm
+
+
+def _simular_job(pm, video_name, frames=200):
+    while not pm.difusor.tem_ouvintes(video_name):
+        time.sleep(0.01)
+    for f in range(1, frames + 1):
+        pm.atualizar(video_name, f, frames, contagem=f // 50)
+        time.sleep(0.002)
+    pm.update_status_message(video_name, "Gerando vídeo anotado...")
+    pm.finalizar(video_name, {"video": video_name, "total_count": 4})
+    pm.encerrar(video_name)
+
+
+def test_websocket_transmite_progresso_ate_o_resultado(monkeypatch):
+    cliente, pm = _cliente(monkeypatch)
+    pm.iniciar("job.mp4")
+    consultas = []
+    monkeypatch.setattr(pm, "_execute_query", lambda *a, **k: consultas.append(a[0]))
+    with cliente.websocket_connect("/ws/progresso/job.mp4") as ws:
+        mensagens = [ws.receive_json()]
+        threading.Thread(target=_simular_job, args=(pm, "job.mp4")).start()
+        while mensagens[-1]["evento"] not in ("concluido", "erro", "cancelado"):
+            mensagens.append(ws.receive_json())
+
+    assert mensagens[0]["evento"] == "progresso" and mensagens[0]["dados"]["tempo_restante"] == "Na fila..."
+    progresso = [m["dados"] for m in mensagens if m["evento"] == "progresso"]
+    frames = [d["frame_atual"] for d in progresso]
+    assert frames == sorted(frames)
+    assert any(d.get("contagem_parcial", 0) > 0 for d in progresso)
+    # 200 atualizações em ~0,5 s chegam agrupadas (PROGRESSO_STREAM_INTERVALO_S), não uma mensagem por frame.
+    assert len(mensagens) < 40
+    assert mensagens[-1]["evento"] == "concluido" and mensagens[-1]["dados"]["resultado"]["total_count"] == 4
+    # O stream nunca leu o status do banco: só houve as gravações do próprio job (flush e finalizar).
+    assert not any("SELECT video_name, frame_atual" in q for q in consultas)
+
+
+def test_sse_envia_eventos_e_termina_com_o_job(monkeypatch):
+    cliente, pm = _cliente(monkeypatch)
+    pm.iniciar("sse.mp4")
+    eventos = []
+    threading.Thread(target=_simular_job, args=(pm, "sse.mp4", 50)).start()
+    with cliente.stream("GET", "/progresso/sse.mp4/stream") as resposta:
+        assert resposta.headers["content-type"].startswith("text/event-stream")
+        evento = None
+        for linha in resposta.iter_lines():
+            if linha.startswith("event: "):
+                evento = linha[len("event: "):]
+            elif linha.startswith("data: "):
+                eventos.append((evento, json.loads(linha[len("data: "):])))
+    assert eventos[0][0] == "progresso" and eventos[-1][0] == "concluido"
+    assert eventos[-1][1]["resultado"]["total_count"] == 4
+    assert pm.difusor.total_ouvintes() == 0
+
+
+def test_mil_ouvintes_um_produtor():
+    difusor = DifusorProgresso(intervalo_s=0.01)
+    assert not difusor.tem_ouvintes("v")
+    difusor.publicar("v", {"frame_atual": 1})  # Sem ouvintes: descartado sem custo
+
+    async def cenario():
+        estado_inicial = {"video_name": "v", "frame_atual": 0, "finalizado": False}
+        carregamentos = []
+
+        async def carregar():
+            carregamentos.append(1)
+            await asyncio.sleep(0.01)
+            return estado_inicial
+
+        async def ouvir():
+            vistos = []
+            async for estado in difusor.assinar("v", carregar, local=lambda: True):
+                if estado is not None: vistos.append(estado)
+            return vistos
+
+        tarefas = [asyncio.create_task(ouvir()) for _ in range(1000)]
+        while difusor.total_ouvintes() < 1000:
+            await asyncio.sleep(0.01)
+
+        def produtor():
+            for f in range(1, 101):
+                difusor.publicar("v", {"video_name": "v", "frame_atual": f, "finalizado": False})
+                time.sleep(0.001)
+            difusor.publicar("v", {"video_name": "v", "frame_atual": 100, "finalizado": True}, imediato=True)
+        await asyncio.get_running_loop().run_in_executor(None, produtor)
+        resultados = await asyncio.wait_for(asyncio.gather(*tarefas), timeout=30)
+        return resultados, carregamentos
+
+    resultados, carregamentos = asyncio.run(cenario())
+    assert len(carregamentos) == 1  # Estado inicial lido uma vez para o canal, não uma vez por ouvinte
+    for vistos in resultados:
+        assert vistos[-1]["finalizado"] and vistos[-1]["frame_atual"] == 100
+    assert difusor.total_ouvintes() == 0 and not difusor.tem_ouvintes("v")
@@ -0,0 +1,123 @@
+# Arquivo: test_quantizacao.py
+# Verifica a variante INT8 dos modelos: amostragem compartilhada com o extract_frames.py, dataset de
+# calibração montado das filmagens próprias (e reaproveitado), "l-int8" no registro de modelos (com queda
+# para fp32 quando não há como quantizar), modelos registrados que nunca são despejados,
+# e o relatório de desvio da contagem contra a fp32.
+import os
+import shutil
+
+from extract_frames import extract_frames
+from utils import backends_inferencia, modelos, quantizacao
+from utils.amostragem_frames import amostrar_frames
+from utils.backends_inferencia import CacheExportacoes
+from utils.modelos import RegistroModelos
+from utils.quantizacao import desvio_contagem, preparar_calibracao
+from utils.video_sintetico import gerar_video_sintetico
+
+
+def test_amostragem_compartilhada_com_extract_frames(tmp_path):
+    video = str(tmp_path / "video.mp4")
+    gerar_video_sintetico(video, 320, 240, 70)
+    assert [idx for idx, _ in amostrar_frames(video, 30)] == [0, 30, 60]
+    assert [idx for idx, _ in amostrar_frames(video, 30, maximo=2)] == [0, 30]
+    extract_frames(video, str(tmp_path / "frames"), step=30)
+    assert sorted(os.listdir(tmp_path / "frames")) == ["frame_0000.jpg", "frame_0001.jpg", "frame_0002.jpg"]
+
+
+def test_calibracao_usa_as_filmagens_e_e_reaproveitada(tmp_path, monkeypatch):
+    filmagens = tmp_path / "filmagens"; filmagens.mkdir()
+    pasta = str(tmp_path / "exportados")
+    assert preparar_calibracao(str(filmagens), pasta) is None  # Sem filmagens, sem INT8
+    for nome in ("curral1.mp4", "curral2.mp4"):
+        gerar_video_sintetico(str(filmagens / nome), 320, 240, 90)
+    extract_frames(str(filmagens / "curral1.mp4"), str(filmagens / "fotos"), step=90)
+
+    dados = preparar_calibracao(str(filmagens), pasta, passo=30, maximo=5)
+    imagens = sorted(os.listdir(os.path.join(os.path.dirname(dados), "images")))
+    assert len(imagens) == 5 and sum(i.startswith("v000_") for i in imagens) == 2  # 1 foto + 2 frames por vídeo
+    assert f"path: {os.path.dirname(dados)}" in open(dados, encoding="utf-8").read()
+    assert preparar_calibracao(str(filmagens), pasta, passo=30, maximo=5) == dados
+    assert preparar_calibracao(str(filmagens), pasta, passo=15, maximo=5) != dados  # Outra amostragem, outro dataset
+    assert [p for p in os.listdir(pasta) if p.startswith(".")] == []
+
+    # Outro processo (worker do pool) termina o mesmo dataset primeiro: o os.replace falha e o dele é usado.
+    substituir = os.replace
+
+    def concorrente(origem, destino):
+        shutil.copytree(origem, destino)
+        substituir(origem, destino)
+    monkeypatch.setattr(quantizacao.os, "replace", concorrente)
+    outro = preparar_calibracao(str(filmagens), pasta, passo=10, maximo=5)
+    assert os.path.isfile(outro) and [p for p in os.listdir(pasta) if p.startswith(".")] == []
+
+
+class _YOLOFalso:
+    def __init__(self, origem, task=None):
+        self.origem, self.names = origem, {0: "cow"}
+
+    def predict(self, *args, **kwargs):
+        return []
+
+
+def test_variante_int8_no_registro(tmp_path, monkeypatch):
+    pesos = tmp_path / "yolov8l.pt"; pesos.write_bytes(b"pesos")
+    filmagens = tmp_path / "filmagens"; filmagens.mkdir()
+    gerar_video_sintetico(str(filmagens / "curral.mp4"), 320, 240, 90)
+    chamadas = []
+
+    def exportador(pesos, backend, imgsz, pasta, calibracao=None):
+        chamadas.append((backend, calibracao))
+        artefato = os.path.join(pasta, "modelo" + backends_inferencia.SUFIXOS[backend])
+        os.makedirs(artefato)
+        return artefato
+    monkeypatch.setattr(backends_inferencia, "backend_disponivel", lambda b, int8=False: True)
+    monkeypatch.setattr(modelos, "exportacoes", CacheExportacoes(str(tmp_path / "cache"), exportador=exportador))
+    preparos = []
+    monkeypatch.setattr(modelos, "preparar_calibracao",
+                        lambda: preparos.append(1) or preparar_calibracao(str(filmagens), str(tmp_path / "cache")))
+    monkeypatch.setattr(modelos, "YOLO", _YOLOFalso)
+
+    registro = RegistroModelos(model_files={"l": str(pesos)})
+    int8 = registro.obter("l-int8")
+    assert (int8.backend, int8.precisao) == ("openvino", "int8") and "-int8-" in int8.model.origem
+    assert chamadas[0][1].endswith("dados.yaml")  # Calibrada nas filmagens
+    fp32 = registro.obter("l")
+    assert fp32 is not int8 and fp32.precisao == "fp32" and registro.obter("L-INT8") is int8
+    assert len(preparos) == 1  # Variante já carregada: as filmagens não são varridas de novo a cada job
+    assert registro._carregando == {}  # Locks de carga não ficam acumulados por variante
+
+    # Sem filmagens para calibrar (ou sem backend que quantize), "l-int8" é o próprio modelo fp32.
+    shutil.rmtree(filmagens)
+    registro = RegistroModelos(model_files={"l": str(pesos)})
+    assert registro.obter("l-int8") is registro.obter("l") and registro.obter("l-int8").precisao == "fp32"
+
+
+def test_modelo_registrado_vale_para_qualquer_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(modelos, "YOLO", lambda *a, **k: (_ for _ in ()).throw(AssertionError("não deveria carregar")))
+    registro = RegistroModelos(model_files={"l": str(tmp_path / "yolov8l.pt")})
+    injetado = registro.registrar("L", _YOLOFalso("injetado"))
+    assert registro.obter("l", "openvino") is injetado and registro.obter("L", "auto") is injetado
+    assert list(registro.carregados()) == ["l"]
+
+
+def test_modelo_registrado_nunca_e_despejado(tmp_path, monkeypatch):
+    monkeypatch.setattr(modelos, "YOLO", _YOLOFalso)
+    registro = RegistroModelos(memoria_max_mb=1, model_files={"l": str(tmp_path / "yolov8l.pt")})
+    injetado = registro.registrar("blobs", _YOLOFalso("injetado"))
+    injetado.tamanho_bytes = 10 * 1024 * 1024  # Sozinho já estoura o orçamento
+    registro.obter("l", "pytorch")
+    # Não há de onde recarregar um modelo injetado: sem ele, "blobs" cairia no modelo padrão.
+    assert "blobs" in registro.carregados() and registro.obter("blobs") is injetado
+
+
+def test_desvio_da_contagem_int8_contra_fp32():
+    contagens = {("a.mp4", "l"): 100, ("a.mp4", "l-int8"): 99, ("b.mp4", "l"): 50, ("b.mp4", "l-int8"): 50}
+
+    def contar(video, choice, **parametros):
+        assert parametros == {"orientation": "N"}
+        return {"total_count": contagens[(video, choice)], "precisao": "int8" if choice.endswith("-int8") else "fp32"}
+    relatorio = desvio_contagem("l-int8", ["a.mp4", "b.mp4"], contar, desvio_max_pct=2, orientation="N")
+    assert [v["desvio_pct"] for v in relatorio["videos"]] == [-1.0, 0.0]
+    assert relatorio["desvio_total_pct"] == -0.67 and relatorio["desvio_max_abs_pct"] == 1.0
+    assert relatorio["aprovado"] and relatorio["precisao_int8_usada"] == "int8"
+    assert not desvio_contagem("l", ["a.mp4"], contar, desvio_max_pct=0.5, orientation="N")["aprovado"]
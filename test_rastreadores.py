@@ -0,0 +1,83 @@
+# Arquivo: test_rastreadores.py
+# Verifica os rastreadores plugáveis: configuração por perfil de câmera e por requisição, IDs estáveis do
+# rastreador IoU (com o fallback por centro, também em grupos apertados) e a mesma contagem com ByteTrack, BoT-SORT sem GMC e IoU.
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils import rastreadores
+from utils.contagem_video import contar_gado_em_video
+from utils.executor_processos import ProgressoLocal
+from utils.modelos import registro_modelos
+from utils.rastreadores import RastreadorIoU, _parear, criar_rastreador, resolver_config
+from utils.video_sintetico import DetectorBlobs, gerar_video_sintetico
+
+
+def test_configuracao_por_perfil_e_por_requisicao(tmp_path, monkeypatch):
+    perfis = tmp_path / "perfis.yaml"
+    perfis.write_text("brete:\n  tipo: iou\n  iou_min: 0.4\n  track_buffer: 10\n", encoding="utf-8")
+    monkeypatch.setattr(rastreadores, "RASTREADOR_PADRAO", "bytetrack")
+    assert resolver_config(None, str(perfis)) == {"tipo": "bytetrack"}
+    config = resolver_config({"perfil": "brete", "track_buffer": 20, "gmc": None}, str(perfis))
+    assert config == {"tipo": "iou", "perfil": "brete", "iou_min": 0.4, "track_buffer": 20}
+    assert resolver_config(config, str(perfis)) == config  # Resolver de novo (nos workers) não muda nada
+    for invalido in ({"perfil": "porteira"}, {"tipo": "sort"}, {"tipo": "iou", "limiar": 1}):
+        with pytest.raises(ValueError):
+            resolver_config(invalido, str(perfis))
+
+    botsort = criar_rastreador({"tipo": "botsort", "gmc": False, "track_buffer": 60})
+    assert botsort.gmc.method in (None, "none") and botsort.args.track_buffer == 60
+
+
+def _det(*caixas, conf=0.9):
+    xyxy = np.array(caixas, dtype=np.float32).reshape(-1, 4)
+    return SimpleNamespace(xyxy=xyxy, conf=np.full(len(xyxy), conf, np.float32), cls=np.zeros(len(xyxy), np.float32))
+
+
+def test_rastreador_iou_mantem_ids():
+    tracker = RastreadorIoU(iou_min=0.3, distancia_max=1.0, track_buffer=2)
+    primeiro = tracker.update(_det([0, 0, 10, 10], [50, 50, 60, 60]))
+    assert primeiro[:, 4].tolist() == [1, 2] and primeiro[:, 7].tolist() == [0, 1]
+    # Ordem das detecções trocada e um salto sem sobreposição (casa pelo centro, até 1 diagonal).
+    segundo = tracker.update(_det([58, 58, 68, 68], [2, 0, 12, 10]))
+    assert segundo[:, 4].tolist() == [2, 1]
+    assert tracker.update(_det([80, 80, 90, 90], conf=0.1)).shape == (0, 8)  # Confiança baixa não abre track
+    tracker.update(_det()); tracker.update(_det())
+    assert tracker.update(_det([2, 0, 12, 10]))[0, 4] == 3  # track_buffer esgotado: ID novo
+
+
+def test_ids_estaveis_em_grupo_apertado():
+    # Uma célula já usada com pontuação alta não pode encerrar o pareamento antes dos pares válidos mais fracos.
+    assert _parear(np.array([[0.9, 0.8], [0.0, 0.7]]), lambda v: v >= 0.3) == [(0, 0), (1, 1)]
+    rng = np.random.default_rng(0)
+    tracker = RastreadorIoU(iou_min=0.3, distancia_max=0.2)
+    # Três animais parados e sobrepostos no brete (IoU ~0,6 entre vizinhos) e um andando rápido (IoU ~0,43 consigo).
+    parados = np.array([[0, 0, 40, 40], [10, 0, 50, 40], [20, 0, 60, 40]], dtype=np.float32)
+    for f in range(20):
+        andando = [200 + 16 * f, 0, 240 + 16 * f, 40]
+        saida = tracker.update(_det(*(parados + rng.uniform(-1, 1, parados.shape)), andando))
+        assert saida[:, 4].tolist() == [1, 2, 3, 4]
+
+
+def test_mesma_contagem_com_cada_rastreador(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "false")
+    registro_modelos.registrar("blobs", DetectorBlobs())
+    contagens = {}
+    for config in ({"tipo": "bytetrack"}, {"tipo": "botsort", "gmc": False}, {"tipo": "iou"}):
+        video = os.path.join(tmp_path, f"video_{config['tipo']}.mp4")
+        gerar_video_sintetico(video, 320, 240, 90, n_animais=3)
+        progresso = ProgressoLocal()
+        resultado = contar_gado_em_video(video, os.path.basename(video), progresso, model_choice="blobs", orientation="S",
+                                         rastreador=config)
+        assert not progresso.erros and resultado["rastreador"]["tipo"] == config["tipo"]
+        contagens[config["tipo"]] = resultado["total_count"]
+    assert contagens == {"bytetrack": 3, "botsort": 3, "iou": 3}
+
+    video = os.path.join(tmp_path, "video_invalido.mp4")
+    gerar_video_sintetico(video, 320, 240, 30)
+    progresso = ProgressoLocal()
+    assert contar_gado_em_video(video, "video_invalido.mp4", progresso, model_choice="blobs", rastreador={"perfil": "nenhum"}) is None
+    assert "rastreador inválida" in progresso.erros[0]
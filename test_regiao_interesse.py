@@ -0,0 +1,36 @@
+# Arquivo: test_regiao_interesse.py
+# Verifica que o modo ROI conta o mesmo que o frame inteiro e que os tiles diagonais cobrem a linha.
+import os
+
+from utils.modelos import registro_modelos
+from utils.contagem_video import contar_gado_em_video
+from utils.executor_processos import ProgressoLocal
+from utils.regiao_interesse import planejar_roi
+from utils.video_sintetico import DetectorBlobs, gerar_video_sintetico
+
+
+def test_roi_conta_igual_ao_frame_inteiro(tmp_path, monkeypatch):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "false")
+    registro_modelos.registrar("blobs", DetectorBlobs())
+
+    resultados = {}
+    for roi in (False, True):
+        video = os.path.join(tmp_path, f"video_roi_{roi}.mp4")
+        gerar_video_sintetico(video, 320, 240, 90, n_animais=3)
+        progresso = ProgressoLocal()
+        resultados[roi] = contar_gado_em_video(video, os.path.basename(video), progresso, model_choice="blobs",
+                                               orientation="S", roi=roi)
+        assert not progresso.erros
+
+    assert resultados[True]["total_count"] == resultados[False]["total_count"] == 3
+    assert resultados[True]["roi"]["fracao_pixels"] < 0.5
+
+
+def test_tiles_diagonais_cobrem_a_linha():
+    width, height = 1920, 1080
+    tiles = planejar_roi(((0, 0), (width, height)), width, height, banda_ratio=0.3)
+    assert len(tiles) > 1
+    for i in range(101):
+        x, y = width * i / 100, height * i / 100
+        assert any(x1 <= x <= x2 and y1 <= y <= y2 for x1, y1, x2, y2 in tiles)
@@ -0,0 +1,68 @@
+import os
+import stat
+
+import cv2
+import numpy as np
+
+from utils.contagem_video import contar_gado_em_video
+from utils.executor_processos import ProgressoLocal
+from utils.modelos import registro_modelos
+from utils.renderizacao import EncoderFFmpeg, Renderizador
+from utils.video_sintetico import DetectorBlobs, gerar_video_sintetico
+
+
+def _contar_anotado(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "true")
+    monkeypatch.setattr("utils.renderizacao.RENDER_ENCODER", "opencv")
+    monkeypatch.chdir(tmp_path)
+    registro_modelos.registrar("blobs", DetectorBlobs())
+    gerar_video_sintetico(str(tmp_path / "video.mp4"), 320, 240, 90, n_animais=3)
+    resultado = contar_gado_em_video(str(tmp_path / "video.mp4"), "video.mp4", ProgressoLocal(), model_choice="blobs", **kwargs)
+    cap = cv2.VideoCapture(os.path.join("videos_processados_temp", "processed_video.mp4"))
+    saida = {"frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), "fps": cap.get(cv2.CAP_PROP_FPS),
+             "largura": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), "altura": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}
+    cap.release()
+    return resultado, saida
+
+
+def test_frame_skip_mantem_a_duracao_do_video(tmp_path, monkeypatch):
+    # 90 frames a 30 fps, processando 1 a cada 3: 30 quadros a 10 fps = os mesmos 3 segundos.
+    resultado, saida = _contar_anotado(tmp_path, monkeypatch, frame_skip=3, perfil_video="metade")
+    assert resultado["total_count"] > 0
+    assert saida["frames"] == 30 and abs(saida["fps"] - 10) < 0.01
+    assert (saida["largura"], saida["altura"]) == (160, 120)
+    # Os buffers da metade da resolução são reaproveitados, não alocados por quadro.
+    assert resultado["video_anotado"]["buffers_alocados"] < 15
+
+
+def test_perfil_destaques_grava_so_em_volta_das_contagens(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.renderizacao.RENDER_DESTAQUE_ANTES_S", 0.2)
+    monkeypatch.setattr("utils.renderizacao.RENDER_DESTAQUE_DEPOIS_S", 0.2)
+    resultado, saida = _contar_anotado(tmp_path, monkeypatch, perfil_video="destaques")
+    info = resultado["video_anotado"]
+    assert resultado["total_count"] > 0 and info["clipes"] >= 1
+    assert 0 < saida["frames"] == info["quadros_gravados"] < resultado["total_frames"]
+
+
+def test_fps_reduzido():
+    render = Renderizador("fps_reduzido", 1920, 1080, fps=30, frame_skip=1)
+    assert render.a_cada == 3 and render.fps_saida == 10
+    gravados = []
+    for _ in range(9):
+        render.processar(np.zeros((1080, 1920, 3), np.uint8), False, lambda c, e: None, lambda c, d: gravados.append(c))
+    assert len(gravados) == 3
+
+
+def test_encoder_ffmpeg_envia_frames_crus_pelo_pipe(tmp_path):
+    # ffmpeg falso: grava o stdin no arquivo de saída (último argumento).
+    falso = tmp_path / "ffmpeg"
+    falso.write_text('#!/bin/sh\nfor a; do out="$a"; done\ncat > "$out"\n')
+    falso.chmod(falso.stat().st_mode | stat.S_IEXEC)
+    encoder = EncoderFFmpeg(str(tmp_path / "saida.mp4"), 64, 48, 10.0, binario=str(falso))
+    quadro = np.arange(48 * 64 * 3, dtype=np.uint8).reshape(48, 64, 3)
+    for _ in range(3):
+        encoder.write(quadro)
+    encoder.release()
+    dados = (tmp_path / "saida.mp4").read_bytes()
+    assert dados == quadro.tobytes() * 3
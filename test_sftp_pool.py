@@ -0,0 +1,75 @@
+import os
+import threading
+
+import pytest
+
+from utils import sftp_handler
+from utils.sftp_handler import PoolSFTP, upload_file_sftp, download_file_sftp, delete_file_sftp
+
+
+@pytest.fixture
+def pool(servidor, monkeypatch):
+    p = PoolSFTP("127.0.0.1", servidor.porta, "gado", "senha", max_conexoes=2)
+    monkeypatch.setattr(sftp_handler, "_pool", p)
+    yield p
+    p.fechar()
+
+
+def _arquivo_local(pasta, nome, conteudo=b"video" * 1000):
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, "wb") as f: f.write(conteudo)
+    return caminho
+
+
+def test_reaproveita_conexao_e_cache_de_diretorios(servidor, pool, tmp_path):
+    local = _arquivo_local(tmp_path, "a.mp4")
+    assert upload_file_sftp(local, "public_html/videos/2024/a.mp4")
+    stats_primeiro = servidor.contadores["stat"]
+    assert upload_file_sftp(local, "public_html/videos/2024/b.mp4")
+    # Segundo upload na mesma pasta: nenhum stat de diretório, só o da confirmação do put.
+    assert servidor.contadores["stat"] == stats_primeiro + 1
+    assert download_file_sftp("public_html/videos/2024/b.mp4", str(tmp_path / "baixado.mp4"))
+    assert open(tmp_path / "baixado.mp4", "rb").read() == open(local, "rb").read()
+    assert delete_file_sftp("public_html/videos/2024/a.mp4")
+    assert not os.path.exists(os.path.join(servidor.raiz, "public_html/videos/2024/a.mp4"))
+    # Quatro operações, um único handshake SSH.
+    assert servidor.contadores["conexoes"] == 1
+    assert pool.estatisticas()["reaproveitadas"] == 3
+
+
+def test_reconecta_quando_servidor_derruba_a_conexao(servidor, pool, tmp_path):
+    local = _arquivo_local(tmp_path, "a.mp4")
+    assert upload_file_sftp(local, "videos/a.mp4")
+    servidor.derrubar_conexoes()
+    assert upload_file_sftp(local, "videos/b.mp4")
+    assert os.path.exists(os.path.join(servidor.raiz, "videos/b.mp4"))
+    assert servidor.contadores["conexoes"] == 2
+
+
+def test_diretorio_apagado_no_servidor_e_recriado(servidor, pool, tmp_path):
+    local = _arquivo_local(tmp_path, "a.mp4")
+    assert upload_file_sftp(local, "videos/dia1/a.mp4")
+    os.remove(os.path.join(servidor.raiz, "videos/dia1/a.mp4"))
+    os.rmdir(os.path.join(servidor.raiz, "videos/dia1"))
+    assert upload_file_sftp(local, "videos/dia1/b.mp4")
+    assert os.path.exists(os.path.join(servidor.raiz, "videos/dia1/b.mp4"))
+
+
+def test_upload_cancelado_remove_parcial(servidor, pool, tmp_path):
+    local = _arquivo_local(tmp_path, "grande.mp4", os.urandom(2 * 1024 * 1024))
+    cancelamento = threading.Event()
+    def progresso(enviados, total):
+        if enviados > 256 * 1024: cancelamento.set()
+    assert not upload_file_sftp(local, "videos/grande.mp4", progresso, cancelamento)
+    assert not os.path.exists(os.path.join(servidor.raiz, "videos/grande.mp4"))
+    # O pool continua utilizável depois do cancelamento.
+    assert upload_file_sftp(local, "videos/grande.mp4")
+
+
+def test_pool_limita_conexoes_simultaneas(servidor, pool, tmp_path):
+    local = _arquivo_local(tmp_path, "a.mp4")
+    threads = [threading.Thread(target=upload_file_sftp, args=(local, f"videos/{i}.mp4")) for i in range(6)]
+    for t in threads: t.start()
+    for t in threads: t.join(timeout=30)
+    assert len(os.listdir(os.path.join(servidor.raiz, "videos"))) == 6
+    assert servidor.contadores["conexoes"] <= 2
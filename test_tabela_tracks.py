@@ -0,0 +1,46 @@
+# Arquivo: test_tabela_tracks.py
+# Verifica a tabela de tracks (despejo por idade) e que uma oclusão curta na linha não perde a contagem.
+import os
+
+import cv2
+import numpy as np
+
+from utils.modelos import registro_modelos
+from utils.contagem_video import contar_gado_em_video
+from utils.tabela_tracks import TabelaTracks
+from utils.video_sintetico import DetectorBlobs
+
+
+def test_tabela_despeja_tracks_antigos_e_reaproveita_slots():
+    tabela = TabelaTracks(max_idade_frames=5, capacidade=2)
+    tabela.atualizar(np.array([1, 2]), np.array([0, 0]), np.array([10, 20]), np.array([10, 20]), frame_idx=0)
+    _, _, valido = tabela.anteriores(np.array([1, 2, 3]), frame_idx=5)
+    assert valido.tolist() == [True, True, False]
+    _, _, valido = tabela.anteriores(np.array([1]), frame_idx=6)
+    assert valido.tolist() == [False]
+
+    tabela.atualizar(np.array([3]), np.array([0]), np.array([30]), np.array([30]), frame_idx=10)
+    assert len(tabela) == 1 and tabela.despejados == 2 and len(tabela.ids) == 2
+    x, y, valido = tabela.anteriores(np.array([3]), frame_idx=11)
+    assert (x[0], y[0], valido[0]) == (30, 30, True)
+
+
+def test_oclusao_curta_na_linha_ainda_conta(tmp_path, monkeypatch, progresso):
+    monkeypatch.setenv("USE_SFTP", "false")
+    monkeypatch.setenv("CREATE_ANNOTATED_VIDEO", "false")
+    registro_modelos.registrar("blobs", DetectorBlobs())
+
+    # Um blob descendo que some por 3 frames bem quando o centro cruza a linha do meio (y = 120).
+    video = os.path.join(tmp_path, "video_oclusao.mp4")
+    out = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*"mp4v"), 30, (320, 240))
+    for i in range(70):
+        frame = np.zeros((240, 320, 3), np.uint8)
+        y = i * 4 - 30
+        if not 118 <= y + 15 <= 130:
+            cv2.rectangle(frame, (140, y), (180, y + 30), (255, 255, 255), -1)
+        out.write(frame)
+    out.release()
+
+    resultado = contar_gado_em_video(video, os.path.basename(video), progresso, model_choice="blobs", orientation="S")
+    assert not progresso.erros
+    assert resultado["total_count"] == 1
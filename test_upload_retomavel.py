@@ -0,0 +1,93 @@
+# Arquivo: test_upload_retomavel.py
+# Verifica o upload retomável: queda no meio, retomada pelo offset, conferência do SHA-256, limite de tamanho,
+# a sessão liberada mesmo quando a gravação em disco falha,
+# e o /upload-video/ recusando pelo Content-Length antes de ler o corpo.
+import hashlib
+import os
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import video_routes
+from utils.upload_retomavel import ArquivoEmEscrita, GerenciadorUploads
+
+
+def _cliente(tmp_path, monkeypatch, limite_bytes=10_000_000):
+    destino = tmp_path / "uploads"
+    monkeypatch.setattr(video_routes, "uploads", GerenciadorUploads(str(tmp_path / "parciais"), str(destino), limite_bytes=limite_bytes))
+    app = FastAPI(); app.include_router(video_routes.router)
+    return TestClient(app), destino
+
+
+def test_upload_retomado_apos_queda(tmp_path, monkeypatch):
+    cliente, destino = _cliente(tmp_path, monkeypatch)
+    dados = os.urandom(300_000)
+    sessao = cliente.post("/upload-sessao/", json={"nome_arquivo_original": "video.mp4", "tamanho_total": len(dados),
+                                                   "sha256": hashlib.sha256(dados).hexdigest()}).json()
+    upload_id = sessao["upload_id"]
+
+    # Primeira tentativa só entrega uma parte (conexão caiu).
+    assert cliente.put(f"/upload-sessao/{upload_id}?offset=0", content=dados[:120_000]).json()["offset"] == 120_000
+    # Offset errado é recusado informando o offset correto.
+    r = cliente.put(f"/upload-sessao/{upload_id}?offset=0", content=dados)
+    assert r.status_code == 409 and r.json()["offset"] == 120_000
+    # Cliente consulta o offset e continua de onde parou.
+    offset = cliente.get(f"/upload-sessao/{upload_id}").json()["offset"]
+    assert cliente.put(f"/upload-sessao/{upload_id}?offset={offset}", content=dados[offset:]).json()["completo"]
+
+    final = cliente.post(f"/upload-sessao/{upload_id}/concluir").json()
+    assert final["sha256"] == hashlib.sha256(dados).hexdigest()
+    assert (destino / final["nome_arquivo"]).read_bytes() == dados
+
+
+def test_limite_de_tamanho_e_upload_simples(tmp_path, monkeypatch):
+    cliente, destino = _cliente(tmp_path, monkeypatch, limite_bytes=1000)
+    r = cliente.post("/upload-sessao/", json={"nome_arquivo_original": "grande.mp4", "tamanho_total": 5000})
+    assert r.status_code == 413
+
+    sessao = cliente.post("/upload-sessao/", json={"nome_arquivo_original": "v.mp4", "tamanho_total": 100}).json()
+    r = cliente.put(f"/upload-sessao/{sessao['upload_id']}?offset=0", content=b"x" * 150)
+    assert r.status_code == 413
+
+    monkeypatch.setattr(video_routes, "UPLOAD_FOLDER", str(destino))
+    r = cliente.post("/upload-video/", files={"file": ("v.mp4", b"abc" * 1000, "video/mp4")})
+    assert r.status_code == 200 and r.json()["sha256"] == hashlib.sha256(b"abc" * 1000).hexdigest()
+    assert (destino / r.json()["nome_arquivo"]).read_bytes() == b"abc" * 1000
+
+    # Hashes de uploads que nunca chegam ao /predict-video/ não se acumulam: sai o mais antigo.
+    monkeypatch.setattr(video_routes, "hashes_uploads", video_routes.OrderedDict())
+    monkeypatch.setattr(video_routes, "HASHES_UPLOADS_MAX", 2)
+    nomes = [cliente.post("/upload-video/", files={"file": (f"v{i}.mp4", b"x" * i, "video/mp4")}).json()["nome_arquivo"]
+             for i in range(1, 4)]
+    assert list(video_routes.hashes_uploads) == nomes[1:]
+
+
+def test_falha_de_disco_libera_a_sessao(tmp_path, monkeypatch):
+    cliente, _ = _cliente(tmp_path, monkeypatch)
+    dados = os.urandom(1000)
+    upload_id = cliente.post("/upload-sessao/", json={"nome_arquivo_original": "v.mp4", "tamanho_total": len(dados)}).json()["upload_id"]
+    escrever = ArquivoEmEscrita.escrever
+
+    def disco_cheio(self, bloco):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(ArquivoEmEscrita, "escrever", disco_cheio)
+    with pytest.raises(OSError):
+        cliente.put(f"/upload-sessao/{upload_id}?offset=0", content=dados)
+
+    # A sessão não ficou presa como "envio em andamento": o próximo PUT grava normalmente.
+    monkeypatch.setattr(ArquivoEmEscrita, "escrever", escrever)
+    assert cliente.get(f"/upload-sessao/{upload_id}").json()["offset"] == 0
+    assert cliente.put(f"/upload-sessao/{upload_id}?offset=0", content=dados).json()["completo"]
+
+
+def test_upload_simples_grande_recusado_pelo_content_length(tmp_path, monkeypatch):
+    cliente, _ = _cliente(tmp_path, monkeypatch)
+    monkeypatch.setattr(video_routes, "UPLOAD_MAX_BYTES", 1000)
+
+    def sem_leitura(self, *args, **kwargs):
+        raise AssertionError("o corpo não deveria ser lido")
+    monkeypatch.setattr(video_routes.Request, "form", sem_leitura)
+    r = cliente.post("/upload-video/", files={"file": ("v.mp4", b"x" * 200_000, "video/mp4")})
+    assert r.status_code == 413 and r.json()["limite_bytes"] == 1000
@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+# Quantos jobs de contagem rodam ao mesmo tempo e quantos podem esperar na fila.
+MAX_JOBS_SIMULTANEOS = int(os.getenv("MAX_JOBS_SIMULTANEOS", "1"))
+MAX_FILA_JOBS = int(os.getenv("MAX_FILA_JOBS", "20"))
+# Duração assumida de um job antes de termos medições reais (para estimar o início dos jobs na fila).
+JOB_DURACAO_INICIAL_S = float(os.getenv("JOB_DURACAO_INICIAL_S", "120"))
+
+
+class FilaCheia(Exception):
+    """A fila de jobs atingiu o limite; retry_after é a sugestão (em segundos) para tentar de novo."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Fila de processamento cheia. Tente novamente em {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class AgendadorJobs:
+    """
+    Fila de jobs com limite de concorrência e prioridade (maior prioridade primeiro; FIFO entre iguais).
+    Um número fixo de threads trabalhadoras consome a fila, então N uploads simultâneos não
+    disputam os mesmos núcleos com N inferências ao mesmo tempo.
+    """
+
+    def __init__(self, max_concorrentes: int = MAX_JOBS_SIMULTANEOS, max_fila: int = MAX_FILA_JOBS,
+                 duracao_inicial_s: float = JOB_DURACAO_INICIAL_S):
+        self.max_concorrentes = max(1, max_concorrentes)
+        self.max_fila = max(0, max_fila)
+        self._fila: List[Tuple[int, int, str]] = []          # (-prioridade, sequência, job_id)
+        self._funcoes: Dict[str, Callable[[], None]] = {}    # job_id -> função, enquanto está na fila
+        self._em_execucao: Dict[str, float] = {}             # job_id -> instante de início
+        self._reservados: set = set()                        # job_ids reservados, ainda sendo preparados para submeter()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._duracao_media_s = duracao_inicial_s
+        self._workers: List[threading.Thread] = []
+
+    def _garantir_workers(self):
+        """Sobe as threads trabalhadoras na primeira submissão. Chamar com _cond."""
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_concorrentes:
+            w = threading.Thread(target=self._loop_worker, name=f"agendador-{len(self._workers)}", daemon=True)
+            w.start()
+            self._workers.append(w)
+
+    def submeter(self, job_id: str, funcao: Callable[[], None], prioridade: int = 0) -> int:
+        """
+        Enfileira um job. Retorna a posição na fila (0 = começa assim que houver vaga). Levanta FilaCheia.
+        Um job reservado com reservar() consome a reserva (na fila cheia, a reserva continua até liberar_reserva()).
+        """
+        with self._cond:
+            if job_id in self._funcoes or job_id in self._em_execucao:
+                raise ValueError(f"Job '{job_id}' já está no agendador.")
+            if len(self._funcoes) >= self.max_fila:
+                raise FilaCheia(self._retry_after())
+            self._reservados.discard(job_id)
+            self._funcoes[job_id] = funcao
+            heapq.heappush(self._fila, (-int(prioridade), next(self._seq), job_id))
+            self._garantir_workers()
+            self._cond.notify()
+            return self._posicao(job_id)
+
+    def contem(self, job_id: str) -> bool:
+        """O job está reservado, na fila ou rodando (inclusive um cancelado que ainda não percebeu o cancelamento)."""
+        with self._cond:
+            return job_id in self._reservados or job_id in self._funcoes or job_id in self._em_execucao
+
+    def reservar(self, job_id: str) -> bool:
+        """
+        Reserva o job_id para quem vai submetê-lo (checagem e registro num passo só). False se ele já está
+        reservado, na fila ou rodando: só o dono da reserva pode mexer no estado do job.
+        """
+        with self._cond:
+            if job_id in self._reservados or job_id in self._funcoes or job_id in self._em_execucao:
+                return False
+            self._reservados.add(job_id)
+            return True
+
+    def liberar_reserva(self, job_id: str):
+        """Desiste de uma reserva que não virou job (sem efeito depois do submeter())."""
+        with self._cond:
+            self._reservados.discard(job_id)
+
+    def remover(self, job_id: str) -> bool:
+        """Tira da fila um job que ainda não começou. Retorna False se ele já está rodando ou não existe."""
+        with self._cond:
+            if job_id not in self._funcoes:
+                return False
+            del self._funcoes[job_id]
+            self._fila = [item for item in self._fila if item[2] != job_id]
+            heapq.heapify(self._fila)
+            return True
+
+    def _loop_worker(self):
+        while True:
+            with self._cond:
+                while not self._fila:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(self._fila)
+                funcao = self._funcoes.pop(job_id, None)
+                if funcao is None:
+                    continue
+                inicio = time.time()
+                self._em_execucao[job_id] = inicio
+            try:
+                funcao()
+            except Exception as e:
+                print(f"[AGENDADOR ERRO] Job '{job_id}' terminou com exceção: {e}")
+            finally:
+                with self._cond:
+                    self._em_execucao.pop(job_id, None)
+                    # Média móvel da duração dos jobs, usada nas estimativas de início.
+                    self._duracao_media_s = 0.8 * self._duracao_media_s + 0.2 * (time.time() - inicio)
+
+    # --- Estimativas ---
+    def _ordem_fila(self) -> List[str]:
+        return [job_id for _, _, job_id in sorted(self._fila) if job_id in self._funcoes]
+
+    def _posicao(self, job_id: str) -> int:
+        return self._ordem_fila().index(job_id)
+
+    def _tempos_de_inicio(self) -> Dict[str, float]:
+        """Simula as vagas liberando na ordem da fila para estimar em quantos segundos cada job começa."""
+        agora = time.time()
+        vagas = [max(0.0, self._duracao_media_s - (agora - inicio)) for inicio in self._em_execucao.values()]
+        vagas += [0.0] * (self.max_concorrentes - len(vagas))
+        heapq.heapify(vagas)
+        estimativas = {}
+        for job_id in self._ordem_fila():
+            livre_em = heapq.heappop(vagas)
+            estimativas[job_id] = livre_em
+            heapq.heappush(vagas, livre_em + self._duracao_media_s)
+        return estimativas
+
+    def _retry_after(self) -> int:
+        """Tempo até a próxima vaga na fila: o início estimado do primeiro job da fila."""
+        estimativas = self._tempos_de_inicio()
+        return max(1, int(round(min(estimativas.values(), default=self._duracao_media_s))))
+
+    def situacao(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Posição na fila e início estimado de um job; None se o job não está no agendador."""
+        with self._cond:
+            if job_id in self._em_execucao:
+                return {"estado": "executando", "posicao_fila": None, "inicio_estimado_s": 0.0}
+            if job_id not in self._funcoes:
+                return None
+            estimativas = self._tempos_de_inicio()
+            return {
+                "estado": "na_fila",
+                "posicao_fila": self._posicao(job_id) + 1,
+                "inicio_estimado_s": round(estimativas.get(job_id, 0.0), 1),
+            }
+
+    def resumo(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "executando": len(self._em_execucao),
+                "na_fila": len(self._funcoes),
+                "max_concorrentes": self.max_concorrentes,
+                "max_fila": self.max_fila,
+                "duracao_media_s": round(self._duracao_media_s, 1),
+            }
@@ -0,0 +1,30 @@
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def amostrar_frames(video_path: str, passo: int = 30, maximo: Optional[int] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Produz (índice, frame) a cada `passo` frames do vídeo, a partir do primeiro, até `maximo` frames.
+    É a amostragem do extract_frames.py, compartilhada com a calibração INT8 e a comparação de backends;
+    os frames pulados só são avançados (grab), sem decodificar.
+    """
+    passo = max(1, int(passo))
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Não foi possível abrir o vídeo: {video_path}")
+    idx, amostrados = 0, 0
+    try:
+        while maximo is None or amostrados < maximo:
+            if idx % passo == 0:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield idx, frame
+                amostrados += 1
+            elif not cap.grab():
+                break
+            idx += 1
+    finally:
+        cap.release()
@@ -0,0 +1,222 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+import numpy as np
+
+from utils.rastreadores import iou_xyxy
+
+# Backend de inferência dos modelos na CPU. "auto" usa o mais rápido disponível (openvino > onnx > pytorch);
+# um backend explícito que falhar (pacote ausente, exportação ou carga com erro) cai para o PyTorch.
+MODELOS_BACKEND = os.getenv("MODELOS_BACKEND", "auto").lower()
+# Modelos exportados, reaproveitados entre reinícios e workers (chave: hash dos pesos + tamanho de entrada).
+MODELOS_EXPORT_DIR = os.getenv("MODELOS_EXPORT_DIR", os.path.join(os.getenv("RENDER_DATA_DIR", "data"), "modelos_exportados"))
+MODELOS_IMGSZ = int(os.getenv("MODELOS_IMGSZ", "640"))
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+ORDEM_AUTO = ("openvino", "onnx", "pytorch")
+# Pacotes necessários para exportar e executar cada backend (o PyTorch já vem com o ultralytics).
+DEPENDENCIAS: Dict[str, Tuple[str, ...]] = {"onnx": ("onnx", "onnxruntime"), "openvino": ("openvino",)}
+# Pacotes extras para gerar a variante INT8 (quantização estática calibrada; ver utils/quantizacao.py).
+DEPENDENCIAS_INT8: Dict[str, Tuple[str, ...]] = {"onnx": (), "openvino": ("nncf",)}
+# Extensão do artefato exportado pelo ultralytics (o OpenVINO gera um diretório).
+SUFIXOS = {"onnx": ".onnx", "openvino": "_openvino_model"}
+
+
+def normalizar_backend(backend: Optional[str]) -> str:
+    nome = str(backend or MODELOS_BACKEND).lower()
+    if nome != "auto" and nome not in BACKENDS:
+        raise ValueError(f"Backend de inferência '{backend}' inválido. Use auto, {', '.join(BACKENDS)}.")
+    return nome
+
+
+def backend_disponivel(backend: str, int8: bool = False) -> bool:
+    """O backend pode ser exportado e executado neste ambiente (pacotes opcionais instalados)."""
+    pacotes = DEPENDENCIAS.get(backend, ()) + (DEPENDENCIAS_INT8.get(backend, ()) if int8 else ())
+    return all(importlib.util.find_spec(pacote) is not None for pacote in pacotes)
+
+
+def candidatos(backend: Optional[str], int8: bool = False) -> List[str]:
+    """
+    Backends a tentar, em ordem; sempre termina no PyTorch. Para a variante INT8, o "auto" só considera
+    os backends com os pacotes de quantização instalados (no PyTorch, último recurso, o modelo roda em fp32).
+    """
+    nome = normalizar_backend(backend)
+    ordem = [b for b in ORDEM_AUTO if backend_disponivel(b, int8)] if nome == "auto" else [nome]
+    return ordem + (["pytorch"] if "pytorch" not in ordem else [])
+
+
+def localizar_pesos(pesos: str) -> str:
+    """Caminho local do .pt (baixa os pesos oficiais do ultralytics se ainda não estiverem no disco)."""
+    if os.path.isfile(pesos):
+        return pesos
+    from ultralytics.utils.downloads import attempt_download_asset
+    return str(attempt_download_asset(pesos))
+
+
+def _exportar_ultralytics(pesos: str, backend: str, imgsz: int, pasta: str, calibracao: Optional[str] = None) -> str:
+    """
+    Exporta com o ultralytics a partir de uma cópia dos pesos em `pasta` (o artefato sai ao lado da cópia).
+    Com `calibracao` (dados.yaml de utils/quantizacao.py) gera a variante INT8: no OpenVINO pela quantização
+    do próprio exportador (NNCF); no ONNX pela quantização estática do ONNX Runtime sobre o modelo fp32.
+    """
+    from ultralytics import YOLO
+    copia = os.path.join(pasta, os.path.basename(pesos))
+    shutil.copy2(pesos, copia)
+    # dynamic: aceita lotes (batch_size) e os recortes do modo ROI, de tamanhos variados.
+    if calibracao and backend == "openvino":
+        return str(YOLO(copia).export(format=backend, imgsz=imgsz, dynamic=True, int8=True, data=calibracao))
+    artefato = str(YOLO(copia).export(format=backend, imgsz=imgsz, dynamic=True, half=False))
+    if calibracao:
+        from utils.quantizacao import quantizar_onnx
+        return quantizar_onnx(artefato, calibracao, imgsz, os.path.join(pasta, "modelo_int8" + SUFIXOS[backend]))
+    return artefato
+
+
+class CacheExportacoes:
+    """
+    Modelos exportados para ONNX / OpenVINO IR, um por (pesos, backend, tamanho de entrada). A chave usa o
+    SHA-256 dos pesos, então trocar o best.pt gera uma exportação nova. A exportação roda no primeiro uso
+    (ou antes, pelo exportar_modelos.py) num diretório temporário e é movida para o cache já completa.
+    Uma exportação que falhou não é repetida no mesmo processo: o modelo segue no PyTorch.
+    """
+
+    def __init__(self, pasta: str = MODELOS_EXPORT_DIR, imgsz: int = MODELOS_IMGSZ,
+                 exportador: Callable[[str, str, int, str, Optional[str]], str] = _exportar_ultralytics):
+        self.pasta = pasta
+        self.imgsz = imgsz
+        self.exportador = exportador
+        self._hashes: Dict[Tuple[str, float, int], str] = {}
+        self._falhas: Dict[str, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def hash_pesos(self, pesos: str) -> str:
+        from utils.cache_resultados import calcular_sha256
+        info = os.stat(pesos)
+        chave = (os.path.abspath(pesos), info.st_mtime, info.st_size)
+        if chave not in self._hashes:
+            self._hashes[chave] = calcular_sha256(pesos)
+        return self._hashes[chave]
+
+    def caminho(self, pesos: str, backend: str, calibracao: Optional[str] = None) -> str:
+        nome = os.path.splitext(os.path.basename(pesos))[0]
+        # A variante INT8 depende também do conjunto de calibração.
+        variante = f"-int8-{self.hash_pesos(calibracao)[:8]}" if calibracao else ""
+        return os.path.join(self.pasta, f"{nome}-{self.hash_pesos(pesos)[:16]}-{self.imgsz}{variante}{SUFIXOS[backend]}")
+
+    def obter(self, pesos: str, backend: str, calibracao: Optional[str] = None) -> Optional[str]:
+        """
+        Caminho do modelo exportado (exporta na primeira vez); None se o backend não puder ser usado.
+        Com `calibracao`, devolve a variante INT8 calibrada nesse dataset.
+        """
+        if not backend_disponivel(backend, int8=bool(calibracao)):
+            return None
+        pesos = localizar_pesos(pesos)
+        destino = self.caminho(pesos, backend, calibracao)
+        with self._lock:
+            if destino in self._falhas:
+                return None
+            lock = self._locks.setdefault(destino, threading.Lock())
+        with lock:  # Dois jobs pedindo o mesmo modelo não exportam duas vezes
+            if os.path.exists(destino):
+                return destino
+            os.makedirs(self.pasta, exist_ok=True)
+            inicio = time.time()
+            try:
+                with tempfile.TemporaryDirectory(dir=self.pasta, prefix=".exportando-") as tmp:
+                    artefato = self.exportador(pesos, backend, self.imgsz, tmp, calibracao)
+                    if not os.path.exists(destino):  # Outro worker pode ter terminado a mesma exportação antes
+                        os.replace(artefato, destino)
+            except Exception as e:
+                self.registrar_falha(destino, e)
+                return None
+            print(f"[MODELOS] '{os.path.basename(pesos)}' exportado para {backend}{' (INT8)' if calibracao else ''} em {time.time() - inicio:.1f}s ({destino}).")
+            return destino
+
+    def registrar_falha(self, destino: str, erro: BaseException):
+        with self._lock:
+            self._falhas[destino] = str(erro)
+        print(f"[MODELOS ERRO] Backend indisponível para '{os.path.basename(destino)}': {erro}. Usando PyTorch.")
+
+    def situacao(self) -> Dict[str, Any]:
+        artefatos = sorted(os.listdir(self.pasta)) if os.path.isdir(self.pasta) else []
+        with self._lock:
+            falhas = dict(self._falhas)
+        return {"pasta": self.pasta, "imgsz": self.imgsz, "disponiveis": [b for b in BACKENDS if backend_disponivel(b)],
+                "exportados": [a for a in artefatos if not a.startswith(".")], "falhas": falhas}
+
+
+# Instância única do processo, usada pelo registro de modelos.
+exportacoes = CacheExportacoes()
+
+
+# ---------------------------------------------------------------------------
+# Comparação entre backends (velocidade e concordância das detecções)
+# ---------------------------------------------------------------------------
+def parear_deteccoes(ref_xyxy: np.ndarray, ref_cls: np.ndarray, alt_xyxy: np.ndarray, alt_cls: np.ndarray,
+                     iou_min: float = 0.5) -> List[float]:
+    """Pareamento guloso (maior IoU primeiro, mesma classe); devolve o IoU de cada par."""
+    if len(ref_xyxy) == 0 or len(alt_xyxy) == 0:
+        return []
+    iou = iou_xyxy(ref_xyxy, alt_xyxy) * (ref_cls[:, None] == alt_cls[None, :])
+    pares, usadas_i, usadas_j = [], set(), set()
+    for idx in np.argsort(-iou, axis=None):
+        i, j = (int(v) for v in np.unravel_index(idx, iou.shape))
+        if iou[i, j] < iou_min:
+            break
+        if i in usadas_i or j in usadas_j:
+            continue
+        usadas_i.add(i); usadas_j.add(j)
+        pares.append(float(iou[i, j]))
+    return pares
+
+
+def _deteccoes(result: Any) -> Tuple[np.ndarray, np.ndarray]:
+    boxes = result.boxes
+    return np.asarray(boxes.xyxy.cpu().numpy(), dtype=np.float32).reshape(-1, 4), np.asarray(boxes.cls.cpu().numpy()).reshape(-1)
+
+
+def comparar_backends(model_choice: str, frames: List[np.ndarray], backends: Optional[List[str]] = None,
+                      registro: Any = None, conf: float = 0.3, iou_min: float = 0.5) -> Dict[str, Any]:
+    """
+    Roda os mesmos frames em cada backend e compara com o PyTorch: ms por frame (p50 e média) e
+    concordância das detecções (pares com IoU >= iou_min e mesma classe / maior número de detecções).
+    """
+    if registro is None:
+        from utils.modelos import registro_modelos as registro
+    relatorio: Dict[str, Any] = {"model_choice": model_choice, "frames": len(frames), "backends": {}}
+    referencia: List[Tuple[np.ndarray, np.ndarray]] = []
+    for backend in ["pytorch"] + [b for b in (backends or [b for b in BACKENDS if b != "pytorch"]) if b != "pytorch"]:
+        inicio = time.time()
+        modelo = registro.obter(model_choice, backend=backend)
+        carga_s = time.time() - inicio
+        if modelo.backend != backend:
+            relatorio["backends"][backend] = {"disponivel": False, "usado": modelo.backend}
+            continue
+        tempos, deteccoes = [], []
+        for frame in frames:
+            t = time.perf_counter()
+            result = modelo.predict(frame, conf=conf)[0]
+            tempos.append(time.perf_counter() - t)
+            deteccoes.append(_deteccoes(result))
+        item = {"disponivel": True, "carga_s": round(carga_s, 2), "ms_por_frame_p50": round(1000 * float(np.median(tempos)), 2) if tempos else None,
+                "ms_por_frame_media": round(1000 * float(np.mean(tempos)), 2) if tempos else None,
+                "deteccoes": int(sum(len(d[0]) for d in deteccoes))}
+        if backend == "pytorch":
+            referencia = deteccoes
+        else:
+            pares = [parear_deteccoes(r[0], r[1], a[0], a[1], iou_min) for r, a in zip(referencia, deteccoes)]
+            total = sum(max(len(r[0]), len(a[0])) for r, a in zip(referencia, deteccoes))
+            todos = [p for ps in pares for p in ps]
+            item.update(concordancia=round(len(todos) / total, 4) if total else 1.0,
+                        iou_medio=round(float(np.mean(todos)), 4) if todos else None)
+            p50_ref = relatorio["backends"]["pytorch"]["ms_por_frame_p50"]
+            if p50_ref and item["ms_por_frame_p50"]:
+                item["speedup_vs_pytorch"] = round(p50_ref / item["ms_por_frame_p50"], 2)
+        relatorio["backends"][backend] = item
+    return relatorio
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable
+
+try:
+    import psycopg
+except ImportError:  # Sem o driver: o banco fica indisponível, como sem DATABASE_URL
+    psycopg = None
+
+# --- Pool de conexões assíncronas com o PostgreSQL (psycopg 3) ---
+# Conexões mínimas abertas e o limite. O limite cobre as threads de flush/cache e as rotas; somando as
+# instâncias da API, deve ficar abaixo do max_connections do PostgreSQL (100 por padrão).
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Pool esgotado: a consulta espera uma conexão livre por até este tempo (antes, o pool falhava na hora).
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "5"))
+# Limite de cada comando no servidor e da abertura de uma conexão nova.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+DB_CONNECT_TIMEOUT_S = int(os.getenv("DB_CONNECT_TIMEOUT_S", "5"))
+
+
+class PoolEsgotado(TimeoutError):
+    """Nenhuma conexão ficou livre dentro de DB_POOL_TIMEOUT_S."""
+
+
+class PoolConexoesAsync:
+    """
+    Pool de conexões assíncronas: cresce até `maximo` sob demanda e, esgotado, faz a consulta esperar
+    (até `timeout_s`) por uma conexão devolvida, em vez de falhar. Conexões quebradas são descartadas
+    na devolução. Usado só de dentro do event loop do BancoAsync.
+    """
+
+    def __init__(self, conectar: Callable[[], Awaitable[Any]], minimo: int = DB_POOL_MIN, maximo: int = DB_POOL_MAX,
+                 timeout_s: float = DB_POOL_TIMEOUT_S):
+        self.conectar = conectar
+        self.minimo = max(0, minimo)
+        self.maximo = max(1, maximo)
+        self.timeout_s = timeout_s
+        self._livres: deque = deque()
+        self._abertas = 0          # Conexões abertas ou sendo abertas (livres + em uso)
+        self._esperando = 0
+        self._condicao = asyncio.Condition()
+
+    async def abrir(self):
+        """Abre as conexões mínimas que faltam (levanta a exceção da conexão se o banco não responder)."""
+        for _ in range(self.minimo - self._abertas):
+            self._abertas += 1
+            try:
+                self._livres.append(await self.conectar())
+            except Exception:
+                self._abertas -= 1
+                raise
+
+    async def obter(self) -> Any:
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + self.timeout_s
+        async with self._condicao:
+            while not self._livres and self._abertas >= self.maximo:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    raise PoolEsgotado(f"Nenhuma conexão livre em {self.timeout_s:.1f}s ({self.maximo} em uso).")
+                self._esperando += 1
+                try:
+                    await asyncio.wait_for(self._condicao.wait(), restante)
+                except asyncio.TimeoutError:
+                    pass  # Reavalia: pode ter vagado uma conexão junto com o timeout
+                finally:
+                    self._esperando -= 1
+            if self._livres:
+                return self._livres.pop()
+            self._abertas += 1
+        try:
+            return await self.conectar()
+        except Exception:
+            await self._liberar_vaga()
+            raise
+
+    async def devolver(self, conn: Any, descartar: bool = False):
+        if descartar or getattr(conn, "closed", False):
+            try: await conn.close()
+            except Exception: pass
+            await self._liberar_vaga()
+            return
+        async with self._condicao:
+            self._livres.append(conn)
+            self._condicao.notify()
+
+    async def _liberar_vaga(self):
+        async with self._condicao:
+            self._abertas -= 1
+            self._condicao.notify()
+
+    async def fechar(self):
+        while self._livres:
+            conn = self._livres.pop()
+            self._abertas -= 1
+            try: await conn.close()
+            except Exception: pass
+
+    def situacao(self) -> Dict[str, int]:
+        return {"em_uso": self._abertas - len(self._livres), "livres": len(self._livres), "max": self.maximo,
+                "esperando": self._esperando}
+
+
+class BancoAsync:
+    """
+    Acesso ao PostgreSQL por um driver assíncrono (psycopg 3), em um event loop próprio ("banco-async").
+    As rotas aguardam executar_async() sem bloquear o event loop do servidor; as threads de contagem,
+    flush e cache usam executar(), a fachada síncrona sobre o mesmo pool. Ter um loop só do banco faz o
+    pool valer para qualquer chamador, independente do loop (ou thread) de quem chama.
+    """
+
+    def __init__(self, dsn: Optional[str], conectar: Optional[Callable[[], Awaitable[Any]]] = None,
+                 minimo: int = DB_POOL_MIN, maximo: int = DB_POOL_MAX, timeout_s: float = DB_POOL_TIMEOUT_S):
+        self.dsn = dsn
+        self.pool = PoolConexoesAsync(conectar or self._conectar, minimo, maximo, timeout_s)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    async def _conectar(self) -> Any:
+        return await psycopg.AsyncConnection.connect(
+            self.dsn, autocommit=True, connect_timeout=DB_CONNECT_TIMEOUT_S,
+            options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}")
+
+    def _garantir_loop(self) -> asyncio.AbstractEventLoop:
+        """Inicia o loop do banco (sem conectar: as conexões abrem sob demanda ou em abrir_async)."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="banco-async", daemon=True).start()
+            return self._loop
+
+    async def abrir_async(self):
+        """Abre as conexões mínimas do pool; levanta a exceção se o banco não responder."""
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.pool.abrir(), self._garantir_loop()))
+
+    async def _executar(self, query: str, params: tuple, fetch: Optional[str]) -> Tuple[Any, bool]:
+        try:
+            conn = await self.pool.obter()
+        except Exception as e:
+            print(f"[DB ERRO] Sem conexão para a query '{query[:60].strip()}...': {e}")
+            return None, False
+        descartar = False
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params or None)
+                if fetch == 'one':
+                    return await cur.fetchone(), True
+                if fetch == 'all':
+                    return await cur.fetchall(), True
+                return None, True
+        except Exception as e:
+            print(f"[DB ERRO] Falha na query '{query[:60].strip()}...': {e}")
+            # Erro de conexão (não de SQL): a conexão não volta para o pool.
+            descartar = psycopg is not None and isinstance(e, psycopg.OperationalError)
+            return None, False
+        finally:
+            await self.pool.devolver(conn, descartar)
+
+    async def executar_async(self, query: str, params: tuple = (), fetch: Optional[str] = None) -> Tuple[Any, bool]:
+        """Executa a query no loop do banco e aguarda sem bloquear o loop de quem chama. Retorna (resultado, ok)."""
+        futuro = asyncio.run_coroutine_threadsafe(self._executar(query, params, fetch), self._garantir_loop())
+        return await asyncio.wrap_future(futuro)
+
+    def executar(self, query: str, params: tuple = (), fetch: Optional[str] = None) -> Tuple[Any, bool]:
+        """Fachada síncrona para threads: bloqueia a thread chamadora (nunca o loop do banco) até o resultado."""
+        loop = self._garantir_loop()
+        futuro = asyncio.run_coroutine_threadsafe(self._executar(query, params, fetch), loop)
+        return futuro.result(timeout=self.pool.timeout_s + DB_STATEMENT_TIMEOUT_MS / 1000 + DB_CONNECT_TIMEOUT_S + 5)
+
+    def situacao(self) -> Dict[str, int]:
+        return self.pool.situacao()
+
+    def fechar(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try: asyncio.run_coroutine_threadsafe(self.pool.fechar(), loop).result(timeout=10)
+        except Exception as e: print(f"[DB AVISO] Falha ao fechar o pool de conexões: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def criar_banco(dsn: Optional[str]) -> Optional[BancoAsync]:
+    """BancoAsync para a DATABASE_URL, ou None (com o motivo no log) se não houver URL ou driver."""
+    if not dsn:
+        print("[DB ERRO] A variável de ambiente DATABASE_URL não foi definida.")
+        return None
+    if psycopg is None:
+        print("[DB ERRO] Driver psycopg (3) não instalado; o banco de dados ficará indisponível.")
+        return None
+    return BancoAsync(dsn)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+# Retenção das entradas do cache de resultados (dias sem acesso) e número máximo de entradas.
+CACHE_RESULTADOS_RETENCAO_DIAS = float(os.getenv("CACHE_RESULTADOS_RETENCAO_DIAS", "30"))
+CACHE_RESULTADOS_MAX_ITENS = int(os.getenv("CACHE_RESULTADOS_MAX_ITENS", "5000"))
+# Entradas mantidas também em memória (evita ida ao banco em reenvios seguidos).
+CACHE_RESULTADOS_MEMORIA_ITENS = 256
+# Detecções/tracks por frame, para recontar com outra linha sem inferência. Limite total em disco.
+CACHE_DETECCOES_DIR = os.getenv("CACHE_DETECCOES_DIR", os.path.join(os.getenv("RENDER_DATA_DIR", "data"), "cache_deteccoes"))
+CACHE_DETECCOES_MAX_MB = float(os.getenv("CACHE_DETECCOES_MAX_MB", "2048"))
+
+# Parâmetros da contagem que não mudam o resultado (ficam fora da chave).
+PARAMETROS_SEM_EFEITO = {"video_path", "batch_size", "prioridade", "comparar_sequencial"}
+# Parâmetros que mudam as detecções/tracks em si; os demais (linha, orientação, classes, zonas) só mudam a contagem.
+PARAMETROS_DETECCAO = ("model_choice", "frame_skip", "backend_inferencia", "rastreador")
+
+
+def executar_query(query: str, params: tuple = (), fetch: Optional[str] = None):
+    # Import tardio: os workers de contagem usam salvar_deteccoes sem abrir conexões com o banco.
+    from utils.gerenciador_progresso import executar_query as _executar
+    return _executar(query, params, fetch)
+
+
+def calcular_sha256(caminho: str, bloco: int = 1024 * 1024) -> str:
+    """SHA-256 do arquivo, lido em blocos."""
+    hasher = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        while True:
+            dados = f.read(bloco)
+            if not dados: break
+            hasher.update(dados)
+    return hasher.hexdigest()
+
+
+def _normalizar(parametros: Dict[str, Any]) -> Dict[str, Any]:
+    normalizados = {k: v for k, v in parametros.items() if k not in PARAMETROS_SEM_EFEITO and v is not None}
+    if normalizados.get("target_classes"):
+        normalizados["target_classes"] = sorted(normalizados["target_classes"])
+    if "orientation" in normalizados:
+        normalizados["orientation"] = str(normalizados["orientation"]).upper()
+    return normalizados
+
+
+def chave_resultado(video_sha256: str, parametros: Dict[str, Any]) -> str:
+    """Chave do cache de resultados: conteúdo do vídeo + todos os parâmetros que afetam a contagem."""
+    conteudo = json.dumps({"video": video_sha256, **_normalizar(parametros)}, sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def chave_deteccoes(video_sha256: str, parametros: Dict[str, Any]) -> Optional[str]:
+    """
+    Chave das detecções reaproveitáveis entre linhas diferentes. None quando as detecções dependem da linha
+    (ROI e gate de movimento olham só a faixa da linha) ou quando o job roda em segmentos paralelos.
+    """
+    if parametros.get("roi") or parametros.get("gate_movimento") or int(parametros.get("segmentos_paralelos") or 1) > 1:
+        return None
+    conteudo = json.dumps({"video": video_sha256, **{k: parametros.get(k) for k in PARAMETROS_DETECCAO if parametros.get(k) is not None}}, sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+class CacheResultados:
+    """
+    Cache de resultados de contagem na tabela video_result_cache (ao lado de video_progress), com uma cópia
+    LRU em memória, e cache das detecções por frame em arquivos .npz para recontagem sem inferência.
+    """
+
+    def __init__(self, retencao_dias: float = CACHE_RESULTADOS_RETENCAO_DIAS, max_itens: int = CACHE_RESULTADOS_MAX_ITENS,
+                 pasta_deteccoes: str = CACHE_DETECCOES_DIR, deteccoes_max_mb: float = CACHE_DETECCOES_MAX_MB):
+        self.retencao_dias = retencao_dias
+        self.max_itens = max_itens
+        self.pasta_deteccoes = pasta_deteccoes
+        self.deteccoes_max_bytes = int(deteccoes_max_mb * 1024 * 1024)
+        self._memoria: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # --- Resultados ---
+    def obter(self, chave: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            resultado = self._memoria.get(chave)
+            if resultado is not None:
+                self._memoria.move_to_end(chave)
+        if resultado is None:
+            linha = executar_query(
+                "UPDATE video_result_cache SET ultimo_acesso = NOW(), acessos = acessos + 1 WHERE chave = %s RETURNING resultado;",
+                (chave,), fetch='one')
+            if linha:
+                resultado = linha[0] if isinstance(linha[0], dict) else json.loads(linha[0])
+                self._guardar_memoria(chave, resultado)
+        with self._lock:
+            if resultado is None: self.misses += 1
+            else: self.hits += 1
+        return json.loads(json.dumps(resultado)) if resultado is not None else None  # Cópia: o chamador pode alterar
+
+    def _guardar_memoria(self, chave: str, resultado: Dict[str, Any]):
+        with self._lock:
+            self._memoria[chave] = resultado
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > CACHE_RESULTADOS_MEMORIA_ITENS:
+                self._memoria.popitem(last=False)
+
+    def gravar(self, chave: str, video_sha256: str, parametros: Dict[str, Any], resultado: Dict[str, Any]):
+        self._guardar_memoria(chave, resultado)
+        executar_query("""
+            INSERT INTO video_result_cache (chave, video_sha256, parametros, resultado, criado_em, ultimo_acesso)
+            VALUES (%s, %s, %s, %s, NOW(), NOW())
+            ON CONFLICT (chave) DO UPDATE SET resultado = EXCLUDED.resultado, ultimo_acesso = NOW();
+        """, (chave, video_sha256, json.dumps(_normalizar(parametros), default=str), json.dumps(resultado)))
+        self.limpar()
+
+    def limpar(self):
+        """Remove as entradas sem acesso há mais de retencao_dias e, acima de max_itens, as menos acessadas recentemente."""
+        executar_query("DELETE FROM video_result_cache WHERE ultimo_acesso < NOW() - %s * INTERVAL '1 day';", (self.retencao_dias,))
+        executar_query("""
+            DELETE FROM video_result_cache WHERE chave IN (
+                SELECT chave FROM video_result_cache ORDER BY ultimo_acesso DESC OFFSET %s
+            );
+        """, (self.max_itens,))
+
+    # --- Detecções por frame ---
+    def caminho_deteccoes(self, chave: str) -> str:
+        return os.path.join(self.pasta_deteccoes, f"{chave}.npz")
+
+    def carregar_deteccoes(self, chave: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not chave: return None
+        caminho = self.caminho_deteccoes(chave)
+        if not os.path.isfile(caminho): return None
+        try:
+            with np.load(caminho, allow_pickle=False) as dados:
+                deteccoes = {k: dados[k] for k in dados.files}
+            os.utime(caminho)  # Marca o uso para o despejo LRU
+        except Exception as e:
+            print(f"[CACHE ERRO] Detecções em cache ilegíveis ({caminho}): {e}")
+            return None
+        meta = json.loads(str(deteccoes.pop("meta")))
+        meta["names"] = {int(k): v for k, v in meta["names"].items()}
+        return {**meta, **deteccoes}
+
+    def limpar_deteccoes(self):
+        """Despeja os arquivos de detecções menos usados até caber em deteccoes_max_bytes."""
+        if not os.path.isdir(self.pasta_deteccoes): return
+        arquivos = []
+        for nome in os.listdir(self.pasta_deteccoes):
+            caminho = os.path.join(self.pasta_deteccoes, nome)
+            try: arquivos.append((os.path.getmtime(caminho), os.path.getsize(caminho), caminho))
+            except OSError: continue
+        total = sum(t for _, t, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.deteccoes_max_bytes: break
+            try: os.remove(caminho); total -= tamanho
+            except OSError: pass
+
+    def resumo(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "em_memoria": len(self._memoria)}
+
+
+def salvar_deteccoes(caminho: str, ids: np.ndarray, linhas: np.ndarray, names: Dict[int, str],
+                     width: int, height: int, total_frames: int):
+    """Grava os tracks do vídeo (id + [frame, x1, y1, x2, y2, cls] por detecção) num .npz comprimido."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    meta = json.dumps({"names": {str(k): v for k, v in names.items()}, "width": width, "height": height, "total_frames": total_frames})
+    tmp = caminho + ".tmp.npz"
+    np.savez_compressed(tmp, ids=np.asarray(ids, dtype=np.int64), linhas=np.asarray(linhas, dtype=np.float32), meta=np.array(meta))
+    os.replace(tmp, caminho)
+
+
+def recontar_deteccoes(deteccoes: Dict[str, Any], video_name: str, orientation: str = "S",
+                       target_classes: Optional[List[str]] = None, line_position_ratio: float = 0.5,
+                       linhas: Optional[List[Dict[str, Any]]] = None, zonas: Optional[List[Dict[str, Any]]] = None,
+                       **_: Any) -> Dict[str, Any]:
+    """Aplica uma nova linha/orientação (e linhas/zonas extras) a detecções em cache, sem rodar o modelo."""
+    from utils.contagem_video import get_line_and_direction_config, linha_principal
+    from utils.contagem_paralela import contar_trajetorias
+    from utils.motor_contagem import MotorContagem, linhas_e_zonas_da_requisicao
+
+    inicio = time.perf_counter()
+    width, height = deteccoes["width"], deteccoes["height"]
+    line_type, direcao, line_points, _, _ = get_line_and_direction_config(orientation, width, height, line_position_ratio)
+    linhas_extras, zonas_cfg = linhas_e_zonas_da_requisicao(linhas, zonas, width, height)
+    motor = MotorContagem([linha_principal(line_type, direcao, line_points)] + linhas_extras, zonas_cfg,
+                          names=deteccoes["names"], target_classes=target_classes)
+    ids, dados = deteccoes["ids"], deteccoes["linhas"]
+    ordem = np.lexsort((dados[:, 0], ids))  # Agrupa por track, em ordem de frame
+    ids, dados = ids[ordem], dados[ordem]
+    cortes = np.flatnonzero(np.diff(ids)) + 1
+    trajetorias = {int(grupo_ids[0]): grupo for grupo_ids, grupo in zip(np.split(ids, cortes), np.split(dados, cortes)) if len(grupo)}
+    total_count, por_classe = contar_trajetorias(trajetorias, motor)
+    return {"video": video_name, "video_processado": "Vídeo anotado não é gerado na recontagem a partir do cache.",
+            "total_frames": deteccoes["total_frames"], "total_count": total_count, "por_classe": por_classe,
+            **motor.resumo(), "recontagem": {"tracks": len(trajetorias), "tempo_s": round(time.perf_counter() - inicio, 3)}}
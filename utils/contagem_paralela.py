@@ -0,0 +1,310 @@
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Tuple, List, Dict, Any
+
+import cv2
+import numpy as np
+
+from utils.contagem_video import get_line_and_direction_config, linha_principal, LINHA_PRINCIPAL
+from utils.motor_contagem import MotorContagem, linhas_e_zonas_da_requisicao
+from utils.rastreadores import resolver_config
+from utils.tabela_tracks import TRACK_MAX_IDADE_FRAMES
+from utils.regiao_interesse import planejar_roi, descrever_roi, ROI_BANDA_RATIO_PADRAO
+
+# Frames lidos antes do início de cada segmento para "aquecer" o tracker e costurar os tracks na emenda.
+SEGMENTOS_SOBREPOSICAO_FRAMES = int(os.getenv("SEGMENTOS_SOBREPOSICAO_FRAMES", "45"))
+# Quantos processos atendem os segmentos (cada um mantém o próprio modelo carregado).
+SEGMENTOS_MAX_WORKERS = int(os.getenv("SEGMENTOS_MAX_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# IoU médio mínimo, nos frames da sobreposição, para considerar dois tracks o mesmo animal.
+COSTURA_IOU_MIN = 0.5
+
+# Colunas das trajetórias devolvidas pelos segmentos: frame, x1, y1, x2, y2, classe.
+_F, _X1, _Y1, _X2, _Y2, _CLS = range(6)
+
+
+def planejar_segmentos(total_frames: int, num_segmentos: int, sobreposicao: int) -> List[Tuple[int, int, int]]:
+    """
+    Divide o vídeo em segmentos (inicio_leitura, inicio_posse, fim).
+    Cada segmento é "dono" dos frames [inicio_posse, fim) e lê também os `sobreposicao` frames anteriores.
+    """
+    num_segmentos = max(1, min(num_segmentos, total_frames))
+    tamanho = math.ceil(total_frames / num_segmentos)
+    planos = []
+    for i in range(num_segmentos):
+        posse = i * tamanho
+        if posse >= total_frames:
+            break
+        fim = min(total_frames, posse + tamanho)
+        planos.append((max(0, posse - sobreposicao), posse, fim))
+    return planos
+
+
+# ---------------------------------------------------------------------------
+# Worker (processo filho): detecção + rastreamento de um segmento
+# ---------------------------------------------------------------------------
+def _inicializar_worker(torch_threads: int):
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+
+
+def _processar_segmento(video_path: str, model_choice: str, leitura: int, fim: int, indice: int,
+                        progresso: Any, cancelamento: Any, batch_size: int = 1, conf: float = 0.3,
+                        roi: Optional[List[Tuple[int, int, int, int]]] = None, backend_inferencia: Optional[str] = None,
+                        rastreador: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Rastreia os frames [leitura, fim) com um tracker próprio e devolve as trajetórias de cada track."""
+    from utils.modelos import registro_modelos
+
+    modelo = registro_modelos.obter(model_choice, backend_inferencia)
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    sessao = modelo.nova_sessao(rastreador, frame_rate=int(round(fps)))
+    sessao.definir_roi(roi)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, leitura)
+
+    def frames():
+        for frame_idx in range(leitura, fim):
+            if (frame_idx - leitura) % 30 == 0:
+                if cancelamento.is_set(): return
+                progresso[indice] = frame_idx - leitura
+            ret, frame = cap.read()
+            if not ret: return
+            yield frame_idx, frame
+
+    linhas: Dict[int, List[List[float]]] = defaultdict(list)
+    try:
+        for frame_idx, _, results in sessao.rastrear_stream(frames(), conf=conf, batch_size=batch_size):
+            boxes = results[0].boxes
+            if boxes is None or boxes.id is None:
+                continue
+            for tid, cls_id, (x1, y1, x2, y2) in zip(boxes.id.cpu().numpy().astype(int), boxes.cls.cpu().numpy(), boxes.xyxy.cpu().numpy()):
+                linhas[int(tid)].append([frame_idx, x1, y1, x2, y2, cls_id])
+    finally:
+        cap.release()
+    progresso[indice] = fim - leitura
+    return {"trajetorias": {tid: np.asarray(l, dtype=np.float32) for tid, l in linhas.items()}, "names": dict(modelo.names)}
+
+
+# ---------------------------------------------------------------------------
+# Costura dos tracks entre segmentos
+# ---------------------------------------------------------------------------
+def _iou_medio(a: np.ndarray, b: np.ndarray) -> Tuple[float, int]:
+    """IoU médio de dois tracks nos frames em que ambos aparecem."""
+    comuns, ia, ib = np.intersect1d(a[:, _F], b[:, _F], return_indices=True)
+    if len(comuns) == 0:
+        return 0.0, 0
+    ba, bb = a[ia, _X1:_Y2 + 1], b[ib, _X1:_Y2 + 1]
+    ix = np.clip(np.minimum(ba[:, 2], bb[:, 2]) - np.maximum(ba[:, 0], bb[:, 0]), 0, None)
+    iy = np.clip(np.minimum(ba[:, 3], bb[:, 3]) - np.maximum(ba[:, 1], bb[:, 1]), 0, None)
+    inter = ix * iy
+    area_a = (ba[:, 2] - ba[:, 0]) * (ba[:, 3] - ba[:, 1])
+    area_b = (bb[:, 2] - bb[:, 0]) * (bb[:, 3] - bb[:, 1])
+    iou = inter / np.maximum(area_a + area_b - inter, 1e-6)
+    return float(iou.mean()), len(comuns)
+
+
+def costurar_trajetorias(segmentos: List[Dict[int, np.ndarray]], planos: List[Tuple[int, int, int]],
+                         iou_min: float = COSTURA_IOU_MIN) -> Tuple[Dict[int, np.ndarray], int]:
+    """
+    Une os tracks que atravessam a emenda entre segmentos consecutivos, casando-os pelo IoU médio nos frames
+    de sobreposição. Cada segmento contribui só com os frames de que é dono, então nenhum frame é contado duas vezes.
+    Retorna as trajetórias globais e o número de costuras feitas.
+    """
+    pai: Dict[Tuple[int, int], Tuple[int, int]] = {}
+
+    def raiz(k):
+        while pai.get(k, k) != k:
+            k = pai[k]
+        return k
+
+    costuras = 0
+    for i in range(1, len(segmentos)):
+        leitura, posse, _ = planos[i]
+        anteriores = {t: r for t, r in segmentos[i - 1].items() if np.any((r[:, _F] >= leitura) & (r[:, _F] < posse))}
+        atuais = {t: r for t, r in segmentos[i].items() if np.any(r[:, _F] < posse)}
+        candidatos = []
+        for ta, ra in anteriores.items():
+            for tb, rb in atuais.items():
+                iou, n = _iou_medio(ra, rb)
+                if n and iou >= iou_min:
+                    candidatos.append((iou, n, ta, tb))
+        usados_a, usados_b = set(), set()
+        for _, _, ta, tb in sorted(candidatos, reverse=True):  # Guloso: melhores pares primeiro, 1 para 1
+            if ta in usados_a or tb in usados_b:
+                continue
+            usados_a.add(ta); usados_b.add(tb)
+            pai[raiz((i, tb))] = raiz((i - 1, ta))
+            costuras += 1
+
+    globais: Dict[Tuple[int, int], List[np.ndarray]] = defaultdict(list)
+    for i, trajetorias in enumerate(segmentos):
+        _, posse, fim = planos[i]
+        for tid, rows in trajetorias.items():
+            proprios = rows[(rows[:, _F] >= posse) & (rows[:, _F] < fim)]
+            if len(proprios):
+                globais[raiz((i, tid))].append(proprios)
+    resultado = {}
+    for gid, (_, partes) in enumerate(globais.items(), start=1):
+        rows = np.concatenate(partes)
+        resultado[gid] = rows[np.argsort(rows[:, _F], kind="stable")]
+    return resultado, costuras
+
+
+def contar_trajetorias(trajetorias: Dict[int, np.ndarray], motor: MotorContagem,
+                       max_lacuna: int = TRACK_MAX_IDADE_FRAMES) -> Tuple[int, Dict[str, int]]:
+    """
+    Aplica as regras de cruzamento a trajetórias completas: todos os pares de posições consecutivas de todos os
+    tracks vão ao MotorContagem de uma vez (um track conta uma vez por linha). Retorna a contagem da linha principal.
+    """
+    trajetorias = {tid: rows for tid, rows in trajetorias.items() if len(rows) > 1}
+    if trajetorias:
+        rows = np.concatenate(list(trajetorias.values()))
+        ids = np.concatenate([np.full(len(r), tid, dtype=np.int64) for tid, r in trajetorias.items()])
+        caixas = rows[:, _X1:_Y2 + 1].astype(int)
+        cx = (caixas[:, 0] + caixas[:, 2]) // 2; cy = (caixas[:, 1] + caixas[:, 3]) // 2
+        # Pares (i-1, i) dentro do mesmo track; como no modo sequencial, a posição anterior só vale se o track
+        # foi visto há no máximo max_lacuna frames.
+        mesmo_track = ids[1:] == ids[:-1]
+        valido = mesmo_track & (np.diff(rows[:, _F]) <= max_lacuna)
+        motor.processar(ids[1:], rows[1:, _CLS].astype(int), cx[:-1], cy[:-1], cx[1:], cy[1:], valido=valido)
+    return motor.total_linha(LINHA_PRINCIPAL)
+
+
+# ---------------------------------------------------------------------------
+# Orquestração (processo da API)
+# ---------------------------------------------------------------------------
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _obter_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            torch_threads = max(1, (os.cpu_count() or 2) // SEGMENTOS_MAX_WORKERS)
+            _executor = ProcessPoolExecutor(max_workers=SEGMENTOS_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_inicializar_worker, initargs=(torch_threads,))
+        return _executor
+
+
+def _rastrear_segmentos(video_path: str, model_choice: str, planos: List[Tuple[int, int, int]], batch_size: int,
+                        video_name: str, progresso_manager: Any, roi: Optional[List[Tuple[int, int, int, int]]] = None,
+                        backend_inferencia: Optional[str] = None,
+                        rastreador: Optional[Dict[str, Any]] = None) -> Optional[List[Dict[str, Any]]]:
+    """Roda os segmentos em paralelo, repassando progresso e cancelamento. Retorna None se o job foi cancelado."""
+    executor = _obter_executor()
+    cancelamento_local = progresso_manager.evento_cancelamento(video_name)
+    with multiprocessing.get_context("spawn").Manager() as manager:
+        progresso, cancelamento = manager.dict(), manager.Event()
+        futuros = [executor.submit(_processar_segmento, video_path, model_choice, leitura, fim, i, progresso, cancelamento, batch_size, 0.3, roi,
+                                   backend_inferencia, rastreador)
+                   for i, (leitura, _, fim) in enumerate(planos)]
+        pendentes = set(futuros)
+        while pendentes:
+            _, pendentes = wait(pendentes, timeout=0.5, return_when=FIRST_COMPLETED)
+            if cancelamento_local.is_set():
+                cancelamento.set()
+                wait(futuros)
+                return None
+            # Progresso em frames lidos por todos os segmentos (inclui a sobreposição).
+            progresso_manager.atualizar(video_name, sum(progresso.values()), sum(fim - leitura for leitura, _, fim in planos))
+        return [f.result() for f in futuros]
+
+
+def contar_gado_paralelo(video_path: str,
+                         video_name: str,
+                         progresso_manager: Any,
+                         model_choice: str = "l",
+                         orientation: str = "S",
+                         target_classes: Optional[List[str]] = None,
+                         line_position_ratio: float = 0.5,
+                         num_segmentos: int = 4,
+                         sobreposicao_frames: int = SEGMENTOS_SOBREPOSICAO_FRAMES,
+                         batch_size: int = 1,
+                         comparar_sequencial: bool = False,
+                         roi: bool = False,
+                         roi_banda_ratio: float = ROI_BANDA_RATIO_PADRAO,
+                         linhas: Optional[List[Dict[str, Any]]] = None,
+                         zonas: Optional[List[Dict[str, Any]]] = None,
+                         backend_inferencia: Optional[str] = None,
+                         rastreador: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Conta um vídeo longo dividindo-o em segmentos sobrepostos processados em paralelo, cada um com seu tracker,
+    e costurando os tracks nas emendas antes de aplicar as regras de cruzamento.
+    Com comparar_sequencial=True, também roda o vídeo inteiro como um único segmento e informa speedup e concordância.
+    O vídeo anotado e o arquivamento SFTP não são feitos neste modo.
+    """
+    if not os.path.exists(video_path):
+        progresso_manager.erro(video_name, f"Arquivo de vídeo local não encontrado em '{video_path}'.")
+        return None
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)); height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if total_frames <= 0 or width == 0 or height == 0:
+        progresso_manager.erro(video_name, "Dimensões ou número de frames do vídeo inválidos.")
+        return None
+
+    line_type, effective_counting_dir, line_points, _, _ = \
+        get_line_and_direction_config(orientation, width, height, line_position_ratio)
+    def novo_motor(names: Dict[int, str]) -> MotorContagem:
+        return MotorContagem([linha_principal(line_type, effective_counting_dir, line_points)] + linhas_extras, zonas,
+                             names=names, target_classes=target_classes)
+
+    try:  # Valida linhas e zonas antes de gastar tempo com o rastreamento
+        linhas_extras, zonas = linhas_e_zonas_da_requisicao(linhas, zonas, width, height)
+        novo_motor({})
+    except ValueError as e:
+        progresso_manager.erro(video_name, f"Configuração de linhas/zonas inválida: {e}")
+        return None
+    try:  # Resolvido aqui (perfil de câmera incluso) para todos os segmentos usarem o mesmo rastreador
+        rastreador = resolver_config(rastreador)
+    except ValueError as e:
+        progresso_manager.erro(video_name, f"Configuração de rastreador inválida: {e}")
+        return None
+    retangulos_roi = planejar_roi(line_points, width, height, roi_banda_ratio) if roi else None
+    planos = planejar_segmentos(total_frames, num_segmentos, sobreposicao_frames)
+    progresso_manager.update_status_message(video_name, f"Processando em {len(planos)} segmentos...")
+
+    inicio = time.perf_counter()
+    saidas = _rastrear_segmentos(video_path, model_choice, planos, batch_size, video_name, progresso_manager, retangulos_roi,
+                                 backend_inferencia, rastreador)
+    if saidas is None:
+        if os.path.exists(video_path): os.remove(video_path)
+        return None
+    names = saidas[0]["names"]
+    trajetorias, costuras = costurar_trajetorias([s["trajetorias"] for s in saidas], planos)
+    motor = novo_motor(names)
+    total_count, por_classe = contar_trajetorias(trajetorias, motor)
+    tempo_paralelo = time.perf_counter() - inicio
+
+    relatorio: Dict[str, Any] = {"segmentos": len(planos), "sobreposicao_frames": sobreposicao_frames,
+                                 "costuras": costuras, "tempo_s": round(tempo_paralelo, 2)}
+    if comparar_sequencial:
+        progresso_manager.update_status_message(video_name, "Comparando com execução sequencial...")
+        inicio = time.perf_counter()
+        referencia = _rastrear_segmentos(video_path, model_choice, [(0, 0, total_frames)], batch_size, video_name, progresso_manager,
+                                         retangulos_roi, backend_inferencia, rastreador)
+        if referencia is None:
+            if os.path.exists(video_path): os.remove(video_path)
+            return None
+        seq_count, seq_por_classe = contar_trajetorias(referencia[0]["trajetorias"], novo_motor(names))
+        tempo_sequencial = time.perf_counter() - inicio
+        relatorio.update({
+            "tempo_sequencial_s": round(tempo_sequencial, 2),
+            "speedup": round(tempo_sequencial / tempo_paralelo, 2) if tempo_paralelo > 0 else None,
+            "contagem_sequencial": seq_count,
+            "por_classe_sequencial": seq_por_classe,
+            "concorda": seq_count == total_count and seq_por_classe == por_classe,
+        })
+
+    if os.path.exists(video_path): os.remove(video_path)
+    print(f"[INFO CONTAGEM PARALELA] {video_name}: {total_count} em {len(planos)} segmentos ({relatorio})")
+    return {"video": video_name, "video_processado": "Vídeo anotado não é gerado no modo paralelo.",
+            "total_frames": total_frames, "total_count": total_count, "por_classe": por_classe, **motor.resumo(), "paralelo": relatorio,
+            "roi": descrever_roi(retangulos_roi, width, height), "rastreador": rastreador}
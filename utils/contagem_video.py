@@ -1,12 +1,20 @@
 import cv2
 import os
-from ultralytics import YOLO
-from collections import defaultdict
 import numpy as np
 from typing import Optional, Tuple, List, Dict, Any, Callable
 
-# Importa as funções SFTP do seu handler
-from utils.sftp_handler import upload_file_sftp, delete_file_sftp
+from utils.fila_transferencias import url_publica_processado
+from utils.metricas import TemposJob
+from utils.modelos import registro_modelos
+from utils.pipeline_video import PipelineVideo
+from utils.rastreadores import resolver_config
+from utils.renderizacao import Renderizador
+from utils.gate_movimento import GateMovimento
+from utils.regiao_interesse import planejar_roi, descrever_roi, ROI_BANDA_RATIO_PADRAO
+from utils.cache_resultados import salvar_deteccoes as salvar_deteccoes_npz
+from utils.tabela_tracks import TabelaTracks, TRACK_MAX_IDADE_FRAMES
+from utils.motor_contagem import (MotorContagem, LinhaContagem, linhas_e_zonas_da_requisicao,
+                                  SENTIDO_ESQ_DIR, SENTIDO_DIR_ESQ, SENTIDO_AMBOS)
 
 # --- Constantes para Clareza ---
 LINE_HORIZONTAL: str = "horizontal"
@@ -19,6 +27,8 @@ MOVE_LR: str = "left_right"; MOVE_RL: str = "right_left"
 MOVE_TL_BR: str = "topleft_bottomright"; MOVE_BR_TL: str = "bottomright_topleft"
 MOVE_TR_BL: str = "topright_bottomleft"; MOVE_BL_TR: str = "bottomleft_topright"
 
+LINHA_PRINCIPAL: str = "principal"
+
 
 def get_line_and_direction_config(orientation_code: str, width: int, height: int, line_ratio: float = 0.5) -> Tuple[Optional[str], Optional[str], Optional[Tuple], Optional[int], Optional[Tuple]]:
     """Determina tipo de linha, posição e direção com base na orientação."""
@@ -83,6 +93,18 @@ def is_crossing_diagonal_line(p_prev_x: int, p_prev_y: int, p_curr_x: int, p_cur
     elif direction == MOVE_TR_BL: return (p_curr_x < p_prev_x and p_curr_y > p_prev_y)
     return False
 
+def linha_principal(line_type: Optional[str], effective_counting_dir: Optional[str], line_points: Tuple) -> LinhaContagem:
+    """Linha de contagem da orientação, com as mesmas regras de cruzamento de sempre, para o MotorContagem."""
+    if line_type == LINE_HORIZONTAL:  # Linha desenhada da esquerda para a direita: o lado "direito" é o de baixo
+        sentido = SENTIDO_ESQ_DIR if effective_counting_dir == MOVE_TB else SENTIDO_DIR_ESQ
+        return LinhaContagem(LINHA_PRINCIPAL, line_points[0], line_points[1], sentido, segmento=False)
+    if line_type == LINE_VERTICAL:  # Linha desenhada de cima para baixo: o lado "direito" é o da esquerda
+        sentido = SENTIDO_DIR_ESQ if effective_counting_dir == MOVE_LR else SENTIDO_ESQ_DIR
+        return LinhaContagem(LINHA_PRINCIPAL, line_points[0], line_points[1], sentido, segmento=False)
+    # Diagonais: troca de lado em qualquer sentido, com o deslocamento na direção configurada.
+    movimento = {MOVE_TL_BR: (1, 1), MOVE_BR_TL: (-1, -1), MOVE_BL_TR: (1, -1), MOVE_TR_BL: (-1, 1)}.get(str(effective_counting_dir), (0, 0))
+    return LinhaContagem(LINHA_PRINCIPAL, line_points[0], line_points[1], SENTIDO_AMBOS, movimento=movimento, segmento=False)
+
 def contar_gado_em_video(video_path: str,
                          video_name: str, 
                          progresso_manager: Any,
@@ -90,7 +112,18 @@ def contar_gado_em_video(video_path: str,
                          frame_skip: int = 1,
                          orientation: str = "S", 
                          target_classes: Optional[List[str]] = None,
-                         line_position_ratio: float = 0.5) -> Optional[Dict[str, Any]]:
+                         line_position_ratio: float = 0.5,
+                         batch_size: int = 1,
+                         gate_movimento: bool = False,
+                         roi: bool = False,
+                         roi_banda_ratio: float = ROI_BANDA_RATIO_PADRAO,
+                         linhas: Optional[List[Dict[str, Any]]] = None,
+                         zonas: Optional[List[Dict[str, Any]]] = None,
+                         track_max_idade_frames: int = TRACK_MAX_IDADE_FRAMES,
+                         salvar_deteccoes: Optional[str] = None,
+                         perfil_video: Optional[str] = None,
+                         backend_inferencia: Optional[str] = None,
+                         rastreador: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     
     USE_SFTP = os.getenv("USE_SFTP", "false").lower() == "true"
     CREATE_ANNOTATED_VIDEO = os.getenv("CREATE_ANNOTATED_VIDEO", "false").lower() == "true"
@@ -98,34 +131,20 @@ def contar_gado_em_video(video_path: str,
     print(f"[CONFIG] Modo SFTP Ativado: {USE_SFTP}")
     print(f"[CONFIG] Gerar Vídeo Anotado: {CREATE_ANNOTATED_VIDEO}")
 
-    sftp_current_action = ""
-    def sftp_progress_callback(bytes_transferred: int, total_bytes: int):
-        if total_bytes > 0:
-            percentage = (bytes_transferred / total_bytes) * 100
-            status_message = f"{sftp_current_action}: {percentage:.0f}%"
-            progresso_manager.update_status_message(video_name, status_message)
-    
+    # Canal de cancelamento do job: checado a cada frame sem consulta ao banco.
+    cancelamento = progresso_manager.evento_cancelamento(video_name)
+
     local_video_path = video_path
     if not os.path.exists(local_video_path):
         error_msg = f"Arquivo de vídeo local não encontrado em '{local_video_path}'. O upload inicial pode ter falhado."
         if progresso_manager: progresso_manager.erro(video_name, error_msg)
         return None
 
-    remote_video_original = f"public_html/kyoday_videos/uploads/{video_name}"
-    if USE_SFTP:
-        sftp_current_action = "Enviando p/ Servidor"
-        if not upload_file_sftp(local_video_path, remote_video_original, progress_callback=sftp_progress_callback):
-            error_msg = "Falha ao enviar o vídeo original para a HostGator."
-            if progresso_manager: progresso_manager.erro(video_name, error_msg)
-            if os.path.exists(local_video_path): os.remove(local_video_path)
-            return None
-    else:
-        progresso_manager.update_status_message(video_name, "Iniciando processamento...")
-
-    model_files = {"n": "yolov8n.pt", "m": "yolov8m.pt", "l": "yolov8l.pt", "p": "best.pt"}
-    actual_model_path = model_files.get(str(model_choice).lower(), "yolov8l.pt")
-    
-    try: model = YOLO(actual_model_path)
+    # O arquivamento na HostGator (original e resultado) é feito pela fila de transferências, fora deste caminho.
+    progresso_manager.update_status_message(video_name, "Iniciando processamento...")
+
+    # Modelo compartilhado do processo (carregado e aquecido uma única vez).
+    try: modelo = registro_modelos.obter(model_choice, backend_inferencia)
     except Exception as e:
         if progresso_manager: progresso_manager.erro(video_name, f"Falha ao carregar modelo: {e}")
         return None
@@ -137,6 +156,17 @@ def contar_gado_em_video(video_path: str,
     
     original_frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     fps = cap.get(cv2.CAP_PROP_FPS); _fps = fps if fps > 0 else 30.0
+    # Estado de rastreamento exclusivo do job, sobre os pesos compartilhados (equivale a model.track(persist=True)),
+    # com o rastreador escolhido (ByteTrack, BoT-SORT ou IoU; ver utils/rastreadores.py).
+    # Tempo por estágio do job (decodificação, inferência, ..., progresso), devolvido em resultado["tempos"].
+    tempos = TemposJob()
+    try:
+        config_rastreador = resolver_config(rastreador)
+        model = modelo.nova_sessao(config_rastreador, frame_rate=int(round(_fps)), tempos=tempos)
+    except ValueError as e:
+        cap.release()
+        if progresso_manager: progresso_manager.erro(video_name, f"Configuração de rastreador inválida: {e}")
+        return None
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)); height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
     if width == 0 or height == 0:
@@ -150,100 +180,131 @@ def contar_gado_em_video(video_path: str,
         if progresso_manager: progresso_manager.erro(video_name, f"Configuração de linha inválida para orientação '{orientation}'.")
         cap.release(); return None
 
-    current_total_count = 0; current_por_classe = defaultdict(int)
-    track_ids_contados = set(); track_previous_x = {}; track_previous_y = {}
+    # Modo ROI: o detector só vê a faixa (ou os tiles, em diagonais) em volta da linha.
+    retangulos_roi = planejar_roi(line_points, width, height, roi_banda_ratio) if roi else None
+    model.definir_roi(retangulos_roi)
+    info_roi = descrever_roi(retangulos_roi, width, height)
+    if info_roi: print(f"[ROI] {video_name}: {len(retangulos_roi)} recorte(s), {info_roi['fracao_pixels']*100:.0f}% dos pixels do frame.")
+
+    # Linha da orientação ("principal", que define total_count) + linhas e zonas extras da requisição.
+    try:
+        linhas_extras, zonas = linhas_e_zonas_da_requisicao(linhas, zonas, width, height)
+        motor = MotorContagem([linha_principal(line_type, effective_counting_dir, line_points)] + linhas_extras, zonas,
+                              names=model.names, target_classes=target_classes)
+    except ValueError as e:
+        if progresso_manager: progresso_manager.erro(video_name, f"Configuração de linhas/zonas inválida: {e}")
+        cap.release(); return None
+    current_total_count = 0
+    # Última posição/frame/classe de cada track, com despejo por idade (tolera oclusões curtas).
+    tracks = TabelaTracks(max_idade_frames=track_max_idade_frames)
+    # Tracks de todos os frames, gravados no fim para o cache de detecções (recontagem com outra linha sem inferência).
+    registro_ids: List[np.ndarray] = []; registro_linhas: List[np.ndarray] = []
+    # Gate de movimento: só manda ao detector frames com movimento na faixa da linha (ou com tracks ativos).
+    gate = GateMovimento(width, height, line_points) if gate_movimento else None
     
     out = None; local_output_path = ""; processed_fn = ""
-    if CREATE_ANNOTATED_VIDEO:
+    render = Renderizador(perfil_video, width, height, _fps, frame_skip) if CREATE_ANNOTATED_VIDEO else None
+    if render is not None:
         output_dir_local = "videos_processados_temp"; os.makedirs(output_dir_local, exist_ok=True)
-        base_name, vid_ext = os.path.splitext(video_name); processed_fn = f"processed_{base_name}{vid_ext}"
+        base_name, _ = os.path.splitext(video_name); processed_fn = f"processed_{base_name}.mp4"
         local_output_path = os.path.join(output_dir_local, processed_fn)
         try:
-            out = cv2.VideoWriter(local_output_path, cv2.VideoWriter_fourcc(*"mp4v"), _fps, (width, height))
-            if not out.isOpened(): raise IOError(f"VideoWriter falhou para {local_output_path}")
+            out = render.abrir_saida(local_output_path)
+            if not out.isOpened(): raise IOError(f"Encoder ({render.nome_encoder}) falhou para {local_output_path}")
         except Exception as e:
             if progresso_manager: progresso_manager.erro(video_name, f"VideoWriter: {e}")
             cap.release(); return None
     
-    frame_atual = 0
-    while cap.isOpened():
-        if progresso_manager.status(video_name).get("cancelado"): break
-        ret, frame = cap.read()
-        if not ret: break
-
-        if frame_atual % frame_skip == 0:
-            if not progresso_manager.atualizar(video_name, frame_atual, original_frame_count): break
+    # Decodificação e codificação rodam em threads próprias, sobrepostas à inferência.
+    pipeline = PipelineVideo(cap, out, frame_skip=frame_skip, tempos=tempos).iniciar()
+    try:
+        # Com batch_size > 1 os frames são inferidos em lote e entregues ao tracker na ordem original.
+        for frame_atual, frame, results in model.rastrear_stream(pipeline.frames(), conf=0.3, batch_size=batch_size,
+                                                                 deve_inferir=gate.deve_inferir if gate else None):
+            if cancelamento.is_set(): break
+            with tempos.medir("progresso"):
+                continuar = progresso_manager.atualizar(video_name, frame_atual, original_frame_count, contagem=current_total_count)
+            if not continuar: break
+            tempos.frames += 1
             
-            results = model.track(frame, persist=True, verbose=False, conf=0.3)
+            if gate is not None and results is not None:
+                gate.registrar_tracks(frame_atual, 0 if results[0].boxes is None or results[0].boxes.id is None else len(results[0].boxes.id))
+            anotacoes = None; houve_contagem = False
+            if results is not None and results[0].boxes is not None and results[0].boxes.id is not None:
+                ids = results[0].boxes.id.cpu().numpy().astype(int)
+                classes = results[0].boxes.cls.cpu().numpy().astype(int)
+                caixas = results[0].boxes.xyxy.cpu().numpy().astype(int)
+                centros_x = (caixas[:, 0] + caixas[:, 2]) // 2; centros_y = (caixas[:, 1] + caixas[:, 3]) // 2
+                with tempos.medir("contagem"):
+                    prev_x, prev_y, tem_prev = tracks.anteriores(ids, frame_atual)
+                    # Todas as caixas do frame contra todas as linhas e zonas de uma vez.
+                    eventos = motor.processar(ids, classes, prev_x, prev_y, centros_x, centros_y, valido=tem_prev)
+                    tracks.atualizar(ids, classes, centros_x, centros_y, frame_atual)
+                if salvar_deteccoes:
+                    registro_ids.append(ids); registro_linhas.append(np.column_stack([np.full(len(ids), frame_atual), caixas, classes]))
+                if eventos:
+                    houve_contagem = True
+                if render is not None: anotacoes = (ids, classes, caixas, motor.ja_contados(ids))
+            current_total_count = motor.total_linha(LINHA_PRINCIPAL)[0]
             
-            annotated_frame = frame.copy() if CREATE_ANNOTATED_VIDEO else None
-            if results[0].boxes is not None and results[0].boxes.id is not None:
-                current_tracked_ids = set(results[0].boxes.id.cpu().numpy().astype(int))
-                for r_id, cls_id, box_coord in zip(current_tracked_ids, results[0].boxes.cls.cpu().numpy(), results[0].boxes.xyxy.cpu().numpy()):
-                    track_id = int(r_id); x1, y1, x2, y2 = map(int, box_coord)
-                    curr_x, curr_y = (x1+x2)//2, (y1+y2)//2; nome_cls = model.names[int(cls_id)]
-                    
-                    if track_id not in track_ids_contados:
-                        crossed = False; has_prev_pos = track_id in track_previous_x and track_id in track_previous_y
-                        if line_type == LINE_HORIZONTAL and has_prev_pos and line_coord_val is not None:
-                            prev_y = track_previous_y[track_id]
-                            if (effective_counting_dir == MOVE_TB and prev_y < line_coord_val and curr_y >= line_coord_val) or \
-                               (effective_counting_dir == MOVE_BT and prev_y > line_coord_val and curr_y <= line_coord_val): crossed = True
-                        elif line_type == LINE_VERTICAL and has_prev_pos and line_coord_val is not None:
-                            prev_x = track_previous_x[track_id]
-                            if (effective_counting_dir == MOVE_LR and prev_x < line_coord_val and curr_x >= line_coord_val) or \
-                               (effective_counting_dir == MOVE_RL and prev_x > line_coord_val and curr_x <= line_coord_val): crossed = True
-                        elif line_type.startswith("diag") and has_prev_pos and line_points is not None:
-                            if is_crossing_diagonal_line(track_previous_x[track_id], track_previous_y[track_id], curr_x, curr_y, line_points[0], line_points[1], str(effective_counting_dir)): crossed = True
-                        
-                        if crossed and (target_classes is None or nome_cls in target_classes):
-                            track_ids_contados.add(track_id); current_total_count += 1; current_por_classe[nome_cls] += 1
-                    
-                    track_previous_x[track_id], track_previous_y[track_id] = curr_x, curr_y
-                    if CREATE_ANNOTATED_VIDEO and annotated_frame is not None:
-                        color = (0,165,255) if track_id in track_ids_contados else ((200,200,200) if target_classes and nome_cls not in target_classes else (0,255,0))
-                        cv2.rectangle(annotated_frame, (x1,y1), (x2,y2), color, 2)
-                        cv2.putText(annotated_frame, f"{nome_cls} ID:{track_id}", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-
-            for tid_set in [track_previous_x, track_previous_y]:
-                for tid in list(tid_set.keys()):
-                    if tid not in current_tracked_ids: del tid_set[tid]
-            
-            if CREATE_ANNOTATED_VIDEO and out is not None and annotated_frame is not None:
-                if line_points: cv2.line(annotated_frame, line_points[0], line_points[1], (0,0,255), 3)
-                if arrow_points: cv2.arrowedLine(annotated_frame, arrow_points[0], arrow_points[1], (0,255,0), 2, tipLength=0.4)
-                info_txt = f"Contagem: {current_total_count}"; cv2.putText(annotated_frame,info_txt,(10,30),cv2.FONT_HERSHEY_SIMPLEX,1.0,(0,0,0),3,cv2.LINE_AA); cv2.putText(annotated_frame,info_txt,(10,30),cv2.FONT_HERSHEY_SIMPLEX,1.0,(255,255,255),2,cv2.LINE_AA)
-                out.write(annotated_frame)
-        frame_atual += 1
-        
-    if cap.isOpened(): cap.release()
-    if out and out.isOpened(): out.release()
-
-    if progresso_manager and progresso_manager.status(video_name).get("cancelado"): 
+            if render is not None:
+                def desenhar(canvas: np.ndarray, escala: float, anotacoes=anotacoes, contagem=current_total_count):
+                    p = lambda pt: (int(pt[0] * escala), int(pt[1] * escala))
+                    if anotacoes is not None:
+                        for track_id, cls_id, (x1, y1, x2, y2), contado in zip(*(a.tolist() for a in anotacoes)):
+                            nome_cls = model.names[cls_id]
+                            color = (0,165,255) if contado else ((200,200,200) if target_classes and nome_cls not in target_classes else (0,255,0))
+                            cv2.rectangle(canvas, p((x1,y1)), p((x2,y2)), color, 2)
+                            cv2.putText(canvas, f"{nome_cls} ID:{track_id}", p((x1, y1-10)), cv2.FONT_HERSHEY_SIMPLEX, 0.6 * max(escala, 0.75), color, 2)
+                    for rx1, ry1, rx2, ry2 in (retangulos_roi or []): cv2.rectangle(canvas, p((rx1, ry1)), p((rx2 - 1, ry2 - 1)), (0,255,255), 1)
+                    for zona in motor.zonas: cv2.polylines(canvas, [(zona.pontos * escala).astype(np.int32)], True, (255,0,255), 2)
+                    for linha in motor.linhas[1:]: cv2.line(canvas, p(linha.p1), p(linha.p2), (255,128,0), 2)
+                    if line_points: cv2.line(canvas, p(line_points[0]), p(line_points[1]), (0,0,255), 3)
+                    if arrow_points: cv2.arrowedLine(canvas, p(arrow_points[0]), p(arrow_points[1]), (0,255,0), 2, tipLength=0.4)
+                    info_txt = f"Contagem: {contagem}"; cv2.putText(canvas,info_txt,(10,30),cv2.FONT_HERSHEY_SIMPLEX,1.0,(0,0,0),3,cv2.LINE_AA); cv2.putText(canvas,info_txt,(10,30),cv2.FONT_HERSHEY_SIMPLEX,1.0,(255,255,255),2,cv2.LINE_AA)
+                # O perfil decide se o quadro entra no vídeo, em que resolução e em qual buffer é desenhado.
+                with tempos.medir("desenho"):  # Inclui o redimensionamento e a espera por vaga na fila do encoder
+                    render.processar(frame, houve_contagem, desenhar, pipeline.escrever)
+    finally:
+        if render is not None: render.finalizar()
+        pipeline.finalizar()
+    estatisticas_pipeline = pipeline.estatisticas()
+    estatisticas_render = render.estatisticas() if render is not None else None
+    estatisticas_tempos = tempos.como_dict()
+    print(f"[PIPELINE] {video_name}: {estatisticas_pipeline}")
+    print(f"[TEMPOS] {video_name}: {estatisticas_tempos['fps']} fps; " +
+          ", ".join(f"{e} {t['total_s']}s" for e, t in estatisticas_tempos["estagios"].items()))
+    estatisticas_gate = gate.estatisticas() if gate else None
+    if estatisticas_gate: print(f"[GATE] {video_name}: {estatisticas_gate}")
+
+    if cancelamento.is_set(): 
         if os.path.exists(local_video_path): os.remove(local_video_path)
         if CREATE_ANNOTATED_VIDEO and os.path.exists(local_output_path): os.remove(local_output_path)
         return None 
 
     public_url = "Vídeo processado não foi gerado (opção desabilitada)."
+    arquivo_processado = None
     if CREATE_ANNOTATED_VIDEO:
         if USE_SFTP:
-            sftp_current_action = "Enviando resultado"
-            remote_processed_path = f"public_html/kyoday_videos/processados/{processed_fn}"
-            if upload_file_sftp(local_output_path, remote_processed_path, progress_callback=sftp_progress_callback):
-                base_url = os.getenv("HG_DOMAIN")
-                public_url = f"{base_url}/kyoday_videos/processados/{processed_fn}" if base_url else "ERRO: HG_DOMAIN não configurado"
-            else:
-                public_url = "ERRO AO FAZER UPLOAD DO VÍDEO PROCESSADO"
-                if progresso_manager: progresso_manager.erro(video_name, public_url)
+            # Enviado depois pela fila de transferências (quem chamou enfileira `arquivo_processado`).
+            public_url = url_publica_processado(processed_fn)
+            arquivo_processado = local_output_path
         else:
             public_url = f"Vídeo processado salvo localmente e será deletado."
             print(f"[INFO] Vídeo processado salvo em {local_output_path} e não será enviado.")
 
-    if USE_SFTP:
-        if CREATE_ANNOTATED_VIDEO and os.path.exists(local_output_path): os.remove(local_output_path)
     if os.path.exists(local_video_path): os.remove(local_video_path)
-    if USE_SFTP: delete_file_sftp(remote_video_original)
 
+    current_total_count, current_por_classe = motor.total_linha(LINHA_PRINCIPAL)
+    if salvar_deteccoes:
+        try:
+            salvar_deteccoes_npz(salvar_deteccoes, np.concatenate(registro_ids) if registro_ids else np.zeros(0),
+                                 np.concatenate(registro_linhas) if registro_linhas else np.zeros((0, 6)),
+                                 dict(model.names), width, height, original_frame_count)
+        except Exception as e:
+            print(f"[CACHE ERRO] Falha ao gravar as detecções de {video_name}: {e}")
     print(f"[INFO CONTAGEM] Contagem finalizada: {current_total_count} para {video_name}")
     
-    return {"video": video_name, "video_processado": public_url, "total_frames": original_frame_count, "total_count": current_total_count, "por_classe": dict(current_por_classe)}
\ No newline at end of file
+    return {"video": video_name, "video_processado": public_url, "total_frames": original_frame_count, "total_count": current_total_count, "por_classe": current_por_classe, **motor.resumo(), "pipeline": estatisticas_pipeline, "gate_movimento": estatisticas_gate, "roi": info_roi,
+            "video_anotado": estatisticas_render, "tempos": estatisticas_tempos, "backend_inferencia": modelo.backend, "precisao": modelo.precisao, "rastreador": config_rastreador,
+            **({"arquivo_processado": arquivo_processado} if arquivo_processado else {})}
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, AsyncIterator
+
+# Intervalo mínimo entre avisos de progresso de um job aos ouvintes (mensagens e estado final saem na hora).
+PROGRESSO_STREAM_INTERVALO_S = float(os.getenv("PROGRESSO_STREAM_INTERVALO_S", "0.25"))
+# Sem novidade por este tempo, o ouvinte recebe um heartbeat (mantém proxies e conexões móveis abertos).
+PROGRESSO_STREAM_HEARTBEAT_S = float(os.getenv("PROGRESSO_STREAM_HEARTBEAT_S", "15"))
+# Jobs de outro processo/instância: uma consulta ao banco por job neste intervalo, qualquer que seja o número de ouvintes.
+PROGRESSO_STREAM_CONSULTA_S = float(os.getenv("PROGRESSO_STREAM_CONSULTA_S", "2"))
+
+ESTADOS_TRANSFERENCIA_ATIVOS = ("pendente", "executando")
+
+
+def estado_terminal(estado: Optional[Dict[str, Any]]) -> bool:
+    """Job finalizado (sucesso, erro ou cancelamento) e sem arquivamento SFTP em andamento."""
+    if not estado or not estado.get("finalizado"):
+        return False
+    return not any(t.get("estado") in ESTADOS_TRANSFERENCIA_ATIVOS for t in estado.get("transferencias") or [])
+
+
+class _Canal:
+    """Último estado publicado de um job e o futuro que acorda os ouvintes na próxima versão."""
+
+    def __init__(self):
+        self.versao = 0
+        self.estado: Optional[Dict[str, Any]] = None
+        self.ouvintes = 0
+        self.futuro: Optional[asyncio.Future] = None
+        self.ultimo_aviso = 0.0
+        self.aviso_agendado = False
+        self.consulta: Optional[asyncio.Task] = None
+        self.carga: Optional[asyncio.Future] = None
+
+
+class DifusorProgresso:
+    """
+    Fan-out do progresso dos jobs para os streams (SSE/WebSocket). Cada job tem um canal com o último
+    estado publicado; o produtor (threads do job) só troca o estado e agenda um aviso no event loop, e
+    cada ouvinte lê a versão mais recente quando acorda. Mil ouvintes custam um produtor e nenhuma
+    consulta por ouvinte; ouvintes lentos pulam estados intermediários em vez de acumular fila.
+    Sem ouvintes, publicar() não faz nada.
+    """
+
+    def __init__(self, intervalo_s: float = PROGRESSO_STREAM_INTERVALO_S, heartbeat_s: float = PROGRESSO_STREAM_HEARTBEAT_S,
+                 consulta_s: float = PROGRESSO_STREAM_CONSULTA_S):
+        self.intervalo_s = intervalo_s
+        self.heartbeat_s = heartbeat_s
+        self.consulta_s = consulta_s
+        self._canais: Dict[str, _Canal] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def tem_ouvintes(self, video_name: str) -> bool:
+        return video_name in self._canais
+
+    def ultimo_estado(self, video_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            canal = self._canais.get(video_name)
+            return dict(canal.estado) if canal is not None and canal.estado is not None else None
+
+    def total_ouvintes(self) -> int:
+        with self._lock:
+            return sum(c.ouvintes for c in self._canais.values())
+
+    # --- Produtor (qualquer thread) ---
+    def publicar(self, video_name: str, estado: Dict[str, Any], imediato: bool = False):
+        """Troca o estado do canal e agenda o aviso aos ouvintes (agrupado em PROGRESSO_STREAM_INTERVALO_S)."""
+        with self._lock:
+            canal = self._canais.get(video_name)
+            if canal is None:
+                return
+            canal.versao += 1
+            canal.estado = estado
+            if canal.aviso_agendado:
+                return  # O aviso já agendado entrega este estado (o mais recente)
+            espera = 0.0 if imediato else max(0.0, canal.ultimo_aviso + self.intervalo_s - time.monotonic())
+            canal.aviso_agendado = True
+            loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            if espera > 0: loop.call_soon_threadsafe(loop.call_later, espera, self._avisar, video_name)
+            else: loop.call_soon_threadsafe(self._avisar, video_name)
+        except RuntimeError:
+            pass  # Event loop encerrado entre a verificação e o agendamento
+
+    def _avisar(self, video_name: str):
+        """Roda no event loop: acorda todos os ouvintes do canal de uma vez."""
+        with self._lock:
+            canal = self._canais.get(video_name)
+            if canal is None:
+                return
+            canal.aviso_agendado = False
+            canal.ultimo_aviso = time.monotonic()
+            futuro, canal.futuro = canal.futuro, None
+        if futuro is not None and not futuro.done():
+            futuro.set_result(None)
+
+    # --- Ouvintes (event loop) ---
+    async def assinar(self, video_name: str, carregar: Callable[[], Awaitable[Dict[str, Any]]],
+                      local: Callable[[], bool]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Produz o estado atual e cada novo estado do job até ele terminar; None é um heartbeat.
+        `carregar()` é a leitura assíncrona do estado (memória ou banco); `local()` diz se o job
+        publica neste processo. Se não publica, um único consultor por canal lê o banco periodicamente.
+        """
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        with self._lock:
+            canal = self._canais.setdefault(video_name, _Canal())
+            canal.ouvintes += 1
+            versao_vista, estado = canal.versao, canal.estado
+        try:
+            if estado is None:
+                # Ouvintes que chegam juntos esperam a mesma leitura do estado inicial.
+                if canal.carga is None: canal.carga = asyncio.ensure_future(carregar())
+                estado = await asyncio.shield(canal.carga)
+                with self._lock:
+                    if canal.estado is None: canal.estado = estado
+                    versao_vista, estado = canal.versao, canal.estado
+            yield dict(estado)
+            while not estado_terminal(estado):
+                with self._lock:
+                    if canal.versao != versao_vista:
+                        versao_vista, estado = canal.versao, canal.estado
+                        futuro = None
+                    else:
+                        if canal.futuro is None: canal.futuro = loop.create_future()
+                        futuro = canal.futuro
+                if futuro is None:
+                    yield dict(estado)
+                    continue
+                if canal.consulta is None and not local():
+                    canal.consulta = loop.create_task(self._consultar(video_name, canal, carregar, local))
+                try:
+                    await asyncio.wait_for(asyncio.shield(futuro), self.heartbeat_s)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                canal.ouvintes -= 1
+                if canal.ouvintes == 0 and self._canais.get(video_name) is canal:
+                    del self._canais[video_name]
+                    if canal.consulta is not None: canal.consulta.cancel()
+
+    async def _consultar(self, video_name: str, canal: _Canal, carregar: Callable[[], Awaitable[Dict[str, Any]]],
+                         local: Callable[[], bool]):
+        """Consultor do banco de um canal cujo job roda em outro processo/instância."""
+        try:
+            while self._canais.get(video_name) is canal:
+                await asyncio.sleep(self.consulta_s)
+                if local():
+                    continue  # O job passou a publicar neste processo
+                estado = await carregar()
+                if estado != canal.estado:
+                    self.publicar(video_name, estado, imediato=True)
+                if estado_terminal(estado):
+                    return
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[STREAM ERRO] Falha ao consultar o progresso de {video_name}: {e}")
+        finally:
+            canal.consulta = None
@@ -0,0 +1,286 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Optional, Dict, Any, List, Tuple
+
+# "thread": contagem roda em threads do próprio processo da API (padrão).
+# "processo": contagem roda em um pool de processos de longa duração, cada um com seus modelos carregados.
+EXECUTOR_BACKEND = os.getenv("EXECUTOR_BACKEND", "thread").lower()
+WORKERS_PROCESSO = int(os.getenv("WORKERS_PROCESSO", "2"))
+# Threads intra-op do torch por worker: WORKERS_PROCESSO x TORCH_THREADS_POR_WORKER ~ núcleos da máquina.
+TORCH_THREADS_POR_WORKER = int(os.getenv("TORCH_THREADS_POR_WORKER", str(max(1, (os.cpu_count() or 2) // max(1, WORKERS_PROCESSO)))))
+# Modelos carregados no início de cada worker (ex.: "l" ou "n,l"); vazio = carrega no primeiro job.
+# Sem valor próprio, segue os modelos aquecidos na subida da API (MODELOS_AQUECER, ver utils/inicializacao.py).
+WORKER_MODELOS_PRECARREGAR = os.getenv("WORKER_MODELOS_PRECARREGAR", os.getenv("MODELOS_AQUECER", ""))
+# Intervalo mínimo entre mensagens de progresso enviadas por um worker (o ProgressoManager já agrupa as gravações).
+WORKER_PROGRESSO_INTERVALO_S = 0.2
+
+
+# ---------------------------------------------------------------------------
+# Lado do worker (processo filho)
+# ---------------------------------------------------------------------------
+class ProgressoRemoto:
+    """ProgressoManager do lado do worker: repassa as atualizações ao processo da API via fila."""
+
+    def __init__(self, video_name: str, saida: Any, cancelamento: threading.Event):
+        self.video_name = video_name
+        self.saida = saida
+        self.cancelamento = cancelamento
+        self._ultimo_envio = 0.0
+
+    def evento_cancelamento(self, video_name: str) -> threading.Event:
+        return self.cancelamento
+
+    def status(self, video_name: str) -> Dict[str, Any]:
+        return {"video_name": video_name, "cancelado": self.cancelamento.is_set(), "finalizado": self.cancelamento.is_set()}
+
+    def atualizar(self, video_name: str, frame_atual: int, total_estimado: int, no_processing: bool = False,
+                  contagem: Optional[int] = None) -> bool:
+        if self.cancelamento.is_set(): return False
+        agora = time.monotonic()
+        if not no_processing and agora - self._ultimo_envio >= WORKER_PROGRESSO_INTERVALO_S:
+            self._ultimo_envio = agora
+            self.saida.put(("atualizar", video_name, frame_atual, total_estimado, contagem))
+        return True
+
+    def update_status_message(self, video_name: str, message: str):
+        self.saida.put(("mensagem", video_name, message))
+
+    def erro(self, video_name: str, mensagem: str):
+        self.saida.put(("erro", video_name, mensagem))
+
+
+class ProgressoLocal:
+    """
+    ProgressoManager em memória para contagens fora da API (verificação INT8, testes): sem banco e sem fila,
+    guarda só os erros e a última atualização. Cancela-se com `cancelamento.set()`.
+    """
+
+    def __init__(self):
+        self.erros: List[str] = []
+        self.ultimo: Optional[Tuple[int, int, Optional[int]]] = None
+        self.cancelamento = threading.Event()
+
+    def evento_cancelamento(self, video_name: str) -> threading.Event:
+        return self.cancelamento
+
+    def status(self, video_name: str) -> Dict[str, Any]:
+        return {"video_name": video_name, "cancelado": self.cancelamento.is_set(), "finalizado": self.cancelamento.is_set()}
+
+    def atualizar(self, video_name: str, frame_atual: int, total_estimado: int, no_processing: bool = False,
+                  contagem: Optional[int] = None) -> bool:
+        self.ultimo = (frame_atual, total_estimado, contagem)
+        return True
+
+    def update_status_message(self, video_name: str, message: str):
+        pass
+
+    def erro(self, video_name: str, mensagem: str):
+        self.erros.append(mensagem)
+
+
+def _loop_worker_processo(indice: int, entrada: Any, saida: Any, torch_threads: int, precarregar: str):
+    """Processo worker: mantém os modelos carregados e executa um job de contagem por vez."""
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+    from utils.contagem_video import contar_gado_em_video
+    from utils.modelos import registro_modelos
+
+    for choice in filter(None, (c.strip() for c in precarregar.split(","))):
+        try: registro_modelos.obter(choice)
+        except Exception as e: print(f"[WORKER {indice} ERRO] Falha ao pré-carregar modelo '{choice}': {e}")
+    print(f"[WORKER {indice}] Pronto (pid={os.getpid()}, torch_threads={torch_threads}).")
+
+    jobs: "queue.Queue" = queue.Queue()
+    cancelamentos: Dict[str, threading.Event] = {}
+
+    def ler_entrada():
+        # Comandos chegam a qualquer momento, inclusive durante um job (cancelamento).
+        while True:
+            msg = entrada.get()
+            if msg is None:
+                jobs.put(None); return
+            if msg[0] == "job":
+                cancelamentos[msg[1]] = threading.Event()
+                jobs.put(msg)
+            elif msg[0] == "cancelar" and msg[1] in cancelamentos:
+                cancelamentos[msg[1]].set()
+
+    threading.Thread(target=ler_entrada, daemon=True).start()
+    saida.put(("pronto", indice, os.getpid()))
+    while True:
+        msg = jobs.get()
+        if msg is None:
+            return
+        _, job_id, kwargs = msg
+        progresso = ProgressoRemoto(job_id, saida, cancelamentos[job_id])
+        try:
+            resultado = contar_gado_em_video(progresso_manager=progresso, **kwargs)
+            saida.put(("resultado", job_id, resultado))
+        except Exception as e:
+            traceback.print_exc()
+            saida.put(("falha", job_id, f"Erro crítico no worker: {e}"))
+        finally:
+            cancelamentos.pop(job_id, None)
+
+
+# ---------------------------------------------------------------------------
+# Lado da API (processo pai)
+# ---------------------------------------------------------------------------
+class _Worker:
+    def __init__(self, indice: int, ctx: Any):
+        self.indice = indice
+        self.entrada = ctx.Queue()
+        # Saída própria: um worker morto no meio de um put deixa o lock da fila preso, e só a fila dele fica inutilizada.
+        self.saida = ctx.Queue()
+        self.processo = ctx.Process(target=_loop_worker_processo, name=f"contagem-worker-{indice}",
+                                    args=(indice, self.entrada, self.saida, TORCH_THREADS_POR_WORKER, WORKER_MODELOS_PRECARREGAR),
+                                    daemon=True)
+        self.processo.start()
+        self.job_atual: Optional[str] = None
+        self.pronto = threading.Event()  # Setado quando o worker termina de importar e pré-carregar os modelos
+
+
+class _JobRemoto:
+    def __init__(self, progresso_manager: Any):
+        self.progresso_manager = progresso_manager
+        self.concluido = threading.Event()
+        self.resultado: Optional[Dict[str, Any]] = None
+        self.erro: Optional[str] = None
+
+
+class PoolProcessos:
+    """
+    Pool de processos de longa duração para contar_gado_em_video.
+    Cada worker mantém seu registro de modelos carregado entre jobs; o progresso e o resultado voltam
+    por uma fila (IPC) e são aplicados ao ProgressoManager da API. Se um worker morrer (crash no
+    OpenCV/torch), só o job dele falha e o worker é recriado.
+    """
+
+    def __init__(self, num_workers: int = WORKERS_PROCESSO):
+        self._ctx = multiprocessing.get_context("spawn")  # fork + torch/threads não é seguro
+        self._jobs: Dict[str, _JobRemoto] = {}
+        self._lock = threading.Lock()
+        self._workers: List[_Worker] = [self._novo_worker(i) for i in range(max(1, num_workers))]
+        self._livres: "queue.Queue[int]" = queue.Queue()
+        for w in self._workers: self._livres.put(w.indice)
+
+    def _novo_worker(self, indice: int) -> _Worker:
+        """Sobe um worker e a thread que despacha as mensagens dele."""
+        worker = _Worker(indice, self._ctx)
+        threading.Thread(target=self._loop_despachante, args=(worker,), name=f"pool-despachante-{indice}", daemon=True).start()
+        return worker
+
+    def _loop_despachante(self, worker: _Worker):
+        """Aplica no processo da API as mensagens que chegam de um worker; termina quando ele morre e a fila esvazia."""
+        while True:
+            try:
+                msg = worker.saida.get(timeout=1.0)
+            except queue.Empty:
+                if not worker.processo.is_alive():
+                    return
+                continue
+            tipo, chave = msg[0], msg[1]
+            if tipo == "pronto":
+                worker.pronto.set()
+                continue
+            with self._lock:
+                job = self._jobs.get(chave)
+            if job is None:
+                continue
+            pm = job.progresso_manager
+            if tipo == "atualizar":
+                pm.atualizar(chave, msg[2], msg[3], contagem=msg[4])
+            elif tipo == "mensagem":
+                pm.update_status_message(chave, msg[2])
+            elif tipo == "erro":
+                pm.erro(chave, msg[2])
+            elif tipo == "resultado":
+                job.resultado = msg[2]; job.concluido.set()
+            elif tipo == "falha":
+                job.erro = msg[2]; job.concluido.set()
+
+    def executar(self, progresso_manager: Any, video_name: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """Roda um job em um worker livre e bloqueia até o resultado (mesmo contrato de contar_gado_em_video)."""
+        indice = self._livres.get()
+        if not self._workers[indice].processo.is_alive():
+            # Morreu ocioso (ex.: OOM killer): recria antes de mandar o job para uma fila que ninguém lê.
+            print(f"[POOL AVISO] Worker {indice} morto antes do job (exitcode={self._workers[indice].processo.exitcode}); recriando.")
+            self._workers[indice] = self._novo_worker(indice)
+        worker = self._workers[indice]
+        job = _JobRemoto(progresso_manager)
+        cancelamento = progresso_manager.evento_cancelamento(video_name)
+        cancelamento_enviado = False
+        with self._lock:
+            self._jobs[video_name] = job
+        worker.job_atual = video_name
+        try:
+            worker.entrada.put(("job", video_name, dict(kwargs, video_name=video_name)))
+            while not job.concluido.wait(0.2):
+                if cancelamento.is_set() and not cancelamento_enviado:
+                    worker.entrada.put(("cancelar", video_name)); cancelamento_enviado = True
+                if not worker.processo.is_alive():
+                    job.erro = f"Worker de contagem caiu (exitcode={worker.processo.exitcode})."
+                    self._workers[indice] = worker = self._novo_worker(indice)
+                    break
+            if job.erro:
+                raise RuntimeError(job.erro)
+            return job.resultado
+        finally:
+            with self._lock:
+                self._jobs.pop(video_name, None)
+            worker.job_atual = None
+            self._livres.put(indice)
+
+    def aguardar_prontos(self, timeout: Optional[float] = None) -> bool:
+        """Espera todos os workers ficarem prontos (modelos pré-carregados); False se o tempo acabar antes."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        for w in list(self._workers):
+            restante = None if limite is None else max(0.0, limite - time.monotonic())
+            if not w.pronto.wait(restante):
+                return False
+        return True
+
+    def resumo(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "prontos": sum(1 for w in self._workers if w.pronto.is_set()),
+            "torch_threads_por_worker": TORCH_THREADS_POR_WORKER,
+            "ocupados": [w.job_atual for w in self._workers if w.job_atual],
+            "vivos": sum(1 for w in self._workers if w.processo.is_alive()),
+        }
+
+
+_pool: Optional[PoolProcessos] = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool() -> PoolProcessos:
+    """Cria o pool de processos na primeira utilização."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolProcessos()
+        return _pool
+
+
+def executar_contagem(progresso_manager: Any, video_name: str, **kwargs) -> Optional[Dict[str, Any]]:
+    """Executa contar_gado_em_video no backend configurado em EXECUTOR_BACKEND (ou o modo por segmentos paralelos)."""
+    segmentos = int(kwargs.pop("segmentos_paralelos", 1) or 1)
+    comparar_sequencial = bool(kwargs.pop("comparar_sequencial", False))
+    if segmentos > 1:
+        from utils.contagem_paralela import contar_gado_paralelo
+        kwargs["comparar_sequencial"] = comparar_sequencial
+        permitidos = ("video_path", "model_choice", "orientation", "target_classes", "line_position_ratio", "batch_size",
+                      "comparar_sequencial", "roi", "roi_banda_ratio", "linhas", "zonas", "backend_inferencia",
+                      "rastreador")
+        return contar_gado_paralelo(video_name=video_name, progresso_manager=progresso_manager, num_segmentos=segmentos,
+                                    **{k: v for k, v in kwargs.items() if k in permitidos})
+    if EXECUTOR_BACKEND == "processo":
+        return obter_pool().executar(progresso_manager, video_name, **kwargs)
+    from utils.contagem_video import contar_gado_em_video
+    return contar_gado_em_video(video_name=video_name, progresso_manager=progresso_manager, **kwargs)
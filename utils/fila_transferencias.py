@@ -0,0 +1,362 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+
+from utils.metricas import metricas
+from utils.sftp_handler import obter_pool_sftp, sftp_bytes
+
+# Transferências SFTP (arquivamento na HostGator) rodam fora do caminho crítico do job, numa fila persistente.
+# Tarefas executadas ao mesmo tempo e partes de um mesmo arquivo enviadas em paralelo (cada uma usa uma conexão do pool SFTP).
+TRANSFER_TAREFAS_PARALELAS = int(os.getenv("TRANSFER_TAREFAS_PARALELAS", "2"))
+TRANSFER_PARTES_PARALELAS = int(os.getenv("TRANSFER_PARTES_PARALELAS", "2"))
+# Arquivos acima disso são enviados em partes deste tamanho.
+TRANSFER_PARTE_BYTES = int(os.getenv("TRANSFER_PARTE_BYTES", str(16 * 1024 * 1024)))
+# Limite de banda somado de todas as transferências (KiB/s); 0 = sem limite.
+TRANSFER_LIMITE_KBPS = float(os.getenv("TRANSFER_LIMITE_KBPS", "0"))
+# Tentativas por tarefa e espera base entre elas (dobra a cada falha, até TRANSFER_BACKOFF_MAX_S).
+TRANSFER_MAX_TENTATIVAS = int(os.getenv("TRANSFER_MAX_TENTATIVAS", "5"))
+TRANSFER_BACKOFF_S = float(os.getenv("TRANSFER_BACKOFF_S", "5"))
+TRANSFER_BACKOFF_MAX_S = 300.0
+# Bloco de leitura/escrita e intervalo mínimo entre relatórios de progresso de uma tarefa.
+TRANSFER_BLOCO_BYTES = 32 * 1024
+TRANSFER_PROGRESSO_INTERVALO_S = 0.5
+
+# Caminhos na HostGator.
+REMOTO_UPLOADS = "public_html/kyoday_videos/uploads"
+REMOTO_PROCESSADOS = "public_html/kyoday_videos/processados"
+
+transferencias_total = metricas.contador("transferencias_total", "Transferências SFTP finalizadas por tipo e estado.", ("tipo", "estado"))
+
+PENDENTE, EXECUTANDO, CONCLUIDA, FALHOU, DESCARTADA = "pendente", "executando", "concluida", "falhou", "descartada"
+
+
+def sftp_ativo() -> bool:
+    return os.getenv("USE_SFTP", "false").lower() == "true"
+
+def caminho_remoto_original(video_name: str) -> str:
+    return f"{REMOTO_UPLOADS}/{video_name}"
+
+def caminho_remoto_processado(nome_arquivo: str) -> str:
+    return f"{REMOTO_PROCESSADOS}/{nome_arquivo}"
+
+def url_publica_processado(nome_arquivo: str) -> str:
+    """URL em que o vídeo processado fica disponível quando o arquivamento terminar."""
+    base_url = os.getenv("HG_DOMAIN")
+    return f"{base_url}/kyoday_videos/processados/{nome_arquivo}" if base_url else "ERRO: HG_DOMAIN não configurado"
+
+
+class LimitadorBanda:
+    """Balde de fichas compartilhado: limita a soma dos bytes/s de todas as transferências."""
+
+    def __init__(self, bytes_por_segundo: float):
+        self.bytes_por_segundo = bytes_por_segundo
+        self._fichas = bytes_por_segundo
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consumir(self, n: int):
+        if self.bytes_por_segundo <= 0:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.bytes_por_segundo, self._fichas + (agora - self._ultimo) * self.bytes_por_segundo)
+            self._ultimo = agora
+            self._fichas -= n
+            espera = -self._fichas / self.bytes_por_segundo if self._fichas < 0 else 0.0
+        if espera > 0:
+            time.sleep(espera)
+
+
+class FilaTransferencias:
+    """
+    Fila persistente de uploads e remoções SFTP. Cada tarefa é um .json em `pasta/tarefas` (o arquivo a enviar
+    fica em `pasta/arquivos`, fora do alcance da limpeza do job), então a fila sobrevive a reinícios e continua
+    de onde parou, inclusive no meio de um envio em partes. Tarefas do mesmo caminho remoto rodam na ordem em
+    que foram enfileiradas; uma remoção descarta o upload ainda não iniciado do mesmo caminho.
+    """
+
+    def __init__(self, pasta: str, ao_progresso: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 tarefas_paralelas: int = TRANSFER_TAREFAS_PARALELAS, partes_paralelas: int = TRANSFER_PARTES_PARALELAS,
+                 parte_bytes: int = TRANSFER_PARTE_BYTES, limite_kbps: float = TRANSFER_LIMITE_KBPS,
+                 max_tentativas: int = TRANSFER_MAX_TENTATIVAS, backoff_s: float = TRANSFER_BACKOFF_S,
+                 obter_pool: Callable[[], Any] = obter_pool_sftp):
+        self.pasta_tarefas = os.path.join(pasta, "tarefas")
+        self.pasta_arquivos = os.path.join(pasta, "arquivos")
+        os.makedirs(self.pasta_tarefas, exist_ok=True)
+        os.makedirs(self.pasta_arquivos, exist_ok=True)
+        self.ao_progresso = ao_progresso
+        self.tarefas_paralelas = max(1, tarefas_paralelas)
+        self.partes_paralelas = max(1, partes_paralelas)
+        self.parte_bytes = max(TRANSFER_BLOCO_BYTES, parte_bytes)
+        self.limitador = LimitadorBanda(limite_kbps * 1024)
+        self.max_tentativas = max(1, max_tentativas)
+        self.backoff_s = backoff_s
+        self.obter_pool = obter_pool
+        self._tarefas: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._parar = False
+        self._carregar()
+
+    # --- Persistência ---
+    def _caminho_tarefa(self, tarefa_id: str) -> str:
+        return os.path.join(self.pasta_tarefas, f"{tarefa_id}.json")
+
+    def _salvar(self, tarefa: Dict[str, Any]):
+        tmp = self._caminho_tarefa(tarefa["id"]) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(tarefa, f)
+        os.replace(tmp, self._caminho_tarefa(tarefa["id"]))
+
+    def _carregar(self):
+        for nome in os.listdir(self.pasta_tarefas):
+            if not nome.endswith(".json"): continue
+            try:
+                with open(os.path.join(self.pasta_tarefas, nome), encoding="utf-8") as f:
+                    tarefa = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[TRANSFER ERRO] Tarefa ilegível '{nome}' ignorada: {e}")
+                continue
+            tarefa["estado"] = PENDENTE  # Interrompida pelo reinício: volta para a fila
+            tarefa["proxima_tentativa"] = 0.0
+            self._tarefas[tarefa["id"]] = tarefa
+            self._seq = max(self._seq, tarefa["seq"])
+        if self._tarefas:
+            print(f"[TRANSFER] {len(self._tarefas)} transferência(s) pendente(s) retomada(s) do disco.")
+            self._garantir_threads()
+
+    def _finalizar(self, tarefa: Dict[str, Any], estado: str, erro: Optional[str] = None):
+        """Estado final: sai da fila e do disco (o último estado ainda é repassado ao progresso)."""
+        tarefa.update(estado=estado, erro=erro, atualizada_em=time.time())
+        transferencias_total.inc(tipo=tarefa["tipo"], estado=estado)
+        for caminho in (self._caminho_tarefa(tarefa["id"]), tarefa.get("arquivo")):
+            if caminho and os.path.exists(caminho):
+                try: os.remove(caminho)
+                except OSError: pass
+        self._notificar(tarefa)
+        with self._cond:
+            self._tarefas.pop(tarefa["id"], None)
+            self._cond.notify_all()
+
+    def _notificar(self, tarefa: Dict[str, Any]):
+        if self.ao_progresso is None: return
+        try: self.ao_progresso(self._publica(tarefa))
+        except Exception as e: print(f"[TRANSFER ERRO] Falha ao reportar progresso: {e}")
+
+    @staticmethod
+    def _publica(tarefa: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: tarefa.get(k) for k in ("id", "tipo", "remoto", "video_name", "estado", "tentativas",
+                                           "bytes_enviados", "tamanho", "erro")}
+
+    # --- Enfileiramento ---
+    def _nova(self, tipo: str, remoto: str, video_name: Optional[str], tarefa_id: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+        self._seq += 1
+        return {"id": tarefa_id or uuid.uuid4().hex, "seq": self._seq, "tipo": tipo, "remoto": remoto.replace("\\", "/"),
+                "video_name": video_name, "estado": PENDENTE, "tentativas": 0, "proxima_tentativa": 0.0,
+                "bytes_enviados": 0, "tamanho": 0, "erro": None, "criada_em": time.time(), **extra}
+
+    def enfileirar_upload(self, caminho_local: str, remoto: str, video_name: Optional[str] = None,
+                          mover: bool = False) -> str:
+        """
+        Enfileira o envio de `caminho_local` para `remoto`. O arquivo é levado para a pasta da fila
+        (movido se `mover`, senão hard link ou cópia), então o chamador pode apagar o original em seguida.
+        """
+        tarefa_id = uuid.uuid4().hex
+        arquivo = os.path.join(self.pasta_arquivos, tarefa_id + os.path.splitext(caminho_local)[1])
+        if mover:
+            shutil.move(caminho_local, arquivo)
+        else:
+            try: os.link(caminho_local, arquivo)
+            except OSError: shutil.copy2(caminho_local, arquivo)
+        with self._cond:
+            tarefa = self._nova("upload", remoto, video_name, tarefa_id, arquivo=arquivo, tamanho=os.path.getsize(arquivo),
+                                partes_concluidas=[], criado_remoto=False)
+            self._salvar(tarefa)
+            self._tarefas[tarefa_id] = tarefa
+            self._cond.notify_all()
+        self._garantir_threads()
+        self._notificar(tarefa)
+        print(f"[TRANSFER] Upload de '{os.path.basename(caminho_local)}' para '{remoto}' enfileirado.")
+        return tarefa_id
+
+    def enfileirar_remocao(self, remoto: str, video_name: Optional[str] = None) -> str:
+        remoto = remoto.replace("\\", "/")
+        descartadas = []
+        with self._cond:
+            # Upload do mesmo caminho que nem começou: seria enviado só para ser apagado.
+            for tarefa in list(self._tarefas.values()):
+                if tarefa["tipo"] == "upload" and tarefa["remoto"] == remoto and tarefa["estado"] == PENDENTE \
+                        and not tarefa["partes_concluidas"] and not tarefa["criado_remoto"]:
+                    descartadas.append(tarefa)
+                    self._tarefas.pop(tarefa["id"])
+            tarefa = self._nova("remocao", remoto, video_name)
+            self._salvar(tarefa)
+            self._tarefas[tarefa["id"]] = tarefa
+            self._cond.notify_all()
+        for descartada in descartadas:
+            print(f"[TRANSFER] Upload de '{remoto}' descartado (remoção enfileirada antes do envio).")
+            self._finalizar(descartada, DESCARTADA)
+        self._garantir_threads()
+        self._notificar(tarefa)
+        return tarefa["id"]
+
+    # --- Execução ---
+    def _garantir_threads(self):
+        with self._cond:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.tarefas_paralelas and not self._parar:
+                t = threading.Thread(target=self._loop, daemon=True, name=f"transfer-{len(self._threads)}")
+                t.start()
+                self._threads.append(t)
+
+    def _proxima(self) -> Optional[Dict[str, Any]]:
+        """Próxima tarefa executável (chamar com o lock): pendente, fora do backoff e sem antecessora no mesmo caminho."""
+        agora = time.time()
+        ocupados = set()
+        for tarefa in sorted(self._tarefas.values(), key=lambda t: t["seq"]):
+            if tarefa["remoto"] in ocupados:
+                continue
+            ocupados.add(tarefa["remoto"])
+            if tarefa["estado"] == PENDENTE and tarefa["proxima_tentativa"] <= agora:
+                return tarefa
+        return None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                tarefa = None
+                while not self._parar:
+                    tarefa = self._proxima()
+                    if tarefa is not None: break
+                    esperas = [t["proxima_tentativa"] - time.time() for t in self._tarefas.values() if t["estado"] == PENDENTE]
+                    self._cond.wait(timeout=min([1.0] + [max(0.01, e) for e in esperas]))
+                if self._parar: return
+                tarefa["estado"] = EXECUTANDO
+                tarefa["tentativas"] += 1
+            self._notificar(tarefa)
+            try:
+                if tarefa["tipo"] == "upload": self._executar_upload(tarefa)
+                else: self._executar_remocao(tarefa)
+            except Exception as e:
+                self._falha(tarefa, e)
+            else:
+                print(f"[TRANSFER] {tarefa['tipo'].capitalize()} de '{tarefa['remoto']}' concluído.")
+                self._finalizar(tarefa, CONCLUIDA)
+
+    def _falha(self, tarefa: Dict[str, Any], e: Exception):
+        erro = f"{e.__class__.__name__}: {e}"
+        permanente = tarefa["tipo"] == "upload" and not os.path.exists(tarefa.get("arquivo") or "")
+        if permanente or tarefa["tentativas"] >= self.max_tentativas:
+            print(f"[TRANSFER ERRO] {tarefa['tipo'].capitalize()} de '{tarefa['remoto']}' falhou em definitivo: {erro}")
+            self._finalizar(tarefa, FALHOU, erro)
+            return
+        espera = min(TRANSFER_BACKOFF_MAX_S, self.backoff_s * 2 ** (tarefa["tentativas"] - 1))
+        print(f"[TRANSFER] {tarefa['tipo'].capitalize()} de '{tarefa['remoto']}' falhou ({erro}); nova tentativa em {espera:.0f}s.")
+        with self._cond:
+            tarefa.update(estado=PENDENTE, erro=erro, proxima_tentativa=time.time() + espera)
+            self._salvar(tarefa)
+            self._cond.notify_all()
+        self._notificar(tarefa)
+
+    def _executar_remocao(self, tarefa: Dict[str, Any]):
+        pool = self.obter_pool()
+        if pool is None: raise RuntimeError("SFTP não configurado.")
+        def remover(sftp):
+            try: sftp.remove(tarefa["remoto"])
+            except FileNotFoundError: pass  # Já não existe: o objetivo foi atingido
+        pool.executar(remover)
+
+    def _executar_upload(self, tarefa: Dict[str, Any]):
+        pool = self.obter_pool()
+        if pool is None: raise RuntimeError("SFTP não configurado.")
+        remoto, tamanho = tarefa["remoto"], tarefa["tamanho"]
+        if not tarefa["criado_remoto"]:
+            def criar(sftp):
+                pool.garantir_diretorio(sftp, os.path.dirname(remoto))
+                sftp.open(remoto, "wb").close()  # Cria (ou zera) o arquivo; as partes são gravadas nas suas posições
+            pool.executar(criar)
+            with self._cond:
+                tarefa["criado_remoto"] = True
+                self._salvar(tarefa)
+
+        concluidas = set(tarefa["partes_concluidas"])
+        partes = [(inicio, min(tamanho, inicio + self.parte_bytes)) for inicio in range(0, tamanho, self.parte_bytes)]
+        pendentes = [p for p in partes if p[0] not in concluidas]
+        enviados_parte: Dict[int, int] = {}
+        ultimo_relatorio = [0.0]
+
+        def progresso(inicio: int, n: int):
+            with self._cond:
+                enviados_parte[inicio] = n
+                tarefa["bytes_enviados"] = sum(min(f, tamanho) - i for i, f in partes if i in concluidas) + sum(enviados_parte.values())
+                agora = time.monotonic()
+                if agora - ultimo_relatorio[0] < TRANSFER_PROGRESSO_INTERVALO_S: return
+                ultimo_relatorio[0] = agora
+            self._notificar(tarefa)
+
+        def enviar_parte(parte):
+            inicio, fim = parte
+            pool.executar(lambda sftp: self._enviar_intervalo(sftp, tarefa["arquivo"], remoto, inicio, fim, progresso))
+            with self._cond:
+                concluidas.add(inicio)
+                enviados_parte.pop(inicio, None)
+                tarefa["partes_concluidas"] = sorted(concluidas)
+                self._salvar(tarefa)  # Retomada após reinício continua das partes que faltam
+
+        if len(pendentes) <= 1 or self.partes_paralelas == 1:
+            for parte in pendentes: enviar_parte(parte)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.partes_paralelas, len(pendentes))) as executor:
+                for futuro in [executor.submit(enviar_parte, p) for p in pendentes]:
+                    futuro.result()
+
+        tamanho_remoto = pool.executar(lambda sftp: sftp.stat(remoto).st_size)
+        if tamanho_remoto != tamanho:
+            with self._cond:
+                tarefa.update(criado_remoto=False, partes_concluidas=[], bytes_enviados=0)
+                self._salvar(tarefa)
+            raise IOError(f"Tamanho remoto {tamanho_remoto} difere do local {tamanho}.")
+
+    def _enviar_intervalo(self, sftp: Any, arquivo: str, remoto: str, inicio: int, fim: int,
+                          progresso: Callable[[int, int], None]):
+        """Grava os bytes [inicio, fim) do arquivo local na mesma posição do arquivo remoto."""
+        enviados = 0
+        with open(arquivo, "rb") as local, sftp.open(remoto, "r+b") as destino:
+            destino.set_pipelined(True)
+            local.seek(inicio); destino.seek(inicio)
+            while inicio + enviados < fim:
+                bloco = local.read(min(TRANSFER_BLOCO_BYTES, fim - inicio - enviados))
+                if not bloco: break
+                self.limitador.consumir(len(bloco))
+                destino.write(bloco)
+                sftp_bytes.inc(len(bloco), direcao="envio")
+                enviados += len(bloco)
+                progresso(inicio, enviados)
+
+    # --- Consulta e parada ---
+    def situacao(self, video_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [self._publica(t) for t in sorted(self._tarefas.values(), key=lambda t: t["seq"])
+                    if video_name is None or t["video_name"] == video_name]
+
+    def aguardar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a fila esvaziar (tarefas concluídas, falhas definitivas ou descartadas)."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._tarefas:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0: return False
+                self._cond.wait(timeout=restante)
+            return True
+
+    def fechar(self):
+        """Para as threads; tarefas em andamento continuam no disco e são retomadas no próximo início."""
+        with self._cond:
+            self._parar = True
+            self._cond.notify_all()
@@ -0,0 +1,100 @@
+import os
+from typing import Optional, Dict, Any, Tuple
+
+import cv2
+import numpy as np
+
+# Largura (px) da imagem reduzida usada na diferença de frames.
+GATE_LARGURA = int(os.getenv("GATE_LARGURA", "160"))
+# Meia-largura da faixa monitorada em volta da linha, como fração da menor dimensão do vídeo
+# (cobre tanto o movimento na linha quanto o que está se aproximando dela).
+GATE_BANDA_RATIO = float(os.getenv("GATE_BANDA_RATIO", "0.2"))
+# Diferença mínima de intensidade (0-255) para um pixel contar como "mudou".
+GATE_LIMIAR_PIXEL = int(os.getenv("GATE_LIMIAR_PIXEL", "25"))
+# Fração mínima dos pixels da faixa que precisam mudar para considerar que há movimento.
+GATE_LIMIAR_AREA = float(os.getenv("GATE_LIMIAR_AREA", "0.002"))
+# Enquanto houver tracks ativos, infere todo frame por mais este número de frames após o último track.
+GATE_MANTER_FRAMES = int(os.getenv("GATE_MANTER_FRAMES", "30"))
+# Mesmo sem movimento, infere ao menos um frame a cada GATE_INTERVALO_MAX (pega animais parados/lentos na faixa).
+GATE_INTERVALO_MAX = int(os.getenv("GATE_INTERVALO_MAX", "30"))
+
+
+class GateMovimento:
+    """
+    Decide, frame a frame, se vale a pena rodar o detector.
+    Compara o frame reduzido e em tons de cinza com o último frame avaliado, só dentro da faixa
+    em volta da linha de contagem. Sem movimento na faixa e sem tracks ativos, o frame é pulado;
+    com tracks ativos a amostragem volta a ser de todos os frames.
+    """
+
+    def __init__(self, width: int, height: int, line_points: Tuple, banda_ratio: float = GATE_BANDA_RATIO,
+                 largura_reduzida: int = GATE_LARGURA, limiar_pixel: int = GATE_LIMIAR_PIXEL,
+                 limiar_area: float = GATE_LIMIAR_AREA, manter_frames: int = GATE_MANTER_FRAMES,
+                 intervalo_max: int = GATE_INTERVALO_MAX):
+        self.escala = min(1.0, largura_reduzida / float(width))
+        self.tamanho = (max(1, int(round(width * self.escala))), max(1, int(round(height * self.escala))))
+        self.limiar_pixel = limiar_pixel
+        self.limiar_area = limiar_area
+        self.manter_frames = max(0, manter_frames)
+        self.intervalo_max = max(1, intervalo_max)
+
+        # Máscara da faixa em volta da linha, já na resolução reduzida.
+        (x1, y1), (x2, y2) = line_points
+        meia_banda = max(1, int(round(min(self.tamanho) * banda_ratio)))
+        self.mascara = np.zeros((self.tamanho[1], self.tamanho[0]), np.uint8)
+        cv2.line(self.mascara, (int(x1 * self.escala), int(y1 * self.escala)), (int(x2 * self.escala), int(y2 * self.escala)),
+                 255, thickness=2 * meia_banda + 1)
+        self._pixels_banda = max(1, int(np.count_nonzero(self.mascara)))
+
+        self._anterior: Optional[np.ndarray] = None
+        self._ultimo_track: Optional[int] = None      # Índice do último frame inferido com tracks
+        self._ultimo_inferido: Optional[int] = None
+        self.frames_avaliados = 0
+        self.frames_inferidos = 0
+        self.inferidos_movimento = 0
+        self.inferidos_tracks = 0
+        self.inferidos_forcados = 0
+
+    def _movimento(self, frame: np.ndarray) -> bool:
+        reduzido = cv2.resize(frame, self.tamanho, interpolation=cv2.INTER_AREA)
+        cinza = cv2.GaussianBlur(cv2.cvtColor(reduzido, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        anterior, self._anterior = self._anterior, cinza
+        if anterior is None:
+            return True
+        diff = cv2.absdiff(cinza, anterior)
+        _, mudou = cv2.threshold(diff, self.limiar_pixel, 255, cv2.THRESH_BINARY)
+        mudou = cv2.bitwise_and(mudou, self.mascara)
+        return cv2.countNonZero(mudou) / self._pixels_banda >= self.limiar_area
+
+    def deve_inferir(self, frame_idx: int, frame: np.ndarray) -> bool:
+        """True se o frame deve ir para o detector. Sempre atualiza o frame de referência."""
+        self.frames_avaliados += 1
+        movimento = self._movimento(frame)
+        if self._ultimo_track is not None and frame_idx - self._ultimo_track <= self.manter_frames:
+            self.inferidos_tracks += 1
+        elif movimento:
+            self.inferidos_movimento += 1
+        elif self._ultimo_inferido is None or frame_idx - self._ultimo_inferido >= self.intervalo_max:
+            self.inferidos_forcados += 1
+        else:
+            return False
+        self.frames_inferidos += 1
+        self._ultimo_inferido = frame_idx
+        return True
+
+    def registrar_tracks(self, frame_idx: int, num_tracks: int):
+        """Realimenta o gate com o resultado do detector: tracks ativos mantêm a amostragem cheia."""
+        if num_tracks > 0:
+            self._ultimo_track = frame_idx
+
+    def estatisticas(self) -> Dict[str, Any]:
+        pulados = self.frames_avaliados - self.frames_inferidos
+        return {
+            "frames_avaliados": self.frames_avaliados,
+            "frames_inferidos": self.frames_inferidos,
+            "frames_pulados": pulados,
+            "percentual_pulado": round(100.0 * pulados / self.frames_avaliados, 1) if self.frames_avaliados else 0.0,
+            "inferidos_por_movimento": self.inferidos_movimento,
+            "inferidos_por_tracks_ativos": self.inferidos_tracks,
+            "inferidos_forcados": self.inferidos_forcados,
+        }
@@ -1,119 +1,361 @@
 import os
-import psycopg2
-import psycopg2.pool
 import time
 import json # Para lidar com a coluna JSONB do resultado
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, AsyncIterator
+
+from utils.banco_async import BancoAsync, criar_banco, psycopg
+from utils.difusor_progresso import DifusorProgresso
+from utils.metricas import metricas
 
 # Pega a URL do banco de dados das variáveis de ambiente carregadas pelo load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# --- Write-behind do progresso ---
+# O progresso dos jobs locais fica em memória e é gravado no banco em segundo plano:
+# no máximo uma vez a cada PROGRESSO_FLUSH_SEGUNDOS, ou antes disso se avançar PROGRESSO_FLUSH_PERCENTUAL.
+PROGRESSO_FLUSH_SEGUNDOS = float(os.getenv("PROGRESSO_FLUSH_SEGUNDOS", "1.0"))
+PROGRESSO_FLUSH_PERCENTUAL = float(os.getenv("PROGRESSO_FLUSH_PERCENTUAL", "5.0"))
+
+# --- Cancelamento ---
+# Canal LISTEN/NOTIFY usado para avisar processos/hosts que rodam o job de que ele foi cancelado.
+CANAL_CANCELAMENTO = "video_progress_cancel"
+
+# --- Transferências em segundo plano ---
+# Vídeos cujo estado das transferências SFTP (arquivamento) fica em memória para o /progresso.
+PROGRESSO_TRANSFERENCIAS_MAX_VIDEOS = 500
+
 # --- Pool de Conexões com o Banco de Dados ---
-pool = None
-try:
-    if not DATABASE_URL:
-        raise ValueError("A variável de ambiente DATABASE_URL não foi definida.")
-    pool = psycopg2.pool.SimpleConnectionPool(1, 5, dsn=DATABASE_URL)
-    print("[DB] Pool de conexões com PostgreSQL criado com sucesso.")
-except Exception as e:
-    print(f"[DB ERRO] Falha CRÍTICA ao criar o pool de conexões com PostgreSQL: {e}")
+# Driver assíncrono (psycopg 3) em um loop próprio: as rotas aguardam sem bloquear o servidor e as
+# threads usam a fachada síncrona sobre o mesmo pool (ver utils/banco_async.py).
+banco: Optional[BancoAsync] = criar_banco(DATABASE_URL)
+if banco is None:
     print("Verifique se o PostgreSQL está rodando e se a DATABASE_URL no seu arquivo .env está correta.")
 
-def create_progress_table_if_not_exists():
-    """Garante que a tabela de progresso exista no banco de dados."""
-    if not pool: 
+SQL_CRIAR_TABELAS = """
+    CREATE TABLE IF NOT EXISTS video_progress (
+        video_name VARCHAR(255) PRIMARY KEY,
+        frame_atual INTEGER DEFAULT 0,
+        total_frames_estimado INTEGER DEFAULT 1,
+        tempo_inicio DOUBLE PRECISION,
+        tempo_restante VARCHAR(50),
+        finalizado BOOLEAN DEFAULT FALSE,
+        resultado JSONB,
+        erro TEXT,
+        cancelado BOOLEAN DEFAULT FALSE,
+        last_updated TIMESTAMPTZ DEFAULT NOW()
+    );
+    -- Cache de resultados por conteúdo do vídeo + parâmetros de contagem (ver utils/cache_resultados.py).
+    CREATE TABLE IF NOT EXISTS video_result_cache (
+        chave VARCHAR(64) PRIMARY KEY,
+        video_sha256 VARCHAR(64) NOT NULL,
+        parametros JSONB,
+        resultado JSONB NOT NULL,
+        criado_em TIMESTAMPTZ DEFAULT NOW(),
+        ultimo_acesso TIMESTAMPTZ DEFAULT NOW(),
+        acessos INTEGER DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS video_result_cache_ultimo_acesso ON video_result_cache (ultimo_acesso);
+"""
+
+async def preparar_banco() -> bool:
+    """
+    Abre as conexões mínimas do pool e garante as tabelas. Uma tentativa; quem chama (o lifespan da API)
+    repete com backoff. Não roda mais no import do módulo: um PostgreSQL lento não atrasa a subida da API.
+    """
+    if not banco: 
         print("[DB AVISO] Pool de conexões não disponível. Tabela não pôde ser verificada/criada.")
-        return
-    conn = None
+        return False
     try:
-        conn = pool.getconn()
-        with conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS video_progress (
-                    video_name VARCHAR(255) PRIMARY KEY,
-                    frame_atual INTEGER DEFAULT 0,
-                    total_frames_estimado INTEGER DEFAULT 1,
-                    tempo_inicio DOUBLE PRECISION,
-                    tempo_restante VARCHAR(50),
-                    finalizado BOOLEAN DEFAULT FALSE,
-                    resultado JSONB,
-                    erro TEXT,
-                    cancelado BOOLEAN DEFAULT FALSE,
-                    last_updated TIMESTAMPTZ DEFAULT NOW()
-                );
-            """)
-            conn.commit()
-            print("[DB] Tabela 'video_progress' verificada/criada com sucesso.")
+        await banco.abrir_async()
     except Exception as e:
-        print(f"[DB ERRO] Falha ao criar/verificar a tabela 'video_progress': {e}")
-    finally:
-        if conn:
-            pool.putconn(conn)
+        print(f"[DB ERRO] Falha ao conectar ao PostgreSQL: {e}")
+        return False
+    _, ok = await banco.executar_async(SQL_CRIAR_TABELAS)
+    if ok:
+        print("[DB] Tabelas 'video_progress' e 'video_result_cache' verificadas/criadas com sucesso.")
+    else:
+        print("[DB ERRO] Falha ao criar/verificar a tabela 'video_progress'.")
+    return ok
+
+def fechar_banco():
+    if banco: banco.fechar()
+
+# --- Métricas do banco ---
+db_consultas = metricas.contador("db_consultas_total", "Round-trips ao PostgreSQL por comando e resultado.", ("comando", "resultado"))
+db_consulta_segundos = metricas.histograma("db_consulta_segundos", "Duração das consultas ao PostgreSQL (inclui a espera por uma conexão do pool).", ("comando",))
+
+def _conexoes_pool() -> Optional[Dict[Tuple[str], int]]:
+    if not banco: return None
+    return {(estado,): n for estado, n in banco.situacao().items()}
 
-# Chama a função para criar a tabela na inicialização do módulo, uma única vez.
-create_progress_table_if_not_exists()
+metricas.medidor("db_pool_conexoes", "Conexões do pool do PostgreSQL (em uso, livres, o limite e consultas esperando uma conexão).",
+                 _conexoes_pool, ("estado",))
+
+def _comando(query: str) -> str:
+    return query.split(None, 1)[0].upper() if query.strip() else "?"
+
+def executar_query(query: str, params: tuple = (), fetch: Optional[str] = None):
+    """
+    Executa uma query usando o pool (fetch: None, 'one' ou 'all'). Retorna None em caso de erro ou sem pool.
+    Bloqueia a thread chamadora; em rotas async, use executar_query_async.
+    """
+    if not banco: 
+        print("[DB ERRO] Tentativa de executar query sem um pool de conexões válido.")
+        return None
+    comando = _comando(query)
+    with db_consulta_segundos.medir(comando=comando):
+        resultado, ok = banco.executar(query, params, fetch)
+    db_consultas.inc(comando=comando, resultado="ok" if ok else "erro")
+    return resultado
+
+async def executar_query_async(query: str, params: tuple = (), fetch: Optional[str] = None):
+    """Mesmo contrato de executar_query, aguardando o driver assíncrono sem bloquear o event loop."""
+    if not banco: 
+        print("[DB ERRO] Tentativa de executar query sem um pool de conexões válido.")
+        return None
+    comando = _comando(query)
+    with db_consulta_segundos.medir(comando=comando):
+        resultado, ok = await banco.executar_async(query, params, fetch)
+    db_consultas.inc(comando=comando, resultado="ok" if ok else "erro")
+    return resultado
+
+# --- Comandos usados pelas versões síncrona e assíncrona do ProgressoManager ---
+SQL_INICIAR = """
+    INSERT INTO video_progress (video_name, tempo_inicio, tempo_restante, finalizado, cancelado, erro, resultado, frame_atual, total_frames_estimado, last_updated)
+    VALUES (%s, %s, %s, %s, %s, NULL, NULL, 0, 1, NOW())
+    ON CONFLICT (video_name) DO UPDATE SET
+        tempo_inicio = EXCLUDED.tempo_inicio, tempo_restante = EXCLUDED.tempo_restante,
+        finalizado = EXCLUDED.finalizado, cancelado = EXCLUDED.cancelado,
+        erro = NULL, resultado = NULL, frame_atual = 0, total_frames_estimado = 1,
+        last_updated = NOW();
+"""
+SQL_STATUS = "SELECT video_name, frame_atual, total_frames_estimado, tempo_inicio, tempo_restante, finalizado, resultado, erro, cancelado FROM video_progress WHERE video_name = %s;"
+SQL_FINALIZAR = """
+    UPDATE video_progress SET finalizado = TRUE, resultado = %s, erro = NULL, tempo_restante = '00:00:00', frame_atual = %s, last_updated = NOW()
+    WHERE video_name = %s;
+"""
+SQL_ERRO = "UPDATE video_progress SET finalizado = TRUE, erro = %s, tempo_restante = 'Erro', last_updated = NOW() WHERE video_name = %s;"
+# Um único comando: com parâmetros, o psycopg 3 não aceita vários comandos na mesma execução.
+SQL_CANCELAR = """
+    WITH cancelado AS (
+        UPDATE video_progress SET cancelado = TRUE, finalizado = TRUE, erro = 'Cancelado pelo usuário.', tempo_restante = 'Cancelado', last_updated = NOW()
+        WHERE video_name = %s RETURNING video_name
+    )
+    SELECT pg_notify(%s, %s) FROM cancelado;
+"""
 
 class ProgressoManager:
-    """Gerencia o progresso do processamento de vídeo usando um banco de dados PostgreSQL."""
+    """
+    Gerencia o progresso do processamento de vídeo usando um banco de dados PostgreSQL.
+    Os jobs iniciados por esta instância têm o estado autoritativo em memória (leituras sem SQL);
+    o banco é atualizado por uma thread de flush, de forma agrupada e limitada no tempo.
+    """
+
+    def __init__(self, flush_segundos: float = PROGRESSO_FLUSH_SEGUNDOS, flush_percentual: float = PROGRESSO_FLUSH_PERCENTUAL):
+        self.flush_segundos = flush_segundos
+        self.flush_percentual = flush_percentual
+        self._locais: Dict[str, Dict[str, Any]] = {}      # Estado dos jobs deste processo
+        self._sujos: Dict[str, float] = {}                # video_name -> percentual no momento em que sujou
+        self._percentual_gravado: Dict[str, float] = {}   # Último percentual gravado no banco
+        self._lock = threading.Lock()
+        self._acordar_flush = threading.Event()
+        self._thread_flush: Optional[threading.Thread] = None
+        self._cancelamentos: Dict[str, threading.Event] = {}  # Canal de cancelamento por job
+        self._thread_listener: Optional[threading.Thread] = None
+        # video_name -> {tarefa_id: estado}; sobrevive ao fim do job (o arquivamento termina depois da contagem).
+        self._transferencias: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+        # Streams de progresso (SSE/WebSocket): um canal por job, alimentado pelas mudanças de estado abaixo.
+        self.difusor = DifusorProgresso()
 
     def _execute_query(self, query: str, params: tuple = (), fetch: Optional[str] = None):
         """Função auxiliar para executar queries no banco de dados usando o pool."""
-        if not pool: 
-            print("[DB ERRO] Tentativa de executar query sem um pool de conexões válido.")
-            return None
-        conn = None
-        try:
-            conn = pool.getconn()
-            with conn.cursor() as cur:
-                cur.execute(query, params or ())
-                if fetch == 'one':
-                    return cur.fetchone()
-                if fetch == 'all':
-                    return cur.fetchall()
-                conn.commit()
-        except Exception as e:
-            print(f"[DB ERRO] Falha na query '{query[:60].strip()}...': {e}")
-            if conn:
-                try: conn.rollback()
-                except psycopg2.InterfaceError: conn = None # Conexão provavelmente já fechada/inválida
-            return None
-        finally:
-            if conn:
-                pool.putconn(conn)
+        return executar_query(query, params, fetch)
+
+    async def _execute_query_async(self, query: str, params: tuple = (), fetch: Optional[str] = None):
+        """Versão assíncrona de _execute_query, para os métodos *_async chamados pelas rotas."""
+        return await executar_query_async(query, params, fetch)
+
+    # --- Write-behind ---
+    def _garantir_thread_flush(self):
+        if self._thread_flush is None or not self._thread_flush.is_alive():
+            self._thread_flush = threading.Thread(target=self._loop_flush, name="progresso-flush", daemon=True)
+            self._thread_flush.start()
+
+    def _marcar_sujo(self, video_name: str, estado: Dict[str, Any]):
+        """Marca o job para o próximo flush; acorda a thread se o progresso avançou o suficiente. Chamar com _lock."""
+        percentual = 100.0 * estado.get("frame_atual", 0) / max(1, estado.get("total_frames_estimado", 1))
+        self._sujos[video_name] = percentual
+        if percentual - self._percentual_gravado.get(video_name, 0.0) >= self.flush_percentual:
+            self._acordar_flush.set()
+
+    def _loop_flush(self):
+        while True:
+            self._acordar_flush.wait(self.flush_segundos)
+            self._acordar_flush.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[DB ERRO] Falha no flush do progresso: {e}")
+            time.sleep(min(self.flush_segundos, 0.2)) # Limita a taxa mesmo com avanços rápidos
+
+    def flush(self):
+        """Grava no banco o último estado de cada job local alterado desde o flush anterior."""
+        with self._lock:
+            pendentes = {nome: dict(self._locais[nome]) for nome in self._sujos if nome in self._locais}
+            percentuais = dict(self._sujos)
+            self._sujos.clear()
+        for nome, estado in pendentes.items():
+            query = """
+                UPDATE video_progress SET frame_atual = %s, total_frames_estimado = %s, tempo_restante = %s, last_updated = NOW()
+                WHERE video_name = %s AND finalizado = FALSE
+                RETURNING cancelado;
+            """
+            params = (estado["frame_atual"], estado["total_frames_estimado"], estado["tempo_restante"], nome)
+            row = self._execute_query(query, params, fetch='one')
+            # O flush também traz de volta um cancelamento feito por outro processo (linha já finalizada no banco).
+            cancelado_fora = row is None and bool(self._execute_query(
+                "SELECT cancelado FROM video_progress WHERE video_name = %s AND cancelado = TRUE;", (nome,), fetch='one'))
+            with self._lock:
+                self._percentual_gravado[nome] = percentuais.get(nome, 0.0)
+            if cancelado_fora:
+                self._marcar_cancelado(nome)
+
+    # --- Cancelamento push ---
+    def evento_cancelamento(self, video_name: str) -> threading.Event:
+        """Evento que é setado quando o job é cancelado; o worker consulta com is_set(), sem custo de SQL."""
+        with self._lock:
+            return self._cancelamentos.setdefault(video_name, threading.Event())
+
+    def _marcar_cancelado(self, video_name: str):
+        """Aplica um cancelamento ao estado em memória e acorda quem espera pelo evento."""
+        with self._lock:
+            estado = self._locais.get(video_name)
+            if estado is not None:
+                estado.update(cancelado=True, finalizado=True, erro="Cancelado pelo usuário.", tempo_restante="Cancelado")
+                self._sujos.pop(video_name, None)
+            evento = self._cancelamentos.get(video_name)
+        if evento is not None:
+            evento.set()
+        self._publicar(video_name, imediato=True)
+
+    def _garantir_thread_listener(self):
+        if not DATABASE_URL or psycopg is None:
+            return
+        if self._thread_listener is None or not self._thread_listener.is_alive():
+            self._thread_listener = threading.Thread(target=self._loop_listener, name="progresso-listener", daemon=True)
+            self._thread_listener.start()
+
+    def _loop_listener(self):
+        """Escuta NOTIFYs de cancelamento em uma conexão dedicada (fora do pool), reconectando com backoff."""
+        espera = 1.0
+        while True:
+            conn = None
+            try:
+                conn = psycopg.connect(DATABASE_URL, autocommit=True)
+                conn.execute(f"LISTEN {CANAL_CANCELAMENTO};")
+                print(f"[DB] Escutando cancelamentos no canal '{CANAL_CANCELAMENTO}'.")
+                espera = 1.0
+                while True:
+                    for notificacao in conn.notifies(timeout=5.0):
+                        self._marcar_cancelado(notificacao.payload)
+            except Exception as e:
+                print(f"[DB ERRO] Listener de cancelamento caiu, reconectando em {espera:.0f}s: {e}")
+                time.sleep(espera)
+                espera = min(espera * 2, 30.0)
+            finally:
+                if conn:
+                    try: conn.close()
+                    except Exception: pass
+
+    def encerrar(self, video_name: str):
+        """Chamado quando a thread do job termina (inclusive após cancelamento): libera o estado em memória."""
+        self._soltar_local(video_name)
+
+    def _soltar_local(self, video_name: str):
+        """Para de acompanhar um job terminado em memória; leituras posteriores vão ao banco."""
+        with self._lock:
+            self._locais.pop(video_name, None)
+            self._sujos.pop(video_name, None)
+            self._percentual_gravado.pop(video_name, None)
+            self._cancelamentos.pop(video_name, None)
 
     def iniciar(self, video_name: str):
         """Inicia ou reseta o progresso para um vídeo no banco de dados."""
-        query = """
-            INSERT INTO video_progress (video_name, tempo_inicio, tempo_restante, finalizado, cancelado, erro, resultado, frame_atual, total_frames_estimado, last_updated)
-            VALUES (%s, %s, %s, %s, %s, NULL, NULL, 0, 1, NOW())
-            ON CONFLICT (video_name) DO UPDATE SET
-                tempo_inicio = EXCLUDED.tempo_inicio, tempo_restante = EXCLUDED.tempo_restante,
-                finalizado = EXCLUDED.finalizado, cancelado = EXCLUDED.cancelado,
-                erro = NULL, resultado = NULL, frame_atual = 0, total_frames_estimado = 1,
-                last_updated = NOW();
-        """
-        params = (video_name, time.time(), "Na fila...", False, False)
-        self._execute_query(query, params)
+        tempo_inicio = time.time()
+        self._execute_query(SQL_INICIAR, (video_name, tempo_inicio, "Na fila...", False, False))
+        self._registrar_inicio(video_name, tempo_inicio)
+
+    async def iniciar_async(self, video_name: str):
+        """iniciar() para as rotas async: aguarda a gravação sem bloquear o event loop."""
+        tempo_inicio = time.time()
+        await self._execute_query_async(SQL_INICIAR, (video_name, tempo_inicio, "Na fila...", False, False))
+        self._registrar_inicio(video_name, tempo_inicio)
+
+    def _registrar_inicio(self, video_name: str, tempo_inicio: float):
+        with self._lock:
+            self._locais[video_name] = {
+                "video_name": video_name, "frame_atual": 0, "total_frames_estimado": 1, "tempo_inicio": tempo_inicio,
+                "tempo_restante": "Na fila...", "finalizado": False, "resultado": None, "erro": None, "cancelado": False,
+            }
+            self._sujos.pop(video_name, None)
+            self._percentual_gravado[video_name] = 0.0
+            self._cancelamentos[video_name] = threading.Event()
+        self._publicar(video_name, imediato=True)
+        self._garantir_thread_flush()
+        self._garantir_thread_listener()
         print(f"[DB Progresso] Progresso iniciado/resetado para: {video_name}")
 
     def is_processing(self, video_name: str) -> bool:
         """Verifica no banco se um vídeo está atualmente em processamento."""
-        status = self.status(video_name)
+        return self._em_processamento(self.status(video_name))
+
+    async def is_processing_async(self, video_name: str) -> bool:
+        return self._em_processamento(await self.status_async(video_name))
+
+    @staticmethod
+    def _em_processamento(status: Optional[Dict[str, Any]]) -> bool:
         return bool(status and not status.get("erro") and not status.get("finalizado"))
 
-    def atualizar(self, video_name: str, frame_atual: int, total_estimado: int, no_processing: bool = False) -> bool:
-        """Atualiza o progresso do processamento de frames no banco de dados."""
+    def atualizar(self, video_name: str, frame_atual: int, total_estimado: int, no_processing: bool = False,
+                  contagem: Optional[int] = None) -> bool:
+        """
+        Atualiza o progresso do processamento de frames (em memória; o banco é atualizado pelo flush).
+        `contagem` é a contagem parcial, repassada aos streams de progresso.
+        """
+        with self._lock:
+            estado = self._locais.get(video_name)
+        if estado is None:
+            # Job de outro processo/instância: mantém o comportamento síncrono antigo.
+            return self._atualizar_no_banco(video_name, frame_atual, total_estimado, no_processing)
+        if estado.get("cancelado") or estado.get("finalizado"): return False
+        if not no_processing:
+            tempo_restante = self._estimar_tempo_restante(estado.get("tempo_inicio"), frame_atual, total_estimado)
+            with self._lock:
+                estado.update(frame_atual=frame_atual, total_frames_estimado=total_estimado, tempo_restante=tempo_restante)
+                if contagem is not None: estado["contagem_parcial"] = contagem
+                self._marcar_sujo(video_name, estado)
+            self._publicar(video_name)
+        return True
+
+    @staticmethod
+    def _estimar_tempo_restante(tempo_inicio: Optional[float], frame_atual: int, total_estimado: int) -> str:
+        tempo_restante = "Calculando..."
+        elapsed = time.time() - (tempo_inicio or time.time())
+        if frame_atual > 5 and elapsed > 0.1:
+            fps_calc = frame_atual / elapsed
+            if fps_calc > 0 and total_estimado > frame_atual:
+                restante_segundos = (total_estimado - frame_atual) / fps_calc
+                tempo_restante = time.strftime("%H:%M:%S", time.gmtime(restante_segundos))
+            else: tempo_restante = "Finalizando..."
+        return tempo_restante
+
+    def _atualizar_no_banco(self, video_name: str, frame_atual: int, total_estimado: int, no_processing: bool) -> bool:
         status = self.status(video_name)
         if not status or status.get("cancelado") or status.get("finalizado"): return False 
         if not no_processing:
-            tempo_restante = "Calculando..."
-            elapsed = time.time() - status.get("tempo_inicio", time.time())
-            if frame_atual > 5 and elapsed > 0.1:
-                fps_calc = frame_atual / elapsed
-                if fps_calc > 0 and total_estimado > frame_atual:
-                    restante_segundos = (total_estimado - frame_atual) / fps_calc
-                    tempo_restante = time.strftime("%H:%M:%S", time.gmtime(restante_segundos))
-                else: tempo_restante = "Finalizando..."
+            tempo_restante = self._estimar_tempo_restante(status.get("tempo_inicio"), frame_atual, total_estimado)
             query = """
                 UPDATE video_progress SET frame_atual = %s, total_frames_estimado = %s, tempo_restante = %s, last_updated = NOW()
                 WHERE video_name = %s;
@@ -125,6 +367,15 @@ class ProgressoManager:
     # --- MÉTODO NOVO QUE ESTAVA FALTANDO ---
     def update_status_message(self, video_name: str, message: str):
         """Atualiza a mensagem de status (usando o campo tempo_restante) para tarefas como SFTP."""
+        with self._lock:
+            estado = self._locais.get(video_name)
+            if estado is not None:
+                if not estado.get("finalizado"):
+                    estado["tempo_restante"] = message
+                    self._marcar_sujo(video_name, estado)
+        if estado is not None:
+            self._publicar(video_name, imediato=True)
+            return
         if self.status(video_name).get("finalizado"): return 
         query = "UPDATE video_progress SET tempo_restante = %s, last_updated = NOW() WHERE video_name = %s;"
         params = (message, video_name)
@@ -133,40 +384,123 @@ class ProgressoManager:
 
     def finalizar(self, video_name: str, resultado: dict):
         """Marca o processamento como finalizado com sucesso no banco de dados."""
-        status = self.status(video_name)
-        frame_final = status.get("total_frames_estimado", status.get("frame_atual", 0)) if status else 0
-        query = """
-            UPDATE video_progress SET finalizado = TRUE, resultado = %s, erro = NULL, tempo_restante = '00:00:00', frame_atual = %s, last_updated = NOW()
-            WHERE video_name = %s;
-        """
-        resultado_json = json.dumps(resultado)
-        params = (resultado_json, frame_final, video_name)
-        self._execute_query(query, params)
+        frame_final = self._frame_final(self.status(video_name))
+        self._execute_query(SQL_FINALIZAR, (json.dumps(resultado), frame_final, video_name))
+        self._registrar_fim(video_name, resultado, frame_final)
+
+    async def finalizar_async(self, video_name: str, resultado: dict):
+        frame_final = self._frame_final(await self.status_async(video_name))
+        await self._execute_query_async(SQL_FINALIZAR, (json.dumps(resultado), frame_final, video_name))
+        self._registrar_fim(video_name, resultado, frame_final)
+
+    @staticmethod
+    def _frame_final(status: Optional[Dict[str, Any]]) -> int:
+        return status.get("total_frames_estimado", status.get("frame_atual", 0)) if status else 0
+
+    def _registrar_fim(self, video_name: str, resultado: dict, frame_final: int):
+        self._publicar(video_name, imediato=True, final=dict(finalizado=True, resultado=resultado, erro=None,
+                                                              tempo_restante="00:00:00", frame_atual=frame_final))
+        self._soltar_local(video_name)
         print(f"[DB Progresso] Finalizado com sucesso para: {video_name}")
 
     def erro(self, video_name: str, mensagem: str):
         """Marca o processamento como finalizado com erro no banco de dados."""
-        query = "UPDATE video_progress SET finalizado = TRUE, erro = %s, tempo_restante = 'Erro', last_updated = NOW() WHERE video_name = %s;"
         if not self.status(video_name).get("erro"): self.iniciar(video_name) # Garante que a linha exista antes de atualizar
-        params = (mensagem, video_name)
-        self._execute_query(query, params)
+        self._execute_query(SQL_ERRO, (mensagem, video_name))
+        self._registrar_erro(video_name, mensagem)
+
+    async def erro_async(self, video_name: str, mensagem: str):
+        if not (await self.status_async(video_name)).get("erro"): await self.iniciar_async(video_name)
+        await self._execute_query_async(SQL_ERRO, (mensagem, video_name))
+        self._registrar_erro(video_name, mensagem)
+
+    def _registrar_erro(self, video_name: str, mensagem: str):
+        self._publicar(video_name, imediato=True, final=dict(finalizado=True, erro=mensagem, tempo_restante="Erro"))
+        self._soltar_local(video_name)
         print(f"[DB Progresso] Erro registrado para: {video_name}")
 
+    def atualizar_transferencia(self, tarefa: Dict[str, Any]):
+        """Registra o estado de uma tarefa da fila de transferências (upload/remoção SFTP) do vídeo."""
+        video_name = tarefa.get("video_name")
+        if not video_name: return
+        with self._lock:
+            self._transferencias.setdefault(video_name, {})[tarefa["id"]] = dict(tarefa)
+            self._transferencias.move_to_end(video_name)
+            while len(self._transferencias) > PROGRESSO_TRANSFERENCIAS_MAX_VIDEOS:
+                self._transferencias.popitem(last=False)
+        self._publicar(video_name, imediato=tarefa.get("estado") not in ("executando",))
+
+    # --- Streams de progresso ---
+    def _publicar(self, video_name: str, imediato: bool = False, final: Optional[Dict[str, Any]] = None):
+        """
+        Repassa o estado do job aos ouvintes do stream, se houver. O estado vem da memória (job local)
+        ou do último estado publicado; nunca do banco. `final` sobrepõe os campos do estado final.
+        """
+        if not self.difusor.tem_ouvintes(video_name):
+            return
+        with self._lock:
+            local = self._locais.get(video_name)
+            estado = dict(local) if local is not None else None
+            transferencias = [dict(t) for t in self._transferencias.get(video_name, {}).values()]
+        if estado is None:
+            estado = self.difusor.ultimo_estado(video_name) or {"video_name": video_name}
+        if final: estado.update(final)
+        if transferencias: estado["transferencias"] = transferencias
+        self.difusor.publicar(video_name, estado, imediato)
+
+    def acompanhar(self, video_name: str) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Stream assíncrono do estado do job até o fim (None = heartbeat); ver DifusorProgresso.assinar."""
+        return self.difusor.assinar(video_name, lambda: self.status_async(video_name), lambda: video_name in self._locais)
+
     def status(self, video_name: str) -> Dict[str, Any]:
-        """Retorna o status atual de um vídeo do banco de dados."""
-        query = "SELECT video_name, frame_atual, total_frames_estimado, tempo_inicio, tempo_restante, finalizado, resultado, erro, cancelado FROM video_progress WHERE video_name = %s;"
-        result = self._execute_query(query, (video_name,), fetch='one')
+        """Retorna o status atual de um vídeo: da memória para jobs locais, do banco de dados para os demais."""
+        status = self._status_local(video_name)
+        if status is None:
+            status = self._status_da_linha(video_name, self._execute_query(SQL_STATUS, (video_name,), fetch='one'))
+        return self._com_transferencias(video_name, status)
+
+    async def status_async(self, video_name: str) -> Dict[str, Any]:
+        """status() para as rotas async: jobs locais sem I/O; os demais aguardam o banco sem bloquear o event loop."""
+        status = self._status_local(video_name)
+        if status is None:
+            status = self._status_da_linha(video_name, await self._execute_query_async(SQL_STATUS, (video_name,), fetch='one'))
+        return self._com_transferencias(video_name, status)
+
+    def _status_local(self, video_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            estado = self._locais.get(video_name)
+            return dict(estado) if estado is not None else None
+
+    @staticmethod
+    def _status_da_linha(video_name: str, result: Optional[tuple]) -> Dict[str, Any]:
         if result:
             keys = ["video_name", "frame_atual", "total_frames_estimado", "tempo_inicio", "tempo_restante", "finalizado", "resultado", "erro", "cancelado"]
             return dict(zip(keys, result))
         return {"erro": f"Processamento para '{video_name}' não encontrado.", "finalizado": True, "video_name": video_name}
 
+    def _com_transferencias(self, video_name: str, status: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            transferencias = [dict(t) for t in self._transferencias.get(video_name, {}).values()]
+        if transferencias:
+            status["transferencias"] = transferencias
+        return status
+
     def cancelar(self, video_name: str) -> bool:
-        """Sinaliza no banco de dados que o processamento deve ser cancelado."""
+        """Sinaliza o cancelamento: evento local imediato, banco de dados e NOTIFY para workers de outros processos."""
         status = self.status(video_name)
         if status and not status.get("finalizado"):
-            query = "UPDATE video_progress SET cancelado = TRUE, finalizado = TRUE, erro = 'Cancelado pelo usuário.', tempo_restante = 'Cancelado', last_updated = NOW() WHERE video_name = %s;"
-            self._execute_query(query, (video_name,))
+            # O job local enxerga o cancelamento na hora, pelo evento, sem ir ao banco.
+            self._marcar_cancelado(video_name)
+            self._execute_query(SQL_CANCELAR, (video_name, CANAL_CANCELAMENTO, video_name))
+            print(f"[DB Progresso] Cancelamento registrado para: {video_name}")
+            return True
+        return False
+
+    async def cancelar_async(self, video_name: str) -> bool:
+        status = await self.status_async(video_name)
+        if status and not status.get("finalizado"):
+            self._marcar_cancelado(video_name)
+            await self._execute_query_async(SQL_CANCELAR, (video_name, CANAL_CANCELAMENTO, video_name))
             print(f"[DB Progresso] Cancelamento registrado para: {video_name}")
             return True
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+# Modelos aquecidos em segundo plano depois que a API já aceita conexões (ex.: "l" ou "n,l"; vazio = nenhum).
+MODELOS_AQUECER = os.getenv("MODELOS_AQUECER", "l")
+# Backoff das tentativas de preparar o banco na subida: dobra a cada falha, até o máximo, sem desistir.
+DB_PREPARO_ESPERA_INICIAL_S = float(os.getenv("DB_PREPARO_ESPERA_INICIAL_S", "1"))
+DB_PREPARO_ESPERA_MAX_S = float(os.getenv("DB_PREPARO_ESPERA_MAX_S", "30"))
+# Backend de processos: tempo máximo esperando os workers pré-carregarem os modelos.
+WORKERS_AQUECER_TIMEOUT_S = float(os.getenv("WORKERS_AQUECER_TIMEOUT_S", "600"))
+
+
+class Prontidao:
+    """
+    Estado dos componentes que a instância precisa antes de receber jobs (banco e modelos), para o /ready.
+    O / continua sendo só o liveness: responde assim que o servidor sobe.
+    """
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self._componentes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def marcar(self, nome: str, pronto: bool, detalhe: str = ""):
+        with self._lock:
+            self._componentes[nome] = {"pronto": pronto, "detalhe": detalhe,
+                                       "atualizado_em_s": round(time.monotonic() - self.inicio, 2)}
+
+    def situacao(self) -> Dict[str, Any]:
+        with self._lock:
+            componentes = {nome: dict(c) for nome, c in self._componentes.items()}
+        return {"pronto": bool(componentes) and all(c["pronto"] for c in componentes.values()), "componentes": componentes}
+
+
+# Instância única do processo (lida pelo /ready).
+prontidao = Prontidao()
+
+
+async def preparar_banco_com_backoff() -> bool:
+    """Prepara o banco (pool + tabelas) em segundo plano, repetindo com backoff exponencial até conseguir."""
+    from utils import gerenciador_progresso
+    if gerenciador_progresso.banco is None:
+        prontidao.marcar("banco", True, "não configurado (sem DATABASE_URL ou driver)")
+        return False
+    espera = DB_PREPARO_ESPERA_INICIAL_S
+    prontidao.marcar("banco", False, "conectando")
+    tentativa = 0
+    while True:
+        tentativa += 1
+        if await gerenciador_progresso.preparar_banco():
+            prontidao.marcar("banco", True, f"tabelas verificadas (tentativa {tentativa})")
+            return True
+        prontidao.marcar("banco", False, f"tentativa {tentativa} falhou; nova tentativa em {espera:.1f}s")
+        print(f"[INICIO] Banco indisponível (tentativa {tentativa}); nova tentativa em {espera:.1f}s.")
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, DB_PREPARO_ESPERA_MAX_S)
+
+
+def aquecer_modelos(modelos: Optional[str] = None):
+    """
+    Carrega e aquece os modelos no backend configurado (roda em uma thread, depois que a API já escuta).
+    É aqui, e não no import das rotas, que torch/ultralytics entram no processo da API.
+    """
+    escolhas = [c.strip() for c in (MODELOS_AQUECER if modelos is None else modelos).split(",") if c.strip()]
+    from utils.executor_processos import EXECUTOR_BACKEND
+    inicio = time.time()
+    prontidao.marcar("modelos", False, f"aquecendo {', '.join(escolhas) or 'nenhum'}")
+    try:
+        if EXECUTOR_BACKEND == "processo":
+            # Cada worker importa torch e pré-carrega WORKER_MODELOS_PRECARREGAR ao subir.
+            from utils.executor_processos import obter_pool
+            if not obter_pool().aguardar_prontos(WORKERS_AQUECER_TIMEOUT_S):
+                raise TimeoutError(f"workers não ficaram prontos em {WORKERS_AQUECER_TIMEOUT_S:.0f}s")
+        else:
+            from utils.modelos import registro_modelos
+            for choice in escolhas:
+                registro_modelos.obter(choice)
+    except Exception as e:
+        prontidao.marcar("modelos", False, f"falha ao aquecer: {e}")
+        print(f"[INICIO ERRO] Falha ao aquecer os modelos: {e}")
+        return
+    prontidao.marcar("modelos", True, f"{', '.join(escolhas) or 'nenhum'} em {time.time() - inicio:.1f}s")
+    print(f"[INICIO] Modelos prontos em {time.time() - inicio:.1f}s ({EXECUTOR_BACKEND}).")
+
+
+def iniciar_aquecimento() -> threading.Thread:
+    thread = threading.Thread(target=aquecer_modelos, name="aquecer-modelos", daemon=True)
+    thread.start()
+    return thread
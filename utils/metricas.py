@@ -0,0 +1,276 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator, Sequence
+
+# Limites (segundos) dos baldes dos histogramas de latência; o balde +Inf é implícito.
+BALDES_SEGUNDOS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Baldes da duração total de um job (segundos).
+BALDES_JOB_SEGUNDOS: Tuple[float, ...] = (5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# Estágios do caminho de um frame em contar_gado_em_video.
+ESTAGIOS: Tuple[str, ...] = ("decodificacao", "inferencia", "rastreamento", "contagem", "desenho", "codificacao", "progresso")
+
+PREFIXO = "kyoday_"
+
+
+class Histograma:
+    """Histograma de baldes fixos (contagens não cumulativas por balde, como no Prometheus antes de acumular)."""
+
+    def __init__(self, limites: Sequence[float] = BALDES_SEGUNDOS):
+        self.limites = tuple(limites)
+        self.baldes = [0] * (len(self.limites) + 1)
+        self.soma = 0.0
+        self.n = 0
+        self.maximo = 0.0
+
+    def observar(self, valor: float):
+        i = 0
+        while i < len(self.limites) and valor > self.limites[i]: i += 1
+        self.baldes[i] += 1
+        self.soma += valor
+        self.n += 1
+        if valor > self.maximo: self.maximo = valor
+
+    def somar(self, baldes: Sequence[int], soma: float, maximo: float = 0.0):
+        """Acumula as contagens de outro histograma com os mesmos limites (ex.: de um job em outro processo)."""
+        if len(baldes) != len(self.baldes):
+            raise ValueError("Histogramas com limites diferentes.")
+        for i, c in enumerate(baldes): self.baldes[i] += int(c)
+        self.soma += soma
+        self.n += sum(int(c) for c in baldes)
+        self.maximo = max(self.maximo, maximo)
+
+    def quantil(self, q: float) -> Optional[float]:
+        """Estimativa do quantil por interpolação linear dentro do balde (mesma regra do histogram_quantile)."""
+        if self.n == 0: return None
+        alvo = q * self.n
+        acumulado = 0
+        for i, c in enumerate(self.baldes):
+            if acumulado + c >= alvo and c > 0:
+                if i == len(self.limites): return self.maximo  # Balde +Inf: o máximo observado é o melhor palpite
+                inferior = self.limites[i - 1] if i > 0 else 0.0
+                return min(self.maximo, inferior + (self.limites[i] - inferior) * (alvo - acumulado) / c)
+            acumulado += c
+        return self.maximo
+
+
+class TemposJob:
+    """
+    Tempo gasto por um job em cada estágio, por frame (inferência e rastreamento: por chamada, que em lote
+    cobre vários frames). Cada estágio é alimentado por uma única thread (decoder, encoder ou o laço
+    principal), então não há lock. O resumo vai no resultado da contagem e é somado às métricas do processo da API.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.histogramas: Dict[str, Histograma] = {e: Histograma() for e in ESTAGIOS}
+        self.frames = 0
+
+    def registrar(self, estagio: str, segundos: float):
+        self.histogramas[estagio].observar(segundos)
+
+    @contextmanager
+    def medir(self, estagio: str) -> Iterator[None]:
+        inicio = time.perf_counter()
+        try: yield
+        finally: self.histogramas[estagio].observar(time.perf_counter() - inicio)
+
+    def como_dict(self) -> Dict[str, Any]:
+        total = time.perf_counter() - self.inicio
+        estagios = {}
+        for estagio, h in self.histogramas.items():
+            if h.n == 0: continue
+            estagios[estagio] = {
+                "n": h.n, "total_s": round(h.soma, 3), "media_ms": round(1000 * h.soma / h.n, 3),
+                **{f"p{int(q * 100)}_ms": round(1000 * h.quantil(q), 3) for q in (0.5, 0.9, 0.99)},
+                "max_ms": round(1000 * h.maximo, 3), "fracao_do_total": round(h.soma / total, 3) if total > 0 else None,
+                "baldes": list(h.baldes),
+            }
+        return {"total_s": round(total, 3), "frames": self.frames,
+                "fps": round(self.frames / total, 2) if total > 0 else None, "estagios": estagios}
+
+
+# ---------------------------------------------------------------------------
+# Registro do processo e exposição no formato texto do Prometheus
+# ---------------------------------------------------------------------------
+def _rotulos(nomes: Sequence[str], valores: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra: pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor: float) -> str:
+    if math.isinf(valor): return "+Inf" if valor > 0 else "-Inf"
+    if math.isnan(valor): return "NaN"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class _Familia:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str], lock: threading.Lock):
+        self.nome = PREFIXO + nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = lock
+
+    def _chave(self, rotulos: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"Métrica {self.nome} espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}.")
+        return tuple(str(rotulos[n]) for n in self.rotulos)
+
+    def _cabecalho(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Contador(_Familia):
+    tipo = "counter"
+
+    def __init__(self, *args: Any):
+        super().__init__(*args)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, valor: float = 1.0, **rotulos: Any):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def valor(self, **rotulos: Any) -> float:
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0.0)
+
+    def exportar(self) -> List[str]:
+        linhas = self._cabecalho()
+        for chave, v in sorted(self._valores.items()):
+            linhas.append(f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(v)}")
+        return linhas
+
+
+class HistogramaMetrica(_Familia):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str], lock: threading.Lock, limites: Sequence[float]):
+        super().__init__(nome, ajuda, rotulos, lock)
+        self.limites = tuple(limites)
+        self._series: Dict[Tuple[str, ...], Histograma] = {}
+
+    def _serie(self, rotulos: Dict[str, Any]) -> Histograma:
+        chave = self._chave(rotulos)
+        if chave not in self._series: self._series[chave] = Histograma(self.limites)
+        return self._series[chave]
+
+    def observar(self, valor: float, **rotulos: Any):
+        with self._lock:
+            self._serie(rotulos).observar(valor)
+
+    def somar(self, baldes: Sequence[int], soma: float, maximo: float = 0.0, **rotulos: Any):
+        with self._lock:
+            self._serie(rotulos).somar(baldes, soma, maximo)
+
+    @contextmanager
+    def medir(self, **rotulos: Any) -> Iterator[None]:
+        inicio = time.perf_counter()
+        try: yield
+        finally: self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def exportar(self) -> List[str]:
+        linhas = self._cabecalho()
+        for chave, h in sorted(self._series.items()):
+            acumulado = 0
+            for limite, c in zip(self.limites + (math.inf,), h.baldes):
+                acumulado += c
+                le = 'le="' + _numero(limite) + '"'
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(h.soma)}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {h.n}")
+        return linhas
+
+
+class Medidor(_Familia):
+    """Gauge lido na hora da coleta: `funcao()` devolve um número ou {valores dos rótulos: número}."""
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str], lock: threading.Lock, funcao: Callable[[], Any]):
+        super().__init__(nome, ajuda, rotulos, lock)
+        self.funcao = funcao
+
+    def exportar(self) -> List[str]:
+        try:
+            valores = self.funcao()
+        except Exception as e:
+            print(f"[METRICAS ERRO] Falha ao coletar {self.nome}: {e}")
+            return []
+        if valores is None: return []
+        if not isinstance(valores, dict): valores = {(): valores}
+        linhas = self._cabecalho()
+        for chave, v in sorted(valores.items(), key=lambda kv: str(kv[0])):
+            chave = chave if isinstance(chave, tuple) else (chave,)
+            linhas.append(f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(v)}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Métricas do processo. Cada módulo registra as suas na importação; o /metrics chama exportar()."""
+
+    def __init__(self):
+        self._familias: Dict[str, _Familia] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, familia: _Familia) -> Any:
+        with self._lock:
+            existente = self._familias.get(familia.nome)
+            if existente is not None:
+                if type(existente) is not type(familia): raise ValueError(f"Métrica {familia.nome} já registrada com outro tipo.")
+                if isinstance(familia, Medidor): existente.funcao = familia.funcao  # Reimportação: fica a coleta nova
+                return existente
+            self._familias[familia.nome] = familia
+            return familia
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos, self._lock))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), limites: Sequence[float] = BALDES_SEGUNDOS) -> HistogramaMetrica:
+        return self._registrar(HistogramaMetrica(nome, ajuda, rotulos, self._lock, limites))
+
+    def medidor(self, nome: str, ajuda: str, funcao: Callable[[], Any], rotulos: Sequence[str] = ()) -> Medidor:
+        return self._registrar(Medidor(nome, ajuda, rotulos, self._lock, funcao))
+
+    def exportar(self) -> str:
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        with self._lock:
+            familias = list(self._familias.values())
+        linhas: List[str] = []
+        for familia in familias:
+            if isinstance(familia, Medidor):
+                linhas += familia.exportar()  # Coleta fora do lock: a função pode consultar outros locks
+            else:
+                with self._lock: linhas += familia.exportar()
+        return "\n".join(linhas) + "\n"
+
+
+# Instância única do processo.
+metricas = RegistroMetricas()
+
+jobs_total = metricas.contador("jobs_total", "Jobs de contagem por evento (enfileirado, recusado, concluido, interrompido, falhou, cache).", ("evento",))
+frames_total = metricas.contador("frames_processados_total", "Frames processados pelos jobs de contagem concluídos.")
+job_duracao = metricas.histograma("job_duracao_segundos", "Duração dos jobs de contagem.", limites=BALDES_JOB_SEGUNDOS)
+estagio_segundos = metricas.histograma("estagio_segundos", "Tempo por frame (ou por chamada) em cada estágio da contagem.", ("estagio",))
+_ultimo_fps: Dict[str, float] = {}
+metricas.medidor("ultimo_job_fps", "Frames por segundo do último job concluído.", lambda: _ultimo_fps.get("fps"))
+
+
+def registrar_tempos_job(tempos: Optional[Dict[str, Any]]):
+    """Soma o resumo de um job (TemposJob.como_dict(), possivelmente vindo de outro processo) às métricas."""
+    if not tempos: return
+    frames_total.inc(tempos.get("frames", 0))
+    job_duracao.observar(tempos.get("total_s", 0.0))
+    if tempos.get("fps") is not None: _ultimo_fps["fps"] = tempos["fps"]
+    for estagio, info in (tempos.get("estagios") or {}).items():
+        try: estagio_segundos.somar(info["baldes"], info["total_s"], info["max_ms"] / 1000.0, estagio=estagio)
+        except (KeyError, ValueError) as e: print(f"[METRICAS AVISO] Tempos do estágio '{estagio}' ignorados: {e}")
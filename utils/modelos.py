@@ -0,0 +1,327 @@
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple, Callable
+
+import numpy as np
+from ultralytics import YOLO
+
+from utils.backends_inferencia import exportacoes, candidatos
+from utils.quantizacao import separar_variante, preparar_calibracao
+from utils.metricas import TemposJob
+from utils.rastreadores import criar_rastreador
+
+# --- Arquivos de pesos por escolha de modelo (cada um aceita também a variante "<escolha>-int8") ---
+MODEL_FILES: Dict[str, str] = {"n": "yolov8n.pt", "m": "yolov8m.pt", "l": "yolov8l.pt", "p": "best.pt"}
+MODELO_PADRAO: str = "l"
+
+# Orçamento de memória para os pesos carregados (0 = sem limite).
+MODELOS_MEMORIA_MAX_MB = float(os.getenv("MODELOS_MEMORIA_MAX_MB", "0"))
+
+
+def _estimar_tamanho_bytes(model: Any) -> int:
+    """Estima a memória ocupada pelos pesos (parâmetros + buffers) de um modelo YOLO."""
+    try:
+        rede = model.model
+        total = sum(p.numel() * p.element_size() for p in rede.parameters())
+        total += sum(b.numel() * b.element_size() for b in rede.buffers())
+        return int(total)
+    except Exception:
+        return 0
+
+
+def _tamanho_em_disco(caminho: Optional[str]) -> int:
+    """Tamanho do modelo exportado (arquivo .onnx ou diretório do OpenVINO), quando não há pesos do torch."""
+    if not caminho or not os.path.exists(caminho):
+        return 0
+    if os.path.isfile(caminho):
+        return os.path.getsize(caminho)
+    return sum(os.path.getsize(os.path.join(raiz, f)) for raiz, _, arquivos in os.walk(caminho) for f in arquivos)
+
+
+class ModeloCompartilhado:
+    """Um modelo YOLO carregado uma única vez e compartilhado entre os jobs do processo."""
+
+    def __init__(self, model_choice: str, model: Any, backend: str = "pytorch", origem: Optional[str] = None,
+                 precisao: str = "fp32"):
+        self.model_choice = model_choice
+        self.model = model
+        self.backend = backend  # pytorch, onnx ou openvino (o que de fato foi carregado)
+        self.precisao = precisao  # fp32 ou int8
+        self.names = model.names
+        self.tamanho_bytes = _estimar_tamanho_bytes(model) or _tamanho_em_disco(origem)
+        self.ultimo_uso = time.time()
+        # Sessões vivas: enquanto algum job usa o modelo ele não é despejado do registro.
+        self.sessoes: "weakref.WeakSet[SessaoRastreamento]" = weakref.WeakSet()
+        # O predictor do ultralytics não é thread-safe: uma inferência por vez por instância.
+        self.lock = threading.Lock()
+
+    def aquecer(self, imgsz: int = 640):
+        """Roda uma inferência com um frame vazio para inicializar o predictor antes do primeiro job."""
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        with self.lock:
+            self.model.predict(dummy, verbose=False)
+
+    def predict(self, frames: Any, **kwargs) -> List[Any]:
+        """Inferência sem estado (sem rastreamento), serializada pelo lock do modelo."""
+        with self.lock:
+            return self.model.predict(frames, verbose=False, **kwargs)
+
+    def nova_sessao(self, rastreador: Optional[Dict[str, Any]] = None, frame_rate: int = 30,
+                    tempos: Optional[TemposJob] = None) -> "SessaoRastreamento":
+        """
+        Cria um estado de rastreamento exclusivo para um job, sem recarregar os pesos.
+        `rastreador`: tipo, perfil de câmera e parâmetros (ver utils/rastreadores.py); None = RASTREADOR_PADRAO.
+        """
+        sessao = SessaoRastreamento(self, rastreador, frame_rate, tempos)
+        self.sessoes.add(sessao)
+        self.ultimo_uso = time.time()
+        return sessao
+
+    @property
+    def em_uso(self) -> int:
+        return len(self.sessoes)
+
+
+class SessaoRastreamento:
+    """
+    Estado de rastreamento de um job, sobre um modelo compartilhado.
+    Equivale a model.track(persist=True), mas o tracker pertence ao job e não ao modelo,
+    então vários jobs podem usar os mesmos pesos sem misturar IDs.
+    """
+
+    def __init__(self, modelo: ModeloCompartilhado, rastreador: Optional[Dict[str, Any]] = None, frame_rate: int = 30,
+                 tempos: Optional[TemposJob] = None):
+        self.modelo = modelo
+        self.tempos = tempos  # Tempo de inferência (inclui a espera pelo lock do modelo) e de rastreamento do job
+        self.names = modelo.names
+        self.tracker = criar_rastreador(rastreador, frame_rate)
+        # Retângulos (x1, y1, x2, y2) enviados ao detector no modo ROI; None = frame inteiro.
+        self.roi: Optional[List[Tuple[int, int, int, int]]] = None
+
+    def definir_roi(self, retangulos: Optional[List[Tuple[int, int, int, int]]]):
+        """Restringe a detecção aos retângulos dados (ver utils/regiao_interesse.py)."""
+        self.roi = list(retangulos) if retangulos else None
+
+    def _detectar(self, frames: List[np.ndarray], conf: float) -> List[Any]:
+        if self.tempos is None:
+            return self._inferir(frames, conf)
+        with self.tempos.medir("inferencia"):
+            return self._inferir(frames, conf)
+
+    def _inferir(self, frames: List[np.ndarray], conf: float) -> List[Any]:
+        if self.roi:
+            from utils.regiao_interesse import detectar_em_roi
+            return detectar_em_roi(self.modelo, frames, self.roi, conf=conf)
+        return self.modelo.predict(frames if len(frames) > 1 else frames[0], conf=conf)
+
+    def _aplicar_tracker(self, result: Any) -> Any:
+        """Atualiza o tracker com as detecções de um frame e devolve o Results com os IDs (como no ultralytics)."""
+        if self.tempos is None:
+            return self._atualizar_tracker(result)
+        with self.tempos.medir("rastreamento"):
+            return self._atualizar_tracker(result)
+
+    def _atualizar_tracker(self, result: Any) -> Any:
+        import torch
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, result.orig_img)
+        if len(tracks) == 0:
+            return result[:0]
+        idx = tracks[:, -1].astype(int)
+        result = result[idx]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return result
+
+    def track(self, frame: np.ndarray, conf: float = 0.3) -> List[Any]:
+        """Detecta e rastreia um frame; mesmo contrato de retorno de model.track()."""
+        results = self._detectar([frame], conf)
+        return [self._aplicar_tracker(results[0])]
+
+    def track_lote(self, frames: List[np.ndarray], conf: float = 0.3) -> List[Any]:
+        """
+        Detecta N frames com um único predict e alimenta o tracker na ordem dos frames.
+        Como o tracker vê exatamente a mesma sequência de detecções, IDs e contagens batem com track().
+        """
+        if not frames:
+            return []
+        results = self._detectar(frames, conf)
+        return [self._aplicar_tracker(r) for r in results]
+
+    def rastrear_stream(self, frames: Iterable[Tuple[int, np.ndarray]], conf: float = 0.3,
+                        batch_size: int = 1,
+                        deve_inferir: Optional[Callable[[int, np.ndarray], bool]] = None) -> Iterator[Tuple[int, np.ndarray, Optional[List[Any]]]]:
+        """
+        Consome (índice, frame) e produz (índice, frame, results), inferindo em lotes de batch_size frames.
+        Se deve_inferir recusar um frame, ele sai com results=None, sem passar pelo modelo nem pelo tracker
+        (o lote pendente é inferido antes para manter a ordem).
+        """
+        batch_size = max(1, int(batch_size))
+        lote: List[Tuple[int, np.ndarray]] = []
+        for item in frames:
+            if deve_inferir is not None and not deve_inferir(item[0], item[1]):
+                if lote:
+                    yield from self._rastrear_lote(lote, conf)
+                    lote = []
+                yield item[0], item[1], None
+                continue
+            lote.append(item)
+            if len(lote) < batch_size:
+                continue
+            yield from self._rastrear_lote(lote, conf)
+            lote = []
+        if lote:
+            yield from self._rastrear_lote(lote, conf)
+
+    def _rastrear_lote(self, lote: List[Tuple[int, np.ndarray]], conf: float) -> Iterator[Tuple[int, np.ndarray, List[Any]]]:
+        if len(lote) == 1:
+            resultados = self.track(lote[0][1], conf=conf)
+        else:
+            resultados = self.track_lote([frame for _, frame in lote], conf=conf)
+        for (idx, frame), result in zip(lote, resultados):
+            yield idx, frame, [result]
+
+
+class RegistroModelos:
+    """
+    Registro de modelos YOLO do processo, indexado por model_choice.
+    Carrega cada modelo uma única vez, pré-aquece e mantém um orçamento de memória
+    com despejo LRU das variantes menos usadas (modelos em uso nunca são despejados).
+    """
+
+    def __init__(self, memoria_max_mb: float = MODELOS_MEMORIA_MAX_MB, model_files: Optional[Dict[str, str]] = None):
+        self.memoria_max_bytes = int(memoria_max_mb * 1024 * 1024)
+        self.model_files = dict(model_files or MODEL_FILES)
+        self._modelos: "OrderedDict[str, ModeloCompartilhado]" = OrderedDict()
+        self._carregando: Dict[str, threading.Lock] = {}
+        self._registrados: set = set()  # Escolhas injetadas com registrar(): valem para qualquer backend
+        # Variantes INT8 já resolvidas: (escolha, backend pedido) -> argumentos de _obter_chave.
+        self._int8_resolvidos: Dict[Tuple[str, Optional[str]], Tuple[str, str, Optional[str], Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _carregar(self, choice: str, backend: str, calibracao: Optional[str] = None) -> ModeloCompartilhado:
+        """
+        Carrega no primeiro backend que funcionar (exporta se preciso); o PyTorch é o último recurso.
+        Com `calibracao`, carrega a variante INT8 (o PyTorch, se chegar a ele, roda em fp32).
+        """
+        caminho = self.model_files.get(separar_variante(choice)[0], self.model_files[MODELO_PADRAO])
+        for candidato in candidatos(backend, int8=bool(calibracao)):
+            inicio = time.time()
+            origem = caminho if candidato == "pytorch" else exportacoes.obter(caminho, candidato, calibracao)
+            if origem is None:
+                continue
+            precisao = "int8" if calibracao and candidato != "pytorch" else "fp32"
+            try:
+                modelo = ModeloCompartilhado(choice, YOLO(origem, task="detect"), candidato, origem, precisao)
+                modelo.aquecer(exportacoes.imgsz)
+            except Exception as e:
+                if candidato == "pytorch": raise
+                exportacoes.registrar_falha(origem, e)
+                continue
+            if calibracao and precisao == "fp32":
+                print(f"[MODELOS ERRO] Variante INT8 de '{caminho}' indisponível; '{choice}' roda em fp32.")
+            print(f"[MODELOS] '{caminho}' ({candidato}, {precisao}) carregado e aquecido em {time.time() - inicio:.1f}s ({modelo.tamanho_bytes / 1e6:.0f} MB).")
+            return modelo
+        raise RuntimeError(f"Nenhum backend disponível para '{caminho}'.")
+
+    def registrar(self, model_choice: str, model: Any) -> ModeloCompartilhado:
+        """Registra um modelo já instanciado (útil para testes e backends alternativos)."""
+        choice = str(model_choice).lower()  # Mesma normalização do obter()
+        modelo = ModeloCompartilhado(choice, model)
+        with self._lock:
+            self._modelos[choice] = modelo
+            self._modelos.move_to_end(choice)
+            self._registrados.add(choice)
+        return modelo
+
+    def obter(self, model_choice: Optional[str], backend: Optional[str] = None) -> ModeloCompartilhado:
+        """
+        Retorna o modelo compartilhado, carregando-o na primeira vez. `backend` (auto, pytorch, onnx,
+        openvino; padrão MODELOS_BACKEND) entra na chave: o mesmo modelo pode estar carregado em dois backends.
+        Modelos registrados com registrar() ignoram o backend.
+
+        "<escolha>-int8" (ex.: "l-int8", "p-int8") pede a variante quantizada, calibrada nas filmagens de
+        MODELOS_INT8_CALIBRACAO_DIR. Sem filmagens ou sem backend que quantize, usa o modelo fp32.
+        """
+        choice = str(model_choice or MODELO_PADRAO).lower()
+        with self._lock:
+            registrado = choice in self._registrados
+        if registrado:
+            return self._obter_chave(choice, choice, None)
+        base, int8 = separar_variante(choice)
+        if base not in self.model_files and choice not in self._modelos:
+            choice, base, int8 = MODELO_PADRAO, MODELO_PADRAO, False
+        if int8:
+            # Variante já carregada: não varre de novo a pasta de filmagens a cada job.
+            with self._lock:
+                resolvido = self._int8_resolvidos.get((choice, backend))
+                carregado = resolvido is not None and resolvido[0] in self._modelos
+            if carregado:
+                return self._obter_chave(*resolvido)
+        pedido, chave, calibracao = (choice, backend), choice, None
+        if base in self.model_files:
+            calibracao = preparar_calibracao() if int8 else None
+            # "auto" e o backend explícito equivalente compartilham a mesma instância.
+            backend = candidatos(backend, int8=bool(calibracao))[0]
+            if backend == "pytorch" or not calibracao:
+                choice, calibracao = base, None  # Sem INT8 possível: a variante é o próprio modelo fp32
+            chave = choice if backend == "pytorch" else f"{choice}@{backend}"
+        if int8:
+            with self._lock:
+                self._int8_resolvidos[pedido] = (chave, choice, backend, calibracao)
+        return self._obter_chave(chave, choice, backend, calibracao)
+
+    def _obter_chave(self, chave: str, choice: str, backend: Optional[str], calibracao: Optional[str] = None) -> ModeloCompartilhado:
+        with self._lock:
+            modelo = self._modelos.get(chave)
+            if modelo is None:
+                carregando = self._carregando.setdefault(chave, threading.Lock())
+        if modelo is None:
+            # Um lock por variante: dois jobs pedindo o mesmo modelo não carregam os pesos duas vezes.
+            with carregando:
+                with self._lock:
+                    modelo = self._modelos.get(chave)
+                if modelo is None:
+                    try:
+                        modelo = self._carregar(choice, backend, calibracao)
+                    finally:
+                        with self._lock:
+                            if modelo is not None: self._modelos[chave] = modelo
+                            # O lock só serve durante a carga; quem já o pegou ainda o usa até conferir o modelo.
+                            self._carregando.pop(chave, None)
+        with self._lock:
+            modelo.ultimo_uso = time.time()
+            self._modelos.move_to_end(chave)
+            self._despejar(manter=chave)
+        return modelo
+
+    def _despejar(self, manter: Optional[str] = None):
+        """
+        Remove modelos ociosos, do menos para o mais recentemente usado, até caber no orçamento. Chamar com _lock.
+        Um modelo despejado continua válido para quem ainda tem referência; os pesos são liberados com o último job.
+        Modelos injetados com registrar() nunca saem: não há de onde recarregá-los.
+        """
+        if self.memoria_max_bytes <= 0:
+            return
+        total = sum(m.tamanho_bytes for m in self._modelos.values())
+        for choice in list(self._modelos.keys()):
+            if total <= self.memoria_max_bytes:
+                break
+            modelo = self._modelos[choice]
+            if choice == manter or modelo.em_uso > 0 or choice in self._registrados:
+                continue
+            del self._modelos[choice]
+            total -= modelo.tamanho_bytes
+            print(f"[MODELOS] Modelo '{choice}' despejado do cache (orçamento de {self.memoria_max_bytes / 1e6:.0f} MB).")
+
+    def carregados(self) -> Dict[str, Dict[str, Any]]:
+        """Resumo dos modelos em memória, do menos para o mais recentemente usado."""
+        with self._lock:
+            return {c: {"tamanho_mb": round(m.tamanho_bytes / 1e6, 1), "backend": m.backend, "precisao": m.precisao, "em_uso": m.em_uso, "ultimo_uso": m.ultimo_uso}
+                    for c, m in self._modelos.items()}
+
+
+# Instância única do processo, compartilhada por todos os jobs.
+registro_modelos = RegistroModelos()
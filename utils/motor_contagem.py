@@ -0,0 +1,205 @@
+from collections import defaultdict
+from typing import Optional, Dict, Any, List, Tuple, Sequence
+
+import numpy as np
+
+# Sentidos de cruzamento, relativos a quem caminha de p1 para p2 sobre a linha
+# (em coordenadas de imagem, com y para baixo, o lado "direito" é o de produto vetorial positivo).
+SENTIDO_ESQ_DIR: str = "esquerda_direita"
+SENTIDO_DIR_ESQ: str = "direita_esquerda"
+SENTIDO_AMBOS: str = "ambos"
+_CODIGO_SENTIDO = {SENTIDO_ESQ_DIR: 1, SENTIDO_DIR_ESQ: -1, SENTIDO_AMBOS: 0}
+
+
+class LinhaContagem:
+    """
+    Uma linha de contagem. Um track conta (uma vez por linha) quando o centro passa de um lado para o outro
+    no sentido configurado. `movimento` exige também o sinal do deslocamento em x/y (ex.: (1, 1) = indo para
+    baixo e para a direita); `segmento=False` trata a linha como infinita.
+    """
+
+    def __init__(self, nome: str, p1: Tuple[float, float], p2: Tuple[float, float], sentido: str = SENTIDO_AMBOS,
+                 movimento: Tuple[int, int] = (0, 0), segmento: bool = True):
+        if sentido not in _CODIGO_SENTIDO:
+            raise ValueError(f"Sentido '{sentido}' inválido para a linha '{nome}'. Use {list(_CODIGO_SENTIDO)}.")
+        self.nome = nome
+        self.p1 = (float(p1[0]), float(p1[1]))
+        self.p2 = (float(p2[0]), float(p2[1]))
+        self.sentido = sentido
+        self.movimento = (int(np.sign(movimento[0])), int(np.sign(movimento[1])))
+        self.segmento = segmento
+
+
+class ZonaContagem:
+    """Zona poligonal: conta entradas (fora -> dentro) e saídas (dentro -> fora), uma vez por track."""
+
+    def __init__(self, nome: str, pontos: Sequence[Tuple[float, float]]):
+        if len(pontos) < 3:
+            raise ValueError(f"A zona '{nome}' precisa de pelo menos 3 pontos.")
+        self.nome = nome
+        self.pontos = np.asarray(pontos, dtype=np.float64)
+
+
+def lado_da_linha(x: np.ndarray, y: np.ndarray, p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
+    """Produto vetorial (p2 - p1) x (p - p1) para L linhas e N pontos: matriz (L, N). >0 = lado direito."""
+    dx = (p2[:, 0] - p1[:, 0])[:, None]; dy = (p2[:, 1] - p1[:, 1])[:, None]
+    return (y[None, :] - p1[:, 1:2]) * dx - (x[None, :] - p1[:, 0:1]) * dy
+
+
+def dentro_do_poligono(x: np.ndarray, y: np.ndarray, poligono: np.ndarray) -> np.ndarray:
+    """Ray casting vetorizado: máscara (N,) dos pontos dentro do polígono."""
+    xi, yi = poligono[:, 0:1], poligono[:, 1:2]
+    xj, yj = np.roll(poligono[:, 0], 1)[:, None], np.roll(poligono[:, 1], 1)[:, None]
+    cruza_y = (yi > y[None, :]) != (yj > y[None, :])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_corte = (xj - xi) * (y[None, :] - yi) / (yj - yi) + xi
+    return (np.count_nonzero(cruza_y & (x[None, :] < x_corte), axis=0) % 2) == 1
+
+
+class MotorContagem:
+    """
+    Motor de contagem vetorizado. Recebe, de uma vez, todas as caixas de um frame (ou todos os pares de
+    posições consecutivas de várias trajetórias) e avalia todas as linhas e zonas com NumPy, mantendo
+    contadores por classe para cada uma.
+    """
+
+    def __init__(self, linhas: List[LinhaContagem], zonas: Optional[List[ZonaContagem]] = None,
+                 names: Optional[Dict[int, str]] = None, target_classes: Optional[List[str]] = None):
+        nomes = [l.nome for l in linhas] + [z.nome for z in (zonas or [])]
+        if len(set(nomes)) != len(nomes):
+            raise ValueError("Linhas e zonas precisam ter nomes distintos.")
+        self.linhas = list(linhas)
+        self.zonas = list(zonas or [])
+        self.names = dict(names or {})
+        self.target_classes = target_classes
+        self._p1 = np.array([l.p1 for l in self.linhas], dtype=np.float64).reshape(-1, 2)
+        self._p2 = np.array([l.p2 for l in self.linhas], dtype=np.float64).reshape(-1, 2)
+        self._sentido = np.array([_CODIGO_SENTIDO[l.sentido] for l in self.linhas], dtype=np.int8)[:, None]
+        self._movimento = np.array([l.movimento for l in self.linhas], dtype=np.int8).reshape(-1, 2)
+        self._segmento = np.array([l.segmento for l in self.linhas], dtype=bool)[:, None]
+        # IDs já contados em cada linha / zona (arrays ordenados, consultados com np.isin).
+        self._contados_linha = [np.empty(0, dtype=np.int64) for _ in self.linhas]
+        self._entradas_zona = [np.empty(0, dtype=np.int64) for _ in self.zonas]
+        self._saidas_zona = [np.empty(0, dtype=np.int64) for _ in self.zonas]
+        self.por_linha: Dict[str, Dict[str, Dict[str, int]]] = {
+            l.nome: {SENTIDO_ESQ_DIR: defaultdict(int), SENTIDO_DIR_ESQ: defaultdict(int)} for l in self.linhas}
+        self.por_zona: Dict[str, Dict[str, Dict[str, int]]] = {
+            z.nome: {"entradas": defaultdict(int), "saidas": defaultdict(int)} for z in self.zonas}
+
+    @property
+    def contados(self) -> set:
+        """IDs contados em qualquer linha."""
+        return set(np.concatenate(self._contados_linha).tolist()) if self.linhas else set()
+
+    def ja_contados(self, ids: np.ndarray) -> np.ndarray:
+        """Máscara dos IDs já contados em alguma linha (para a anotação do vídeo)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.linhas:
+            return np.zeros(len(ids), dtype=bool)
+        return np.isin(ids, np.concatenate(self._contados_linha))
+
+    def _nome_classe(self, cls_id: int) -> str:
+        return self.names.get(int(cls_id), str(int(cls_id)))
+
+    def _classes_validas(self, classes: np.ndarray) -> np.ndarray:
+        if self.target_classes is None:
+            return np.ones(len(classes), dtype=bool)
+        validas = [c for c, n in self.names.items() if n in self.target_classes]
+        return np.isin(classes, np.asarray(validas, dtype=classes.dtype))
+
+    @staticmethod
+    def _primeira_ocorrencia(mascara: np.ndarray, ids: np.ndarray, ja_contados: np.ndarray) -> np.ndarray:
+        """Índices dos eventos a contar: primeiro evento de cada ID ainda não contado (os pares vêm em ordem temporal)."""
+        candidatos = np.flatnonzero(mascara & ~np.isin(ids, ja_contados))
+        if len(candidatos) == 0:
+            return candidatos
+        _, primeiros = np.unique(ids[candidatos], return_index=True)
+        return candidatos[np.sort(primeiros)]
+
+    def processar(self, ids: np.ndarray, classes: np.ndarray, prev_x: np.ndarray, prev_y: np.ndarray,
+                  curr_x: np.ndarray, curr_y: np.ndarray, valido: Optional[np.ndarray] = None) -> List[Tuple[str, int, str, str]]:
+        """
+        Avalia N deslocamentos (prev -> curr) em todas as linhas e zonas.
+        `valido` marca os deslocamentos com posição anterior conhecida. Retorna os eventos contados
+        como (nome_da_linha_ou_zona, track_id, classe, sentido).
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return []
+        classes = np.asarray(classes).astype(np.int64)
+        px, py = np.asarray(prev_x, np.float64), np.asarray(prev_y, np.float64)
+        cx, cy = np.asarray(curr_x, np.float64), np.asarray(curr_y, np.float64)
+        base = self._classes_validas(classes)
+        if valido is not None:
+            base &= np.asarray(valido, dtype=bool)
+        eventos: List[Tuple[str, int, str, str]] = []
+
+        if self.linhas:
+            s_prev = lado_da_linha(px, py, self._p1, self._p2)
+            s_curr = lado_da_linha(cx, cy, self._p1, self._p2)
+            esq_dir = (s_prev < 0) & (s_curr >= 0)
+            dir_esq = (s_prev > 0) & (s_curr <= 0)
+            cruzou = np.where(self._sentido == 1, esq_dir, np.where(self._sentido == -1, dir_esq, esq_dir | dir_esq))
+            # Restrição opcional do sinal do deslocamento (usada nas diagonais legadas).
+            mx, my = self._movimento[:, 0:1], self._movimento[:, 1:2]
+            cruzou &= (mx == 0) | (mx * (cx - px)[None, :] > 0)
+            cruzou &= (my == 0) | (my * (cy - py)[None, :] > 0)
+            # Linhas finitas: os extremos da linha também precisam ficar em lados opostos do deslocamento.
+            if self._segmento.any():
+                mov = np.stack([px, py], axis=1), np.stack([cx, cy], axis=1)
+                t1 = lado_da_linha(self._p1[:, 0], self._p1[:, 1], mov[0], mov[1]).T
+                t2 = lado_da_linha(self._p2[:, 0], self._p2[:, 1], mov[0], mov[1]).T
+                cruzou &= ~self._segmento | (t1 * t2 <= 0)
+            cruzou &= base[None, :]
+            for i, linha in enumerate(self.linhas):
+                for j in self._primeira_ocorrencia(cruzou[i], ids, self._contados_linha[i]):
+                    sentido = SENTIDO_ESQ_DIR if esq_dir[i, j] else SENTIDO_DIR_ESQ
+                    nome_cls = self._nome_classe(classes[j])
+                    self.por_linha[linha.nome][sentido][nome_cls] += 1
+                    eventos.append((linha.nome, int(ids[j]), nome_cls, sentido))
+                    self._contados_linha[i] = np.union1d(self._contados_linha[i], ids[j:j + 1])
+
+        for k, zona in enumerate(self.zonas):
+            dentro_antes = dentro_do_poligono(px, py, zona.pontos)
+            dentro_agora = dentro_do_poligono(cx, cy, zona.pontos)
+            for tipo, mascara, ja in (("entradas", base & ~dentro_antes & dentro_agora, self._entradas_zona),
+                                      ("saidas", base & dentro_antes & ~dentro_agora, self._saidas_zona)):
+                for j in self._primeira_ocorrencia(mascara, ids, ja[k]):
+                    nome_cls = self._nome_classe(classes[j])
+                    self.por_zona[zona.nome][tipo][nome_cls] += 1
+                    eventos.append((zona.nome, int(ids[j]), nome_cls, tipo))
+                    ja[k] = np.union1d(ja[k], ids[j:j + 1])
+        return eventos
+
+    def total_linha(self, nome: str) -> Tuple[int, Dict[str, int]]:
+        """Total e contagem por classe de uma linha (somando os dois sentidos)."""
+        por_classe: Dict[str, int] = defaultdict(int)
+        for contagem in self.por_linha[nome].values():
+            for nome_cls, n in contagem.items():
+                por_classe[nome_cls] += n
+        return sum(por_classe.values()), dict(por_classe)
+
+    def resumo(self) -> Dict[str, Any]:
+        """Contadores de todas as linhas e zonas, para o dict de resultado."""
+        linhas = {}
+        for linha in self.linhas:
+            total, por_classe = self.total_linha(linha.nome)
+            linhas[linha.nome] = {
+                "sentido": linha.sentido, "total": total, "por_classe": por_classe,
+                "por_sentido": {s: dict(c) for s, c in self.por_linha[linha.nome].items()},
+            }
+        zonas = {}
+        for zona in self.zonas:
+            c = self.por_zona[zona.nome]
+            zonas[zona.nome] = {"entradas": sum(c["entradas"].values()), "saidas": sum(c["saidas"].values()),
+                                "entradas_por_classe": dict(c["entradas"]), "saidas_por_classe": dict(c["saidas"])}
+        return {"linhas": linhas, "zonas": zonas}
+
+
+def linhas_e_zonas_da_requisicao(linhas: Optional[List[Dict[str, Any]]], zonas: Optional[List[Dict[str, Any]]],
+                                 width: int, height: int) -> Tuple[List[LinhaContagem], List[ZonaContagem]]:
+    """Converte linhas/zonas da requisição (coordenadas normalizadas 0-1) para pixels do vídeo."""
+    saida_linhas = [LinhaContagem(l["nome"], (l["x1"] * width, l["y1"] * height), (l["x2"] * width, l["y2"] * height),
+                                  sentido=l.get("sentido") or SENTIDO_AMBOS) for l in (linhas or [])]
+    saida_zonas = [ZonaContagem(z["nome"], [(x * width, y * height) for x, y in z["pontos"]]) for z in (zonas or [])]
+    return saida_linhas, saida_zonas
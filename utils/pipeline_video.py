@@ -0,0 +1,186 @@
+import os
+import queue
+import threading
+import time
+from typing import Optional, Dict, Any, Iterator, Tuple, Callable
+
+import cv2
+import numpy as np
+
+from utils.metricas import TemposJob
+
+# Tamanho das filas entre os estágios (frames em memória por fila).
+PIPELINE_FILA_FRAMES = int(os.getenv("PIPELINE_FILA_FRAMES", "8"))
+
+_FIM = object()  # Sentinela de fim de stream entre os estágios
+
+
+class EstatisticasFila:
+    """Profundidade e tempos de espera (stall) de uma fila entre dois estágios."""
+
+    def __init__(self, nome: str, capacidade: int):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.itens = 0
+        self.profundidade_max = 0
+        self._soma_profundidade = 0
+        self.espera_produtor_s = 0.0   # Produtor bloqueado com a fila cheia
+        self.espera_consumidor_s = 0.0  # Consumidor bloqueado com a fila vazia
+
+    def registrar_put(self, profundidade: int, espera: float):
+        self.itens += 1
+        self._soma_profundidade += profundidade
+        self.profundidade_max = max(self.profundidade_max, profundidade)
+        self.espera_produtor_s += espera
+
+    def como_dict(self, profundidade_atual: int = 0) -> Dict[str, Any]:
+        return {
+            "capacidade": self.capacidade,
+            "profundidade_atual": profundidade_atual,
+            "profundidade_max": self.profundidade_max,
+            "profundidade_media": round(self._soma_profundidade / self.itens, 2) if self.itens else 0.0,
+            "itens": self.itens,
+            "espera_produtor_s": round(self.espera_produtor_s, 3),
+            "espera_consumidor_s": round(self.espera_consumidor_s, 3),
+        }
+
+
+class PipelineVideo:
+    """
+    Pipeline de três estágios: decodificação -> inferência/contagem -> codificação.
+    Uma thread decodifica frames para uma fila limitada, o chamador consome os frames (inferência)
+    e uma segunda thread grava os frames anotados no VideoWriter. Assim o decoder e o encoder
+    trabalham enquanto o modelo roda.
+    """
+
+    def __init__(self, cap: cv2.VideoCapture, out: Optional[cv2.VideoWriter] = None,
+                 frame_skip: int = 1, tamanho_fila: int = PIPELINE_FILA_FRAMES, tempos: Optional[TemposJob] = None):
+        self.cap = cap
+        self.tempos = tempos  # Tempo por frame da decodificação e da codificação, no resumo do job
+        self.out = out
+        self.frame_skip = max(1, int(frame_skip))
+        tamanho_fila = max(1, int(tamanho_fila))
+        self._fila_decodificados: "queue.Queue" = queue.Queue(maxsize=tamanho_fila)
+        self._fila_codificar: "queue.Queue" = queue.Queue(maxsize=tamanho_fila)
+        self.stats_decodificados = EstatisticasFila("decodificados", tamanho_fila)
+        self.stats_codificar = EstatisticasFila("codificar", tamanho_fila)
+        self._parar = threading.Event()
+        self._decoder = threading.Thread(target=self._loop_decoder, name="pipeline-decoder", daemon=True)
+        self._encoder = threading.Thread(target=self._loop_encoder, name="pipeline-encoder", daemon=True) if out is not None else None
+        self.tempo_decoder_s = 0.0
+        self.tempo_encoder_s = 0.0
+        self.frames_lidos = 0
+        self.frames_escritos = 0
+        self.erro_decoder: Optional[str] = None
+        self.erro_encoder: Optional[str] = None
+
+    # --- Estágio 1: decodificação ---
+    def _put(self, fila: "queue.Queue", stats: EstatisticasFila, item: Any) -> bool:
+        """put() bloqueante que respeita o pedido de parada e contabiliza o tempo com a fila cheia."""
+        inicio = time.perf_counter()
+        while not self._parar.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                if item is not _FIM: stats.registrar_put(fila.qsize(), time.perf_counter() - inicio)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _loop_decoder(self):
+        frame_idx = 0
+        try:
+            while not self._parar.is_set():
+                inicio = time.perf_counter()
+                if frame_idx % self.frame_skip == 0:
+                    ret, frame = self.cap.read()
+                else:
+                    # Frames pulados só avançam o stream, sem converter os pixels.
+                    ret, frame = self.cap.grab(), None
+                duracao = time.perf_counter() - inicio
+                self.tempo_decoder_s += duracao
+                if self.tempos is not None: self.tempos.registrar("decodificacao", duracao)
+                if not ret:
+                    break
+                self.frames_lidos += 1
+                if frame is not None and not self._put(self._fila_decodificados, self.stats_decodificados, (frame_idx, frame)):
+                    break
+                frame_idx += 1
+        except Exception as e:
+            self.erro_decoder = str(e)
+            print(f"[PIPELINE ERRO] Falha na decodificação: {e}")
+        finally:
+            self._put(self._fila_decodificados, self.stats_decodificados, _FIM)
+
+    # --- Estágio 3: codificação ---
+    def _loop_encoder(self):
+        while True:
+            inicio = time.perf_counter()
+            item = self._fila_codificar.get()
+            self.stats_codificar.espera_consumidor_s += time.perf_counter() - inicio
+            if item is _FIM:
+                break
+            frame, devolver = item
+            try:
+                if self.erro_encoder:
+                    continue  # Continua drenando para não travar o estágio de inferência
+                inicio = time.perf_counter()
+                self.out.write(frame)
+                duracao = time.perf_counter() - inicio
+                self.tempo_encoder_s += duracao
+                if self.tempos is not None: self.tempos.registrar("codificacao", duracao)
+                self.frames_escritos += 1
+            except Exception as e:
+                self.erro_encoder = str(e)
+                print(f"[PIPELINE ERRO] Falha na codificação: {e}")
+            finally:
+                if devolver is not None: devolver(frame)  # Buffer reaproveitável volta ao pool
+
+    # --- Interface do estágio 2 (chamador) ---
+    def iniciar(self) -> "PipelineVideo":
+        self._decoder.start()
+        if self._encoder: self._encoder.start()
+        return self
+
+    def frames(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """Itera (índice_do_frame, frame) na ordem do vídeo, já respeitando o frame_skip."""
+        while True:
+            inicio = time.perf_counter()
+            item = self._fila_decodificados.get()
+            self.stats_decodificados.espera_consumidor_s += time.perf_counter() - inicio
+            if item is _FIM:
+                return
+            yield item
+
+    def escrever(self, frame: np.ndarray, devolver: Optional[Callable[[np.ndarray], None]] = None):
+        """Envia um frame anotado para o estágio de codificação; `devolver(frame)` é chamado depois de codificado."""
+        if self._encoder is None:
+            return
+        self._put(self._fila_codificar, self.stats_codificar, (frame, devolver))
+
+    def finalizar(self):
+        """Para o decoder, espera o encoder esvaziar a fila e libera o VideoCapture/VideoWriter."""
+        self._parar.set()
+        # Esvazia a fila de entrada para destravar um decoder bloqueado em put().
+        while self._decoder.is_alive():
+            try: self._fila_decodificados.get(timeout=0.1)
+            except queue.Empty: pass
+        self._decoder.join()
+        if self._encoder is not None:
+            self._fila_codificar.put(_FIM)
+            self._encoder.join()
+        if self.cap.isOpened(): self.cap.release()
+        if self.out is not None and self.out.isOpened():
+            try: self.out.release()
+            except Exception as e:
+                self.erro_encoder = self.erro_encoder or str(e)
+                print(f"[PIPELINE ERRO] Falha ao fechar o encoder: {e}")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Profundidade das filas e tempos de espera de cada estágio."""
+        return {
+            "decoder": {"frames_lidos": self.frames_lidos, "tempo_s": round(self.tempo_decoder_s, 3), "erro": self.erro_decoder},
+            "encoder": {"frames_escritos": self.frames_escritos, "tempo_s": round(self.tempo_encoder_s, 3), "erro": self.erro_encoder},
+            "fila_decodificados": self.stats_decodificados.como_dict(self._fila_decodificados.qsize()),
+            "fila_codificar": self.stats_codificar.como_dict(self._fila_codificar.qsize()),
+        }
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+import numpy as np
+
+from utils.backends_inferencia import MODELOS_EXPORT_DIR
+
+# Variante quantizada de um modelo: model_choice com este sufixo (ex.: "l-int8", "p-int8").
+SUFIXO_INT8 = "-int8"
+# Filmagens próprias (vídeos e/ou imagens) usadas na calibração da quantização INT8.
+MODELOS_INT8_CALIBRACAO_DIR = os.getenv("MODELOS_INT8_CALIBRACAO_DIR", os.path.join(os.getenv("RENDER_DATA_DIR", "data"), "calibracao_int8"))
+# Mesma amostragem do extract_frames.py: um frame a cada N, até o máximo somando todos os vídeos.
+MODELOS_INT8_PASSO = int(os.getenv("MODELOS_INT8_PASSO", "30"))
+MODELOS_INT8_MAX_FRAMES = int(os.getenv("MODELOS_INT8_MAX_FRAMES", "300"))
+# Desvio máximo aceito (em % por vídeo) entre a contagem INT8 e a fp32 na verificação de referência.
+MODELOS_INT8_DESVIO_MAX_PCT = float(os.getenv("MODELOS_INT8_DESVIO_MAX_PCT", "2"))
+
+EXTENSOES_VIDEO = (".mp4", ".avi", ".mov", ".mkv")
+EXTENSOES_IMAGEM = (".jpg", ".jpeg", ".png")
+
+# Só serializa as threads deste processo; entre processos (workers do pool) vale o os.replace atômico.
+_lock_calibracao = threading.Lock()
+
+
+def separar_variante(model_choice: str) -> Tuple[str, bool]:
+    """'l-int8' -> ('l', True); 'l' -> ('l', False)."""
+    if model_choice.endswith(SUFIXO_INT8):
+        return model_choice[:-len(SUFIXO_INT8)], True
+    return model_choice, False
+
+
+def _fontes(origem: str) -> List[str]:
+    if not os.path.isdir(origem):
+        return []
+    return sorted(os.path.join(raiz, f) for raiz, _, arquivos in os.walk(origem) for f in arquivos
+                  if f.lower().endswith(EXTENSOES_VIDEO + EXTENSOES_IMAGEM))
+
+
+def chave_calibracao(fontes: List[str], passo: int, maximo: int) -> str:
+    """Identifica o conjunto de calibração pelos arquivos de origem (nome, tamanho, data) e pela amostragem."""
+    h = hashlib.sha256(f"{passo}:{maximo}".encode("utf-8"))
+    for caminho in fontes:
+        info = os.stat(caminho)
+        h.update(f"|{os.path.basename(caminho)}:{info.st_size}:{int(info.st_mtime)}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def preparar_calibracao(origem: str = MODELOS_INT8_CALIBRACAO_DIR, pasta: str = MODELOS_EXPORT_DIR,
+                        passo: int = MODELOS_INT8_PASSO, maximo: int = MODELOS_INT8_MAX_FRAMES) -> Optional[str]:
+    """
+    Monta (uma vez por conjunto de filmagens) o dataset de calibração no formato do ultralytics: frames
+    amostrados dos vídeos de `origem` + as imagens de lá, e um dados.yaml. Devolve o caminho do yaml, ou
+    None se não houver filmagens para calibrar (o modelo INT8 então não é gerado).
+    """
+    fontes = _fontes(origem)
+    if not fontes:
+        return None
+    destino = os.path.join(pasta, f"calibracao-{chave_calibracao(fontes, passo, maximo)[:12]}")
+    dados = os.path.join(destino, "dados.yaml")
+    with _lock_calibracao:
+        if os.path.exists(dados):
+            return dados
+        import cv2
+        from utils.amostragem_frames import amostrar_frames
+        os.makedirs(pasta, exist_ok=True)
+        videos = [f for f in fontes if f.lower().endswith(EXTENSOES_VIDEO)]
+        imagens = [f for f in fontes if f.lower().endswith(EXTENSOES_IMAGEM)]
+        # O orçamento de frames é dividido entre os vídeos para todos estarem representados.
+        por_video = max(1, (maximo - len(imagens)) // len(videos)) if videos else 0
+        tmp = tempfile.mkdtemp(dir=pasta, prefix=".calibrando-")
+        try:
+            pasta_imagens = os.path.join(tmp, "images")
+            os.makedirs(pasta_imagens)
+            total = 0
+            for i, imagem in enumerate(imagens[:maximo]):
+                shutil.copy2(imagem, os.path.join(pasta_imagens, f"img{i:04d}_{os.path.basename(imagem)}"))
+                total += 1
+            for i, video in enumerate(videos):
+                try:
+                    for idx, frame in amostrar_frames(video, passo, por_video):
+                        cv2.imwrite(os.path.join(pasta_imagens, f"v{i:03d}_frame_{idx:06d}.jpg"), frame)
+                        total += 1
+                except FileNotFoundError:
+                    print(f"[MODELOS ERRO] Vídeo de calibração ilegível: {video}")
+            if total == 0:
+                return None
+            with open(os.path.join(tmp, "dados.yaml"), "w", encoding="utf-8") as f:
+                # Só as imagens importam para a calibração; as classes não são usadas.
+                f.write(f"path: {destino}\ntrain: images\nval: images\nnames:\n  0: gado\n")
+            try:
+                os.replace(tmp, destino)  # O dataset só aparece no cache completo
+            except OSError:
+                if not os.path.exists(dados):
+                    raise
+                return dados  # Outro processo montou o mesmo dataset antes
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        print(f"[MODELOS] Calibração INT8 com {total} frames de {len(fontes)} arquivo(s) em {destino}.")
+        return dados
+
+
+def _letterbox(frame: np.ndarray, imgsz: int) -> np.ndarray:
+    """Mesmo pré-processamento do predictor do ultralytics: redimensiona mantendo a proporção, borda 114, RGB, 0..1, NCHW."""
+    import cv2
+    altura, largura = frame.shape[:2]
+    escala = min(imgsz / altura, imgsz / largura)
+    nova_l, nova_a = int(round(largura * escala)), int(round(altura * escala))
+    saida = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    topo, esquerda = (imgsz - nova_a) // 2, (imgsz - nova_l) // 2
+    saida[topo:topo + nova_a, esquerda:esquerda + nova_l] = cv2.resize(frame, (nova_l, nova_a), interpolation=cv2.INTER_LINEAR)
+    return np.ascontiguousarray(saida[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def quantizar_onnx(modelo_fp32: str, calibracao: str, imgsz: int, saida: str) -> str:
+    """
+    Quantização estática INT8 do ONNX Runtime, calibrada nas imagens do dataset de `calibracao` (dados.yaml).
+    Só as camadas com pesos (Conv/Gemm/MatMul) são quantizadas: a decodificação da cabeça segue em float,
+    senão caixas (0..640) e scores (0..1) dividiriam uma única escala INT8 e os scores zerariam.
+    """
+    import cv2
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, quantize_static
+
+    pasta_imagens = os.path.join(os.path.dirname(calibracao), "images")
+    imagens = sorted(os.path.join(pasta_imagens, f) for f in os.listdir(pasta_imagens))
+    grafo = onnx.load(modelo_fp32).graph
+    entrada = grafo.input[0].name
+    excluir = [n.name for n in grafo.node if n.op_type not in {"Conv", "Gemm", "MatMul"}]
+    del grafo
+
+    class Leitor(CalibrationDataReader):
+        def __init__(self):
+            self._imagens = iter(imagens)
+
+        def get_next(self):
+            for caminho in self._imagens:
+                frame = cv2.imread(caminho)
+                if frame is not None:
+                    return {entrada: _letterbox(frame, imgsz)}
+            return None
+
+    quantize_static(modelo_fp32, saida, Leitor(), quant_format=QuantFormat.QDQ, nodes_to_exclude=excluir)
+    return saida
+
+
+# ---------------------------------------------------------------------------
+# Verificação: desvio da contagem INT8 em relação à fp32 num conjunto de vídeos de referência
+# ---------------------------------------------------------------------------
+def contar_localmente(video_path: str, model_choice: str, **parametros: Any) -> Dict[str, Any]:
+    """Roda contar_gado_em_video direto no processo (sem SFTP e sem vídeo anotado)."""
+    from utils.contagem_video import contar_gado_em_video
+    from utils.executor_processos import ProgressoLocal
+    progresso = ProgressoLocal()
+    parametros.setdefault("orientation", "S")
+    resultado = contar_gado_em_video(video_path, os.path.basename(video_path), progresso, model_choice=model_choice, **parametros)
+    if resultado is None:
+        raise RuntimeError(f"Contagem de '{video_path}' com '{model_choice}' falhou: {'; '.join(progresso.erros)}")
+    return resultado
+
+
+def desvio_contagem(model_choice: str, videos: List[str], contar: Callable[..., Dict[str, Any]] = contar_localmente,
+                    desvio_max_pct: float = MODELOS_INT8_DESVIO_MAX_PCT, **parametros: Any) -> Dict[str, Any]:
+    """
+    Conta cada vídeo de referência com o modelo fp32 e com a variante INT8 e compara: desvio da contagem
+    por vídeo e no total, e o ganho de velocidade. `aprovado` diz se nenhum vídeo passou de desvio_max_pct.
+    """
+    base, _ = separar_variante(model_choice)
+    linhas, tempos = [], {"fp32": 0.0, "int8": 0.0}
+    precisao_usada = None
+    for video in videos:
+        contagens = {}
+        for variante, choice in (("fp32", base), ("int8", base + SUFIXO_INT8)):
+            inicio = time.perf_counter()
+            resultado = contar(video, choice, **parametros)
+            tempos[variante] += time.perf_counter() - inicio
+            contagens[variante] = int(resultado["total_count"])
+            if variante == "int8":
+                precisao_usada = resultado.get("precisao", precisao_usada)
+        desvio = contagens["int8"] - contagens["fp32"]
+        linhas.append({"video": os.path.basename(video), "fp32": contagens["fp32"], "int8": contagens["int8"], "desvio": desvio,
+                       "desvio_pct": round(100.0 * desvio / contagens["fp32"], 2) if contagens["fp32"] else (0.0 if desvio == 0 else None)})
+    total_fp32 = sum(l["fp32"] for l in linhas); total_int8 = sum(l["int8"] for l in linhas)
+    pior = max((abs(l["desvio_pct"]) if l["desvio_pct"] is not None else float("inf") for l in linhas), default=0.0)
+    return {
+        "model_choice": base, "precisao_int8_usada": precisao_usada, "videos": linhas,
+        "total_fp32": total_fp32, "total_int8": total_int8,
+        "desvio_total_pct": round(100.0 * (total_int8 - total_fp32) / total_fp32, 2) if total_fp32 else None,
+        "desvio_max_abs_pct": pior if pior != float("inf") else None,
+        "speedup_int8": round(tempos["fp32"] / tempos["int8"], 2) if tempos["int8"] > 0 else None,
+        "limite_pct": desvio_max_pct, "aprovado": pior <= desvio_max_pct,
+    }
@@ -0,0 +1,165 @@
+import os
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+import yaml
+
+# Rastreador dos jobs que não escolhem um: "botsort" (padrão do ultralytics, com compensação de movimento
+# da câmera), "bytetrack" (mesma associação, sem GMC) ou "iou" (NumPy puro, para câmeras fixas de brete).
+RASTREADOR_PADRAO = os.getenv("RASTREADOR_PADRAO", "botsort").lower()
+# Perfis de câmera: parâmetros do rastreador por instalação (yaml: nome do perfil -> tipo e parâmetros).
+PERFIS_CAMERA_ARQUIVO = os.getenv("PERFIS_CAMERA_ARQUIVO", "perfis_camera.yaml")
+
+TIPOS = ("bytetrack", "botsort", "iou")
+YAML_ULTRALYTICS = {"bytetrack": "bytetrack.yaml", "botsort": "botsort.yaml"}
+# Parâmetros aceitos na requisição e nos perfis. Os do ultralytics valem para bytetrack/botsort ("gmc" só no
+# botsort); iou_min e distancia_max são do rastreador IoU; track_buffer e new_track_thresh valem para todos.
+PARAMETROS = ("track_buffer", "match_thresh", "track_high_thresh", "track_low_thresh", "new_track_thresh", "gmc",
+              "iou_min", "distancia_max")
+
+_perfis: Dict[str, Any] = {"chave": None, "perfis": {}}
+_lock_perfis = threading.Lock()
+
+
+def carregar_perfis(arquivo: str = PERFIS_CAMERA_ARQUIVO) -> Dict[str, Dict[str, Any]]:
+    """Perfis de câmera do arquivo (relido só quando ele muda); vazio se o arquivo não existir."""
+    if not os.path.isfile(arquivo):
+        return {}
+    info = os.stat(arquivo)
+    chave = (os.path.abspath(arquivo), info.st_mtime, info.st_size)
+    with _lock_perfis:
+        if _perfis["chave"] != chave:
+            with open(arquivo, encoding="utf-8") as f:
+                _perfis.update(chave=chave, perfis=yaml.safe_load(f) or {})
+        return _perfis["perfis"]
+
+
+def resolver_config(rastreador: Optional[Dict[str, Any]] = None, arquivo_perfis: str = PERFIS_CAMERA_ARQUIVO) -> Dict[str, Any]:
+    """
+    Configuração completa do rastreador de um job: RASTREADOR_PADRAO, depois o perfil de câmera pedido
+    (rastreador["perfil"]) e, por cima, os parâmetros da própria requisição. Valores None são ignorados.
+    Levanta ValueError para perfil, tipo ou parâmetro desconhecido.
+    """
+    pedido = {k: v for k, v in (rastreador or {}).items() if v is not None}
+    config: Dict[str, Any] = {"tipo": RASTREADOR_PADRAO}
+    perfil = pedido.pop("perfil", None)
+    if perfil:
+        perfis = carregar_perfis(arquivo_perfis)
+        if perfil not in perfis:
+            raise ValueError(f"Perfil de câmera '{perfil}' não encontrado em {arquivo_perfis}.")
+        config.update({k: v for k, v in perfis[perfil].items() if v is not None}, perfil=perfil)
+    config.update(pedido)
+    config["tipo"] = str(config["tipo"]).lower()
+    if config["tipo"] not in TIPOS:
+        raise ValueError(f"Rastreador '{config['tipo']}' inválido. Use {', '.join(TIPOS)}.")
+    desconhecidos = set(config) - set(PARAMETROS) - {"tipo", "perfil"}
+    if desconhecidos:
+        raise ValueError(f"Parâmetros de rastreador desconhecidos: {', '.join(sorted(desconhecidos))}.")
+    return config
+
+
+def criar_rastreador(rastreador: Optional[Dict[str, Any]] = None, frame_rate: int = 30) -> Any:
+    """
+    Cria um rastreador novo (um por job/segmento) com a interface do ultralytics: update(det, img) recebe as
+    detecções do frame (boxes em NumPy) e devolve [x1, y1, x2, y2, id, score, cls, idx_deteccao] por track.
+    """
+    config = resolver_config(rastreador)
+    if config["tipo"] == "iou":
+        return RastreadorIoU(frame_rate=frame_rate, **{k: config[k] for k in ("iou_min", "distancia_max", "track_buffer",
+                                                                              "new_track_thresh") if k in config})
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    with open(check_yaml(YAML_ULTRALYTICS[config["tipo"]]), encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg.update({k: v for k, v in config.items() if k in cfg})
+    if "gmc" in config and "gmc_method" in cfg:
+        # A compensação de movimento (fluxo óptico esparso por frame) é o maior custo do BoT-SORT.
+        cfg["gmc_method"] = "sparseOptFlow" if config["gmc"] else "none"
+    cfg = IterableSimpleNamespace(**cfg)
+    try:
+        return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+    except TypeError:  # Versões mais novas do ultralytics não recebem frame_rate
+        return TRACKER_MAP[cfg.tracker_type](args=cfg)
+
+
+def iou_xyxy(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Matriz de IoU entre caixas xyxy (N x 4) e (M x 4)."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0]); y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2]); y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]); area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _parear(pontuacao: np.ndarray, aceitar) -> List[Tuple[int, int]]:
+    """Pareamento guloso: melhor pontuação primeiro, cada linha e coluna usadas uma vez."""
+    pares: List[Tuple[int, int]] = []
+    usadas_i, usadas_j = set(), set()
+    for idx in np.argsort(-pontuacao, axis=None):
+        i, j = (int(v) for v in np.unravel_index(idx, pontuacao.shape))
+        if not aceitar(pontuacao[i, j]):
+            break  # Daqui em diante todas as pontuações são piores
+        if i in usadas_i or j in usadas_j:
+            continue
+        usadas_i.add(i); usadas_j.add(j)
+        pares.append((i, j))
+    return pares
+
+
+class RastreadorIoU:
+    """
+    Rastreador mínimo para câmeras fixas (brete, corredor): cada detecção fica com o track de maior IoU com
+    a última caixa dele e, sem sobreposição suficiente, com o de centro mais próximo (até distancia_max vezes a
+    diagonal da caixa). Sem filtro de Kalman e sem compensação de movimento: custo desprezível por frame,
+    suficiente para IDs estáveis perto da linha quando os animais andam em fila.
+    """
+
+    def __init__(self, iou_min: float = 0.3, distancia_max: float = 0.5, track_buffer: int = 15,
+                 new_track_thresh: float = 0.25, frame_rate: int = 30):
+        self.iou_min = float(iou_min)
+        self.distancia_max = float(distancia_max)
+        self.new_track_thresh = float(new_track_thresh)
+        # Frames que um track sobrevive sem detecção (track_buffer é em frames a 30 fps, como no ultralytics).
+        self.max_perdido = max(1, int(frame_rate / 30.0 * int(track_buffer)))
+        self.frame = 0
+        self._proximo_id = 1
+        self._caixas = np.zeros((0, 4), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._vistos = np.zeros(0, dtype=np.int64)
+
+    def update(self, det: Any, img: Any = None) -> np.ndarray:
+        self.frame += 1
+        vivos = self.frame - self._vistos <= self.max_perdido
+        self._caixas, self._ids, self._vistos = self._caixas[vivos], self._ids[vivos], self._vistos[vivos]
+        caixas = np.asarray(det.xyxy, dtype=np.float32).reshape(-1, 4)
+        conf = np.asarray(det.conf, dtype=np.float32).reshape(-1)
+        cls = np.asarray(det.cls, dtype=np.float32).reshape(-1)
+
+        pares = _parear(iou_xyxy(self._caixas, caixas), lambda v: v >= self.iou_min) if len(caixas) else []
+        livres_t = np.setdiff1d(np.arange(len(self._caixas)), [i for i, _ in pares])
+        livres_d = np.setdiff1d(np.arange(len(caixas)), [j for _, j in pares])
+        if len(livres_t) and len(livres_d):
+            centros_t = (self._caixas[livres_t, :2] + self._caixas[livres_t, 2:]) / 2
+            centros_d = (caixas[livres_d, :2] + caixas[livres_d, 2:]) / 2
+            diagonal = np.hypot(*(self._caixas[livres_t, 2:] - self._caixas[livres_t, :2]).T)
+            # Distância relativa à diagonal do track (negativa, para o melhor par ser o de maior pontuação).
+            relativa = -np.linalg.norm(centros_t[:, None] - centros_d[None], axis=2) / np.maximum(diagonal[:, None], 1e-6)
+            pares += [(int(livres_t[i]), int(livres_d[j])) for i, j in _parear(relativa, lambda v: -v <= self.distancia_max)]
+
+        saida = []
+        for i, j in pares:
+            self._caixas[i], self._vistos[i] = caixas[j], self.frame
+            saida.append((*caixas[j], self._ids[i], conf[j], cls[j], j))
+        pareadas = {j for _, j in pares}
+        novas = [j for j in range(len(caixas)) if j not in pareadas and conf[j] >= self.new_track_thresh]
+        if novas:
+            ids = np.arange(self._proximo_id, self._proximo_id + len(novas))
+            self._proximo_id += len(novas)
+            self._caixas = np.vstack([self._caixas, caixas[novas]])
+            self._ids = np.concatenate([self._ids, ids])
+            self._vistos = np.concatenate([self._vistos, np.full(len(novas), self.frame)])
+            saida += [(*caixas[j], tid, conf[j], cls[j], j) for j, tid in zip(novas, ids)]
+        return np.asarray(sorted(saida, key=lambda t: t[-1]), dtype=np.float32).reshape(-1, 8)
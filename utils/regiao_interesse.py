@@ -0,0 +1,85 @@
+import math
+import os
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+# Largura total da faixa em volta da linha, como fração da dimensão perpendicular à linha
+# (altura do frame para linhas horizontais, largura para verticais, menor dimensão para diagonais).
+ROI_BANDA_RATIO_PADRAO = float(os.getenv("ROI_BANDA_RATIO", "0.4"))
+# IoU acima do qual duas caixas vindas de tiles vizinhos são a mesma detecção.
+ROI_NMS_IOU = 0.5
+
+Retangulo = Tuple[int, int, int, int]  # (x1, y1, x2, y2) em coordenadas do frame inteiro
+
+
+def planejar_roi(line_points: Tuple, width: int, height: int, banda_ratio: float = ROI_BANDA_RATIO_PADRAO) -> List[Retangulo]:
+    """
+    Retângulos do frame que são enviados ao detector no modo ROI.
+    Linhas horizontais/verticais viram uma única faixa; diagonais viram tiles quadrados em
+    sequência ao longo da linha (uma faixa diagonal recortada num retângulo pegaria o frame quase todo).
+    """
+    (x1, y1), (x2, y2) = line_points
+    banda_ratio = min(1.0, max(0.0, banda_ratio))
+    if y1 == y2:
+        meia = int(round(height * banda_ratio / 2))
+        return [(0, max(0, y1 - meia), width, min(height, y1 + meia))]
+    if x1 == x2:
+        meia = int(round(width * banda_ratio / 2))
+        return [(max(0, x1 - meia), 0, min(width, x1 + meia), height)]
+
+    lado = max(32, int(round(min(width, height) * banda_ratio)))
+    comprimento = math.hypot(x2 - x1, y2 - y1)
+    # Tiles com ~20% de sobreposição ao longo da linha, para um animal na emenda aparecer inteiro em algum tile.
+    n_tiles = max(1, math.ceil(comprimento / (lado * 0.8)))
+    tiles: List[Retangulo] = []
+    for i in range(n_tiles):
+        t = (i + 0.5) / n_tiles
+        cx, cy = x1 + (x2 - x1) * t, y1 + (y2 - y1) * t
+        tx1 = int(min(max(0, cx - lado / 2), max(0, width - lado)))
+        ty1 = int(min(max(0, cy - lado / 2), max(0, height - lado)))
+        tiles.append((tx1, ty1, min(width, tx1 + lado), min(height, ty1 + lado)))
+    return tiles
+
+
+def fracao_pixels(retangulos: List[Retangulo], width: int, height: int) -> float:
+    """Pixels enviados ao detector (somando os tiles) em relação ao frame inteiro."""
+    total = sum((rx2 - rx1) * (ry2 - ry1) for rx1, ry1, rx2, ry2 in retangulos)
+    return total / float(width * height) if width and height else 1.0
+
+
+def detectar_em_roi(modelo: Any, frames: List[np.ndarray], retangulos: List[Retangulo], conf: float = 0.3) -> List[Any]:
+    """
+    Roda o detector só nos recortes de cada frame (todos os recortes de todos os frames em um predict)
+    e devolve um Results por frame, com as caixas já em coordenadas do frame inteiro.
+    """
+    import torch
+    import torchvision
+    from ultralytics.engine.results import Results
+
+    recortes = [frame[ry1:ry2, rx1:rx2] for frame in frames for rx1, ry1, rx2, ry2 in retangulos]
+    parciais = modelo.predict(recortes, conf=conf)
+    saida = []
+    for i, frame in enumerate(frames):
+        caixas = []
+        for (rx1, ry1, _, _), r in zip(retangulos, parciais[i * len(retangulos):(i + 1) * len(retangulos)]):
+            if r.boxes is None or len(r.boxes) == 0:
+                continue
+            data = r.boxes.data.clone()
+            data[:, [0, 2]] += rx1
+            data[:, [1, 3]] += ry1
+            caixas.append(data)
+        data = torch.cat(caixas) if caixas else torch.zeros((0, 6))
+        if len(retangulos) > 1 and len(data):
+            # Tiles sobrepostos podem detectar o mesmo animal duas vezes.
+            manter = torchvision.ops.batched_nms(data[:, :4], data[:, 4], data[:, 5].long(), ROI_NMS_IOU)
+            data = data[manter]
+        saida.append(Results(frame, path="", names=modelo.names, boxes=data))
+    return saida
+
+
+def descrever_roi(retangulos: Optional[List[Retangulo]], width: int, height: int) -> Optional[Dict[str, Any]]:
+    """Resumo do ROI para o dict de resultado."""
+    if not retangulos:
+        return None
+    return {"retangulos": [list(r) for r in retangulos], "fracao_pixels": round(fracao_pixels(retangulos, width, height), 3)}
@@ -0,0 +1,209 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Tuple
+
+import cv2
+import numpy as np
+
+# Perfis do vídeo anotado.
+PERFIL_COMPLETO = "completo"           # Resolução original, todos os frames processados
+PERFIL_METADE = "metade"               # Metade da resolução
+PERFIL_FPS_REDUZIDO = "fps_reduzido"   # Resolução original, no máximo RENDER_FPS_REDUZIDO quadros por segundo
+PERFIL_DESTAQUES = "destaques"         # Só trechos em volta de cada contagem, em metade da resolução
+PERFIS = (PERFIL_COMPLETO, PERFIL_METADE, PERFIL_FPS_REDUZIDO, PERFIL_DESTAQUES)
+
+RENDER_PERFIL_PADRAO = os.getenv("RENDER_PERFIL", PERFIL_COMPLETO)
+# "auto" usa o ffmpeg (H.264 via pipe) se estiver no PATH e cai para o VideoWriter do OpenCV (mp4v) se não.
+RENDER_ENCODER = os.getenv("RENDER_ENCODER", "auto").lower()
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+RENDER_CRF = int(os.getenv("RENDER_CRF", "28"))
+RENDER_PRESET = os.getenv("RENDER_PRESET", "veryfast")
+RENDER_FPS_REDUZIDO = float(os.getenv("RENDER_FPS_REDUZIDO", "10"))
+# Segundos de vídeo antes e depois de cada contagem no perfil de destaques.
+RENDER_DESTAQUE_ANTES_S = float(os.getenv("RENDER_DESTAQUE_ANTES_S", "2"))
+RENDER_DESTAQUE_DEPOIS_S = float(os.getenv("RENDER_DESTAQUE_DEPOIS_S", "2"))
+RENDER_ESCALA_REDUZIDA = 0.5
+
+_codec_ffmpeg: Dict[str, Optional[str]] = {}
+
+
+def codec_ffmpeg(binario: str = FFMPEG_BIN) -> Optional[str]:
+    """Codec usado com o ffmpeg (libx264 se disponível, senão mpeg4); None se o ffmpeg não existe."""
+    if binario not in _codec_ffmpeg:
+        caminho = shutil.which(binario)
+        codec = None
+        if caminho:
+            try:
+                encoders = subprocess.run([caminho, "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=10).stdout
+                codec = "libx264" if "libx264" in encoders else "mpeg4"
+            except (OSError, subprocess.SubprocessError):
+                codec = None
+        _codec_ffmpeg[binario] = codec
+    return _codec_ffmpeg[binario]
+
+
+class EncoderFFmpeg:
+    """
+    Encoder com a mesma interface usada do cv2.VideoWriter (write/isOpened/release): os frames BGR vão
+    crus, sem cópia, pelo stdin de um processo ffmpeg que codifica em H.264 (arquivos bem menores que mp4v).
+    """
+
+    def __init__(self, caminho: str, largura: int, altura: int, fps: float, codec: str = "libx264",
+                 crf: int = RENDER_CRF, preset: str = RENDER_PRESET, binario: str = FFMPEG_BIN):
+        self.caminho = caminho
+        self.tamanho = (largura, altura)
+        qualidade = ["-preset", preset, "-crf", str(crf)] if codec == "libx264" else ["-q:v", "5"]
+        cmd = [binario, "-y", "-hide_banner", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{largura}x{altura}", "-r", f"{fps:.6g}", "-i", "-",
+               "-an", "-c:v", codec, *qualidade, "-pix_fmt", "yuv420p", "-movflags", "+faststart", caminho]
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr)
+
+    def _erro(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", "replace").strip()[-500:]
+
+    def isOpened(self) -> bool:
+        return self._proc.poll() is None
+
+    def write(self, frame: np.ndarray):
+        if frame.shape[1::-1] != self.tamanho:
+            raise ValueError(f"Frame {frame.shape[1::-1]} diferente do tamanho do encoder {self.tamanho}.")
+        try:
+            self._proc.stdin.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+        except BrokenPipeError:
+            raise IOError(f"ffmpeg encerrou durante a codificação: {self._erro()}")
+
+    def release(self):
+        if self._proc.stdin and not self._proc.stdin.closed:
+            try: self._proc.stdin.close()
+            except BrokenPipeError: pass
+        codigo = self._proc.wait()
+        erro = self._erro() if codigo else ""
+        self._stderr.close()
+        if codigo:
+            raise IOError(f"ffmpeg terminou com código {codigo}: {erro}")
+
+
+def abrir_encoder(caminho: str, largura: int, altura: int, fps: float, encoder: Optional[str] = None) -> Tuple[Any, str]:
+    """Abre o encoder do vídeo anotado. Retorna (writer, nome do encoder)."""
+    encoder = encoder or RENDER_ENCODER
+    codec = codec_ffmpeg() if encoder in ("auto", "ffmpeg") else None
+    if codec:
+        return EncoderFFmpeg(caminho, largura, altura, fps, codec=codec), f"ffmpeg/{codec}"
+    if encoder == "ffmpeg":
+        print(f"[RENDER AVISO] ffmpeg ('{FFMPEG_BIN}') não encontrado; usando o VideoWriter do OpenCV.")
+    return cv2.VideoWriter(caminho, cv2.VideoWriter_fourcc(*"mp4v"), fps, (largura, altura)), "opencv/mp4v"
+
+
+class PoolBuffers:
+    """Buffers de frame reaproveitados entre quadros: voltam para o pool depois de codificados."""
+
+    def __init__(self, largura: int, altura: int):
+        self.forma = (altura, largura, 3)
+        self._livres: deque = deque()
+        self.alocados = 0
+
+    def obter(self) -> np.ndarray:
+        try:
+            return self._livres.pop()
+        except IndexError:
+            self.alocados += 1
+            return np.empty(self.forma, dtype=np.uint8)
+
+    def devolver(self, buffer: np.ndarray):
+        self._livres.append(buffer)
+
+
+def _par(valor: float) -> int:
+    """Dimensão par (exigida pelo yuv420p)."""
+    return max(2, int(valor) // 2 * 2)
+
+
+class Renderizador:
+    """
+    Decide quais quadros do vídeo anotado são desenhados e codificados, em que resolução e a que fps.
+    O fps de saída considera o frame_skip (só os frames processados são gravados), então a duração do
+    vídeo anotado bate com a do original. Nos perfis reduzidos, o frame é redimensionado para um buffer
+    do pool e as anotações são desenhadas na escala de saída; no perfil completo, direto no frame decodificado.
+    """
+
+    def __init__(self, perfil: Optional[str], width: int, height: int, fps: float, frame_skip: int = 1):
+        self.perfil = perfil if perfil in PERFIS else RENDER_PERFIL_PADRAO
+        if self.perfil not in PERFIS:
+            print(f"[RENDER AVISO] Perfil '{self.perfil}' desconhecido; usando '{PERFIL_COMPLETO}'.")
+            self.perfil = PERFIL_COMPLETO
+        self.escala = RENDER_ESCALA_REDUZIDA if self.perfil in (PERFIL_METADE, PERFIL_DESTAQUES) else 1.0
+        self.largura = width if self.escala == 1.0 else _par(width * self.escala)
+        self.altura = height if self.escala == 1.0 else _par(height * self.escala)
+        fps_processado = (fps if fps > 0 else 30.0) / max(1, int(frame_skip))
+        self.a_cada = max(1, round(fps_processado / RENDER_FPS_REDUZIDO)) if self.perfil == PERFIL_FPS_REDUZIDO else 1
+        self.fps_saida = fps_processado / self.a_cada
+        self.buffers = PoolBuffers(self.largura, self.altura) if self.escala != 1.0 else None
+        self._antes: deque = deque(maxlen=max(1, int(round(RENDER_DESTAQUE_ANTES_S * self.fps_saida))))
+        self._depois_total = max(1, int(round(RENDER_DESTAQUE_DEPOIS_S * self.fps_saida)))
+        self._depois_restantes = 0
+        self._quadros = 0
+        self.quadros_gravados = 0
+        self.clipes = 0
+        self.nome_encoder: Optional[str] = None
+
+    def abrir_saida(self, caminho: str) -> Any:
+        writer, self.nome_encoder = abrir_encoder(caminho, self.largura, self.altura, self.fps_saida)
+        return writer
+
+    def _canvas(self, frame: np.ndarray) -> Tuple[np.ndarray, Optional[Callable[[np.ndarray], None]]]:
+        if self.buffers is None:
+            return frame, None  # Frame decodificado é exclusivo deste estágio: desenha direto nele
+        buffer = self.buffers.obter()
+        cv2.resize(frame, (self.largura, self.altura), dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer, self.buffers.devolver
+
+    def processar(self, frame: np.ndarray, houve_contagem: bool, desenhar: Callable[[np.ndarray, float], None],
+                  escrever: Callable[[np.ndarray, Optional[Callable[[np.ndarray], None]]], None]):
+        """
+        Recebe cada frame processado. `desenhar(canvas, escala)` só é chamado nos quadros que vão para
+        o vídeo; `escrever(canvas, devolver)` os manda ao encoder (que chama devolver ao terminar).
+        """
+        indice = self._quadros
+        self._quadros += 1
+        if indice % self.a_cada:
+            return
+        canvas, devolver = self._canvas(frame)
+        desenhar(canvas, self.escala)
+        if self.perfil != PERFIL_DESTAQUES:
+            self._gravar(canvas, devolver, escrever)
+            return
+        if houve_contagem:
+            if self._depois_restantes == 0: self.clipes += 1
+            while self._antes:
+                self._gravar(*self._antes.popleft(), escrever)
+            self._gravar(canvas, devolver, escrever)
+            self._depois_restantes = self._depois_total
+        elif self._depois_restantes > 0:
+            self._gravar(canvas, devolver, escrever)
+            self._depois_restantes -= 1
+        else:
+            if len(self._antes) == self._antes.maxlen:
+                buffer_antigo, devolver_antigo = self._antes.popleft()
+                if devolver_antigo: devolver_antigo(buffer_antigo)
+            self._antes.append((canvas, devolver))
+
+    def _gravar(self, canvas: np.ndarray, devolver: Optional[Callable[[np.ndarray], None]], escrever: Callable):
+        self.quadros_gravados += 1
+        escrever(canvas, devolver)
+
+    def finalizar(self):
+        """Devolve os quadros pré-contagem que não chegaram a ser gravados."""
+        while self._antes:
+            canvas, devolver = self._antes.popleft()
+            if devolver: devolver(canvas)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {"perfil": self.perfil, "resolucao": [self.largura, self.altura], "fps_saida": round(self.fps_saida, 3),
+                "encoder": self.nome_encoder, "quadros_gravados": self.quadros_gravados,
+                "clipes": self.clipes if self.perfil == PERFIL_DESTAQUES else None,
+                "buffers_alocados": self.buffers.alocados if self.buffers else 0}
@@ -1,7 +1,13 @@
 import os
+import socket
+import threading
+import time
 import paramiko
+from contextlib import contextmanager
 from stat import S_ISDIR
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple, Callable, List, Set, Dict, Any, Iterator, TypeVar
+
+from utils.metricas import metricas
 
 # Carrega as credenciais das variáveis de ambiente configuradas
 # (no seu .env localmente, ou no dashboard do Render)
@@ -10,8 +16,39 @@ HG_USER = os.getenv("HG_USER")
 HG_PASS = os.getenv("HG_PASS")
 HG_PORT = int(os.getenv("HG_PORT", 22))
 
+# Pool de conexões SFTP: máximo de conexões abertas ao mesmo tempo (por processo), intervalo do keepalive SSH
+# e tempo ocioso depois do qual a conexão é fechada em vez de reaproveitada.
+SFTP_POOL_MAX = int(os.getenv("SFTP_POOL_MAX", "4"))
+SFTP_KEEPALIVE_S = int(os.getenv("SFTP_KEEPALIVE_S", "30"))
+SFTP_OCIOSA_MAX_S = float(os.getenv("SFTP_OCIOSA_MAX_S", "300"))
+SFTP_TIMEOUT_S = float(os.getenv("SFTP_TIMEOUT_S", "30"))
+# Conexão parada há mais que isso passa por um round-trip (stat) antes de ser entregue.
+SFTP_VERIFICAR_APOS_S = 10.0
+
+T = TypeVar("T")
+
+class TransferenciaCancelada(Exception):
+    """Levantada dentro do callback do paramiko para interromper uma transferência cancelada."""
+
+
+class ConexaoPerdida(Exception):
+    """A conexão SFTP caiu no meio de uma operação; a conexão foi descartada e a operação pode ser repetida."""
+
+
+def _callback_cancelavel(progress_callback: Optional[Callable[[int, int], None]],
+                         cancelamento: Optional[threading.Event]) -> Optional[Callable[[int, int], None]]:
+    """Envolve o callback de progresso para abortar a transferência assim que o job for cancelado."""
+    if cancelamento is None:
+        return progress_callback
+    def callback(bytes_transferred: int, total_bytes: int):
+        if cancelamento.is_set():
+            raise TransferenciaCancelada()
+        if progress_callback:
+            progress_callback(bytes_transferred, total_bytes)
+    return callback
+
 def sftp_connect() -> Optional[Tuple[paramiko.SFTPClient, paramiko.Transport]]:
-    """Cria e retorna um cliente SFTP conectado."""
+    """Cria e retorna um cliente SFTP conectado (fora do pool; o chamador fecha sftp e transport)."""
     if not all([HG_HOST, HG_USER, HG_PASS]):
         print("[SFTP ERRO] Variáveis de ambiente (HG_HOST, HG_USER, HG_PASS) não estão configuradas.")
         return None, None
@@ -25,78 +62,313 @@ def sftp_connect() -> Optional[Tuple[paramiko.SFTPClient, paramiko.Transport]]:
         print(f"[SFTP ERRO] Falha ao conectar: {e}")
         return None, None
 
-def _ensure_remote_dir_exists(sftp: paramiko.SFTPClient, remote_path: str):
+
+def _erro_de_conexao(e: BaseException) -> bool:
+    """Erros que indicam canal/transporte quebrado (e não um erro do servidor SFTP como arquivo inexistente)."""
+    return isinstance(e, (EOFError, paramiko.SSHException, socket.timeout, ConnectionError))
+
+
+class _ConexaoSFTP:
+    def __init__(self, transport: paramiko.Transport, sftp: paramiko.SFTPClient):
+        self.transport = transport
+        self.sftp = sftp
+        self.ultimo_uso = time.monotonic()
+
+    def ativa(self) -> bool:
+        return self.transport.is_active()
+
+    def fechar(self):
+        for obj in (self.sftp, self.transport):
+            try: obj.close()
+            except Exception: pass
+
+
+class PoolSFTP:
     """
-    Função auxiliar interna para garantir que um diretório remoto exista,
-    criando-o recursivamente se necessário.
+    Pool thread-safe de conexões SFTP para um servidor. Cada conexão (Transport + SFTPClient) é reaproveitada
+    entre uploads, downloads e remoções, com keepalive SSH para o servidor não derrubá-la por inatividade.
+    Na retirada, conexões mortas ou ociosas demais são descartadas; uma conexão que cai no meio de uma
+    operação é descartada e a operação é repetida numa conexão nova (ver `executar`). Também guarda os
+    diretórios remotos que já se sabe que existem, para não repetir um stat por nível a cada upload.
     """
-    remote_dir = os.path.dirname(remote_path.replace("\\", "/"))
-    if not remote_dir or remote_dir == '.':
-        return # Não precisa criar diretório se o caminho for na raiz
-        
-    # Divide o caminho em partes para criar cada nível do diretório
-    dirs = remote_dir.split('/')
-    current_dir = ''
-    for d in dirs:
-        if not d: continue # Ignora strings vazias (ex: de um caminho começando com /)
+
+    def __init__(self, host: str, port: int, usuario: str, senha: str, max_conexoes: int = SFTP_POOL_MAX,
+                 keepalive_s: int = SFTP_KEEPALIVE_S, ociosa_max_s: float = SFTP_OCIOSA_MAX_S,
+                 timeout_s: float = SFTP_TIMEOUT_S):
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.senha = senha
+        self.max_conexoes = max(1, int(max_conexoes))
+        self.keepalive_s = keepalive_s
+        self.ociosa_max_s = ociosa_max_s
+        self.timeout_s = timeout_s
+        self._livres: List[_ConexaoSFTP] = []
+        self._abertas = 0
+        self._cond = threading.Condition()
+        self._diretorios: Set[str] = set()
+        self._fechado = False
+        self.conexoes_criadas = 0
+        self.reaproveitadas = 0
+        self.reconexoes = 0
+
+    # --- Conexões ---
+    def _conectar(self) -> _ConexaoSFTP:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout_s)
+        transport = paramiko.Transport(sock)
+        try:
+            transport.connect(username=self.usuario, password=self.senha)
+            transport.set_keepalive(self.keepalive_s)
+            sftp = paramiko.SFTPClient.from_transport(transport)
+            sftp.get_channel().settimeout(self.timeout_s)
+        except Exception:
+            transport.close()
+            raise
+        with self._cond:
+            self.conexoes_criadas += 1
+        print(f"[SFTP] Conexão com {self.host} bem-sucedida.")
+        return _ConexaoSFTP(transport, sftp)
+
+    def _saudavel(self, con: _ConexaoSFTP) -> bool:
+        if not con.ativa():
+            return False
+        if time.monotonic() - con.ultimo_uso > SFTP_VERIFICAR_APOS_S:
+            try: con.sftp.stat(".")
+            except Exception: return False
+        return True
+
+    def _obter(self) -> _ConexaoSFTP:
+        while True:
+            descartar: List[_ConexaoSFTP] = []
+            candidata = None
+            with self._cond:
+                while True:
+                    if self._fechado:
+                        raise RuntimeError("Pool SFTP fechado.")
+                    agora = time.monotonic()
+                    # Conexões paradas há mais de ociosa_max_s são fechadas (as mais antigas ficam no início).
+                    while self._livres and agora - self._livres[0].ultimo_uso > self.ociosa_max_s:
+                        descartar.append(self._livres.pop(0)); self._abertas -= 1
+                    if self._livres:
+                        candidata = self._livres.pop()
+                        break
+                    if self._abertas < self.max_conexoes:
+                        self._abertas += 1
+                        break
+                    self._cond.wait()
+            for con in descartar: con.fechar()
+
+            if candidata is None:
+                try:
+                    return self._conectar()
+                except Exception:
+                    with self._cond:
+                        self._abertas -= 1
+                        self._cond.notify()
+                    raise
+            if self._saudavel(candidata):
+                with self._cond:
+                    self.reaproveitadas += 1
+                return candidata
+            print(f"[SFTP] Conexão ociosa com {self.host} não responde; descartando.")
+            self._devolver(candidata, descartar=True)
+
+    def _devolver(self, con: _ConexaoSFTP, descartar: bool = False):
+        with self._cond:
+            if descartar or self._fechado:
+                self._abertas -= 1
+            else:
+                con.ultimo_uso = time.monotonic()
+                self._livres.append(con)
+            self._cond.notify()
+        if descartar or self._fechado:
+            con.fechar()
+
+    @contextmanager
+    def conexao(self) -> Iterator[paramiko.SFTPClient]:
+        """
+        Empresta um SFTPClient do pool. Se a conexão cair durante o uso, ela é descartada e o erro
+        vira ConexaoPerdida; erros do servidor (arquivo inexistente, permissão) passam como estão.
+        """
+        con = self._obter()
+        descartar = False
+        try:
+            yield con.sftp
+        except TransferenciaCancelada:
+            # A transferência parou no meio (com leituras adiantadas pendentes no download): não reaproveita o canal.
+            descartar = True
+            raise
+        except Exception as e:
+            if _erro_de_conexao(e) or not con.ativa():
+                descartar = True
+                raise ConexaoPerdida(str(e) or e.__class__.__name__) from e
+            raise
+        finally:
+            self._devolver(con, descartar=descartar)
+
+    def executar(self, operacao: Callable[[paramiko.SFTPClient], T], tentativas: int = 2) -> T:
+        """Roda `operacao(sftp)` numa conexão do pool, reconectando e repetindo se a conexão cair no meio."""
+        for tentativa in range(1, tentativas + 1):
+            try:
+                with self.conexao() as sftp:
+                    return operacao(sftp)
+            except ConexaoPerdida as e:
+                if tentativa >= tentativas:
+                    raise
+                with self._cond:
+                    self.reconexoes += 1
+                print(f"[SFTP] Conexão com {self.host} perdida ({e}); reconectando (tentativa {tentativa + 1}/{tentativas}).")
+
+    def fechar(self):
+        """Fecha as conexões ociosas; as emprestadas são fechadas quando voltarem."""
+        with self._cond:
+            self._fechado = True
+            livres, self._livres = self._livres, []
+            self._abertas -= len(livres)
+            self._cond.notify_all()
+        for con in livres: con.fechar()
+
+    # --- Diretórios remotos ---
+    def garantir_diretorio(self, sftp: paramiko.SFTPClient, remote_dir: str):
+        """Cria `remote_dir` (e os pais) se preciso, sem consultar o servidor para os níveis já conhecidos."""
+        remote_dir = remote_dir.replace("\\", "/").rstrip("/")
+        if not remote_dir or remote_dir == '.':
+            return # Não precisa criar diretório se o caminho for na raiz
+        with self._cond:
+            if remote_dir in self._diretorios:
+                return
         # Para caminhos relativos como 'public_html/...', current_dir começa sem a barra
-        if current_dir:
-            current_dir += '/' + d
-        else:
-            current_dir = d
-        
+        current_dir = '/' if remote_dir.startswith('/') else ''
+        for d in remote_dir.split('/'):
+            if not d: continue
+            current_dir = f"{current_dir.rstrip('/')}/{d}" if current_dir else d
+            with self._cond:
+                if current_dir in self._diretorios:
+                    continue
+            try:
+                if not S_ISDIR(sftp.stat(current_dir).st_mode):
+                    raise NotADirectoryError(f"Caminho remoto existe e não é diretório: {current_dir}")
+            except FileNotFoundError:
+                print(f"[SFTP] Criando diretório remoto: {current_dir}")
+                try:
+                    sftp.mkdir(current_dir)
+                except OSError:
+                    sftp.stat(current_dir)  # Outro upload pode ter criado ao mesmo tempo
+            with self._cond:
+                self._diretorios.add(current_dir)
+
+    def esquecer_diretorios(self, remote_dir: Optional[str] = None):
+        """Invalida o cache de diretórios (todo, ou `remote_dir` e seus subdiretórios)."""
+        with self._cond:
+            if remote_dir is None:
+                self._diretorios.clear()
+                return
+            remote_dir = remote_dir.replace("\\", "/").rstrip("/")
+            self._diretorios = {d for d in self._diretorios if d != remote_dir and not d.startswith(remote_dir + "/")}
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"abertas": self._abertas, "ociosas": len(self._livres), "max_conexoes": self.max_conexoes,
+                    "conexoes_criadas": self.conexoes_criadas, "reaproveitadas": self.reaproveitadas,
+                    "reconexoes": self.reconexoes, "diretorios_conhecidos": len(self._diretorios)}
+
+
+_pool: Optional[PoolSFTP] = None
+_pool_lock = threading.Lock()
+
+def obter_pool_sftp() -> Optional[PoolSFTP]:
+    """Pool do servidor configurado em HG_* (criado no primeiro uso, um por processo)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if not all([HG_HOST, HG_USER, HG_PASS]):
+                print("[SFTP ERRO] Variáveis de ambiente (HG_HOST, HG_USER, HG_PASS) não estão configuradas.")
+                return None
+            _pool = PoolSFTP(HG_HOST, HG_PORT, HG_USER, HG_PASS)
+        return _pool
+
+sftp_bytes = metricas.contador("sftp_bytes_total", "Bytes transferidos por SFTP.", ("direcao",))
+
+def _conexoes_pool() -> Optional[Dict[Tuple[str], int]]:
+    if _pool is None: return None
+    e = _pool.estatisticas()
+    return {("abertas",): e["abertas"], ("ociosas",): e["ociosas"], ("max",): e["max_conexoes"]}
+
+metricas.medidor("sftp_pool_conexoes", "Conexões do pool SFTP (abertas, ociosas e o limite).", _conexoes_pool, ("estado",))
+
+def fechar_pool_sftp():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.fechar()
+            _pool = None
+
+def upload_file_sftp(local_path: str, remote_path: str, progress_callback: Optional[Callable[[int, int], None]] = None,
+                     cancelamento: Optional[threading.Event] = None) -> bool:
+    """Faz upload de um arquivo local para um caminho remoto via SFTP, com callback de progresso.
+    Se `cancelamento` for setado durante a transferência, ela é interrompida e o arquivo parcial removido."""
+    pool = obter_pool_sftp()
+    if not pool: return False
+    remote_path = remote_path.replace("\\", "/")
+    remote_dir = os.path.dirname(remote_path)
+
+    def enviar(sftp: paramiko.SFTPClient):
+        pool.garantir_diretorio(sftp, remote_dir)
+        callback = _callback_cancelavel(progress_callback, cancelamento)
         try:
-            # Verifica se o diretório/arquivo existe
-            sftp.stat(current_dir)
-        except FileNotFoundError:
-            # Se não existe, cria o diretório
-            print(f"[SFTP] Criando diretório remoto: {current_dir}")
-            sftp.mkdir(current_dir)
-
-def upload_file_sftp(local_path: str, remote_path: str, progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
-    """Faz upload de um arquivo local para um caminho remoto via SFTP, com callback de progresso."""
-    sftp, transport = sftp_connect()
-    if not sftp: return False
-    
+            try:
+                sftp.put(local_path, remote_path, callback=callback)
+            except FileNotFoundError:
+                # Diretório apagado no servidor depois de entrar no cache: esquece e cria de novo.
+                pool.esquecer_diretorios(remote_dir)
+                pool.garantir_diretorio(sftp, remote_dir)
+                sftp.put(local_path, remote_path, callback=callback)
+        except TransferenciaCancelada:
+            try: sftp.remove(remote_path)
+            except Exception: pass
+            raise
+
     try:
-        _ensure_remote_dir_exists(sftp, remote_path)
-        
         print(f"[SFTP] Fazendo upload de '{local_path}' para '{remote_path}'...")
-        # Passa a função de callback para o método .put() do paramiko
-        sftp.put(local_path, remote_path.replace("\\", "/"), callback=progress_callback)
+        pool.executar(enviar)
+        sftp_bytes.inc(os.path.getsize(local_path), direcao="envio")
         print(f"[SFTP] Upload de '{os.path.basename(local_path)}' concluído.")
         return True
+    except TransferenciaCancelada:
+        print(f"[SFTP] Upload de '{os.path.basename(local_path)}' cancelado.")
+        return False
     except Exception as e:
         print(f"[SFTP ERRO] Falha no upload: {e}"); return False
-    finally:
-        if sftp: sftp.close()
-        if transport: transport.close()
-
-def download_file_sftp(remote_path: str, local_path: str, progress_callback: Optional[Callable[[int, int], None]] = None) -> bool:
-    """Baixa um arquivo de um caminho remoto para um local via SFTP, com callback de progresso."""
-    sftp, transport = sftp_connect()
-    if not sftp: return False
-    
+
+def download_file_sftp(remote_path: str, local_path: str, progress_callback: Optional[Callable[[int, int], None]] = None,
+                       cancelamento: Optional[threading.Event] = None) -> bool:
+    """Baixa um arquivo de um caminho remoto para um local via SFTP, com callback de progresso e cancelamento."""
+    pool = obter_pool_sftp()
+    if not pool: return False
+
     try:
         print(f"[SFTP] Baixando de '{remote_path}' para '{local_path}'...")
         # Passa a função de callback para o método .get() do paramiko
-        sftp.get(remote_path.replace("\\", "/"), local_path, callback=progress_callback)
+        pool.executar(lambda sftp: sftp.get(remote_path.replace("\\", "/"), local_path,
+                                            callback=_callback_cancelavel(progress_callback, cancelamento)))
+        sftp_bytes.inc(os.path.getsize(local_path), direcao="recebimento")
         print(f"[SFTP] Download de '{os.path.basename(remote_path)}' concluído.")
         return True
+    except TransferenciaCancelada:
+        print(f"[SFTP] Download de '{os.path.basename(remote_path)}' cancelado.")
+        if os.path.exists(local_path): os.remove(local_path)
+        return False
     except Exception as e:
         print(f"[SFTP ERRO] Falha no download: {e}"); return False
-    finally:
-        if sftp: sftp.close()
-        if transport: transport.close()
 
 def delete_file_sftp(remote_path: str) -> bool:
     """Deleta um arquivo em um caminho remoto via SFTP."""
-    sftp, transport = sftp_connect()
-    if not sftp: return False
-    
+    pool = obter_pool_sftp()
+    if not pool: return False
+
     try:
         print(f"[SFTP] Deletando arquivo remoto: '{remote_path}'...")
-        sftp.remove(remote_path.replace("\\", "/"))
+        pool.executar(lambda sftp: sftp.remove(remote_path.replace("\\", "/")))
         print(f"[SFTP] Arquivo '{os.path.basename(remote_path)}' deletado.")
         return True
     except FileNotFoundError:
@@ -104,6 +376,3 @@ def delete_file_sftp(remote_path: str) -> bool:
         return True # Considera sucesso se o arquivo já não existe
     except Exception as e:
         print(f"[SFTP ERRO] Falha ao deletar '{remote_path}': {e}"); return False
-    finally:
-        if sftp: sftp.close()
-        if transport: transport.close()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Por quantos frames (do vídeo) a última posição de um track continua valendo sem ele ser detectado.
+# Cobre oclusões curtas e falhas de detecção de um frame sem perder o cruzamento.
+TRACK_MAX_IDADE_FRAMES = int(os.getenv("TRACK_MAX_IDADE_FRAMES", "15"))
+# Slots pré-alocados; a tabela só cresce se houver mais tracks vivos do que isso ao mesmo tempo.
+TRACK_CAPACIDADE_INICIAL = 256
+
+
+class TabelaTracks:
+    """
+    Estado dos tracks em arrays NumPy pré-alocados: última posição, último frame visto e classe.
+    Cada frame só toca os slots dos tracks detectados; entradas mais velhas que max_idade_frames são despejadas
+    em lote, então a memória fica limitada ao número de tracks vivos.
+    """
+
+    def __init__(self, max_idade_frames: int = TRACK_MAX_IDADE_FRAMES, capacidade: int = TRACK_CAPACIDADE_INICIAL):
+        self.max_idade_frames = max(1, int(max_idade_frames))
+        capacidade = max(1, int(capacidade))
+        self.ids = np.full(capacidade, -1, dtype=np.int64)
+        self.x = np.zeros(capacidade, dtype=np.int64)
+        self.y = np.zeros(capacidade, dtype=np.int64)
+        self.ultimo_frame = np.zeros(capacidade, dtype=np.int64)
+        self.classe = np.zeros(capacidade, dtype=np.int64)
+        self._slot: Dict[int, int] = {}          # track_id -> slot
+        self._livres = list(range(capacidade - 1, -1, -1))
+        self._proxima_expiracao = self.max_idade_frames
+        self.despejados = 0
+
+    def __len__(self) -> int:
+        return len(self._slot)
+
+    def _slots(self, ids: np.ndarray) -> np.ndarray:
+        """Slot de cada ID (-1 se o ID não está na tabela)."""
+        return np.fromiter((self._slot.get(tid, -1) for tid in ids.tolist()), dtype=np.int64, count=len(ids))
+
+    def anteriores(self, ids: np.ndarray, frame_idx: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Última posição conhecida de cada ID e se ela ainda vale (vista há no máximo max_idade_frames)."""
+        slots = self._slots(ids)
+        existe = slots >= 0
+        s = np.where(existe, slots, 0)
+        valido = existe & (frame_idx - self.ultimo_frame[s] <= self.max_idade_frames)
+        return self.x[s], self.y[s], valido
+
+    def atualizar(self, ids: np.ndarray, classes: np.ndarray, x: np.ndarray, y: np.ndarray, frame_idx: int):
+        """Grava a posição atual dos IDs detectados no frame, criando slots para os novos."""
+        if frame_idx >= self._proxima_expiracao:
+            self.expirar(frame_idx)
+        slots = self._slots(ids)
+        for i in np.flatnonzero(slots < 0).tolist():
+            if not self._livres:
+                self.expirar(frame_idx)
+                if not self._livres: self._crescer()
+            slot = self._livres.pop()
+            tid = int(ids[i])
+            self._slot[tid] = slot; self.ids[slot] = tid
+            slots[i] = slot
+        self.x[slots] = x; self.y[slots] = y
+        self.classe[slots] = classes
+        self.ultimo_frame[slots] = frame_idx
+
+    def expirar(self, frame_idx: int) -> int:
+        """Libera, de uma vez, os slots dos tracks não vistos há mais de max_idade_frames."""
+        velhos = np.flatnonzero((self.ids >= 0) & (frame_idx - self.ultimo_frame > self.max_idade_frames))
+        for slot in velhos.tolist():
+            del self._slot[int(self.ids[slot])]
+            self._livres.append(slot)
+        self.ids[velhos] = -1
+        self.despejados += len(velhos)
+        self._proxima_expiracao = frame_idx + self.max_idade_frames
+        return len(velhos)
+
+    def _crescer(self):
+        antiga = len(self.ids)
+        for nome in ("ids", "x", "y", "ultimo_frame", "classe"):
+            arr = getattr(self, nome)
+            extra = np.full(antiga, -1, dtype=arr.dtype) if nome == "ids" else np.zeros(antiga, dtype=arr.dtype)
+            setattr(self, nome, np.concatenate([arr, extra]))
+        self._livres.extend(range(2 * antiga - 1, antiga - 1, -1))
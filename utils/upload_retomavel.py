@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, Iterable
+
+# Tamanho máximo de um vídeo enviado (bytes). Padrão: 4 GiB.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(4 * 1024 ** 3)))
+# Tamanho dos blocos lidos da requisição e gravados em disco (e sugerido ao cliente nos uploads retomáveis).
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Sessões de upload sem atividade por mais que isso são descartadas (arquivo parcial incluído).
+UPLOAD_SESSAO_TTL_S = float(os.getenv("UPLOAD_SESSAO_TTL_S", str(24 * 3600)))
+
+
+class UploadErro(Exception):
+    """Erro de upload com o status HTTP correspondente (400, 404, 409, 413...)."""
+
+    def __init__(self, status_code: int, mensagem: str, **extra: Any):
+        super().__init__(mensagem)
+        self.status_code = status_code
+        self.mensagem = mensagem
+        self.extra = extra
+
+
+class ArquivoEmEscrita:
+    """Arquivo sendo gravado em blocos, com o SHA-256 calculado à medida que os bytes chegam."""
+
+    def __init__(self, caminho: str, limite_bytes: int = UPLOAD_MAX_BYTES, offset: int = 0, hasher: Any = None):
+        self.caminho = caminho
+        self.limite_bytes = limite_bytes
+        self.offset = offset
+        self.hasher = hasher or hashlib.sha256()
+        self._f = open(caminho, "r+b" if offset else "wb")
+        self._f.seek(offset)
+
+    def escrever(self, bloco: bytes):
+        """Grava um bloco (chamar fora do event loop). Levanta UploadErro 413 se passar do limite."""
+        if self.offset + len(bloco) > self.limite_bytes:
+            raise UploadErro(413, f"Arquivo excede o limite de {self.limite_bytes} bytes.", limite_bytes=self.limite_bytes)
+        self._f.write(bloco)
+        self.hasher.update(bloco)
+        self.offset += len(bloco)
+
+    def abortar(self):
+        """Fecha o arquivo sem confirmar a gravação (o chamador decide se apaga)."""
+        if not self._f.closed: self._f.close()
+
+    def fechar(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.truncate(self.offset)
+        self._f.close()
+
+
+class _Sessao:
+    def __init__(self, upload_id: str, nome_original: str, tamanho_total: int, sha256_esperado: Optional[str],
+                 offset: int = 0, criado_em: Optional[float] = None):
+        self.upload_id = upload_id
+        self.nome_original = nome_original
+        self.tamanho_total = tamanho_total
+        self.sha256_esperado = sha256_esperado.lower() if sha256_esperado else None
+        self.offset = offset
+        self.criado_em = criado_em or time.time()
+        self.atualizado_em = time.time()
+        self.hasher: Any = None          # Reconstruído a partir do arquivo parcial se o servidor reiniciou
+        self.lock = threading.Lock()     # Um PUT por vez por sessão
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {"upload_id": self.upload_id, "nome_original": self.nome_original, "tamanho_total": self.tamanho_total,
+                "sha256_esperado": self.sha256_esperado, "offset": self.offset, "criado_em": self.criado_em}
+
+
+class GerenciadorUploads:
+    """
+    Sessões de upload retomável. O cliente cria uma sessão (nome e tamanho), envia os bytes em um ou mais
+    PUTs a partir do offset que o servidor confirmou e, no fim, conclui a sessão. Se a conexão cair, consulta
+    o offset e continua de onde parou. O estado de cada sessão fica num .json ao lado do arquivo parcial,
+    então as sessões sobrevivem a um reinício do servidor.
+    """
+
+    def __init__(self, pasta_sessoes: str, pasta_destino: str, limite_bytes: int = UPLOAD_MAX_BYTES,
+                 ttl_s: float = UPLOAD_SESSAO_TTL_S):
+        self.pasta_sessoes = pasta_sessoes
+        self.pasta_destino = pasta_destino
+        self.limite_bytes = limite_bytes
+        self.ttl_s = ttl_s
+        os.makedirs(pasta_sessoes, exist_ok=True)
+        os.makedirs(pasta_destino, exist_ok=True)
+        self._sessoes: Dict[str, _Sessao] = {}
+        self._lock = threading.Lock()
+
+    def _caminho_parcial(self, upload_id: str) -> str:
+        return os.path.join(self.pasta_sessoes, f"{upload_id}.part")
+
+    def _caminho_meta(self, upload_id: str) -> str:
+        return os.path.join(self.pasta_sessoes, f"{upload_id}.json")
+
+    def _salvar_meta(self, sessao: _Sessao):
+        tmp = self._caminho_meta(sessao.upload_id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sessao.como_dict(), f)
+        os.replace(tmp, self._caminho_meta(sessao.upload_id))
+
+    def _remover_arquivos(self, upload_id: str):
+        for caminho in (self._caminho_parcial(upload_id), self._caminho_meta(upload_id)):
+            if os.path.exists(caminho): os.remove(caminho)
+
+    def limpar_expiradas(self) -> int:
+        """Apaga as sessões paradas há mais de ttl_s (inclusive as que só existem em disco)."""
+        limite = time.time() - self.ttl_s
+        removidas = 0
+        for nome in os.listdir(self.pasta_sessoes):
+            if not nome.endswith(".json"):
+                continue
+            upload_id = nome[:-5]
+            caminho = self._caminho_meta(upload_id)
+            try:
+                if os.path.getmtime(caminho) >= limite:
+                    continue
+            except OSError:
+                continue
+            with self._lock:
+                self._sessoes.pop(upload_id, None)
+            self._remover_arquivos(upload_id)
+            removidas += 1
+        if removidas: print(f"[UPLOAD] {removidas} sessão(ões) de upload expirada(s) removida(s).")
+        return removidas
+
+    def criar(self, nome_original: str, tamanho_total: int, sha256: Optional[str] = None) -> Dict[str, Any]:
+        if tamanho_total <= 0:
+            raise UploadErro(400, "tamanho_total deve ser maior que zero.")
+        if tamanho_total > self.limite_bytes:
+            raise UploadErro(413, f"Arquivo excede o limite de {self.limite_bytes} bytes.", limite_bytes=self.limite_bytes)
+        self.limpar_expiradas()
+        sessao = _Sessao(uuid.uuid4().hex, nome_original, tamanho_total, sha256)
+        open(self._caminho_parcial(sessao.upload_id), "wb").close()
+        self._salvar_meta(sessao)
+        with self._lock:
+            self._sessoes[sessao.upload_id] = sessao
+        print(f"[UPLOAD] Sessão {sessao.upload_id} criada para '{nome_original}' ({tamanho_total} bytes).")
+        return self.situacao(sessao.upload_id)
+
+    def _obter(self, upload_id: str) -> _Sessao:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            raise UploadErro(404, "Sessão de upload não encontrada ou expirada.")
+        with self._lock:
+            sessao = self._sessoes.get(upload_id)
+            if sessao is not None:
+                return sessao
+            # Sessão criada antes de um reinício: recarrega do disco.
+            caminho = self._caminho_meta(upload_id)
+            if not os.path.isfile(caminho) or not os.path.isfile(self._caminho_parcial(upload_id)):
+                raise UploadErro(404, "Sessão de upload não encontrada ou expirada.")
+            with open(caminho, encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["offset"] = min(meta.get("offset", 0), os.path.getsize(self._caminho_parcial(upload_id)))
+            sessao = _Sessao(meta["upload_id"], meta["nome_original"], meta["tamanho_total"], meta.get("sha256_esperado"),
+                             offset=meta["offset"], criado_em=meta.get("criado_em"))
+            self._sessoes[upload_id] = sessao
+            return sessao
+
+    def situacao(self, upload_id: str) -> Dict[str, Any]:
+        sessao = self._obter(upload_id)
+        return {"upload_id": sessao.upload_id, "offset": sessao.offset, "tamanho_total": sessao.tamanho_total,
+                "completo": sessao.offset >= sessao.tamanho_total, "chunk_recomendado": UPLOAD_CHUNK_BYTES}
+
+    def _hasher_ate_offset(self, sessao: _Sessao) -> Any:
+        """Hash dos bytes já recebidos; só relê o arquivo parcial se a sessão veio do disco."""
+        if sessao.hasher is None:
+            hasher = hashlib.sha256()
+            with open(self._caminho_parcial(sessao.upload_id), "rb") as f:
+                restante = sessao.offset
+                while restante > 0:
+                    bloco = f.read(min(UPLOAD_CHUNK_BYTES, restante))
+                    if not bloco: break
+                    hasher.update(bloco); restante -= len(bloco)
+            sessao.hasher = hasher
+        return sessao.hasher
+
+    def abrir_escrita(self, upload_id: str, offset: int) -> ArquivoEmEscrita:
+        """
+        Prepara a gravação de um PUT a partir de `offset` (chamar fora do event loop). O offset precisa ser
+        exatamente o que o servidor já tem; senão levanta UploadErro 409 informando o offset correto.
+        """
+        sessao = self._obter(upload_id)
+        if not sessao.lock.acquire(blocking=False):
+            raise UploadErro(409, "Já existe um envio em andamento para esta sessão.", offset=sessao.offset)
+        try:
+            if offset != sessao.offset:
+                raise UploadErro(409, f"Offset {offset} não confere com o recebido pelo servidor.", offset=sessao.offset)
+            return ArquivoEmEscrita(self._caminho_parcial(upload_id), limite_bytes=sessao.tamanho_total,
+                                    offset=sessao.offset, hasher=self._hasher_ate_offset(sessao))
+        except Exception:
+            sessao.lock.release()
+            raise
+
+    def fechar_escrita(self, upload_id: str, arquivo: ArquivoEmEscrita):
+        """Grava o offset alcançado (mesmo se a conexão caiu no meio) e libera a sessão para o próximo PUT."""
+        sessao = self._obter(upload_id)
+        try:
+            arquivo.fechar()
+            sessao.offset = arquivo.offset
+            sessao.hasher = arquivo.hasher
+            sessao.atualizado_em = time.time()
+            self._salvar_meta(sessao)
+        finally:
+            sessao.lock.release()
+
+    def escrever(self, upload_id: str, offset: int, blocos: Iterable[bytes]) -> Dict[str, Any]:
+        """Versão síncrona de um PUT completo (abrir, gravar os blocos e fechar)."""
+        arquivo = self.abrir_escrita(upload_id, offset)
+        try:
+            for bloco in blocos:
+                arquivo.escrever(bloco)
+        finally:
+            self.fechar_escrita(upload_id, arquivo)
+        return self.situacao(upload_id)
+
+    def concluir(self, upload_id: str) -> Dict[str, Any]:
+        """Confere tamanho e hash e move o arquivo para a pasta de uploads com um nome único."""
+        sessao = self._obter(upload_id)
+        with sessao.lock:
+            if sessao.offset != sessao.tamanho_total:
+                raise UploadErro(409, f"Upload incompleto: {sessao.offset} de {sessao.tamanho_total} bytes.", offset=sessao.offset)
+            sha256 = self._hasher_ate_offset(sessao).hexdigest()
+            if sessao.sha256_esperado and sha256 != sessao.sha256_esperado:
+                with self._lock:
+                    self._sessoes.pop(upload_id, None)
+                self._remover_arquivos(upload_id)
+                raise UploadErro(422, "SHA-256 do arquivo recebido não confere; envie novamente.", sha256=sha256)
+            nome_final = f"{uuid.uuid4()}{os.path.splitext(sessao.nome_original)[1]}"
+            os.replace(self._caminho_parcial(upload_id), os.path.join(self.pasta_destino, nome_final))
+            if os.path.exists(self._caminho_meta(upload_id)): os.remove(self._caminho_meta(upload_id))
+            with self._lock:
+                self._sessoes.pop(upload_id, None)
+        print(f"[UPLOAD] Sessão {upload_id} concluída: '{sessao.nome_original}' salvo como '{nome_final}'.")
+        return {"nome_arquivo": nome_final, "sha256": sha256, "tamanho": sessao.tamanho_total}
+
+    def cancelar(self, upload_id: str):
+        sessao = self._obter(upload_id)
+        with sessao.lock:
+            with self._lock:
+                self._sessoes.pop(upload_id, None)
+            self._remover_arquivos(upload_id)
@@ -0,0 +1,80 @@
+from typing import Dict, Any, List
+
+import cv2
+import numpy as np
+
+# Brilho mínimo dos "animais" e máximo do fundo: o DetectorBlobs separa os dois por limiar.
+BRILHO_ANIMAL = 200
+BRILHO_FUNDO_MAX = 90
+
+
+def gerar_video_sintetico(caminho: str, largura: int = 640, altura: int = 360, n_frames: int = 150, fps: float = 30.0,
+                          n_animais: int = 5, semente: int = 0, line_position_ratio: float = 0.5) -> Dict[str, Any]:
+    """
+    Grava um vídeo com `n_animais` elipses claras descendo sobre um fundo escuro com ruído (orientação S),
+    entrando em momentos e velocidades diferentes. Determinístico para a mesma semente.
+    Retorna os metadados, incluindo quantos animais cruzam a linha dentro do vídeo (contagem esperada).
+    """
+    rng = np.random.default_rng(semente)
+    fundo = rng.integers(20, BRILHO_FUNDO_MAX, size=(altura, largura, 3), dtype=np.uint8)
+    fundo = cv2.GaussianBlur(fundo, (5, 5), 0)
+    eixo_y = max(4, int(altura * 0.05)); eixo_x = max(6, int(eixo_y * 1.6))
+    # Faixas horizontais distintas para os animais não se fundirem num só blob ao se cruzarem.
+    faixas = max(1, (largura - 2 * eixo_x) // (2 * eixo_x + 4))
+    animais: List[Dict[str, float]] = []
+    for i in range(n_animais):
+        animais.append({
+            "x": eixo_x + (i % faixas) * (2 * eixo_x + 4) + eixo_x // 2 + float(rng.uniform(0, 2)),
+            "entrada": float(rng.uniform(0, max(1, n_frames * 0.6))),
+            "velocidade": float(rng.uniform(altura / n_frames * 1.2, altura / n_frames * 3.0)),
+            "deriva": float(rng.uniform(-0.3, 0.3)),
+        })
+    linha_y = int(altura * line_position_ratio)
+    out = cv2.VideoWriter(caminho, cv2.VideoWriter_fourcc(*"mp4v"), fps, (largura, altura))
+    cruzaram = set()
+    frame = np.empty_like(fundo)
+    for f in range(n_frames):
+        np.copyto(frame, fundo)
+        for i, a in enumerate(animais):
+            t = f - a["entrada"]
+            if t < 0: continue
+            y = -eixo_y + t * a["velocidade"]
+            x = a["x"] + t * a["deriva"]
+            if y - eixo_y > altura: continue
+            if y > linha_y: cruzaram.add(i)
+            cv2.ellipse(frame, (int(x), int(y)), (eixo_x, eixo_y), 0, 0, 360, (BRILHO_ANIMAL,) * 3, -1)
+        out.write(frame)
+    out.release()
+    return {"caminho": caminho, "largura": largura, "altura": altura, "frames": n_frames, "fps": fps,
+            "animais": n_animais, "semente": semente, "esperado": len(cruzaram)}
+
+
+class DetectorBlobs:
+    """
+    Detector falso com a interface de YOLO.predict(): cada região clara do frame vira uma 'cow'.
+    Custo baixo e previsível, para medir o resto do pipeline sem pesos de modelo.
+    """
+    names = {0: "cow"}
+
+    def __init__(self, limiar: int = (BRILHO_ANIMAL + BRILHO_FUNDO_MAX) // 2, area_min: int = 50):
+        self.limiar = limiar
+        self.area_min = area_min
+
+    def predict(self, source: Any, verbose: bool = False, conf: float = 0.25, **kwargs: Any) -> List[Any]:
+        import torch
+        from ultralytics.engine.results import Results
+
+        frames = source if isinstance(source, list) else [source]
+        results = []
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            _, mask = cv2.threshold(gray, self.limiar, 255, cv2.THRESH_BINARY)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+            stats = stats[1:n]
+            stats = stats[stats[:, 4] > self.area_min]
+            data = np.zeros((len(stats), 6), dtype=np.float32)
+            data[:, 0] = stats[:, 0]; data[:, 1] = stats[:, 1]
+            data[:, 2] = stats[:, 0] + stats[:, 2]; data[:, 3] = stats[:, 1] + stats[:, 3]
+            data[:, 4] = 0.9
+            results.append(Results(frame, path="", names=self.names, boxes=torch.from_numpy(data)))
+        return results